@@ -30,10 +30,15 @@ if str(SRC_DIR) not in sys.path:
 # IMPORTS DEL MOTOR QA
 # ==========================================================
 
-from core.build_case import build_case_from_dicom
-from qa.engine import evaluate_case
+from core.build_case import build_lazy_case_from_dicom, build_preview_case_from_dicom
+from qa.engine import evaluate_case, evaluate_case_preview
+from qa.checks import get_struct_categories_for_checks
 # ¡IMPORTANTE: Renombrar una de las funciones para evitar conflicto!
-from qa.build_ui_config import get_effective_configs, build_ui_config as build_effective_config
+from qa.build_ui_config import (
+    get_effective_configs,
+    get_enabled_check_ids,
+    build_ui_config as build_effective_config,
+)
 from qa.config import build_ui_config
 from qa.config_overrides import load_overrides, save_overrides
 
@@ -83,6 +88,14 @@ class ConnectionManager:
                 # Si hay error, desconectar
                 self.disconnect(connection)
 
+    async def send_preview(self, payload: Dict[str, Any]):
+        """Envía el resultado parcial (vista previa de cabeceras) a los clientes"""
+        for connection in self.active_connections:
+            try:
+                await connection.send_json({"type": "preview", **payload})
+            except:
+                self.disconnect(connection)
+
 manager = ConnectionManager()
 
 # WebSocket para progreso
@@ -215,31 +228,42 @@ async def run_qa(
         # -----------------------------
         # Motor QA
         # -----------------------------
-        case = build_case_from_dicom(
+        # Case perezoso: sólo se lee lo que tocan los checks activos
+        eff = get_effective_configs()
+        enabled_checks = get_enabled_check_ids(eff)
+
+        case_kwargs = dict(
             patient_id=patient_id,
             ct_folder=str(ct_path),
             rtstruct_path=str(rtstruct_path),
             rtplan_path=str(rtplan_path) if rtplan_path.exists() else None,
             rtdose_path=str(rtdose_path) if rtdose_path.exists() else None,
         )
-        
-        await manager.send_progress("Ejecutando análisis de CT...", 40)
-        await asyncio.sleep(0.1)  # Pequeña pausa para que se vea el progreso
-        
-        await manager.send_progress("Ejecutando análisis de estructuras...", 50)
-        await asyncio.sleep(0.1)
-        
-        await manager.send_progress("Ejecutando análisis del plan...", 60)
-        await asyncio.sleep(0.1)
-        
-        await manager.send_progress("Ejecutando análisis de dosis...", 70)
-        
-        qa_result = evaluate_case(case)
+
+        # Fase 1: vista previa con checks de cabecera (CT geometry/FOV, plan...)
+        preview_case = await asyncio.to_thread(build_preview_case_from_dicom, **case_kwargs)
+        preview_result = await asyncio.to_thread(
+            evaluate_case_preview, preview_case, enabled_checks
+        )
+        await manager.send_preview(
+            {
+                "patient_id": patient_id,
+                "total_score": preview_result.total_score,
+                "checks": [_normalize_check(chk) for chk in preview_result.checks],
+            }
+        )
+
+        # Fase 2: QA completo (píxeles), en un hilo para no bloquear el websocket
+        await manager.send_progress("Vista previa lista. Ejecutando checks de CT, estructuras y dosis...", 40)
+        case = build_lazy_case_from_dicom(
+            **case_kwargs,
+            struct_categories=get_struct_categories_for_checks(enabled_checks),
+        )
+        qa_result = await asyncio.to_thread(evaluate_case, case, enabled_checks)
         
         await manager.send_progress("Procesando resultados...", 80)
         all_checks = [_normalize_check(chk) for chk in qa_result.checks]
 
-        eff = get_effective_configs()
         checks_cfg = eff["checks"]
 
         enabled_by_result_name: Dict[str, bool] = {}
@@ -355,15 +379,17 @@ async def export_csv(data_root: str, patient_id: str):
     rtdose_path   = patient_dir / "RTDOSE.dcm"
     rtplan_path   = patient_dir / "RTPLAN.dcm"
 
-    case = build_case_from_dicom(
+    enabled_checks = get_enabled_check_ids()
+    case = build_lazy_case_from_dicom(
         patient_id=patient_id,
         ct_folder=str(ct_path),
         rtstruct_path=str(rtstruct_path),
         rtplan_path=str(rtplan_path) if rtplan_path.exists() else None,
         rtdose_path=str(rtdose_path) if rtdose_path.exists() else None,
+        struct_categories=get_struct_categories_for_checks(enabled_checks),
     )
 
-    qa_result = evaluate_case(case)
+    qa_result = evaluate_case(case, enabled_checks=enabled_checks)
     checks = [_normalize_check_for_ui(chk) for chk in qa_result.checks]
 
     buffer = io.StringIO()
@@ -1,200 +1,178 @@
 # src/common/build_case.py
 
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 import numpy as np
 import os
 
 
-from core.case import Case, StructureInfo, PlanInfo, BeamInfo
+from core.case import (
+    Case,
+    StructureInfo,
+    PlanInfo,
+    BeamInfo,
+    LazyCase,
+    LazyMetadata,
+    LazyStructureInfo,
+    structure_stats_from_mask,
+)
 from core.geometry import compute_centroid, compute_volume_cc
+from core.control_points import (
+    extract_control_point_arrays,
+    compute_aperture_areas_cm2,
+    _raw_text,
+)
+from core.delivery import gantry_steps_deg
+from core.naming import StructCategory, normalize_structure_name, is_helper_structure
 from core.dicom_io import (
     load_ct_series,
+    read_ct_series_header,
     load_rtstruct,
+    open_rtstruct,
+    read_rtstruct_roi_names,
+    read_rtstruct_index,
+    rtstruct_roi_mask,
     load_rtplan,
+    RTPLAN_QA_TAGS,
     load_rtdose,
     resample_dose_to_ct,
+    resample_dose_to_grid,
 )
 
 
+# =====================================================
+# RTPLAN → PlanInfo (parser único)
+# =====================================================
+#
+# Un solo recorrido por BeamSequence y, dentro de cada beam, un solo
+# recorrido por ControlPointSequence (core.control_points). El resto de
+# campos de beam se leen por tag sin convertir el Dataset completo.
 
-def _extract_beams_from_rtplan(ds_plan) -> List[BeamInfo]:
-    """
-    Extrae información básica de cada beam/arco de un RTPLAN (pydicom Dataset)
-    y la empaqueta en una lista de BeamInfo.
-
-    Intenta ser robusto:
-      - Si faltan algunos campos, pone None.
-      - Detecta si es arco mirando:
-          * BeamType == 'DYNAMIC'  (Varian VMAT típico)
-          * ó si hay ControlPointSequence con gantry angles distintos.
-    """
-    beams: List[BeamInfo] = []
+_TAG_BEAM_NUMBER = 0x300A00C0          # BeamNumber
+_TAG_BEAM_NAME = 0x300A00C2            # BeamName
+_TAG_BEAM_TYPE = 0x300A00C4            # BeamType
+_TAG_RADIATION_TYPE = 0x300A00C6       # RadiationType
+_TAG_DELIVERY_TYPE = 0x300A00CE        # TreatmentDeliveryType
+_TAG_MACHINE_NAME = 0x300A00B2         # TreatmentMachineName
 
-    if not hasattr(ds_plan, "BeamSequence"):
-        return beams
-
-    for beam_ds in ds_plan.BeamSequence:
-        beam_number = int(getattr(beam_ds, "BeamNumber", len(beams) + 1))
-        beam_name = str(getattr(beam_ds, "BeamName", f"Beam_{beam_number}"))
-
-        modality = getattr(beam_ds, "RadiationType", None)        # "PHOTON", "ELECTRON", etc.
-        beam_type = getattr(beam_ds, "BeamType", None)            # "STATIC", "DYNAMIC", etc.
-
-        # Angulos couch / colimador (a nivel de beam, si existen)
-        couch_angle = None
-        collimator_angle = None
-        if hasattr(beam_ds, "ControlPointSequence") and len(beam_ds.ControlPointSequence) > 0:
-            cp0 = beam_ds.ControlPointSequence[0]
-            couch_angle = float(getattr(cp0, "PatientSupportAngle", 0.0))
-            collimator_angle = float(getattr(cp0, "BeamLimitingDeviceAngle", 0.0))
-
-        # Intento de determinar si es arco (gantry se mueve)
-        gantry_start = None
-        gantry_end = None
-        is_arc = False
-
-        if hasattr(beam_ds, "ControlPointSequence") and len(beam_ds.ControlPointSequence) >= 2:
-            cp0 = beam_ds.ControlPointSequence[0]
-            cp_last = beam_ds.ControlPointSequence[-1]
-
-            g0 = float(getattr(cp0, "GantryAngle", 0.0))
-            g1 = float(getattr(cp_last, "GantryAngle", 0.0))
-
-            gantry_start = g0
-            gantry_end = g1
-
-            if abs(g1 - g0) > 1.0:
-                is_arc = True
-
-        # Otra pista: BeamType "DYNAMIC" suele indicar arco VMAT
-        if beam_type is not None and "DYNAMIC" in str(beam_type).upper():
-            is_arc = True
-
-        beams.append(
-            BeamInfo(
-                beam_number=beam_number,
-                beam_name=beam_name,
-                modality=str(modality) if modality is not None else None,
-                beam_type=str(beam_type) if beam_type is not None else None,
-                is_arc=is_arc,
-                gantry_start=gantry_start,
-                gantry_end=gantry_end,
-                couch_angle=couch_angle,
-                collimator_angle=collimator_angle,
-            )
-        )
-
-    return beams
 
+def _parse_beam(beam_ds, index: int, beam_mu: Dict[int, float]) -> BeamInfo:
+    """
+    BeamInfo de un item de BeamSequence, con sus ControlPointArrays.
 
+    Es arco si el CP0 declara rotación de gantry (CW/CC) o si el gantry
+    se mueve más de 1° a lo largo de los control points.
+    """
+    try:
+        beam_number = int(_raw_text(beam_ds, _TAG_BEAM_NUMBER) or index + 1)
+    except ValueError:
+        beam_number = index + 1
+    beam_name = _raw_text(beam_ds, _TAG_BEAM_NAME) or f"Beam{beam_number}"
+    beam_type = (_raw_text(beam_ds, _TAG_BEAM_TYPE) or "").upper() or None
+    modality = _raw_text(beam_ds, _TAG_RADIATION_TYPE)
+
+    cpa = extract_control_point_arrays(beam_ds)
+
+    gantry_start = gantry_end = couch_angle = col_angle = None
+    is_arc = False
+    apertures = None
+    if cpa is not None:
+        gantry_start = float(cpa.gantry_deg[0])
+        gantry_end = float(cpa.gantry_deg[-1])
+        couch_angle = float(cpa.couch_deg[0])
+        col_angle = float(cpa.collimator_deg[0])
+        rot_dir = cpa.gantry_rotation_direction or ""
+        is_arc = rot_dir in ("CW", "CC", "CCW") or float(gantry_steps_deg(cpa).sum()) > 1.0
+        apertures = compute_aperture_areas_cm2(cpa)
+
+    return BeamInfo(
+        beam_number=beam_number,
+        beam_name=beam_name,
+        modality=modality,
+        beam_type=beam_type,
+        is_arc=is_arc,
+        gantry_start=gantry_start,
+        gantry_end=gantry_end,
+        couch_angle=couch_angle,
+        collimator_angle=col_angle,
+        monitor_units=beam_mu.get(beam_number),
+        num_control_points=len(cpa) if cpa is not None else None,
+        control_points=cpa,
+        aperture_areas_cm2=apertures,
+    )
 
-from typing import Optional, List
-from core.case import PlanInfo, BeamInfo
 
 def _build_plan_info(ds) -> Optional[PlanInfo]:
     """
-    Extrae información básica del RTPLAN (pydicom Dataset) para PlanInfo.
+    Extrae la información del RTPLAN (pydicom Dataset) para PlanInfo.
     Diseñado pensando en Eclipse/Halcyon, pero robusto.
+
+    Basta con un Dataset leído con dicom_io.RTPLAN_QA_TAGS.
+
+    Energía, técnica, máquina e isocentro salen del primer beam de
+    tratamiento (TreatmentDeliveryType == TREATMENT), no de los de setup
+    o imagen (kV/CBCT).
     """
     if ds is None:
         return None
 
-    # 1) Primer haz
-    try:
-        first_beam = ds.BeamSequence[0]
-    except Exception:
-        first_beam = None
-
-    # 2) Energía nominal
-    energy = "UNKNOWN"
+    # 1) MU por beam (por fracción) y nº de fracciones
+    beam_mu: Dict[int, float] = {}
+    num_fx_planned = None
     try:
-        if first_beam is not None:
-            cp0 = first_beam.ControlPointSequence[0]
-            if hasattr(cp0, "NominalBeamEnergy"):
-                energy = str(cp0.NominalBeamEnergy)
-            elif hasattr(first_beam, "NominalBeamEnergy"):
-                energy = str(first_beam.NominalBeamEnergy)
+        fg0 = ds.FractionGroupSequence[0]
+        num_fx_planned = int(getattr(fg0, "NumberOfFractionsPlanned", 0)) or None
+        for ref in getattr(fg0, "ReferencedBeamSequence", []) or []:
+            meterset = getattr(ref, "BeamMeterset", None)
+            if meterset is not None:
+                beam_mu[int(ref.ReferencedBeamNumber)] = float(meterset)
     except Exception:
         pass
 
-    # 3) Técnica (heurística)
+    # 2) Beams (un único recorrido)
+    beams: List[BeamInfo] = []
+    treatment_flags: List[bool] = []
+    beam_datasets = []
+    for i, beam_ds in enumerate(getattr(ds, "BeamSequence", []) or []):
+        try:
+            beam = _parse_beam(beam_ds, i, beam_mu)
+        except Exception:
+            continue
+        if beam.control_points is None:
+            continue
+        beams.append(beam)
+        beam_datasets.append(beam_ds)
+        delivery = (_raw_text(beam_ds, _TAG_DELIVERY_TYPE) or "TREATMENT").upper()
+        treatment_flags.append(delivery == "TREATMENT")
+
+    ref_idx = treatment_flags.index(True) if True in treatment_flags else 0
+    reference_beam = beams[ref_idx] if beams else None
+    reference_ds = beam_datasets[ref_idx] if beams else None
+
+    # número de arcos: cuenta solo beams marcados como arco
+    num_arcs = sum(1 for b in beams if b.is_arc)
+
+    # 3) Energía, técnica, isocentro y máquina del beam de referencia
+    energy = "UNKNOWN"
     technique = "UNKNOWN"
-    try:
-        if first_beam is not None:
-            beam_type = getattr(first_beam, "BeamType", "").upper()  # STATIC / DYNAMIC
-            has_gantry_rot = hasattr(
-                first_beam.ControlPointSequence[0], "GantryRotationDirection"
-            )
-            if beam_type == "DYNAMIC" and has_gantry_rot:
-                technique = "VMAT"
-            elif beam_type == "STATIC":
-                technique = "STATIC"
-            else:
-                technique = beam_type or "UNKNOWN"
-    except Exception:
-        pass
-
-    # 4) Beams y num_arcs
-    from core.case import BeamInfo  # import local para evitar ciclos
-
-    beams = []
-    num_arcs = 0
-    try:
-        seq = getattr(ds, "BeamSequence", [])
-        for beam in seq:
-            try:
-                cps = getattr(beam, "ControlPointSequence", None)
-                if cps is None or len(cps) == 0:
-                    continue
-
-                gantry_start = float(getattr(cps[0], "GantryAngle", 0.0))
-                gantry_end   = float(getattr(cps[-1], "GantryAngle", 0.0))
-                col_angle    = float(getattr(cps[0], "BeamLimitingDeviceAngle", 0.0))
-                couch_angle  = float(getattr(cps[0], "PatientSupportAngle", 0.0))
-                beam_type    = getattr(beam, "BeamType", "").upper()
-                modality     = getattr(beam, "RadiationType", None)
-                beam_number  = int(getattr(beam, "BeamNumber", 0))
-                beam_name    = str(getattr(beam, "BeamName", f"Beam{beam_number}"))
-
-                is_arc = False
-                try:
-                    rot_dir = getattr(cps[0], "GantryRotationDirection", "").upper()
-                    if rot_dir in ["CW", "CCW"]:
-                        is_arc = True
-                except Exception:
-                    pass
-
-                beams.append(
-                    BeamInfo(
-                        beam_number=beam_number,
-                        beam_name=beam_name,
-                        modality=modality,
-                        beam_type=beam_type,
-                        is_arc=is_arc,
-                        gantry_start=gantry_start,
-                        gantry_end=gantry_end,
-                        couch_angle=couch_angle,
-                        collimator_angle=col_angle,
-                    )
-                )
-            except Exception:
-                continue
-
-        # número de arcos: cuenta solo beams marcados como arco
-        num_arcs = sum(1 for b in beams if b.is_arc)
-    except Exception:
-        pass
-
-    # 5) Isocentro
     iso = (0.0, 0.0, 0.0)
-    try:
-        if first_beam is not None:
-            iso_pos = first_beam.ControlPointSequence[0].IsocenterPosition  # [x,y,z] mm
-            iso = (float(iso_pos[0]), float(iso_pos[1]), float(iso_pos[2]))
-    except Exception:
-        pass
+    machine_name = None
+    if reference_beam is not None:
+        cpa = reference_beam.control_points
+        if cpa.nominal_beam_energy is not None:
+            e = cpa.nominal_beam_energy
+            energy = str(int(e)) if float(e).is_integer() else str(e)
+        beam_type = reference_beam.beam_type or ""
+        if beam_type == "DYNAMIC" and reference_beam.is_arc:
+            technique = "VMAT"
+        elif beam_type == "STATIC":
+            technique = "STATIC"
+        else:
+            technique = beam_type or "UNKNOWN"
+        if cpa.isocenter_mm is not None:
+            iso = cpa.isocenter_mm
+        machine_name = _raw_text(reference_ds, _TAG_MACHINE_NAME)
 
-    # 6) Prescripción (muy básica; se puede refinar luego)
+    # 4) Prescripción (muy básica; se puede refinar luego)
     total_dose_gy = None
     num_fx = None
     dose_per_fx = None
@@ -209,14 +187,9 @@ def _build_plan_info(ds) -> Optional[PlanInfo]:
     except Exception:
         pass
 
-    if total_dose_gy is not None and hasattr(ds, "FractionGroupSequence"):
-        try:
-            fg = ds.FractionGroupSequence[0]
-            num_fx = int(getattr(fg, "NumberOfFractionsPlanned", 0))
-            if num_fx > 0:
-                dose_per_fx = total_dose_gy / num_fx
-        except Exception:
-            pass
+    if total_dose_gy is not None and num_fx_planned:
+        num_fx = num_fx_planned
+        dose_per_fx = total_dose_gy / num_fx
 
     return PlanInfo(
         energy=energy,
@@ -227,6 +200,7 @@ def _build_plan_info(ds) -> Optional[PlanInfo]:
         total_dose_gy=total_dose_gy,
         num_fractions=num_fx,
         dose_per_fraction_gy=dose_per_fx,
+        machine_name=machine_name,
     )
 
 
@@ -239,29 +213,13 @@ def _build_structures(
     Convierte el dict de máscaras {nombre: mask[z,y,x]} en StructureInfo,
     calculando volumen en cc y centroide aproximado (en mm, coords de paciente).
     """
-    dz, dy, dx = spacing_zyx          # (z,y,x) en mm
-    ox, oy, oz = ct_origin_xyz        # (x,y,z) coords paciente
-    voxel_vol_cc = (dx * dy * dz) / 1000.0  # mm^3 → cc
-
     structs: Dict[str, StructureInfo] = {}
 
     for name, mask in masks.items():
         mask_bool = mask.astype(bool)
-        num_voxels = int(mask_bool.sum())
-        volume_cc = num_voxels * voxel_vol_cc
-
-        if num_voxels > 0:
-            # indices [z,y,x]
-            idx = np.argwhere(mask_bool)
-            mean_z, mean_y, mean_x = idx.mean(axis=0)
-
-            # convertir a coords de paciente (x,y,z)
-            x_mm = ox + mean_x * dx
-            y_mm = oy + mean_y * dy
-            z_mm = oz + mean_z * dz
-            centroid = (float(x_mm), float(y_mm), float(z_mm))
-        else:
-            centroid = (0.0, 0.0, 0.0)
+        volume_cc, centroid = structure_stats_from_mask(
+            mask_bool, spacing_zyx, ct_origin_xyz
+        )
 
         structs[name] = StructureInfo(
             name=name,
@@ -311,7 +269,7 @@ def build_case_from_dicom(
     plan_info: Optional[PlanInfo] = None
     if rtplan_path is not None and os.path.exists(rtplan_path):
         try:
-            ds_plan = load_rtplan(rtplan_path)
+            ds_plan = load_rtplan(rtplan_path, specific_tags=RTPLAN_QA_TAGS)
             plan_info = _build_plan_info(ds_plan)
             print(f"[INFO] RTPLAN cargado: {rtplan_path} (Label={getattr(ds_plan, 'RTPlanLabel', 'N/A')})")
         except Exception as e:
@@ -323,7 +281,9 @@ def build_case_from_dicom(
         "ct_spacing_sitk": spacing_sitk,
         "ct_direction": direction,
         "ct_spacing_zyx": (dz, dy, dx),
+        "ct_shape": tuple(ct_array.shape),
         "ct_source_folder": ct_folder,
+        "rtstruct_source_path": rtstruct_path,
     }
 
     # 5) RTDOSE → dose_gy en grid del CT
@@ -359,4 +319,301 @@ def build_case_from_dicom(
         metadata=metadata,
     )
 
-    return case
\ No newline at end of file
+    return case
+
+
+# =====================================================
+# Construcción perezosa (LazyCase)
+# =====================================================
+
+# Claves de metadata que produce la carga de RTDOSE (mismo convenio que
+# build_case_from_dicom). En un LazyCase se resuelven juntas al primer acceso.
+DOSE_METADATA_KEYS: Tuple[str, ...] = (
+    "dose_gy",
+    "dose_origin",
+    "dose_spacing_sitk",
+    "dose_direction",
+    "dose_source_path",
+    "dose_load_error",
+)
+
+
+def _load_dose_metadata(rtdose_path: str, ct_header: Dict) -> Dict:
+    """
+    Carga RTDOSE y la remuestrea al grid del CT descrito por ct_header
+    (ver read_ct_series_header). Devuelve las claves dose_* de metadata.
+    """
+    meta: Dict = {}
+    try:
+        dose_image, _, _, _, _ = load_rtdose(rtdose_path)
+        dose_resampled_image, dose_resampled_array = resample_dose_to_grid(
+            dose_image,
+            size=ct_header["size"],
+            spacing=ct_header["spacing"],
+            origin=ct_header["origin"],
+            direction=ct_header["direction"],
+        )
+        meta["dose_gy"] = dose_resampled_array.astype(np.float32)
+        meta["dose_origin"] = dose_resampled_image.GetOrigin()
+        meta["dose_spacing_sitk"] = dose_resampled_image.GetSpacing()
+        meta["dose_direction"] = dose_resampled_image.GetDirection()
+        meta["dose_source_path"] = rtdose_path
+        print(f"[INFO] RTDOSE cargado y remuestreado (lazy): {rtdose_path}")
+    except Exception as e:
+        print(f"[WARN] Error al cargar/remuestrear RTDOSE {rtdose_path}: {e}")
+        meta["dose_load_error"] = f"{type(e).__name__}: {e}"
+    return meta
+
+
+def _load_plan_info(rtplan_path: str) -> Optional[PlanInfo]:
+    """
+    Carga el RTPLAN y lo resume en PlanInfo; None si falla.
+    """
+    try:
+        ds_plan = load_rtplan(rtplan_path, specific_tags=RTPLAN_QA_TAGS)
+        return _build_plan_info(ds_plan)
+    except Exception as e:
+        print(f"[WARN] Error al cargar RTPLAN {rtplan_path}: {e}")
+        return None
+
+
+def _make_lazy_structs_loader(
+    rtstruct_path: str,
+    ct_folder: str,
+    spacing_zyx: Tuple[float, float, float],
+    ct_origin_xyz: Tuple[float, float, float],
+    ct_shape_zyx: Tuple[int, int, int],
+    prefetch_categories: Optional[Iterable[StructCategory]] = None,
+):
+    """
+    Devuelve un loader para LazyCase.structs.
+
+    En el primer acceso a case.structs se lee sólo el índice del RTSTRUCT
+    (nombres + metadatos de contorno, ver read_rtstruct_index); las ROIs
+    sin contornos se omiten, igual que en load_rtstruct.
+
+    El RTSTRUCT se abre con rt_utils (que lee la serie de CT) sólo cuando
+    hace falta la primera máscara, y ese objeto se comparte entre todas.
+
+    prefetch_categories: categorías (core.naming) que se rasterizan de una
+    vez al construir el índice; los helpers (is_helper_structure) nunca se
+    prefetchean. El resto de ROIs sigue disponible bajo demanda.
+    """
+    state: Dict = {}
+    prefetch = set(prefetch_categories or ()) - {StructCategory.HELPER}
+
+    def _get_rt():
+        if "rt" not in state:
+            state["rt"] = open_rtstruct(rtstruct_path, ct_folder)
+        return state["rt"]
+
+    def _mask_loader(roi_name: str) -> np.ndarray:
+        try:
+            mask = rtstruct_roi_mask(_get_rt(), roi_name)
+        except Exception as e:
+            print(f"[WARN] No se pudo rasterizar ROI '{roi_name}': {e}")
+            mask = None
+        if mask is None:
+            return np.zeros(ct_shape_zyx, dtype=bool)
+        return mask.astype(bool)
+
+    def _structs_loader() -> Dict[str, StructureInfo]:
+        structs: Dict[str, StructureInfo] = {}
+        for roi in read_rtstruct_index(rtstruct_path):
+            name = roi["name"]
+            if roi["num_contours"] == 0:
+                print(f"[INFO] ROI '{name}' sin contornos → se omite")
+                continue
+            st = LazyStructureInfo(
+                name=name,
+                mask_loader=_mask_loader,
+                spacing_zyx=spacing_zyx,
+                ct_origin_xyz=ct_origin_xyz,
+            )
+            st.contour_meta = roi
+            structs[name] = st
+
+        if prefetch:
+            to_load = [
+                name for name in structs
+                if normalize_structure_name(name).category in prefetch
+                and not is_helper_structure(name)
+            ]
+            print(
+                f"[INFO] Rasterizando {len(to_load)}/{len(structs)} ROIs "
+                f"({', '.join(sorted(c.name for c in prefetch))}); resto bajo demanda."
+            )
+            for name in to_load:
+                structs[name].mask  # dispara la carga y la deja cacheada
+
+        return structs
+
+    return _structs_loader
+
+
+def build_lazy_case_from_dicom(
+    patient_id: str,
+    ct_folder: str,
+    rtstruct_path: str,
+    rtplan_path: Optional[str] = None,
+    rtdose_path: Optional[str] = None,
+    struct_categories: Optional[Iterable[StructCategory]] = None,
+) -> LazyCase:
+    """
+    Versión perezosa de build_case_from_dicom (mismos argumentos).
+
+    Sólo lee las cabeceras de la serie de CT (shape, spacing, origen,
+    dirección). El resto se carga y cachea la primera vez que un check
+    lo usa:
+
+      - case.ct_hu                → píxeles del CT
+      - case.structs              → índice de ROIs del RTSTRUCT
+      - case.structs[n].mask      → rasterización de esa ROI
+      - case.plan                 → parseo del RTPLAN
+      - case.metadata["dose_gy"]  → RTDOSE remuestreada al grid del CT
+
+    Así, un perfil de QA con sólo checks de plan no lee los píxeles del
+    CT ni rasteriza estructuras.
+
+    struct_categories: categorías de estructura que necesitan los checks
+    activos (qa.checks.get_struct_categories_for_checks). Sus máscaras se
+    rasterizan juntas al cargar el índice; las demás (anillos, _OPT,
+    crops...) sólo si algún check las pide.
+    """
+    # 1) CT: sólo cabeceras
+    header = read_ct_series_header(ct_folder)
+    nx, ny, nz = header["size"]
+    sx, sy, sz = header["spacing"]
+    dz, dy, dx = sz, sy, sx                 # Nuestro convenio: (z,y,x)
+    origin = header["origin"]
+
+    def _ct_loader() -> np.ndarray:
+        _, ct_array, _, _, _ = load_ct_series(ct_folder)
+        return ct_array
+
+    # 2) Metadata base (mismo convenio que el Case eager)
+    metadata = LazyMetadata(
+        {
+            "ct_origin": origin,
+            "ct_spacing_sitk": header["spacing"],
+            "ct_direction": header["direction"],
+            "ct_spacing_zyx": (dz, dy, dx),
+            "ct_shape": (nz, ny, nx),
+            "ct_source_folder": ct_folder,
+            "rtstruct_source_path": rtstruct_path,
+        }
+    )
+
+    # 3) RTDOSE bajo demanda
+    if rtdose_path is not None and os.path.exists(rtdose_path):
+        metadata.add_lazy_group(
+            DOSE_METADATA_KEYS,
+            lambda: _load_dose_metadata(rtdose_path, header),
+        )
+    elif rtdose_path is not None:
+        print(f"[WARN] RTDOSE no encontrado en ruta {rtdose_path}. Seguimos sin dosis.")
+
+    # 4) Plan bajo demanda
+    plan_loader = None
+    if rtplan_path is not None and os.path.exists(rtplan_path):
+        plan_loader = lambda: _load_plan_info(rtplan_path)
+
+    # 5) Estructuras bajo demanda
+    structs_loader = _make_lazy_structs_loader(
+        rtstruct_path=rtstruct_path,
+        ct_folder=ct_folder,
+        spacing_zyx=(dz, dy, dx),
+        ct_origin_xyz=origin,
+        ct_shape_zyx=(nz, ny, nx),
+        prefetch_categories=struct_categories,
+    )
+
+    return LazyCase(
+        case_id=patient_id,
+        ct_spacing=(dz, dy, dx),
+        ct_loader=_ct_loader,
+        structs_loader=structs_loader,
+        plan_loader=plan_loader,
+        metadata=metadata,
+    )
+
+
+# =====================================================
+# Case de vista previa (sólo cabeceras)
+# =====================================================
+
+class PreviewDataUnavailable(RuntimeError):
+    """Se pidió a un Case de vista previa un dato que no tiene (p.ej. una máscara)."""
+
+
+def _preview_mask_loader(roi_name: str) -> np.ndarray:
+    raise PreviewDataUnavailable(
+        f"Case de vista previa: la máscara de '{roi_name}' no está disponible "
+        "(sólo cabeceras). Usa build_lazy_case_from_dicom para el QA completo."
+    )
+
+
+def build_preview_case_from_dicom(
+    patient_id: str,
+    ct_folder: str,
+    rtstruct_path: str,
+    rtplan_path: Optional[str] = None,
+    rtdose_path: Optional[str] = None,
+) -> LazyCase:
+    """
+    Construye un Case sólo con metadatos, a partir de lecturas de cabecera:
+
+      - CT: shape / spacing / origen / dirección (sin píxeles).
+      - RTSTRUCT: nombres de ROI (sin contornos ni máscaras).
+      - RTPLAN: PlanInfo completo (el RTPLAN no tiene píxeles).
+      - RTDOSE: no se carga.
+
+    Pensado para la fase de vista previa del QA
+    (qa.engine.evaluate_case_preview), que ejecuta sólo los checks cuyos
+    requisitos son de cabecera. Acceder a ct_hu devuelve None y acceder a
+    una máscara lanza PreviewDataUnavailable (un RuntimeError).
+
+    rtdose_path se acepta por simetría con build_case_from_dicom y se ignora.
+    """
+    header = read_ct_series_header(ct_folder)
+    nx, ny, nz = header["size"]
+    sx, sy, sz = header["spacing"]
+    dz, dy, dx = sz, sy, sx                 # Nuestro convenio: (z,y,x)
+    origin = header["origin"]
+
+    metadata = LazyMetadata(
+        {
+            "ct_origin": origin,
+            "ct_spacing_sitk": header["spacing"],
+            "ct_direction": header["direction"],
+            "ct_spacing_zyx": (dz, dy, dx),
+            "ct_shape": (nz, ny, nx),
+            "ct_source_folder": ct_folder,
+            "rtstruct_source_path": rtstruct_path,
+            "preview": True,
+        }
+    )
+
+    roi_names = read_rtstruct_roi_names(rtstruct_path)
+    structs: Dict[str, StructureInfo] = {
+        name: LazyStructureInfo(
+            name=name,
+            mask_loader=_preview_mask_loader,
+            spacing_zyx=(dz, dy, dx),
+            ct_origin_xyz=origin,
+        )
+        for name in roi_names
+    }
+
+    plan_loader = None
+    if rtplan_path is not None and os.path.exists(rtplan_path):
+        plan_loader = lambda: _load_plan_info(rtplan_path)
+
+    return LazyCase(
+        case_id=patient_id,
+        ct_spacing=(dz, dy, dx),
+        ct_loader=None,
+        structs_loader=lambda: structs,
+        plan_loader=plan_loader,
+        metadata=metadata,
+    )
@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Any, Tuple
 import numpy as np
 
 
@@ -33,6 +33,68 @@ class StructureInfo:
 # Info de beams/arcos (RTPLAN)
 # ---------------------------------------------------------
 
+@dataclass
+class ControlPointArrays:
+    """
+    Control points de un beam, en arrays NumPy compactos (uno por magnitud).
+
+    Cada array tiene n_cp filas, en el orden de ControlPointSequence. Los
+    valores que el RTPLAN no repite en un CP (DICOM sólo guarda lo que
+    cambia) se arrastran desde el CP anterior, así que todas las filas
+    están completas.
+
+    Attributes
+    ----------
+    gantry_deg, collimator_deg, couch_deg : np.ndarray
+        Ángulos por CP, [n_cp] float32.
+    cum_meterset_weight : np.ndarray
+        CumulativeMetersetWeight por CP, [n_cp] float32 (sin normalizar).
+    final_meterset_weight : float
+        FinalCumulativeMetersetWeight del beam.
+    gantry_rotation_direction : str, opcional
+        "CW", "CC" o "NONE" (del CP0).
+    dose_rate_set_mu_min : float, opcional
+        DoseRateSet del CP0 (MU/min), si el RTPLAN lo trae.
+    nominal_beam_energy : float, opcional
+        NominalBeamEnergy del CP0 (MV).
+    isocenter_mm : (x, y, z), opcional
+        IsocenterPosition del CP0 (mm, coordenadas de paciente).
+    jaw_x_mm, jaw_y_mm : np.ndarray, opcional
+        Posiciones de mandíbulas (X1, X2) / (Y1, Y2), [n_cp, 2] float32.
+        None si el beam no define ese dispositivo.
+    mlc_mm : dict
+        Tipo de MLC (p.ej. "MLCX", "MLCX1", "MLCX2") -> posiciones de
+        láminas [n_cp, n_leaves] float32: primero el banco A (n_pairs
+        valores) y después el banco B, como en LeafJawPositions.
+    leaf_boundaries_mm : dict
+        Tipo de MLC -> LeafPositionBoundaries [n_pairs + 1] float32.
+    """
+    gantry_deg: np.ndarray
+    collimator_deg: np.ndarray
+    couch_deg: np.ndarray
+    cum_meterset_weight: np.ndarray
+    final_meterset_weight: float = 1.0
+    gantry_rotation_direction: Optional[str] = None
+    dose_rate_set_mu_min: Optional[float] = None
+    nominal_beam_energy: Optional[float] = None
+    isocenter_mm: Optional[Tuple[float, float, float]] = None
+    jaw_x_mm: Optional[np.ndarray] = None
+    jaw_y_mm: Optional[np.ndarray] = None
+    mlc_mm: Dict[str, np.ndarray] = field(default_factory=dict)
+    leaf_boundaries_mm: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return int(self.gantry_deg.shape[0])
+
+    def mlc_banks(self, device: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Devuelve (banco A, banco B) de un MLC, cada uno [n_cp, n_pairs].
+        """
+        leaves = self.mlc_mm[device]
+        n_pairs = leaves.shape[1] // 2
+        return leaves[:, :n_pairs], leaves[:, n_pairs:]
+
+
 @dataclass
 class BeamInfo:
     """
@@ -43,6 +105,12 @@ class BeamInfo:
       - tipo (STATIC / DYNAMIC)
       - si es arco o no
       - ángulos de gantry, colimador y mesa
+
+    Si el RTPLAN trae ControlPointSequence, además:
+      - monitor_units: MU por fracción (BeamMeterset del FractionGroup)
+      - num_control_points
+      - control_points: ControlPointArrays con todos los CP del beam
+      - aperture_areas_cm2: área de apertura MLC/mandíbulas por CP [n_cp]
     """
     beam_number: int
     beam_name: str
@@ -53,6 +121,10 @@ class BeamInfo:
     gantry_end: Optional[float]       # grados
     couch_angle: Optional[float]      # PatientSupportAngle en grados
     collimator_angle: Optional[float] # BeamLimitingDeviceAngle en grados
+    monitor_units: Optional[float] = None
+    num_control_points: Optional[int] = None
+    control_points: Optional[ControlPointArrays] = None
+    aperture_areas_cm2: Optional[np.ndarray] = None
 
 
 # ---------------------------------------------------------
@@ -83,6 +155,9 @@ class PlanInfo:
     num_fractions: Optional[int] = None
     dose_per_fraction_gy: Optional[float] = None
 
+    # Máquina (TreatmentMachineName del primer beam), p.ej. "HAL2290"
+    machine_name: Optional[str] = None
+
 
 # ---------------------------------------------------------
 # Caso clínico completo (CT + estructuras + plan)
@@ -116,6 +191,287 @@ class Case:
     plan: Optional[PlanInfo] = None
     metadata: Dict[str, Any] = field(default_factory=dict)
 
+    @property
+    def ct_shape(self) -> Tuple[int, ...]:
+        """
+        Shape del CT [z, y, x].
+
+        Los checks que sólo necesitan la geometría deberían usar esto en
+        lugar de case.ct_hu.shape, para que un LazyCase pueda responder
+        desde las cabeceras DICOM sin leer los píxeles.
+        """
+        return tuple(self.ct_hu.shape)
+
+
+# ---------------------------------------------------------
+# Variantes perezosas (carga bajo demanda)
+#
+# build_lazy_case_from_dicom (core.build_case) devuelve un LazyCase:
+# CT, máscaras, plan y dosis se leen la primera vez que un check los
+# toca y quedan cacheados. Un perfil de QA que sólo ejecuta checks de
+# plan no llega a leer los píxeles del CT ni a rasterizar estructuras.
+# ---------------------------------------------------------
+
+def structure_stats_from_mask(
+    mask: np.ndarray,
+    spacing_zyx: Tuple[float, float, float],
+    ct_origin_xyz: Tuple[float, float, float],
+) -> Tuple[float, Tuple[float, float, float]]:
+    """
+    Calcula (volume_cc, centroid_mm) de una máscara [z,y,x] en el grid del CT.
+
+    El centroide se devuelve en coordenadas de paciente (x,y,z) en mm.
+    """
+    dz, dy, dx = spacing_zyx
+    ox, oy, oz = ct_origin_xyz
+    voxel_vol_cc = (dx * dy * dz) / 1000.0  # mm^3 → cc
+
+    num_voxels = int(np.count_nonzero(mask))
+    volume_cc = float(num_voxels * voxel_vol_cc)
+
+    if num_voxels == 0:
+        return volume_cc, (0.0, 0.0, 0.0)
+
+    idx = np.argwhere(mask)
+    mean_z, mean_y, mean_x = idx.mean(axis=0)
+    centroid = (
+        float(ox + mean_x * dx),
+        float(oy + mean_y * dy),
+        float(oz + mean_z * dz),
+    )
+    return volume_cc, centroid
+
+
+class LazyStructureInfo(StructureInfo):
+    """
+    StructureInfo cuya máscara se rasteriza la primera vez que se pide.
+
+    volume_cc y centroid_mm se derivan de la máscara y también se cachean.
+    Si se conocen de antemano (p.ej. desde metadatos del contorno) se pueden
+    pasar en el constructor y no fuerzan la rasterización.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        mask_loader: Callable[[str], Optional[np.ndarray]],
+        spacing_zyx: Tuple[float, float, float],
+        ct_origin_xyz: Tuple[float, float, float],
+        volume_cc: Optional[float] = None,
+        centroid_mm: Optional[Tuple[float, float, float]] = None,
+    ):
+        self.name = name
+        self._mask_loader = mask_loader
+        self._spacing_zyx = spacing_zyx
+        self._ct_origin_xyz = ct_origin_xyz
+        self._mask: Optional[np.ndarray] = None
+        self._volume_cc = volume_cc
+        self._centroid_mm = centroid_mm
+        # Metadatos del contorno (nº contornos/puntos, extensión en z), si se leyeron
+        self.contour_meta: Dict[str, Any] = {}
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._mask is not None
+
+    @property
+    def mask(self) -> np.ndarray:
+        if self._mask is None:
+            self._mask = self._mask_loader(self.name)
+        return self._mask
+
+    @mask.setter
+    def mask(self, value: np.ndarray) -> None:
+        self._mask = value
+        self._volume_cc = None
+        self._centroid_mm = None
+
+    def _compute_stats(self) -> None:
+        vol, centroid = structure_stats_from_mask(
+            self.mask, self._spacing_zyx, self._ct_origin_xyz
+        )
+        if self._volume_cc is None:
+            self._volume_cc = vol
+        if self._centroid_mm is None:
+            self._centroid_mm = centroid
+
+    @property
+    def volume_cc(self) -> float:
+        if self._volume_cc is None:
+            self._compute_stats()
+        return self._volume_cc
+
+    @volume_cc.setter
+    def volume_cc(self, value: float) -> None:
+        self._volume_cc = value
+
+    @property
+    def centroid_mm(self) -> Tuple[float, float, float]:
+        if self._centroid_mm is None:
+            self._compute_stats()
+        return self._centroid_mm
+
+    @centroid_mm.setter
+    def centroid_mm(self, value: Tuple[float, float, float]) -> None:
+        self._centroid_mm = value
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.is_loaded else "lazy"
+        return f"LazyStructureInfo(name={self.name!r}, {state})"
+
+
+class LazyMetadata(dict):
+    """
+    dict de metadata donde algunos grupos de claves se resuelven bajo demanda.
+
+    Cada grupo lazy es (claves, loader); el loader devuelve un dict con
+    (un subconjunto de) esas claves. Se ejecuta una sola vez, la primera
+    vez que se consulta cualquiera de sus claves vía [], get() o `in`.
+
+    Iterar (keys/items/values) NO dispara loaders: sólo ve lo ya cargado.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lazy_groups: List[Tuple[frozenset, Callable[[], Dict[str, Any]]]] = []
+
+    def add_lazy_group(
+        self,
+        keys: Iterable[str],
+        loader: Callable[[], Dict[str, Any]],
+    ) -> None:
+        self._lazy_groups.append((frozenset(keys), loader))
+
+    def is_pending(self, key: str) -> bool:
+        return any(key in keys for keys, _ in self._lazy_groups)
+
+    def _resolve(self, key: str) -> None:
+        for i, (keys, loader) in enumerate(self._lazy_groups):
+            if key in keys:
+                # Se quita antes de cargar para que un fallo no se reintente
+                del self._lazy_groups[i]
+                super().update(loader() or {})
+                return
+
+    def __getitem__(self, key):
+        if not super().__contains__(key) and self.is_pending(key):
+            self._resolve(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if not super().__contains__(key) and self.is_pending(key):
+            self._resolve(key)
+        return super().get(key, default)
+
+    def __contains__(self, key) -> bool:
+        if not super().__contains__(key) and self.is_pending(key):
+            self._resolve(key)
+        return super().__contains__(key)
+
+
+class LazyCase(Case):
+    """
+    Case con carga bajo demanda de CT, estructuras y plan.
+
+    - ct_hu: se lee con ct_loader() en el primer acceso.
+    - structs: structs_loader() devuelve el dict {nombre: StructureInfo}
+      (típicamente LazyStructureInfo, que a su vez rasteriza bajo demanda).
+    - plan: plan_loader() devuelve PlanInfo (o None).
+    - dosis: vive en metadata (LazyMetadata) igual que en el Case eager.
+
+    ct_shape se toma de metadata["ct_shape"] (leído de las cabeceras),
+    así que los checks de geometría no fuerzan la lectura de píxeles.
+    """
+
+    def __init__(
+        self,
+        case_id: str,
+        ct_spacing: Tuple[float, float, float],
+        ct_loader: Optional[Callable[[], np.ndarray]] = None,
+        structs_loader: Optional[Callable[[], Dict[str, StructureInfo]]] = None,
+        plan_loader: Optional[Callable[[], Optional[PlanInfo]]] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        self.case_id = case_id
+        self.ct_spacing = ct_spacing
+        self.metadata = metadata if metadata is not None else LazyMetadata()
+
+        self._ct_loader = ct_loader
+        self._structs_loader = structs_loader
+        self._plan_loader = plan_loader
+
+        self._ct_hu: Optional[np.ndarray] = None
+        self._structs: Optional[Dict[str, StructureInfo]] = None
+        self._plan: Optional[PlanInfo] = None
+        self._plan_loaded = plan_loader is None
+
+    # --- CT ---
+    @property
+    def ct_hu(self) -> np.ndarray:
+        if self._ct_hu is None and self._ct_loader is not None:
+            self._ct_hu = self._ct_loader()
+        return self._ct_hu
+
+    @ct_hu.setter
+    def ct_hu(self, value: np.ndarray) -> None:
+        self._ct_hu = value
+
+    @property
+    def ct_shape(self) -> Tuple[int, ...]:
+        shape = self.metadata.get("ct_shape")
+        if shape is not None:
+            return tuple(shape)
+        return tuple(self.ct_hu.shape)
+
+    # --- Estructuras ---
+    @property
+    def structs(self) -> Dict[str, StructureInfo]:
+        if self._structs is None:
+            self._structs = self._structs_loader() if self._structs_loader else {}
+        return self._structs
+
+    @structs.setter
+    def structs(self, value: Dict[str, StructureInfo]) -> None:
+        self._structs = value
+
+    # --- Plan ---
+    @property
+    def plan(self) -> Optional[PlanInfo]:
+        if not self._plan_loaded:
+            self._plan_loaded = True
+            self._plan = self._plan_loader()
+        return self._plan
+
+    @plan.setter
+    def plan(self, value: Optional[PlanInfo]) -> None:
+        self._plan = value
+        self._plan_loaded = True
+
+    def loaded_parts(self) -> Dict[str, Any]:
+        """
+        Resumen de qué partes del caso se han cargado ya (debug / UI).
+        """
+        structs_loaded: List[str] = []
+        if self._structs is not None:
+            structs_loaded = [
+                name for name, st in self._structs.items()
+                if getattr(st, "is_loaded", True)
+            ]
+
+        meta = self.metadata
+        dose_pending = isinstance(meta, LazyMetadata) and meta.is_pending("dose_gy")
+
+        return {
+            "ct_hu": self._ct_hu is not None,
+            "structs_index": self._structs is not None,
+            "struct_masks": structs_loaded,
+            "plan": self._plan_loaded and self._plan_loader is not None,
+            "dose": not dose_pending and dict.get(meta, "dose_gy") is not None,
+        }
+
+    def __repr__(self) -> str:
+        return f"LazyCase(case_id={self.case_id!r}, loaded={self.loaded_parts()})"
+
 
 # ---------------------------------------------------------
 # Resultados individuales de cada check
@@ -0,0 +1,318 @@
+# src/core/control_points.py
+
+"""
+core/control_points.py
+======================
+
+Lectura de ControlPointSequence de un RTPLAN a arrays NumPy
+(ControlPointArrays) y geometría de apertura derivada de ellos.
+
+Los checks de plan trabajan sobre estos arrays de forma vectorizada, sin
+volver a recorrer secuencias pydicom.
+
+Convenciones:
+  - Dispositivos de mandíbula: "X"/"ASYMX" y "Y"/"ASYMY".
+  - MLC: cualquier tipo "MLCX*" / "MLCY*". Con MLC de doble capa
+    (Halcyon: MLCX1 + MLCX2) la apertura efectiva es la intersección de
+    ambas capas.
+  - Posiciones en mm en el plano del isocentro (como vienen en DICOM).
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.case import ControlPointArrays
+
+
+_JAW_X_TYPES = ("X", "ASYMX")
+_JAW_Y_TYPES = ("Y", "ASYMY")
+
+
+# =====================================================
+# 1) Extracción desde pydicom
+# =====================================================
+#
+# La ControlPointSequence se recorre una sola vez y por tag: los valores
+# DS/IS/CS se leen del RawDataElement sin convertirlos a objetos pydicom
+# (convertir LeafJawPositions a DSfloat domina el parseo de un VMAT).
+
+_TAG_CP_SEQ = 0x300A0111              # ControlPointSequence
+_TAG_BLD_SEQ = 0x300A00B6             # BeamLimitingDeviceSequence
+_TAG_BLD_POS_SEQ = 0x300A011A         # BeamLimitingDevicePositionSequence
+_TAG_BLD_TYPE = 0x300A00B8            # RTBeamLimitingDeviceType
+_TAG_LEAF_BOUNDS = 0x300A00BE         # LeafPositionBoundaries
+_TAG_LEAF_JAW_POS = 0x300A011C        # LeafJawPositions
+_TAG_GANTRY = 0x300A011E              # GantryAngle
+_TAG_GANTRY_DIR = 0x300A011F          # GantryRotationDirection
+_TAG_COLLIM = 0x300A0120              # BeamLimitingDeviceAngle
+_TAG_COUCH = 0x300A0122               # PatientSupportAngle
+_TAG_CMW = 0x300A0134                 # CumulativeMetersetWeight
+_TAG_FINAL_CMW = 0x300A010E           # FinalCumulativeMetersetWeight
+_TAG_ENERGY = 0x300A0114              # NominalBeamEnergy
+_TAG_DOSE_RATE = 0x300A0115           # DoseRateSet
+_TAG_ISO = 0x300A012C                 # IsocenterPosition
+
+
+def _raw_text(ds, tag: int) -> Optional[str]:
+    """
+    Valor de texto de un elemento (CS/LO/...) sin conversión pydicom.
+    """
+    elem = ds.get_item(tag)
+    if elem is None or elem.value is None:
+        return None
+    v = elem.value
+    if isinstance(v, (bytes, bytearray)):
+        v = bytes(v).decode("latin-1", errors="ignore")
+    v = str(v).strip(" \x00")
+    return v or None
+
+
+def _raw_floats(ds, tag: int, dtype=np.float32) -> Optional[np.ndarray]:
+    """
+    Valores numéricos (DS/IS, multi-valor) de un elemento (float32 por
+    defecto), parseando el texto crudo del fichero si aún no se ha
+    convertido.
+    """
+    elem = ds.get_item(tag)
+    if elem is None or elem.value is None:
+        return None
+    v = elem.value
+    try:
+        if isinstance(v, (bytes, bytearray)):
+            v = bytes(v).strip(b" \x00")
+            if not v:
+                return None
+            return np.array(v.split(b"\\"), dtype=dtype)
+        return np.atleast_1d(np.asarray(v, dtype=dtype))
+    except (ValueError, TypeError):
+        return None
+
+
+def _raw_float(ds, tag: int) -> Optional[float]:
+    vals = _raw_floats(ds, tag)
+    return float(vals[0]) if vals is not None and vals.size else None
+
+
+def _sequence(ds, tag: int):
+    elem = ds.get(tag)
+    return elem.value if elem is not None and elem.value is not None else []
+
+
+def extract_control_point_arrays(beam_ds) -> Optional[ControlPointArrays]:
+    """
+    Convierte la ControlPointSequence de un beam (pydicom Dataset) en un
+    ControlPointArrays. Devuelve None si el beam no tiene control points.
+
+    DICOM sólo repite en cada CP lo que cambia respecto al anterior; aquí
+    se arrastra el último valor conocido para que cada fila esté completa.
+    """
+    cps = _sequence(beam_ds, _TAG_CP_SEQ)
+    if len(cps) == 0:
+        return None
+
+    n_cp = len(cps)
+
+    # Límites de láminas por tipo de MLC (a nivel de beam)
+    leaf_boundaries: Dict[str, np.ndarray] = {}
+    for dev in _sequence(beam_ds, _TAG_BLD_SEQ):
+        dev_type = (_raw_text(dev, _TAG_BLD_TYPE) or "").upper()
+        bounds = _raw_floats(dev, _TAG_LEAF_BOUNDS)
+        if dev_type.startswith("MLC") and bounds is not None:
+            leaf_boundaries[dev_type] = bounds
+
+    gantry = np.zeros(n_cp, dtype=np.float32)
+    collim = np.zeros(n_cp, dtype=np.float32)
+    couch = np.zeros(n_cp, dtype=np.float32)
+    cmw = np.zeros(n_cp, dtype=np.float32)
+
+    # Posiciones de dispositivos: tipo -> lista de filas (None = no visto aún)
+    positions: Dict[str, List[Optional[np.ndarray]]] = {}
+
+    energy = dose_rate = rot_dir = None
+    iso = None
+
+    last_g = last_c = last_t = last_w = 0.0
+    for i, cp in enumerate(cps):
+        g = _raw_float(cp, _TAG_GANTRY)
+        c = _raw_float(cp, _TAG_COLLIM)
+        t = _raw_float(cp, _TAG_COUCH)
+        w = _raw_float(cp, _TAG_CMW)
+        last_g = g if g is not None else last_g
+        last_c = c if c is not None else last_c
+        last_t = t if t is not None else last_t
+        last_w = w if w is not None else last_w
+        gantry[i], collim[i], couch[i], cmw[i] = last_g, last_c, last_t, last_w
+
+        if i == 0:
+            energy = _raw_float(cp, _TAG_ENERGY)
+            dose_rate = _raw_float(cp, _TAG_DOSE_RATE)
+            rot_dir = _raw_text(cp, _TAG_GANTRY_DIR)
+            iso_vals = _raw_floats(cp, _TAG_ISO, dtype=np.float64)
+            if iso_vals is not None and iso_vals.size >= 3:
+                iso = (float(iso_vals[0]), float(iso_vals[1]), float(iso_vals[2]))
+
+        seen = set()
+        for pos in _sequence(cp, _TAG_BLD_POS_SEQ):
+            dev_type = (_raw_text(pos, _TAG_BLD_TYPE) or "").upper()
+            vals = _raw_floats(pos, _TAG_LEAF_JAW_POS)
+            if not dev_type or vals is None:
+                continue
+            rows = positions.setdefault(dev_type, [None] * n_cp)
+            rows[i] = vals
+            seen.add(dev_type)
+
+        # Arrastre de los dispositivos que este CP no repite
+        if i > 0:
+            for dev_type, rows in positions.items():
+                if dev_type not in seen:
+                    rows[i] = rows[i - 1]
+
+    def _stack(rows: List[Optional[np.ndarray]]) -> Optional[np.ndarray]:
+        # Un dispositivo que aparece tarde se rellena hacia atrás con su
+        # primer valor conocido (no debería pasar con CP0 completo).
+        first = next((r for r in rows if r is not None), None)
+        if first is None:
+            return None
+        filled = [first if r is None else r for r in rows]
+        try:
+            return np.stack(filled).astype(np.float32, copy=False)
+        except ValueError:
+            return None  # nº de valores inconsistente entre CPs
+
+    jaw_x = jaw_y = None
+    mlc: Dict[str, np.ndarray] = {}
+    for dev_type, rows in positions.items():
+        arr = _stack(rows)
+        if arr is None:
+            continue
+        if dev_type in _JAW_X_TYPES and arr.shape[1] == 2:
+            jaw_x = arr
+        elif dev_type in _JAW_Y_TYPES and arr.shape[1] == 2:
+            jaw_y = arr
+        elif dev_type.startswith("MLC") and arr.shape[1] % 2 == 0:
+            mlc[dev_type] = arr
+
+    final_w = _raw_float(beam_ds, _TAG_FINAL_CMW)
+    if final_w is None:
+        final_w = float(cmw[-1]) if n_cp > 0 else 1.0
+
+    return ControlPointArrays(
+        gantry_deg=gantry,
+        collimator_deg=collim,
+        couch_deg=couch,
+        cum_meterset_weight=cmw,
+        final_meterset_weight=float(final_w),
+        gantry_rotation_direction=rot_dir.upper() if rot_dir is not None else None,
+        dose_rate_set_mu_min=dose_rate,
+        nominal_beam_energy=energy,
+        isocenter_mm=iso,
+        jaw_x_mm=jaw_x,
+        jaw_y_mm=jaw_y,
+        mlc_mm=mlc,
+        leaf_boundaries_mm={k: v for k, v in leaf_boundaries.items() if k in mlc},
+    )
+
+
+# =====================================================
+# 2) Apertura efectiva (MLC ∩ mandíbulas)
+# =====================================================
+
+def mlc_strip_bounds(cpa: ControlPointArrays) -> Optional[Tuple[str, List[str], np.ndarray]]:
+    """
+    Franjas de lámina del beam: (eje de movimiento "X"/"Y", capas de MLC
+    con esa orientación, límites de franja [n_strips + 1] en mm).
+    None si el beam no tiene MLC con LeafPositionBoundaries.
+    """
+    devices = [d for d in cpa.mlc_mm if d in cpa.leaf_boundaries_mm]
+    if not devices:
+        return None
+
+    # Capas con la orientación de la primera (MLCX* o MLCY*)
+    axis = "Y" if devices[0].startswith("MLCY") else "X"
+    devices = [d for d in devices if d.startswith(f"MLC{axis}")]
+
+    bounds = np.unique(np.concatenate([cpa.leaf_boundaries_mm[d] for d in devices]))
+    return axis, devices, bounds
+
+
+def effective_leaf_openings(
+    cpa: ControlPointArrays,
+) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Apertura efectiva por "franja" de lámina y CP.
+
+    Las franjas son los intervalos entre todos los LeafPositionBoundaries
+    de las capas de MLC con la misma orientación (con una sola capa, una
+    franja = un par de láminas). En cada franja la apertura es la
+    intersección de todas las capas y de las mandíbulas.
+
+    Returns
+    -------
+    (bounds_lo, bounds_hi, left, right) o None si no hay MLC con límites:
+      - bounds_lo/hi: [n_cp, n_strips] extremos de cada franja (mm),
+        recortados por la mandíbula perpendicular al movimiento.
+      - left/right: [n_cp, n_strips] bordes de la apertura (mm) en la
+        dirección de movimiento de las láminas; right <= left = cerrado.
+    """
+    strips = mlc_strip_bounds(cpa)
+    if strips is None:
+        return None
+    axis, devices, bounds = strips
+    lo, hi = bounds[:-1], bounds[1:]
+    centers = 0.5 * (lo + hi)
+    n_cp = len(cpa)
+
+    left = np.full((n_cp, centers.size), -np.inf, dtype=np.float32)
+    right = np.full((n_cp, centers.size), np.inf, dtype=np.float32)
+
+    for dev in devices:
+        bank_a, bank_b = cpa.mlc_banks(dev)
+        dev_bounds = cpa.leaf_boundaries_mm[dev]
+        idx = np.searchsorted(dev_bounds, centers, side="right") - 1
+        inside = (idx >= 0) & (idx < bank_a.shape[1])
+        idx_c = np.clip(idx, 0, bank_a.shape[1] - 1)
+
+        # Fuera del rango de una capa la franja queda tapada por esa capa
+        a = np.where(inside, bank_a[:, idx_c], 0.0)
+        b = np.where(inside, bank_b[:, idx_c], 0.0)
+        left = np.maximum(left, a)
+        right = np.minimum(right, b)
+
+    jaw_move = cpa.jaw_x_mm if axis == "X" else cpa.jaw_y_mm
+    jaw_perp = cpa.jaw_y_mm if axis == "X" else cpa.jaw_x_mm
+
+    if jaw_move is not None:
+        left = np.maximum(left, jaw_move[:, :1])
+        right = np.minimum(right, jaw_move[:, 1:])
+
+    bounds_lo = np.broadcast_to(lo, (n_cp, lo.size)).astype(np.float32)
+    bounds_hi = np.broadcast_to(hi, (n_cp, hi.size)).astype(np.float32)
+    if jaw_perp is not None:
+        bounds_lo = np.maximum(bounds_lo, jaw_perp[:, :1])
+        bounds_hi = np.minimum(bounds_hi, jaw_perp[:, 1:])
+
+    return bounds_lo, bounds_hi, left, right
+
+
+def compute_aperture_areas_cm2(cpa: ControlPointArrays) -> Optional[np.ndarray]:
+    """
+    Área de la apertura efectiva (MLC ∩ mandíbulas) en cada CP, en cm²
+    en el plano del isocentro. Sin MLC se usa el rectángulo de mandíbulas.
+    Devuelve None si el beam no define ni MLC ni mandíbulas X e Y.
+    """
+    openings = effective_leaf_openings(cpa)
+    if openings is not None:
+        bounds_lo, bounds_hi, left, right = openings
+        widths = np.clip(bounds_hi - bounds_lo, 0.0, None)
+        gaps = np.clip(right - left, 0.0, None)
+        return (gaps * widths).sum(axis=1) / 100.0
+
+    if cpa.jaw_x_mm is not None and cpa.jaw_y_mm is not None:
+        wx = np.clip(cpa.jaw_x_mm[:, 1] - cpa.jaw_x_mm[:, 0], 0.0, None)
+        wy = np.clip(cpa.jaw_y_mm[:, 1] - cpa.jaw_y_mm[:, 0], 0.0, None)
+        return wx * wy / 100.0
+
+    return None
@@ -0,0 +1,222 @@
+# src/core/delivery.py
+
+"""
+core/delivery.py
+================
+
+Modelo cinemático simple de la entrega de un beam a partir de sus
+ControlPointArrays y de los límites de la máquina (qa.config.MACHINE_PROFILES).
+
+Cada segmento (CP i-1 → CP i) se recorre, como muy rápido, en
+
+    t_i = max(Δgantry_i / ω_max, ΔMU_i / DR_max)
+
+es decir, limitado por la velocidad de gantry o por la tasa de dosis. Con
+ese tiempo se calcula la velocidad de lámina que el plan exigiría; si
+supera la máxima del MLC, la máquina tendría que frenar (segmento
+"limitado por láminas").
+
+Para estimar el tiempo de haz (estimate_beam_delivery) se añade además el
+límite de láminas: t_i = max(Δgantry/ω_max, ΔMU/DR_max, Δx_max/v_leaf_max).
+
+Todo se calcula con diferencias sobre arrays [n_cp, n_leaves], sin bucles
+por control point.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+import numpy as np
+
+from core.case import ControlPointArrays
+
+
+# =====================================================
+# 1) Pasos de gantry y MU por segmento
+# =====================================================
+
+def gantry_steps_deg(cpa: ControlPointArrays) -> np.ndarray:
+    """
+    Giro de gantry de cada segmento en grados ([n_cp - 1], >= 0), tomando
+    el camino corto (maneja el paso por 0/360).
+    """
+    g = cpa.gantry_deg.astype(np.float64)
+    d = np.diff(g)
+    return np.abs((d + 180.0) % 360.0 - 180.0)
+
+
+def segment_mu(cpa: ControlPointArrays, beam_mu: Optional[float]) -> Optional[np.ndarray]:
+    """
+    MU entregadas en cada segmento ([n_cp - 1]) a partir de los pesos
+    acumulados. None si no se conocen las MU del beam.
+    """
+    if beam_mu is None or beam_mu <= 0:
+        return None
+    final_w = cpa.final_meterset_weight or float(cpa.cum_meterset_weight[-1]) or 1.0
+    dw = np.clip(np.diff(cpa.cum_meterset_weight.astype(np.float64)), 0.0, None)
+    return dw / final_w * float(beam_mu)
+
+
+def segment_times_s(
+    cpa: ControlPointArrays,
+    max_gantry_speed_deg_s: float,
+    max_dose_rate_mu_min: Optional[float] = None,
+    beam_mu: Optional[float] = None,
+) -> np.ndarray:
+    """
+    Tiempo mínimo de cada segmento ([n_cp - 1], s) limitado por gantry y,
+    si se conocen las MU del beam y la tasa de dosis, por la tasa de dosis.
+    """
+    t = gantry_steps_deg(cpa) / float(max_gantry_speed_deg_s)
+    mu = segment_mu(cpa, beam_mu)
+    if mu is not None and max_dose_rate_mu_min:
+        t = np.maximum(t, mu / (float(max_dose_rate_mu_min) / 60.0))
+    return t
+
+
+# =====================================================
+# 2) Cinemática de láminas
+# =====================================================
+
+def _all_leaves(cpa: ControlPointArrays) -> Optional[np.ndarray]:
+    """
+    Posiciones de todas las láminas de todas las capas, [n_cp, n_leaves].
+    """
+    if not cpa.mlc_mm:
+        return None
+    return np.concatenate([cpa.mlc_mm[d] for d in sorted(cpa.mlc_mm)], axis=1)
+
+
+def leaf_pair_gaps_mm(cpa: ControlPointArrays) -> Optional[np.ndarray]:
+    """
+    Gap banco B - banco A de cada par de láminas, [n_cp, n_pairs] con los
+    pares de todas las capas concatenados. Negativo = láminas solapadas.
+    """
+    if not cpa.mlc_mm:
+        return None
+    gaps = []
+    for dev in sorted(cpa.mlc_mm):
+        bank_a, bank_b = cpa.mlc_banks(dev)
+        gaps.append(bank_b - bank_a)
+    return np.concatenate(gaps, axis=1)
+
+
+def compute_leaf_kinematics(
+    cpa: ControlPointArrays,
+    max_gantry_speed_deg_s: float,
+    max_dose_rate_mu_min: Optional[float] = None,
+    beam_mu: Optional[float] = None,
+) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Recorrido, velocidad y aceleración de láminas por segmento.
+
+    Returns
+    -------
+    dict o None (sin MLC o con menos de 2 CP):
+      - segment_time_s: [n_seg] tiempo mínimo del segmento.
+      - gantry_step_deg: [n_seg].
+      - travel_mm: [n_seg, n_leaves] |Δposición|.
+      - travel_per_deg_mm: [n_seg] máximo recorrido por grado (NaN si el
+        gantry no gira en el segmento).
+      - speed_mm_s: [n_seg, n_leaves] velocidad requerida (NaN si t = 0).
+      - accel_mm_s2: [n_seg - 1, n_leaves] |Δvelocidad| / tiempo medio.
+    """
+    leaves = _all_leaves(cpa)
+    if leaves is None or leaves.shape[0] < 2:
+        return None
+
+    t = segment_times_s(cpa, max_gantry_speed_deg_s, max_dose_rate_mu_min, beam_mu)
+    dg = gantry_steps_deg(cpa)
+    travel = np.abs(np.diff(leaves.astype(np.float64), axis=0))
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_deg = np.where(dg > 0, travel.max(axis=1) / dg, np.nan)
+        speed = np.where(t[:, None] > 0, travel / t[:, None], np.nan)
+
+        # Aceleración con velocidades con signo entre segmentos consecutivos
+        v_signed = np.where(
+            t[:, None] > 0, np.diff(leaves.astype(np.float64), axis=0) / t[:, None], np.nan
+        )
+        t_mid = 0.5 * (t[1:] + t[:-1])
+        accel = np.where(
+            t_mid[:, None] > 0, np.abs(np.diff(v_signed, axis=0)) / t_mid[:, None], np.nan
+        )
+
+    return {
+        "segment_time_s": t,
+        "gantry_step_deg": dg,
+        "travel_mm": travel,
+        "travel_per_deg_mm": per_deg,
+        "speed_mm_s": speed,
+        "accel_mm_s2": accel,
+    }
+
+
+# =====================================================
+# 3) Tiempo de entrega estimado
+# =====================================================
+
+def estimate_beam_delivery(
+    cpa: ControlPointArrays,
+    beam_mu: Optional[float],
+    max_gantry_speed_deg_s: float,
+    max_dose_rate_mu_min: float,
+    max_leaf_speed_mm_s: Optional[float] = None,
+) -> Optional[Dict[str, object]]:
+    """
+    Tiempo de haz (beam-on) estimado de un beam.
+
+    Cada segmento dura lo que imponga el más lento de: gantry a velocidad
+    máxima, MU a la tasa de dosis máxima y (si se da) láminas a velocidad
+    máxima. Todo sobre arrays [n_cp - 1] del beam.
+
+    Returns
+    -------
+    dict o None (sin MU):
+      - beam_on_time_s: suma de los tiempos de segmento.
+      - segment_time_s: [n_seg].
+      - limited_by: fracción de segmentos limitados por "gantry",
+        "dose_rate" y "leaves".
+      - mean_dose_rate_mu_min / mean_gantry_speed_deg_s efectivas.
+    """
+    mu = segment_mu(cpa, beam_mu)
+    if mu is None:
+        return None
+
+    if len(cpa) < 2:
+        t_total = float(beam_mu) / (float(max_dose_rate_mu_min) / 60.0)
+        return {
+            "beam_on_time_s": t_total,
+            "segment_time_s": np.array([t_total]),
+            "limited_by": {"gantry": 0.0, "dose_rate": 1.0, "leaves": 0.0},
+            "mean_dose_rate_mu_min": float(max_dose_rate_mu_min),
+            "mean_gantry_speed_deg_s": 0.0,
+        }
+
+    dg = gantry_steps_deg(cpa)
+    t_gantry = dg / float(max_gantry_speed_deg_s)
+    t_dose = mu / (float(max_dose_rate_mu_min) / 60.0)
+    t_leaf = np.zeros_like(t_gantry)
+    leaves = _all_leaves(cpa)
+    if max_leaf_speed_mm_s and leaves is not None:
+        t_leaf = np.abs(np.diff(leaves.astype(np.float64), axis=0)).max(axis=1) / float(max_leaf_speed_mm_s)
+
+    stacked = np.stack([t_gantry, t_dose, t_leaf])          # [3, n_seg]
+    t = stacked.max(axis=0)
+    which = stacked.argmax(axis=0)
+    moving = t > 0
+    n_mov = max(int(moving.sum()), 1)
+
+    total = float(t.sum())
+    return {
+        "beam_on_time_s": total,
+        "segment_time_s": t,
+        "limited_by": {
+            "gantry": float(((which == 0) & moving).sum() / n_mov),
+            "dose_rate": float(((which == 1) & moving).sum() / n_mov),
+            "leaves": float(((which == 2) & moving).sum() / n_mov),
+        },
+        "mean_dose_rate_mu_min": float(mu.sum() / total * 60.0) if total > 0 else 0.0,
+        "mean_gantry_speed_deg_s": float(dg.sum() / total) if total > 0 else 0.0,
+    }
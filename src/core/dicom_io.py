@@ -30,24 +30,251 @@ def load_ct_series(ct_folder):
     return image, array, spacing, origin, direction
 
 
-def load_rtstruct(rtstruct_path, ct_folder):
+def read_ct_series_header(ct_folder):
     """
-    Carga RTSTRUCT y devuelve un dict: {nombre_estructura: mask_array}.
-    Devuelve máscaras en formato [z, y, x] para que coincidan con ct_array.
+    Lee sólo las cabeceras de la serie de CT (sin píxeles).
+
+    Usa las dos primeras imágenes de la serie ordenada por GDCM para obtener
+    spacing en z, igual que hace ImageSeriesReader al montar el volumen.
+
+    Devuelve un dict con:
+      - file_names: lista ordenada de ficheros de la serie
+      - size: (nx, ny, nz)
+      - spacing: (sx, sy, sz)
+      - origin: (x, y, z)
+      - direction: tupla 3x3 aplanada
+    """
+    reader = sitk.ImageSeriesReader()
+    series_ids = reader.GetGDCMSeriesIDs(ct_folder)
+    if not series_ids:
+        raise ValueError(f"No se encontraron series en {ct_folder}")
+
+    file_names = list(reader.GetGDCMSeriesFileNames(ct_folder, series_ids[0]))
+
+    info = sitk.ImageFileReader()
+    info.SetFileName(file_names[0])
+    info.ReadImageInformation()
+
+    nx, ny = info.GetSize()[:2]
+    sx, sy = info.GetSpacing()[:2]
+    origin = info.GetOrigin()
+    direction = info.GetDirection()
+
+    sz = float(info.GetSpacing()[2]) if len(info.GetSpacing()) > 2 else 1.0
+    if len(file_names) > 1:
+        info2 = sitk.ImageFileReader()
+        info2.SetFileName(file_names[1])
+        info2.ReadImageInformation()
+        # Distancia entre cortes proyectada sobre la normal del corte
+        normal = np.asarray(direction, dtype=float).reshape(3, 3)[:, 2]
+        delta = np.asarray(info2.GetOrigin(), dtype=float) - np.asarray(origin, dtype=float)
+        sz = float(abs(np.dot(delta, normal)))
+
+    return {
+        "file_names": file_names,
+        "size": (int(nx), int(ny), len(file_names)),
+        "spacing": (float(sx), float(sy), sz),
+        "origin": tuple(float(v) for v in origin),
+        "direction": tuple(float(v) for v in direction),
+    }
+
+
+def read_rtstruct_roi_names(rtstruct_path):
+    """
+    Lee sólo los nombres de ROI del RTSTRUCT (StructureSetROISequence),
+    sin parsear los contornos ni tocar la serie de CT.
+    """
+    ds = pydicom.dcmread(
+        rtstruct_path,
+        stop_before_pixels=True,
+        specific_tags=["StructureSetROISequence"],
+    )
+    return [
+        str(getattr(roi, "ROIName", ""))
+        for roi in getattr(ds, "StructureSetROISequence", [])
+    ]
+
+
+def _first_contour_z(contour):
+    """
+    z (mm) del primer punto de un item de ContourSequence.
+
+    Lee el elemento ContourData en crudo y sólo convierte los 3 primeros
+    valores: convertir el DS completo de un BODY (cientos de miles de
+    puntos) domina el tiempo de lectura del índice.
+    """
+    try:
+        elem = contour.get_item(0x30060050)  # ContourData
+    except KeyError:
+        return None
+    if elem is None:
+        return None
+    raw = elem.value
+    try:
+        if isinstance(raw, (bytes, bytearray)):
+            parts = bytes(raw[:256]).split(b"\\")
+            return float(parts[2]) if len(parts) >= 3 else None
+        return float(raw[2]) if len(raw) >= 3 else None
+    except (ValueError, TypeError, IndexError):
+        return None
+
+
+def read_rtstruct_index(rtstruct_path):
+    """
+    Lee el índice de ROIs del RTSTRUCT con metadatos de contorno, sin
+    rasterizar nada ni abrir la serie de CT.
+
+    Devuelve una lista (en el orden de StructureSetROISequence) de dicts:
+      - name, roi_number
+      - num_contours, num_points
+      - z_min_mm, z_max_mm (None si no hay contornos)
+    """
+    ds = pydicom.dcmread(
+        rtstruct_path,
+        stop_before_pixels=True,
+        specific_tags=["StructureSetROISequence", "ROIContourSequence"],
+    )
+
+    # Metadatos de contorno por ROINumber
+    contour_meta = {}
+    for roi_contour in getattr(ds, "ROIContourSequence", []):
+        ref = int(getattr(roi_contour, "ReferencedROINumber", -1))
+        n_contours = 0
+        n_points = 0
+        z_vals = []
+        for contour in getattr(roi_contour, "ContourSequence", []):
+            n = int(getattr(contour, "NumberOfContourPoints", 0))
+            if n <= 0:
+                continue
+            n_contours += 1
+            n_points += n
+            z = _first_contour_z(contour)
+            if z is not None:
+                z_vals.append(z)
+        contour_meta[ref] = {
+            "num_contours": n_contours,
+            "num_points": n_points,
+            "z_min_mm": min(z_vals) if z_vals else None,
+            "z_max_mm": max(z_vals) if z_vals else None,
+        }
+
+    index = []
+    for roi in getattr(ds, "StructureSetROISequence", []):
+        number = int(getattr(roi, "ROINumber", -1))
+        meta = contour_meta.get(
+            number,
+            {"num_contours": 0, "num_points": 0, "z_min_mm": None, "z_max_mm": None},
+        )
+        index.append(
+            {
+                "name": str(getattr(roi, "ROIName", "")),
+                "roi_number": number,
+                **meta,
+            }
+        )
+    return index
+
+
+def _contour_points(contour):
+    """ContourData de un item de ContourSequence como array (N, 3) en mm."""
+    try:
+        elem = contour.get_item(0x30060050)  # ContourData
+    except KeyError:
+        return None
+    if elem is None:
+        return None
+    raw = elem.value
+    if isinstance(raw, (bytes, bytearray)):
+        # Conversión directa del texto DS: mucho más rápida que la de pydicom
+        vals = np.array(bytes(raw).split(b"\\"), dtype=float)
+    else:
+        vals = np.asarray(raw, dtype=float)
+    if vals.size < 9:
+        return None
+    return vals[: vals.size // 3 * 3].reshape(-1, 3)
+
+
+def read_roi_contours(rtstruct_path, roi_name):
+    """
+    Contornos de una ROI del RTSTRUCT, leídos con pydicom y sin rt_utils
+    ni la serie de CT: lista de arrays (N, 3) en mm (x, y, z del paciente),
+    uno por item de ContourSequence. Lista vacía si la ROI no existe.
+    """
+    ds = pydicom.dcmread(
+        rtstruct_path,
+        stop_before_pixels=True,
+        specific_tags=["StructureSetROISequence", "ROIContourSequence"],
+    )
+    number = None
+    for roi in getattr(ds, "StructureSetROISequence", []):
+        if str(getattr(roi, "ROIName", "")) == roi_name:
+            number = int(getattr(roi, "ROINumber", -1))
+            break
+    if number is None:
+        return []
+
+    contours = []
+    for roi_contour in getattr(ds, "ROIContourSequence", []):
+        if int(getattr(roi_contour, "ReferencedROINumber", -1)) != number:
+            continue
+        for contour in getattr(roi_contour, "ContourSequence", []):
+            pts = _contour_points(contour)
+            if pts is not None:
+                contours.append(pts)
+    return contours
+
+
+def open_rtstruct(rtstruct_path, ct_folder):
+    """
+    Abre el RTSTRUCT con rt_utils asociado a la serie de CT, sin rasterizar
+    ninguna ROI. Devuelve el RTStruct de rt_utils.
     """
-    rt = rt_utils.RTStructBuilder.create_from(
+    return rt_utils.RTStructBuilder.create_from(
         dicom_series_path=ct_folder,
         rt_struct_path=rtstruct_path
     )
 
+
+def rtstruct_roi_mask(rt, roi_name):
+    """
+    Rasteriza una ROI de un RTStruct (rt_utils) al grid del CT.
+
+    Devuelve la máscara [z, y, x] uint8, o None si la ROI no tiene
+    contornos utilizables. Lanza la excepción de rt_utils si falla.
+    """
+    mask = rt.get_roi_mask_by_name(roi_name)  # ⚠️ viene como [y, x, z]
+    if mask is None:
+        return None
+
+    # rt_utils da [y, x, z] → lo convertimos a [z, y, x]
+    # (movemos el eje de slices al frente)
+    mask = np.moveaxis(mask, -1, 0)  # ahora [z, y, x]
+    return mask.astype(np.uint8)
+
+
+def load_rtstruct(rtstruct_path, ct_folder, roi_names=None):
+    """
+    Carga RTSTRUCT y devuelve un dict: {nombre_estructura: mask_array}.
+    Devuelve máscaras en formato [z, y, x] para que coincidan con ct_array.
+
+    roi_names: si se indica, sólo se rasterizan esas ROIs (las que no
+    existan en el RTSTRUCT se ignoran). None = todas.
+    """
+    rt = open_rtstruct(rtstruct_path, ct_folder)
+
     print("\n[INFO] ROIs encontradas en RTSTRUCT:")
     print("      (intento crear máscara; se saltan las que no tienen contornos)")
 
+    names = rt.get_roi_names()
+    if roi_names is not None:
+        wanted = set(roi_names)
+        names = [n for n in names if n in wanted]
+
     masks = {}
-    for roi_name in rt.get_roi_names():
+    for roi_name in names:
         print(f"   - Probando ROI: {roi_name} ... ", end="")
         try:
-            mask = rt.get_roi_mask_by_name(roi_name)  # ⚠️ viene como [y, x, z]
+            mask = rtstruct_roi_mask(rt, roi_name)
         except Exception as e:
             print(f"FALLO → se omite ({e})")
             continue
@@ -56,14 +283,8 @@ def load_rtstruct(rtstruct_path, ct_folder):
             print("mask=None → se omite")
             continue
 
-        # 🔴 AQUÍ EL CAMBIO IMPORTANTE:
-        # rt_utils da [y, x, z] → lo convertimos a [z, y, x]
-        # (movemos el eje de slices al frente)
-        mask = np.moveaxis(mask, -1, 0)  # ahora [z, y, x]
-
-        mask = mask.astype(np.uint8)
         masks[roi_name] = mask
-        print("OK  shape original y,x,z:", mask.shape)
+        print("OK  shape z,y,x:", mask.shape)
 
     return masks
 
@@ -84,9 +305,13 @@ def load_rtdose(rtdose_path):
     dose_array = sitk.GetArrayFromImage(dose_image).astype(np.float32)
 
     # Aseguramos que está en Gy usando el factor de escala DICOM
-    ds = pydicom.dcmread(rtdose_path)
+    ds = pydicom.dcmread(rtdose_path, stop_before_pixels=True)
     if hasattr(ds, "DoseGridScaling"):
         dose_array *= float(ds.DoseGridScaling)
+        # La imagen también en Gy: es la que se remuestrea al grid del CT
+        scaled_image = sitk.GetImageFromArray(dose_array)
+        scaled_image.CopyInformation(dose_image)
+        dose_image = scaled_image
 
     spacing   = dose_image.GetSpacing()   # (sx, sy, sz) mm
     origin    = dose_image.GetOrigin()
@@ -103,8 +328,29 @@ def resample_dose_to_ct(ct_image, dose_image, default_value=0.0):
       - dose_resampled_image: SimpleITK Image en grid del CT
       - dose_resampled_array: np.ndarray [z,y,x] en Gy
     """
+    return resample_dose_to_grid(
+        dose_image,
+        size=ct_image.GetSize(),
+        spacing=ct_image.GetSpacing(),
+        origin=ct_image.GetOrigin(),
+        direction=ct_image.GetDirection(),
+        default_value=default_value,
+    )
+
+
+def resample_dose_to_grid(dose_image, size, spacing, origin, direction, default_value=0.0):
+    """
+    Igual que resample_dose_to_ct, pero con la geometría destino explícita
+    (size/spacing/origin/direction en convención SimpleITK).
+
+    Permite remuestrear la dosis al grid del CT conociendo sólo las
+    cabeceras de la serie, sin haber leído los píxeles del CT.
+    """
     resampler = sitk.ResampleImageFilter()
-    resampler.SetReferenceImage(ct_image)          # CT como referencia
+    resampler.SetSize([int(v) for v in size])
+    resampler.SetOutputSpacing([float(v) for v in spacing])
+    resampler.SetOutputOrigin([float(v) for v in origin])
+    resampler.SetOutputDirection([float(v) for v in direction])
     resampler.SetInterpolator(sitk.sitkLinear)     # interpolación lineal
     resampler.SetTransform(sitk.Transform())       # identidad
     resampler.SetDefaultPixelValue(default_value)  # 0 Gy fuera del volumen
@@ -115,7 +361,18 @@ def resample_dose_to_ct(ct_image, dose_image, default_value=0.0):
     return dose_resampled_image, dose_resampled_array
 
 
-def load_rtplan(rtplan_path):
+# Elementos de primer nivel del RTPLAN que usa el QA (build_case._build_plan_info).
+# Leer sólo estos evita parsear el resto del fichero (secuencias de
+# paciente, tolerancias, setup, bloques privados...).
+RTPLAN_QA_TAGS = [
+    "RTPlanLabel",
+    "BeamSequence",
+    "FractionGroupSequence",
+    "DoseReferenceSequence",
+]
+
+
+def load_rtplan(rtplan_path, specific_tags=None):
     """
     Carga un RTPLAN con pydicom y devuelve el Dataset crudo.
     Lo usaremos luego para extraer:
@@ -123,11 +380,9 @@ def load_rtplan(rtplan_path):
       - número de arcos,
       - isocentro,
       - etc.
-    """
-    ds = pydicom.dcmread(rtplan_path)
 
-    # Mensaje informativo opcional
-    plan_label = getattr(ds, "RTPlanLabel", "N/A")
-    print(f"[INFO] RTPLAN cargado: {rtplan_path} (Label={plan_label})")
-
-    return ds
+    specific_tags: si se da (p.ej. RTPLAN_QA_TAGS), sólo se leen esos
+    elementos de primer nivel. Los valores se convierten bajo demanda, así
+    que el fichero se lee una única vez.
+    """
+    return pydicom.dcmread(rtplan_path, specific_tags=specific_tags)
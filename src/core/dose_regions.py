@@ -0,0 +1,212 @@
+# src/core/dose_regions.py
+
+"""
+core/dose_regions.py
+====================
+
+Localización de regiones calientes y frías de una distribución de dosis
+mediante componentes conexas (SimpleITK ConnectedComponent).
+
+  - Hotspots: regiones conexas con D >= umbral en todo el grid.
+  - Cold spots: regiones conexas dentro de una máscara (típicamente el
+    PTV) con D < umbral.
+
+Nunca se etiqueta el grid completo: se trabaja sobre el recorte mínimo que
+contiene los candidatos (bounding box de D >= umbral, o de la máscara en
+el caso frío). Para cada región se devuelve volumen, centroide (índices y
+mm de paciente), dosis min/media/máx y las estructuras con las que
+solapa.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import SimpleITK as sitk
+
+from core.geometry import mask_bbox_slices
+
+
+# =====================================================
+# 1) Resultado por región
+# =====================================================
+
+@dataclass
+class DoseRegion:
+    """
+    Región conexa caliente ("HOT") o fría ("COLD").
+
+    centroid_vox en índices (z, y, x) del grid completo; centroid_mm en
+    coordenadas de paciente (x, y, z) si se conoce el origen del grid.
+    overlaps: {estructura: fracción de la región dentro de ella}.
+    """
+    kind: str
+    n_voxels: int
+    volume_cc: float
+    centroid_vox: Tuple[float, float, float]
+    centroid_mm: Optional[Tuple[float, float, float]]
+    bbox_vox: Tuple[Tuple[int, int], Tuple[int, int], Tuple[int, int]]
+    dose_min_gy: float
+    dose_mean_gy: float
+    dose_max_gy: float
+    overlaps: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# =====================================================
+# 2) Etiquetado sobre un recorte
+# =====================================================
+
+def _label_crop(candidates: np.ndarray, min_voxels: int) -> Tuple[np.ndarray, int]:
+    """
+    Componentes conexas (26-vecindad) de un recorte booleano, reetiquetadas
+    por tamaño decreciente y sin las menores de min_voxels.
+    """
+    img = sitk.GetImageFromArray(candidates.astype(np.uint8))
+    cc = sitk.ConnectedComponent(img, True)
+    cc = sitk.RelabelComponent(cc, minimumObjectSize=int(max(min_voxels, 1)), sortByObjectSize=True)
+    labels = sitk.GetArrayFromImage(cc)
+    return labels, int(labels.max())
+
+
+def _regions_from_labels(
+    kind: str,
+    labels: np.ndarray,
+    n_labels: int,
+    dose_crop: np.ndarray,
+    sl: Tuple[slice, slice, slice],
+    spacing_zyx: Sequence[float],
+    origin_xyz: Optional[Sequence[float]],
+    structs: Optional[Mapping[str, np.ndarray]],
+    max_regions: int,
+) -> List[DoseRegion]:
+    """
+    Estadísticas de las max_regions mayores regiones de un recorte
+    etiquetado (bincount sobre las etiquetas, sin un bucle por voxel).
+    """
+    n = min(n_labels, int(max_regions))
+    if n == 0:
+        return []
+
+    flat = labels.ravel()
+    sel = flat > 0
+    lab = flat[sel]
+    d = dose_crop.ravel()[sel].astype(np.float64)
+    zz, yy, xx = np.unravel_index(np.flatnonzero(sel), labels.shape)
+
+    counts = np.bincount(lab, minlength=n_labels + 1)
+    sum_d = np.bincount(lab, weights=d, minlength=n_labels + 1)
+    cz = np.bincount(lab, weights=zz, minlength=n_labels + 1)
+    cy = np.bincount(lab, weights=yy, minlength=n_labels + 1)
+    cx = np.bincount(lab, weights=xx, minlength=n_labels + 1)
+
+    dz, dy, dx = (float(s) for s in spacing_zyx)
+    voxel_cc = dz * dy * dx / 1000.0
+    offset = np.array([sl[0].start, sl[1].start, sl[2].start], dtype=np.float64)
+
+    # Recortes de las estructuras, una sola vez
+    struct_crops = {}
+    for name, mask in (structs or {}).items():
+        crop = mask[sl]
+        if crop.any():
+            struct_crops[name] = crop.astype(bool, copy=False).ravel()[sel]
+
+    regions: List[DoseRegion] = []
+    for k in range(1, n + 1):
+        in_k = lab == k
+        cnt = int(counts[k])
+        dk = d[in_k]
+        c_vox = np.array([cz[k], cy[k], cx[k]]) / cnt + offset
+        c_mm = None
+        if origin_xyz is not None:
+            c_mm = (
+                float(origin_xyz[0] + c_vox[2] * dx),
+                float(origin_xyz[1] + c_vox[1] * dy),
+                float(origin_xyz[2] + c_vox[0] * dz),
+            )
+        kz, ky, kx = zz[in_k], yy[in_k], xx[in_k]
+        bbox = tuple(
+            (int(a.min() + o), int(a.max() + o))
+            for a, o in zip((kz, ky, kx), offset.astype(int))
+        )
+        overlaps = {}
+        for name, crop in struct_crops.items():
+            inter = int(np.count_nonzero(crop[in_k]))
+            if inter:
+                overlaps[name] = inter / cnt
+        regions.append(
+            DoseRegion(
+                kind=kind,
+                n_voxels=cnt,
+                volume_cc=cnt * voxel_cc,
+                centroid_vox=tuple(float(v) for v in c_vox),
+                centroid_mm=c_mm,
+                bbox_vox=bbox,
+                dose_min_gy=float(dk.min()),
+                dose_mean_gy=float(sum_d[k] / cnt),
+                dose_max_gy=float(dk.max()),
+                overlaps=dict(sorted(overlaps.items(), key=lambda kv: -kv[1])),
+            )
+        )
+    return regions
+
+
+# =====================================================
+# 3) API pública
+# =====================================================
+
+def find_hot_regions(
+    dose: np.ndarray,
+    threshold_gy: float,
+    spacing_zyx: Sequence[float],
+    origin_xyz: Optional[Sequence[float]] = None,
+    structs: Optional[Mapping[str, np.ndarray]] = None,
+    min_volume_cc: float = 0.0,
+    max_regions: int = 5,
+) -> List[DoseRegion]:
+    """
+    Regiones conexas con D >= threshold_gy, de mayor a menor volumen.
+    El etiquetado se hace sólo en el bounding box de los voxeles calientes.
+    """
+    hot = dose >= threshold_gy
+    sl = mask_bbox_slices(hot)
+    if sl is None:
+        return []
+    voxel_cc = float(np.prod(spacing_zyx)) / 1000.0
+    labels, n = _label_crop(hot[sl], int(np.ceil(min_volume_cc / voxel_cc)))
+    return _regions_from_labels(
+        "HOT", labels, n, dose[sl], sl, spacing_zyx, origin_xyz, structs, max_regions
+    )
+
+
+def find_cold_regions(
+    dose: np.ndarray,
+    mask: np.ndarray,
+    threshold_gy: float,
+    spacing_zyx: Sequence[float],
+    origin_xyz: Optional[Sequence[float]] = None,
+    structs: Optional[Mapping[str, np.ndarray]] = None,
+    min_volume_cc: float = 0.0,
+    max_regions: int = 5,
+) -> List[DoseRegion]:
+    """
+    Regiones conexas dentro de mask con D < threshold_gy, de mayor a menor
+    volumen. El etiquetado se hace sólo en el bounding box de la máscara.
+    """
+    mask = mask.astype(bool, copy=False)
+    sl = mask_bbox_slices(mask)
+    if sl is None:
+        return []
+    dose_crop = dose[sl]
+    cold = mask[sl] & (dose_crop < threshold_gy)
+    if not cold.any():
+        return []
+    voxel_cc = float(np.prod(spacing_zyx)) / 1000.0
+    labels, n = _label_crop(cold, int(np.ceil(min_volume_cc / voxel_cc)))
+    return _regions_from_labels(
+        "COLD", labels, n, dose_crop, sl, spacing_zyx, origin_xyz, structs, max_regions
+    )
@@ -0,0 +1,198 @@
+# src/core/dvh.py
+
+"""
+core/dvh.py
+===========
+
+Histogramas de dosis (DVH diferenciales) cacheados por Case.
+
+Los checks de dosis necesitan una y otra vez volúmenes de isodosis
+(V_x del cuerpo entero, del PTV, de OARs) y dosis a volumen (D_x). En vez
+de recorrer la matriz de dosis completa en cada check, se calcula una sola
+vez por estructura un histograma con bins de ancho fijo (np.bincount) y
+todas las métricas salen de él:
+
+    hist = get_dvh_cache(case).structure(ptv.name, ptv.mask)
+    hist.volume_at_least(0.5 * rx)    → voxeles con D >= 50 % Rx
+    hist.dose_at_volume(0.95)         → D95
+
+La cache vive en case.metadata["dvh_cache"] y se invalida si cambia la
+matriz de dosis (case.metadata["dose_gy"]).
+
+Dentro de un bin se interpola linealmente, así que el error es como mucho
+el de una distribución uniforme dentro de bin_width_gy (0.01 Gy por
+defecto).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from core.case import Case
+from core.geometry import mask_bbox_slices
+
+
+# =====================================================
+# 1) Histograma de una región
+# =====================================================
+
+@dataclass
+class DoseHistogram:
+    """
+    DVH diferencial: counts[i] voxeles con dosis en [edges[i], edges[i+1]).
+
+    Las aristas pueden ser no uniformes (p.ej. tras convertir a EQD2).
+    """
+    bin_edges_gy: np.ndarray     # [n_bins + 1], crecientes
+    counts: np.ndarray           # [n_bins] int64
+    voxel_volume_cc: float
+
+    @property
+    def n_voxels(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def volume_cc(self) -> float:
+        return self.n_voxels * self.voxel_volume_cc
+
+    @property
+    def max_dose_gy(self) -> float:
+        """Arista superior del último bin con voxeles (cota de Dmax)."""
+        nz = np.flatnonzero(self.counts)
+        return float(self.bin_edges_gy[nz[-1] + 1]) if nz.size else 0.0
+
+    def _cumulative(self) -> np.ndarray:
+        """cum[i] = voxeles con dosis >= edges[i] ([n_bins + 1])."""
+        cum = np.zeros(self.counts.size + 1, dtype=np.float64)
+        cum[:-1] = np.cumsum(self.counts[::-1])[::-1]
+        return cum
+
+    def volume_at_least(self, dose_gy: float) -> float:
+        """Número de voxeles (fraccionario) con dosis >= dose_gy."""
+        if self.counts.size == 0:
+            return 0.0
+        return float(np.interp(dose_gy, self.bin_edges_gy, self._cumulative()))
+
+    def volume_cc_at_least(self, dose_gy: float) -> float:
+        return self.volume_at_least(dose_gy) * self.voxel_volume_cc
+
+    def fraction_at_least(self, dose_gy: float) -> float:
+        n = self.n_voxels
+        return self.volume_at_least(dose_gy) / n if n else 0.0
+
+    def dose_at_volume(self, fraction: float) -> float:
+        """
+        D_x: dosis mínima que recibe la fracción `fraction` (0-1) más
+        caliente de la región (p.ej. 0.95 → D95).
+        """
+        n = self.n_voxels
+        if n == 0:
+            return 0.0
+        cum = self._cumulative()               # decreciente
+        target = float(fraction) * n
+        # np.interp necesita abscisas crecientes: se recorre al revés
+        return float(np.interp(target, cum[::-1], self.bin_edges_gy[::-1]))
+
+    def mean_dose_gy(self) -> float:
+        n = self.n_voxels
+        if n == 0:
+            return 0.0
+        centers = 0.5 * (self.bin_edges_gy[1:] + self.bin_edges_gy[:-1])
+        return float((centers * self.counts).sum() / n)
+
+    def map_edges(self, fn: Callable[[np.ndarray], np.ndarray]) -> "DoseHistogram":
+        """
+        Histograma con las aristas transformadas por una función monótona
+        creciente de la dosis (los counts no cambian).
+        """
+        return DoseHistogram(
+            bin_edges_gy=np.asarray(fn(self.bin_edges_gy), dtype=np.float64),
+            counts=self.counts,
+            voxel_volume_cc=self.voxel_volume_cc,
+        )
+
+
+def compute_dose_histogram(
+    dose_vals: np.ndarray,
+    bin_width_gy: float,
+    voxel_volume_cc: float,
+) -> DoseHistogram:
+    """
+    Histograma de un array de dosis (cualquier forma) con bins de ancho
+    fijo desde 0 Gy.
+    """
+    vals = np.asarray(dose_vals).ravel()
+    if vals.size == 0:
+        return DoseHistogram(np.zeros(1), np.zeros(0, dtype=np.int64), voxel_volume_cc)
+    # La mayoría del grid del CT suele estar a 0 Gy (fuera del grid de
+    # dosis): se binean sólo los voxeles con dosis y el resto va al bin 0.
+    pos = vals[vals > 0]
+    idx = (pos * np.float32(1.0 / bin_width_gy)).astype(np.intp)
+    counts = np.bincount(idx, minlength=1)
+    counts[0] += vals.size - pos.size
+    edges = np.arange(counts.size + 1, dtype=np.float64) * float(bin_width_gy)
+    return DoseHistogram(edges, counts.astype(np.int64), voxel_volume_cc)
+
+
+# =====================================================
+# 2) Cache por Case
+# =====================================================
+
+class DVHCache:
+    """
+    Histogramas de dosis por región de un Case, calculados bajo demanda.
+
+    - total(): todos los voxeles del grid (volúmenes de isodosis).
+    - structure(name, mask): voxeles de una estructura.
+    """
+
+    def __init__(
+        self,
+        dose: np.ndarray,
+        spacing_zyx: Tuple[float, float, float],
+        bin_width_gy: float = 0.01,
+    ):
+        self.dose = dose
+        self.bin_width_gy = float(bin_width_gy)
+        dz, dy, dx = spacing_zyx
+        self.voxel_volume_cc = float(dz * dy * dx) / 1000.0
+        self._total: Optional[DoseHistogram] = None
+        self._structs: Dict[str, DoseHistogram] = {}
+
+    def total(self) -> DoseHistogram:
+        if self._total is None:
+            self._total = compute_dose_histogram(self.dose, self.bin_width_gy, self.voxel_volume_cc)
+        return self._total
+
+    def structure(self, name: str, mask: np.ndarray) -> DoseHistogram:
+        hist = self._structs.get(name)
+        if hist is None:
+            # Gather sobre el bounding box de la máscara, no el grid completo
+            mask = mask.astype(bool, copy=False)
+            sl = mask_bbox_slices(mask)
+            vals = self.dose[sl][mask[sl]] if sl is not None else np.zeros(0, np.float32)
+            hist = compute_dose_histogram(vals, self.bin_width_gy, self.voxel_volume_cc)
+            self._structs[name] = hist
+        return hist
+
+
+def get_dvh_cache(case: Case, bin_width_gy: float = 0.01) -> Optional[DVHCache]:
+    """
+    Devuelve (creándola si hace falta) la DVHCache del Case, o None si no
+    hay dosis cargada.
+    """
+    dose = case.metadata.get("dose_gy", None)
+    if dose is None:
+        return None
+    cache = case.metadata.get("dvh_cache")
+    if (
+        not isinstance(cache, DVHCache)
+        or cache.dose is not dose
+        or cache.bin_width_gy != float(bin_width_gy)
+    ):
+        cache = DVHCache(dose, case.ct_spacing, bin_width_gy=bin_width_gy)
+        case.metadata["dvh_cache"] = cache
+    return cache
@@ -0,0 +1,293 @@
+# src/core/gamma.py
+
+"""
+core/gamma.py
+=============
+
+Índice gamma 3D (Low et al.) para comparar dos distribuciones de dosis en
+el mismo grid: la dosis de referencia (TPS) y una dosis evaluada (recálculo
+independiente o predicción de un modelo, p.ej. ml.models.UNet3D).
+
+Para cada voxel de referencia por encima del umbral de dosis baja:
+
+    Γ(r) = min_o  sqrt( |o|² / DTA² + (D_eval(r + o) - D_ref(r))² / ΔD² )
+
+con ΔD = dose_pct · D_norm (global) o dose_pct · D_ref(r) (local).
+
+Implementación:
+  - Stencil de desplazamientos o precalculado una sola vez (rejilla en mm
+    con paso DTA / step_fraction dentro de la esfera de radio
+    max_gamma · DTA), ordenado por distancia.
+  - D_eval(r + o) se interpola (trilineal) al vuelo: como o es el mismo
+    para todos los voxeles, los pesos de las 8 esquinas son constantes y
+    cada desplazamiento son como mucho 8 gathers sobre el array aplanado.
+  - Terminación temprana: recorriendo el stencil por distancia creciente,
+    un voxel con Γ² <= |o|²/DTA² ya no puede mejorar y sale del conjunto
+    activo; la mayoría de voxeles que pasan lo hacen en los primeros
+    desplazamientos.
+  - Paralelismo por bloques de cortes z (ThreadPoolExecutor): NumPy
+    libera el GIL en los gathers y la aritmética.
+
+Los valores de Γ mayores que max_gamma son cotas superiores (la búsqueda
+no pasa de radio max_gamma · DTA); el pass rate es exacto.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# =====================================================
+# 1) Stencil de búsqueda
+# =====================================================
+
+def build_gamma_stencil(
+    dta_mm: float,
+    spacing_zyx: Sequence[float],
+    max_gamma: float = 2.0,
+    step_fraction: int = 3,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Desplazamientos de búsqueda ordenados por distancia.
+
+    Returns
+    -------
+    offsets_vox : [K, 3] float64, desplazamientos (z, y, x) en voxeles.
+    dist_mm : [K] float64, |o| en mm (creciente, el primero es 0).
+    """
+    radius = float(max_gamma) * float(dta_mm)
+    step = float(dta_mm) / max(int(step_fraction), 1)
+    n = int(np.floor(radius / step))
+    axis = np.arange(-n, n + 1, dtype=np.float64) * step
+    zz, yy, xx = np.meshgrid(axis, axis, axis, indexing="ij")
+    off_mm = np.stack([zz.ravel(), yy.ravel(), xx.ravel()], axis=1)
+    dist = np.sqrt((off_mm ** 2).sum(axis=1))
+    keep = dist <= radius + 1e-9
+    off_mm, dist = off_mm[keep], dist[keep]
+    order = np.argsort(dist, kind="stable")
+    spacing = np.asarray(spacing_zyx, dtype=np.float64)
+    return off_mm[order] / spacing, dist[order]
+
+
+# =====================================================
+# 2) Núcleo por bloque de voxeles
+# =====================================================
+
+def _corner_terms(
+    offset_vox: np.ndarray,
+    strides: np.ndarray,
+) -> List[Tuple[int, float]]:
+    """
+    (desplazamiento en el array aplanado, peso) de las esquinas de la
+    interpolación trilineal para un desplazamiento fraccionario. Los ejes
+    alineados con el grid aportan una sola esquina.
+    """
+    k = np.floor(offset_vox)
+    f = offset_vox - k
+    axes = []
+    for ax in range(3):
+        if f[ax] < 1e-6:
+            axes.append([(int(k[ax]), 1.0)])
+        elif f[ax] > 1.0 - 1e-6:
+            axes.append([(int(k[ax]) + 1, 1.0)])
+        else:
+            axes.append([(int(k[ax]), 1.0 - f[ax]), (int(k[ax]) + 1, f[ax])])
+    terms = []
+    for kz, wz in axes[0]:
+        for ky, wy in axes[1]:
+            for kx, wx in axes[2]:
+                terms.append((int(kz * strides[0] + ky * strides[1] + kx * strides[2]), wz * wy * wx))
+    return terms
+
+
+def _gamma_block(
+    eval_flat: np.ndarray,
+    base_idx: np.ndarray,
+    ref_vals: np.ndarray,
+    inv_dd2: np.ndarray,
+    stencil: List[List[Tuple[int, float]]],
+    dist2_dta: np.ndarray,
+) -> np.ndarray:
+    """
+    Γ² mínimo de un bloque de voxeles de referencia.
+
+    base_idx son los índices de los voxeles en el array de dosis evaluada
+    (con padding) aplanado; inv_dd2 = 1/ΔD² por voxel (escalar en global).
+    """
+    best = np.full(base_idx.shape[0], np.inf, dtype=np.float32)
+    active = np.arange(base_idx.shape[0])
+
+    for terms, d2 in zip(stencil, dist2_dta):
+        # Terminación temprana: Γ² <= |o|²/DTA² ya no puede bajar
+        active = active[best[active] > d2]
+        if active.size == 0:
+            break
+        idx = base_idx[active]
+        off, w = terms[0]
+        ev = eval_flat[idx + off] * np.float32(w)
+        for off, w in terms[1:]:
+            ev += eval_flat[idx + off] * np.float32(w)
+        ev -= ref_vals[active]
+        ev *= ev
+        ev *= inv_dd2 if inv_dd2.ndim == 0 else inv_dd2[active]
+        ev += np.float32(d2)
+        best[active] = np.minimum(best[active], ev)
+
+    return best
+
+
+# =====================================================
+# 3) API pública
+# =====================================================
+
+@dataclass
+class GammaResult:
+    """
+    Resultado de una comparación gamma.
+
+    gamma es un array con la forma de la dosis de referencia (NaN en los
+    voxeles no evaluados, por debajo del umbral de dosis baja).
+    """
+    gamma: np.ndarray
+    pass_rate: float
+    mean_gamma: float
+    gamma_p95: float
+    n_evaluated: int
+    dose_pct: float
+    dta_mm: float
+    local: bool
+    low_dose_threshold_pct: float
+    norm_dose_gy: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Resumen sin el mapa gamma (apto para CheckResult.details)."""
+        return {
+            "pass_rate": self.pass_rate,
+            "mean_gamma": self.mean_gamma,
+            "gamma_p95": self.gamma_p95,
+            "n_evaluated": self.n_evaluated,
+            "dose_pct": self.dose_pct,
+            "dta_mm": self.dta_mm,
+            "local": self.local,
+            "low_dose_threshold_pct": self.low_dose_threshold_pct,
+            "norm_dose_gy": self.norm_dose_gy,
+        }
+
+
+def compute_gamma(
+    dose_ref: np.ndarray,
+    dose_eval: np.ndarray,
+    spacing_zyx: Sequence[float],
+    dose_pct: float = 3.0,
+    dta_mm: float = 2.0,
+    low_dose_threshold_pct: float = 10.0,
+    local: bool = False,
+    norm_dose_gy: Optional[float] = None,
+    max_gamma: float = 2.0,
+    step_fraction: int = 3,
+    n_workers: Optional[int] = None,
+    slab_size: int = 8,
+) -> GammaResult:
+    """
+    Gamma 3D global o local de dose_eval frente a dose_ref (mismo grid
+    [z, y, x], mismo spacing en mm).
+
+    Parameters
+    ----------
+    dose_pct, dta_mm : criterio (p.ej. 3 %/2 mm).
+    low_dose_threshold_pct : sólo se evalúan voxeles con
+        D_ref >= threshold · D_norm / 100.
+    local : ΔD relativo a la dosis local en vez de a D_norm.
+    norm_dose_gy : dosis de normalización global (por defecto, Dmax de ref).
+    max_gamma : radio de búsqueda en unidades de DTA.
+    step_fraction : paso del stencil = DTA / step_fraction.
+    n_workers : hilos (None = os.cpu_count()).
+    slab_size : cortes z por bloque de trabajo.
+    """
+    ref = np.ascontiguousarray(dose_ref, dtype=np.float32)
+    ev = np.asarray(dose_eval, dtype=np.float32)
+    if ref.shape != ev.shape:
+        raise ValueError(f"Dosis con formas distintas: {ref.shape} vs {ev.shape}")
+
+    d_norm = float(norm_dose_gy) if norm_dose_gy else float(ref.max())
+    gamma_map = np.full(ref.shape, np.nan, dtype=np.float32)
+    if d_norm <= 0:
+        return GammaResult(gamma_map, 0.0, float("nan"), float("nan"), 0,
+                           dose_pct, dta_mm, local, low_dose_threshold_pct, d_norm)
+
+    offsets, dist = build_gamma_stencil(dta_mm, spacing_zyx, max_gamma, step_fraction)
+
+    # Padding en voxeles suficiente para el radio de búsqueda (+1 por la
+    # esquina superior de la interpolación); borde replicado.
+    pad = np.ceil(np.abs(offsets).max(axis=0)).astype(int) + 1
+    ev_pad = np.pad(ev, [(int(p), int(p)) for p in pad], mode="edge")
+    strides = np.array([ev_pad.shape[1] * ev_pad.shape[2], ev_pad.shape[2], 1], dtype=np.int64)
+    eval_flat = ev_pad.ravel()
+
+    stencil = [_corner_terms(o, strides) for o in offsets]
+    dist2_dta = (dist / float(dta_mm)) ** 2
+
+    threshold = float(low_dose_threshold_pct) / 100.0 * d_norm
+    dd_global = float(dose_pct) / 100.0 * d_norm
+
+    def run_slab(z0: int, z1: int) -> None:
+        zi, yi, xi = np.nonzero(ref[z0:z1] >= threshold)
+        if zi.size == 0:
+            return
+        zi = zi + z0
+        ref_vals = ref[zi, yi, xi]
+        base = (zi + pad[0]) * strides[0] + (yi + pad[1]) * strides[1] + (xi + pad[2])
+        if local:
+            inv_dd2 = (1.0 / (float(dose_pct) / 100.0 * ref_vals) ** 2).astype(np.float32)
+        else:
+            inv_dd2 = np.float32(1.0 / dd_global ** 2)
+        best = _gamma_block(eval_flat, base, ref_vals, np.asarray(inv_dd2), stencil, dist2_dta)
+        gamma_map[zi, yi, xi] = np.sqrt(best)
+
+    slabs = [(z, min(z + slab_size, ref.shape[0])) for z in range(0, ref.shape[0], slab_size)]
+    workers = n_workers or os.cpu_count() or 1
+    if workers > 1 and len(slabs) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(lambda s: run_slab(*s), slabs))
+    else:
+        for s in slabs:
+            run_slab(*s)
+
+    vals = gamma_map[np.isfinite(gamma_map)]
+    n = int(vals.size)
+    return GammaResult(
+        gamma=gamma_map,
+        pass_rate=float((vals <= 1.0).mean() * 100.0) if n else 0.0,
+        mean_gamma=float(vals.mean()) if n else float("nan"),
+        gamma_p95=float(np.percentile(vals, 95)) if n else float("nan"),
+        n_evaluated=n,
+        dose_pct=float(dose_pct),
+        dta_mm=float(dta_mm),
+        local=bool(local),
+        low_dose_threshold_pct=float(low_dose_threshold_pct),
+        norm_dose_gy=d_norm,
+    )
+
+
+def downsample_to_grid(
+    dose: np.ndarray,
+    spacing_zyx: Sequence[float],
+    grid_mm: Optional[float],
+) -> Tuple[np.ndarray, Tuple[float, float, float]]:
+    """
+    Submuestrea (por paso entero en cada eje) una dosis para que el spacing
+    se acerque a grid_mm sin bajar de él. La dosis del Case está
+    remuestreada al grid del CT; volver a ~2.5 mm basta para gamma y
+    reduce el número de voxeles en un orden de magnitud.
+    """
+    spacing = tuple(float(s) for s in spacing_zyx)
+    if not grid_mm:
+        return dose, spacing
+    steps = [max(1, int(np.floor(float(grid_mm) / s + 1e-6))) for s in spacing]
+    sub = dose[::steps[0], ::steps[1], ::steps[2]]
+    return sub, tuple(s * k for s, k in zip(spacing, steps))
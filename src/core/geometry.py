@@ -1,5 +1,6 @@
-from typing import Tuple
+from typing import Optional, Tuple
 import numpy as np
+import SimpleITK as sitk
 
 
 def compute_centroid(mask: np.ndarray,
@@ -25,3 +26,97 @@ def compute_volume_cc(mask: np.ndarray,
     num_voxels = int(mask.sum())
     vol_mm3 = num_voxels * voxel_vol_mm3
     return vol_mm3 / 1000.0
+
+
+def mask_bbox_slices(mask: np.ndarray,
+                     margin_vox: Tuple[int, int, int] = (0, 0, 0)) -> Optional[Tuple[slice, slice, slice]]:
+    """
+    Bounding box (z, y, x) de una máscara ampliada en margin_vox voxeles
+    por eje y recortada a los límites del volumen. None si está vacía.
+    """
+    slices = []
+    for ax in range(3):
+        other = tuple(a for a in range(3) if a != ax)
+        idx = np.flatnonzero(mask.any(axis=other))
+        if idx.size == 0:
+            return None
+        lo = max(int(idx[0]) - int(margin_vox[ax]), 0)
+        hi = min(int(idx[-1]) + int(margin_vox[ax]) + 1, mask.shape[ax])
+        slices.append(slice(lo, hi))
+    return tuple(slices)
+
+
+def distance_from_mask_mm(mask: np.ndarray,
+                          spacing: Tuple[float, float, float],
+                          max_distance_mm: float) -> Optional[Tuple[Tuple[slice, slice, slice], np.ndarray]]:
+    """
+    Distancia euclídea (mm) de cada voxel a la máscara, calculada sólo en
+    el bounding box de la máscara ampliado en max_distance_mm (los voxeles
+    fuera del recorte están, por construcción, más lejos).
+
+    Devuelve (slices del recorte, distancia [recorte] float32; 0 dentro de
+    la máscara) o None si la máscara está vacía.
+    """
+    margin = tuple(int(np.ceil(max_distance_mm / s)) + 1 for s in spacing)
+    sl = mask_bbox_slices(mask, margin)
+    if sl is None:
+        return None
+    crop = np.ascontiguousarray(mask[sl], dtype=np.uint8)
+    img = sitk.GetImageFromArray(crop)
+    dz, dy, dx = spacing
+    img.SetSpacing((float(dx), float(dy), float(dz)))
+    dist = sitk.SignedMaurerDistanceMap(
+        img, insideIsPositive=False, squaredDistance=False, useImageSpacing=True
+    )
+    arr = sitk.GetArrayFromImage(dist).astype(np.float32)
+    return sl, np.clip(arr, 0.0, None)
+
+
+def rasterize_contours(contours,
+                       size_xyz: Tuple[int, int, int],
+                       spacing: Tuple[float, float, float],
+                       origin: Tuple[float, float, float],
+                       direction: Tuple[float, ...]) -> np.ndarray:
+    """
+    Rasteriza contornos planares (arrays (N, 3) en mm, p.ej. de
+    core.dicom_io.read_roi_contours) a una máscara [z, y, x] uint8 sobre
+    un grid con geometría SimpleITK (size, spacing, origin, direction en
+    x, y, z). Los cortes del grid deben coincidir con los de los contornos
+    (mismo z), pero el grid en el plano puede ser más grueso que el del CT.
+
+    Un voxel está dentro si su centro cae dentro del polígono (regla
+    par-impar); varios contornos en el mismo corte se combinan con XOR,
+    así que los agujeros (contornos interiores) quedan vacíos.
+    """
+    nx, ny, nz = (int(n) for n in size_xyz)
+    mask = np.zeros((nz, ny, nx), dtype=np.uint8)
+    inv = np.linalg.inv(np.asarray(direction, dtype=float).reshape(3, 3))
+    org = np.asarray(origin, dtype=float)
+    spc = np.asarray(spacing, dtype=float)
+
+    for pts in contours:
+        idx = (np.asarray(pts, dtype=float) - org) @ inv.T / spc  # índices continuos (x, y, z)
+        k = int(np.rint(idx[:, 2].mean()))
+        if not 0 <= k < nz or idx.shape[0] < 3:
+            continue
+        u0, v0 = idx[:, 0], idx[:, 1]
+        u1, v1 = np.roll(u0, -1), np.roll(v0, -1)
+
+        rows = np.arange(max(int(np.ceil(v0.min())), 0), min(int(np.floor(v0.max())), ny - 1) + 1)
+        if rows.size == 0:
+            continue
+        # Cruces de cada fila (centro de voxel) con cada arista (semiabierta en v)
+        r = rows[:, None].astype(float)
+        crosses = ((v0 <= r) & (r < v1)) | ((v1 <= r) & (r < v0))
+        ri, ei = np.nonzero(crosses)
+        if ri.size == 0:
+            continue
+        t = (rows[ri] - v0[ei]) / (v1[ei] - v0[ei])
+        x = u0[ei] + t * (u1[ei] - u0[ei])
+
+        # Paridad acumulada: cada cruce conmuta desde el primer centro a su derecha
+        toggles = np.zeros((rows.size, nx + 1), dtype=np.int32)
+        np.add.at(toggles, (ri, np.clip(np.ceil(x).astype(int), 0, nx)), 1)
+        inside = (np.cumsum(toggles, axis=1)[:, :nx] % 2).astype(np.uint8)
+        mask[k, rows[0]:rows[-1] + 1] ^= inside
+    return mask
@@ -0,0 +1,162 @@
+# src/core/hu_stats.py
+
+"""
+core/hu_stats.py
+================
+
+Estadísticas de HU a partir de un histograma entero (1 bin = 1 HU).
+
+Tanto el CT de planificación (qa.checks.ct.check_ct_hu_water_air) como el
+CBCT HyperSight (hypersight) calculan aire / agua / hueso igual:
+
+  - aire: percentil bajo de todo el volumen.
+  - agua / tejido blando: mediana de los voxeles en una ventana en torno
+    a 0 HU.
+  - hueso: mediana de los voxeles por encima de un umbral.
+
+Un histograma entero se acumula corte a corte (np.bincount sobre int32),
+así que no hace falta tener el volumen completo en memoria ni copiarlo a
+float, y percentiles y medianas salen de la suma acumulada (interpolando
+entre voxeles vecinos como np.percentile).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+# Rango de HU representado; lo que quede fuera se acumula en los extremos
+HU_MIN = -8192     # incluye valores de padding habituales (-3024, -8192)
+HU_MAX = 8191
+
+
+# =====================================================
+# 1) Histograma
+# =====================================================
+
+@dataclass
+class HUHistogram:
+    """
+    counts[i] = nº de voxeles con HU == HU_MIN + i (recortado a
+    [HU_MIN, HU_MAX]).
+    """
+    counts: np.ndarray
+
+    @classmethod
+    def empty(cls) -> "HUHistogram":
+        return cls(np.zeros(HU_MAX - HU_MIN + 1, dtype=np.int64))
+
+    @property
+    def n_voxels(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, values: np.ndarray, mask: Optional[np.ndarray] = None) -> None:
+        """Acumula un bloque (p.ej. un corte) de HU, opcionalmente enmascarado."""
+        vals = values[mask] if mask is not None else values.ravel()
+        if vals.size == 0:
+            return
+        if not np.issubdtype(vals.dtype, np.integer):
+            vals = np.rint(vals)
+        idx = np.clip(vals.astype(np.int32, copy=False), HU_MIN, HU_MAX) - HU_MIN
+        self.counts += np.bincount(idx, minlength=self.counts.size)
+
+    def percentile(self, pct: float) -> float:
+        """Percentil (0-100) de todos los voxeles; NaN si está vacío."""
+        return _percentile_in_range(self.counts, pct, HU_MIN, HU_MAX)[0]
+
+    def median_in_window(self, lo_hu: float, hi_hu: float) -> Tuple[float, int]:
+        """(mediana, nº de voxeles) de los voxeles con lo_hu <= HU <= hi_hu."""
+        return _percentile_in_range(self.counts, 50.0, lo_hu, hi_hu)
+
+
+def _percentile_in_range(
+    counts: np.ndarray, pct: float, lo_hu: float, hi_hu: float
+) -> Tuple[float, int]:
+    """
+    Percentil de los voxeles con lo_hu <= HU <= hi_hu, interpolando entre
+    los dos valores ordenados vecinos como np.percentile (método "linear"):
+    con HU enteros da exactamente lo mismo que np.percentile sobre el volumen.
+    """
+    lo = int(np.clip(np.ceil(lo_hu) - HU_MIN, 0, counts.size - 1))
+    hi = int(np.clip(np.floor(hi_hu) - HU_MIN, 0, counts.size - 1))
+    sub = counts[lo:hi + 1]
+    n = int(sub.sum())
+    if n == 0:
+        return float("nan"), 0
+    cum = np.cumsum(sub)
+    pos = float(np.clip(pct, 0.0, 100.0)) / 100.0 * (n - 1)
+    i0 = int(np.floor(pos))
+    i1 = min(i0 + 1, n - 1)
+    # Bin del i-ésimo voxel ordenado (0-based): primer bin con cum > i
+    b0, b1 = np.searchsorted(cum, [i0, i1], side="right")
+    v0 = float(HU_MIN + lo + b0)
+    v1 = float(HU_MIN + lo + b1)
+    return v0 + (pos - i0) * (v1 - v0), n
+
+
+def compute_hu_histogram(
+    slices: Iterable[np.ndarray],
+    masks: Optional[Iterable[np.ndarray]] = None,
+) -> HUHistogram:
+    """
+    Histograma de HU acumulado sobre un iterable de bloques (un volumen
+    [z, y, x] se recorre corte a corte). masks, si se da, recorre en
+    paralelo las máscaras booleanas de cada bloque.
+    """
+    hist = HUHistogram.empty()
+    if masks is None:
+        for sl in slices:
+            hist.add(sl)
+    else:
+        for sl, m in zip(slices, masks):
+            hist.add(sl, m.astype(bool, copy=False))
+    return hist
+
+
+# =====================================================
+# 2) Aire / agua / hueso
+# =====================================================
+
+def classify_hu_deviation(value: float, expected: float, warn_tol: float, tol: float) -> str:
+    """'OK' / 'WARN' / 'FAIL' según |value - expected|; 'NO_INFO' si NaN."""
+    if not np.isfinite(value):
+        return "NO_INFO"
+    delta = abs(value - expected)
+    if delta <= warn_tol:
+        return "OK"
+    if delta <= tol:
+        return "WARN"
+    return "FAIL"
+
+
+def hu_calibration_stats(hist: HUHistogram, cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Aire / agua / hueso a partir del histograma, con las claves de config
+    de CT_HU_CONFIG / CBCT_HU_CONFIG (air_percentile, water_window_*_hu,
+    bone_min_hu...).
+
+    air_min_valid_hu (opcional) excluye del percentil de aire el padding
+    fuera del FOV de reconstrucción (-3024, -8192...).
+    """
+    air_pct = float(cfg.get("air_percentile", 1.0))
+    air_floor = cfg.get("air_min_valid_hu")
+    w_min = float(cfg.get("water_window_min_hu", -200.0))
+    w_max = float(cfg.get("water_window_max_hu", 200.0))
+    bone_min = float(cfg.get("bone_min_hu", 300.0))
+
+    water_hu, num_w = hist.median_in_window(w_min, w_max)
+    bone_hu, num_b = hist.median_in_window(bone_min, HU_MAX)
+    return {
+        "air_hu": (
+            hist.percentile(air_pct) if air_floor is None
+            else _percentile_in_range(hist.counts, air_pct, float(air_floor), HU_MAX)[0]
+        ),
+        "water_hu": water_hu,
+        "num_water_voxels": num_w,
+        "bone_hu": bone_hu,
+        "num_bone_voxels": num_b,
+        "num_voxels": hist.n_voxels,
+    }
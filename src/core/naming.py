@@ -125,9 +125,18 @@ _COUCH_KEYWORDS = {"COUCH", "COUCHSURFACE", "COUCHINTERIOR", "TABLE"}
 
 # Palabras que suelen indicar estructuras helper (no clínicas puras)
 _HELPER_KEYWORDS = {
-    "RING", "SHELL", "ZPTV", "OPT", "OPTI", "MARGIN", "CROP", "BLOCK", "PTV_RING",
+    "RING", "SHELL", "ZPTV", "MARGIN", "CROP", "BLOCK", "PTV_RING",
 }
 
+# OPT / OPTI sólo como palabra (zOPT_Rectum, OPT_PTV, Rectum_OPT1), no
+# dentro de otra palabra: OPTIC_NERVE / OPTIC_CHIASM son OARs.
+_HELPER_OPT_RE = re.compile(r"(?:^|_)Z?OPTI?(?:_|\d|$)")
+
+
+def _has_helper_keyword(name_up: str) -> bool:
+    """name_up: nombre en mayúsculas con separadores como "_"."""
+    return any(key in name_up for key in _HELPER_KEYWORDS) or bool(_HELPER_OPT_RE.search(name_up))
+
 
 def _canonical_from_clean(clean: str) -> Tuple[str, StructCategory]:
     """
@@ -153,9 +162,8 @@ def _canonical_from_clean(clean: str) -> Tuple[str, StructCategory]:
         return clean, StructCategory.CTV
 
     # Helper rings / opti / zPTV
-    for key in _HELPER_KEYWORDS:
-        if key in clean:
-            return clean, StructCategory.HELPER
+    if _has_helper_keyword(clean):
+        return clean, StructCategory.HELPER
 
     # OARs: intentamos mapear al diccionario de sinónimos
     if clean in _CANONICAL_OAR_MAP:
@@ -253,6 +261,21 @@ def group_structures_by_canonical(struct_names: List[str]) -> Dict[str, List[Nor
     return groups
 
 
+def is_helper_structure(raw_name: str) -> bool:
+    """
+    True si la estructura parece auxiliar de optimización (anillo, _OPT,
+    crop, zPTV...).
+
+    Además de la categoría HELPER, mira el nombre crudo: _clean_raw_name
+    quita sufijos como _RING/_OPT, así que "PTV_Ring" se clasifica como
+    PTV aunque sea un anillo.
+    """
+    if normalize_structure_name(raw_name).category == StructCategory.HELPER:
+        return True
+    up = re.sub(r"[ \.\-]+", "_", raw_name.strip().upper())
+    return _has_helper_keyword(up)
+
+
 def choose_primary_structure(
     normalized_group: List[NormalizedName],
 ) -> NormalizedName:
@@ -282,6 +305,23 @@ def choose_primary_structure(
     return candidates_sorted[0]
 
 
+def find_primary_ptv(structs: Dict[str, Any]) -> Optional[Any]:
+    """
+    PTV principal de un dict {nombre: StructureInfo}:
+      1) estructuras cuyo nombre contenga 'PTV',
+      2) excluyendo auxiliares (is_helper_structure: anillos, zPTV, _OPT...),
+      3) de las restantes, la de mayor volumen (volume_cc).
+    None si no hay ninguna.
+    """
+    candidates = [
+        st for name, st in structs.items()
+        if "PTV" in name.upper() and not is_helper_structure(name)
+    ]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda s: s.volume_cc)
+
+
 
 
 # ============================================================
@@ -510,7 +550,9 @@ Cómo extender este módulo
    - Por ejemplo, si tu RTSTRUCT usa "EXTERNAL_CONTOUR" como body, puedes
      añadir "EXTERNAL_CONTOUR" a _BODY_KEYWORDS.
    - Si el servicio usa nombres distintos para shells de optimización,
-     añadir esos patrones a _HELPER_KEYWORDS.
+     añadir esos patrones a _HELPER_KEYWORDS (subcadena). OPT/OPTI van
+     aparte (_HELPER_OPT_RE) porque sólo cuentan como palabra completa:
+     si no, OPTIC_NERVE / OPTIC_CHIASM serían HELPER.
 
 4) Cambiar el criterio para elegir estructura "principal" en un grupo:
 
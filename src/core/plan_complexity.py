@@ -0,0 +1,245 @@
+# src/core/plan_complexity.py
+
+"""
+core/plan_complexity.py
+=======================
+
+Métricas de complejidad de plan calculadas sobre los ControlPointArrays
+de cada beam (ver core.control_points), de forma vectorizada: cada métrica
+es un puñado de operaciones sobre arrays [n_cp, n_franjas], sin bucles por
+control point ni por lámina.
+
+Métricas por control point:
+  - area_cm2: área de la apertura efectiva (MLC ∩ mandíbulas).
+  - lsv: Leaf Sequence Variability (producto de ambos bancos).
+  - aav: Aperture Area Variability, área del CP relativa a la apertura
+    máxima que alcanza cada par de láminas a lo largo del beam.
+  - small_fraction: fracción de pares abiertos con gap < small_aperture_mm.
+  - edge_mm1: métrica de borde = longitud de borde / área (mm⁻¹).
+
+Por beam se agregan ponderando cada segmento (CP i-1 → CP i) por su
+fracción de MU, y el MCS (modulation complexity score, versión VMAT) es
+Σ LSV·AAV·ΔMU/MU. MCS = 1 es un campo abierto sin modular; valores
+cercanos a 0 indican modulación muy alta.
+"""
+
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from core.case import BeamInfo, ControlPointArrays
+from core.control_points import effective_leaf_openings
+
+
+# =====================================================
+# 1) Métricas por control point
+# =====================================================
+
+def _bank_lsv(edges: np.ndarray, open_: np.ndarray) -> np.ndarray:
+    """
+    LSV de un banco: media de (pos_max - |Δpos|) / pos_max sobre pares
+    de láminas adyacentes abiertas, con pos_max = rango de posiciones del
+    banco en las láminas abiertas del CP (McNiven et al.).
+    """
+    big = np.float32(np.inf)
+    hi = np.where(open_, edges, -big).max(axis=1)
+    lo = np.where(open_, edges, big).min(axis=1)
+    pos_max = np.where(np.isfinite(hi - lo), hi - lo, 0.0)[:, None]
+
+    pair_open = open_[:, :-1] & open_[:, 1:]
+    diff = np.abs(np.diff(np.where(open_, edges, 0.0), axis=1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        term = np.where(pos_max > 0, (pos_max - diff) / pos_max, 1.0)
+    term = np.where(pair_open, np.clip(term, 0.0, 1.0), 0.0)
+    n_pairs = pair_open.sum(axis=1)
+    # Un único par abierto no tiene vecinos: LSV = 1 (sin variabilidad)
+    return np.where(n_pairs > 0, term.sum(axis=1) / np.maximum(n_pairs, 1), 1.0)
+
+
+def compute_control_point_metrics(
+    cpa: ControlPointArrays,
+    small_aperture_mm: float = 10.0,
+) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Métricas de complejidad por CP (arrays [n_cp]) de un beam con MLC.
+    Devuelve None si el beam no tiene MLC con límites de lámina.
+    """
+    openings = effective_leaf_openings(cpa)
+    if openings is None:
+        return None
+    bounds_lo, bounds_hi, left, right = openings
+
+    widths = np.clip(bounds_hi - bounds_lo, 0.0, None)        # [n_cp, n_s]
+    gaps = np.clip(right - left, 0.0, None)                   # [n_cp, n_s]
+    gaps = np.where(np.isfinite(gaps), gaps, 0.0)
+    open_ = (gaps > 0) & (widths > 0)
+
+    area_mm2 = (gaps * widths).sum(axis=1)
+
+    # LSV: bordes efectivos de cada banco
+    lsv = _bank_lsv(left, open_) * _bank_lsv(right, open_)
+    lsv = np.where(open_.any(axis=1), lsv, 0.0)
+
+    # AAV: área del CP frente a la apertura máxima de cada par en el beam
+    max_area_mm2 = (gaps.max(axis=0) * widths.max(axis=0)).sum()
+    aav = area_mm2 / max_area_mm2 if max_area_mm2 > 0 else np.zeros_like(area_mm2)
+
+    # Fracción de aperturas pequeñas entre los pares abiertos
+    n_open = open_.sum(axis=1)
+    n_small = (open_ & (gaps < small_aperture_mm)).sum(axis=1)
+    small_fraction = np.where(n_open > 0, n_small / np.maximum(n_open, 1), 0.0)
+
+    # Métrica de borde: puntas de lámina + bordes laterales entre franjas.
+    # El borde lateral entre dos franjas es la diferencia simétrica de sus
+    # intervalos abiertos. Sólo cuentan las franjas abiertas (open_): una
+    # franja tapada por la mandíbula con las láminas abiertas no tiene
+    # borde, y la primera/última franja abierta cierra con su propio gap
+    # (frente a una vecina con g = 0 o en el extremo del array).
+    g = np.where(open_, gaps, 0.0)
+    tips = 2.0 * np.where(open_, widths, 0.0).sum(axis=1)
+    overlap = np.clip(
+        np.minimum(right[:, 1:], right[:, :-1]) - np.maximum(left[:, 1:], left[:, :-1]),
+        0.0, None,
+    )
+    overlap = np.where(open_[:, 1:] & open_[:, :-1], overlap, 0.0)
+    sides = (
+        (g[:, 1:] + g[:, :-1] - 2.0 * overlap).sum(axis=1)
+        + g[:, 0] + g[:, -1]
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        edge = np.where(area_mm2 > 0, (tips + sides) / area_mm2, 0.0)
+
+    return {
+        "area_cm2": (area_mm2 / 100.0).astype(np.float32),
+        "lsv": lsv.astype(np.float32),
+        "aav": np.asarray(aav, dtype=np.float32),
+        "small_fraction": small_fraction.astype(np.float32),
+        "edge_mm1": edge.astype(np.float32),
+    }
+
+
+def segment_mu_weights(cpa: ControlPointArrays) -> np.ndarray:
+    """
+    Fracción de MU de cada segmento CP i-1 → CP i ([n_cp - 1]). Si el beam
+    tiene un único CP o pesos nulos se devuelven pesos uniformes.
+    """
+    n = len(cpa)
+    if n < 2:
+        return np.ones(1, dtype=np.float64)
+    dw = np.clip(np.diff(cpa.cum_meterset_weight.astype(np.float64)), 0.0, None)
+    total = dw.sum()
+    if total <= 0:
+        return np.full(n - 1, 1.0 / (n - 1))
+    return dw / total
+
+
+def _segment_mean(values: np.ndarray, weights: np.ndarray) -> float:
+    """
+    Media ponderada por MU de una métrica por CP, promediando los dos CP
+    que delimitan cada segmento.
+    """
+    if values.size < 2:
+        return float(values.mean()) if values.size else 0.0
+    seg = 0.5 * (values[1:] + values[:-1])
+    return float((seg * weights).sum())
+
+
+# =====================================================
+# 2) Agregado por beam y por plan
+# =====================================================
+
+@dataclass
+class BeamComplexity:
+    """
+    Métricas de complejidad agregadas de un beam (ponderadas por MU).
+    """
+    beam_name: str
+    num_control_points: int
+    mcs: float
+    lsv: float
+    aav: float
+    mean_area_cm2: float
+    area_cv: float
+    small_aperture_fraction: float
+    edge_metric_mm1: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def compute_beam_complexity(
+    beam: BeamInfo,
+    small_aperture_mm: float = 10.0,
+) -> Optional[BeamComplexity]:
+    """
+    Complejidad de un beam a partir de sus control points. None si el
+    beam no trae ControlPointArrays o no tiene MLC.
+    """
+    cpa = beam.control_points
+    if cpa is None:
+        return None
+    m = compute_control_point_metrics(cpa, small_aperture_mm=small_aperture_mm)
+    if m is None:
+        return None
+
+    w = segment_mu_weights(cpa)
+    lsv, aav = m["lsv"].astype(np.float64), m["aav"].astype(np.float64)
+    if lsv.size >= 2:
+        mcs = float((0.5 * (lsv[1:] + lsv[:-1]) * 0.5 * (aav[1:] + aav[:-1]) * w).sum())
+    else:
+        mcs = float((lsv * aav).mean()) if lsv.size else 0.0
+
+    areas = m["area_cm2"].astype(np.float64)
+    mean_area = float(areas.mean()) if areas.size else 0.0
+    area_cv = float(areas.std() / mean_area) if mean_area > 0 else 0.0
+
+    return BeamComplexity(
+        beam_name=beam.beam_name,
+        num_control_points=len(cpa),
+        mcs=mcs,
+        lsv=_segment_mean(lsv, w),
+        aav=_segment_mean(aav, w),
+        mean_area_cm2=_segment_mean(areas, w),
+        area_cv=area_cv,
+        small_aperture_fraction=_segment_mean(m["small_fraction"].astype(np.float64), w),
+        edge_metric_mm1=_segment_mean(m["edge_mm1"].astype(np.float64), w),
+    )
+
+
+def compute_plan_complexity(
+    beams: Iterable[BeamInfo],
+    small_aperture_mm: float = 10.0,
+) -> Dict[str, Any]:
+    """
+    Complejidad de un conjunto de beams (típicamente los arcos clínicos).
+
+    Devuelve {"beams": [BeamComplexity...], "plan": {...}} donde "plan"
+    agrega las métricas de los beams ponderando por sus MU si BeamInfo
+    las trae (monitor_units) y, si no, a partes iguales. "plan" es None
+    si ningún beam tiene datos de MLC.
+    """
+    per_beam: List[BeamComplexity] = []
+    weights: List[float] = []
+    for b in beams:
+        bc = compute_beam_complexity(b, small_aperture_mm=small_aperture_mm)
+        if bc is None:
+            continue
+        per_beam.append(bc)
+        mu = getattr(b, "monitor_units", None)
+        weights.append(float(mu) if mu else 1.0)
+
+    if not per_beam:
+        return {"beams": [], "plan": None}
+
+    w = np.asarray(weights, dtype=np.float64)
+    w = w / w.sum()
+    keys = ("mcs", "lsv", "aav", "mean_area_cm2", "area_cv",
+            "small_aperture_fraction", "edge_metric_mm1")
+    plan = {
+        k: float(sum(getattr(bc, k) * wi for bc, wi in zip(per_beam, w)))
+        for k in keys
+    }
+    return {"beams": per_beam, "plan": plan}
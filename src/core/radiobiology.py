@@ -0,0 +1,156 @@
+# src/core/radiobiology.py
+
+"""
+core/radiobiology.py
+====================
+
+Conversión de dosis física a BED / EQD2 con el modelo lineal-cuadrático:
+
+    d    = D / n                      (dosis por fracción)
+    BED  = D · (1 + d / (α/β))
+    EQD2 = BED / (1 + 2 / (α/β)) = D · (d + α/β) / (2 + α/β)
+
+Dos caminos:
+
+  - Mapas voxel a voxel (convert_dose_map): α/β por voxel a partir de las
+    estructuras (alpha_beta_map) y una sola pasada vectorizada en float32,
+    in-place si se pasa out=dose.
+  - Histogramas (eqd2_histogram / bed_histogram): la conversión es
+    monótona creciente en D, así que basta con transformar las aristas de
+    los bins de un DoseHistogram (core.dvh); no se toca el volumen.
+
+Los α/β se resuelven por nombre de estructura con core.naming
+(canonical / categoría), a partir de un dict de config con la forma de
+qa.config.ALPHA_BETA_CONFIG.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+import numpy as np
+
+from core.case import StructureInfo
+from core.dvh import DoseHistogram
+from core.geometry import mask_bbox_slices
+from core.naming import StructCategory, normalize_structure_name
+
+
+ArrayOrFloat = Union[np.ndarray, float]
+
+
+# =====================================================
+# 1) Fórmulas LQ
+# =====================================================
+
+def bed(dose_gy: ArrayOrFloat, num_fractions: int, alpha_beta_gy: ArrayOrFloat) -> ArrayOrFloat:
+    """BED (Gy) de una dosis total repartida en num_fractions fracciones."""
+    n = float(num_fractions)
+    return dose_gy * (1.0 + (dose_gy / n) / alpha_beta_gy)
+
+
+def eqd2(dose_gy: ArrayOrFloat, num_fractions: int, alpha_beta_gy: ArrayOrFloat) -> ArrayOrFloat:
+    """EQD2 (Gy): dosis equivalente en fracciones de 2 Gy."""
+    n = float(num_fractions)
+    return dose_gy * (dose_gy / n + alpha_beta_gy) / (2.0 + alpha_beta_gy)
+
+
+# =====================================================
+# 2) α/β por estructura
+# =====================================================
+
+def alpha_beta_for_structure(name: str, ab_cfg: Dict[str, Any]) -> float:
+    """
+    α/β (Gy) de una estructura según ab_cfg:
+
+      - by_canonical: {canonical: α/β}, p.ej. {"RECTUM": 3.0}. Se prueba
+        el canonical exacto y sin sufijo de lateralidad (_L / _R).
+      - target_ab_gy: PTV / CTV (y el órgano diana del sitio, si aparece
+        en by_canonical manda éste).
+      - default_ab_gy: resto.
+    """
+    norm = normalize_structure_name(name)
+    by_canon = ab_cfg.get("by_canonical", {})
+    canon = norm.canonical
+    for key in (canon, canon[:-2] if canon.endswith(("_L", "_R")) else None):
+        if key and key in by_canon:
+            return float(by_canon[key])
+    if norm.category in (StructCategory.PTV, StructCategory.CTV):
+        return float(ab_cfg.get("target_ab_gy", 10.0))
+    return float(ab_cfg.get("default_ab_gy", 3.0))
+
+
+def alpha_beta_map(
+    shape: Tuple[int, int, int],
+    structs: Iterable[StructureInfo],
+    ab_cfg: Dict[str, Any],
+) -> np.ndarray:
+    """
+    Mapa de α/β [z, y, x] float32. Empieza en default_ab_gy y cada
+    estructura escribe su α/β en su bounding box; en solapes gana la
+    última, así que conviene pasar los targets al final.
+    """
+    ab = np.full(shape, float(ab_cfg.get("default_ab_gy", 3.0)), dtype=np.float32)
+    for s in structs:
+        mask = s.mask.astype(bool, copy=False)
+        sl = mask_bbox_slices(mask)
+        if sl is None:
+            continue
+        ab[sl][mask[sl]] = alpha_beta_for_structure(s.name, ab_cfg)
+    return ab
+
+
+# =====================================================
+# 3) Mapas voxel a voxel
+# =====================================================
+
+def convert_dose_map(
+    dose_gy: np.ndarray,
+    num_fractions: int,
+    alpha_beta_gy: ArrayOrFloat,
+    kind: str = "EQD2",
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Convierte una matriz de dosis física a EQD2 o BED en float32.
+
+    alpha_beta_gy puede ser un escalar o un mapa con la forma de la dosis
+    (alpha_beta_map). Con out=dose_gy (float32) la conversión es in-place;
+    sólo se usa un temporal del tamaño de la dosis.
+    """
+    kind = kind.upper()
+    if kind not in ("EQD2", "BED"):
+        raise ValueError(f"kind debe ser 'EQD2' o 'BED', no {kind!r}")
+    if out is None:
+        out = np.array(dose_gy, dtype=np.float32, copy=True)
+    elif out is not dose_gy:
+        np.copyto(out, dose_gy, casting="same_kind")
+
+    n = np.float32(num_fractions)
+    ab = alpha_beta_gy if isinstance(alpha_beta_gy, np.ndarray) else np.float32(alpha_beta_gy)
+
+    tmp = np.divide(out, n, dtype=np.float32)         # d = D / n
+    if kind == "BED":
+        tmp /= ab                                     # d / (α/β)
+        tmp += np.float32(1.0)
+        out *= tmp                                    # D · (1 + d/(α/β))
+    else:
+        tmp += ab                                     # d + α/β
+        out *= tmp
+        np.add(ab, np.float32(2.0), out=tmp, dtype=np.float32)
+        out /= tmp                                    # / (2 + α/β)
+    return out
+
+
+# =====================================================
+# 4) Histogramas (sólo aristas)
+# =====================================================
+
+def eqd2_histogram(hist: DoseHistogram, num_fractions: int, alpha_beta_gy: float) -> DoseHistogram:
+    """DVH en EQD2 transformando las aristas de los bins de hist."""
+    return hist.map_edges(lambda d: eqd2(d, num_fractions, alpha_beta_gy))
+
+
+def bed_histogram(hist: DoseHistogram, num_fractions: int, alpha_beta_gy: float) -> DoseHistogram:
+    """DVH en BED transformando las aristas de los bins de hist."""
+    return hist.map_edges(lambda d: bed(d, num_fractions, alpha_beta_gy))
@@ -0,0 +1,82 @@
+# src/hypersight/ingest.py
+
+"""
+hypersight/ingest.py
+====================
+
+Lectura en streaming de una serie CBCT (HyperSight) DICOM.
+
+La serie se ordena con las cabeceras (core.dicom_io.read_ct_series_header)
+y los cortes se leen uno a uno: cada corte se copia a un volumen int16
+preasignado y, en la misma pasada, se acumula el histograma de HU
+(core.hu_stats). Así las estadísticas de calibración están listas al
+terminar la lectura, sin recorrer el volumen otra vez.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Iterator, Tuple
+
+import numpy as np
+import SimpleITK as sitk
+
+from core.dicom_io import read_ct_series_header
+from core.hu_stats import HUHistogram
+
+
+@dataclass
+class CBCTSeries:
+    """
+    CBCT cargado: volumen HU [z, y, x] int16, geometría (convención
+    SimpleITK para spacing/origin/direction) e histograma de HU.
+    """
+    hu: np.ndarray
+    spacing_zyx: Tuple[float, float, float]
+    origin: Tuple[float, ...]
+    direction: Tuple[float, ...]
+    histogram: HUHistogram
+    source_folder: str
+
+    def to_sitk(self) -> sitk.Image:
+        """Imagen SimpleITK (float32) con la geometría de la serie."""
+        img = sitk.GetImageFromArray(self.hu.astype(np.float32))
+        dz, dy, dx = self.spacing_zyx
+        img.SetSpacing((dx, dy, dz))
+        img.SetOrigin(self.origin)
+        img.SetDirection(self.direction)
+        return img
+
+
+def iter_series_slices(file_names) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    (índice z, corte HU [y, x]) de cada fichero de la serie, en orden.
+    SimpleITK aplica RescaleSlope/Intercept al leer.
+    """
+    for z, fname in enumerate(file_names):
+        arr = sitk.GetArrayFromImage(sitk.ReadImage(fname))
+        yield z, arr.reshape(arr.shape[-2:])
+
+
+def load_cbct_series(cbct_folder: str) -> CBCTSeries:
+    """
+    Carga una serie CBCT corte a corte acumulando el histograma de HU.
+    """
+    header = read_ct_series_header(cbct_folder)
+    nx, ny, nz = header["size"]
+    sx, sy, sz = header["spacing"]
+
+    hu = np.empty((nz, ny, nx), dtype=np.int16)
+    hist = HUHistogram.empty()
+    for z, sl in iter_series_slices(header["file_names"]):
+        hu[z] = np.clip(np.rint(sl), -32768, 32767) if sl.dtype.kind == "f" else sl
+        hist.add(hu[z])
+
+    return CBCTSeries(
+        hu=hu,
+        spacing_zyx=(float(sz), float(sy), float(sx)),
+        origin=header["origin"],
+        direction=header["direction"],
+        histogram=hist,
+        source_folder=cbct_folder,
+    )
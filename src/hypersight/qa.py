@@ -0,0 +1,369 @@
+# src/hypersight/qa.py
+
+"""
+hypersight/qa.py
+================
+
+QA diaria de un CBCT HyperSight frente al caso de planificación:
+
+  1) Calibración HU (aire / agua / hueso) con el histograma acumulado en
+     la ingesta (hypersight.ingest), con la misma lógica que el check de
+     HU del CT (core.hu_stats).
+  2) Registro rígido CBCT → CT sobre volúmenes submuestreados
+     (hypersight.registration).
+  3) Acuerdo de HU CBCT vs CT dentro del BODY: el CBCT registrado se
+     remuestrea a un grid grueso del CT y se comparan, voxel a voxel, las
+     diferencias medianas en tejido blando y hueso (clasificados con el
+     CT de planificación). Lo que queda fuera del FOV del CBCT se ignora.
+
+Los resultados son CheckResult con group="CBCT"; no pasan por el
+registro de checks del CT (qa.checks), porque necesitan un volumen que
+no forma parte del Case.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import SimpleITK as sitk
+
+from core.case import Case, CheckResult
+from core.dicom_io import read_roi_contours
+from core.geometry import rasterize_contours
+from core.hu_stats import classify_hu_deviation, hu_calibration_stats
+from core.naming import is_helper_structure, normalize_structure_name
+from qa.config import (
+    get_cbct_hu_config,
+    get_cbct_ct_agreement_config,
+    get_cbct_recommendations,
+    format_recommendations_text,
+)
+from .ingest import CBCTSeries, load_cbct_series
+from .registration import (
+    RigidRegistrationResult,
+    downsample_image,
+    register_cbct_to_ct,
+    resample_cbct_to_ct,
+)
+
+
+_SEVERITY = {"OK": 0, "NO_INFO": 0, "WARN": 1, "FAIL": 2}
+
+
+# ============================================================
+# Utilidades internas
+# ============================================================
+
+def _worst(statuses) -> str:
+    return max(statuses, key=lambda s: _SEVERITY.get(s, 0), default="OK")
+
+
+def _ct_image(case: Case) -> sitk.Image:
+    """CT de planificación como imagen SimpleITK con su geometría."""
+    img = sitk.GetImageFromArray(case.ct_hu)
+    dz, dy, dx = case.ct_spacing
+    img.SetSpacing((float(dx), float(dy), float(dz)))
+    meta = case.metadata
+    if meta.get("ct_origin") is not None:
+        img.SetOrigin(tuple(float(v) for v in meta["ct_origin"]))
+    if meta.get("ct_direction") is not None:
+        img.SetDirection(tuple(float(v) for v in meta["ct_direction"]))
+    return img
+
+
+def _find_body_name(case: Case, patterns) -> Optional[str]:
+    """
+    ROI del BODY: aquella cuyo nombre normalizado (core.naming) coincide
+    exactamente con uno de los patrones, en orden de preferencia. Así
+    "Body" o "BODY_1" valen, pero no "BODY-PTV", "NotBody" ni "Body_Crop".
+    """
+    candidates = {}
+    for name in case.structs.keys():
+        if not is_helper_structure(name):
+            candidates.setdefault(normalize_structure_name(name).cleaned, name)
+    for p in patterns:
+        key = normalize_structure_name(p).cleaned
+        if key in candidates:
+            return candidates[key]
+    return None
+
+
+def _body_mask_image(case: Case, ct_img: sitk.Image, patterns, grid_mm: float) -> Optional[sitk.Image]:
+    """
+    Máscara BODY (uint8) con la geometría física del CT, para remuestrearla
+    (nearest) a los grids gruesos del registro y de la comparación.
+
+    Si la máscara ya está rasterizada en el Case se reutiliza. Si no, los
+    contornos se rasterizan directamente en un grid de ~grid_mm en el plano
+    (mismos cortes que el CT) con core.geometry.rasterize_contours: con
+    rt_utils, un BODY de cientos de miles de puntos tarda del orden de un
+    minuto y aquí sólo hace falta a resolución de registro.
+    """
+    name = _find_body_name(case, patterns)
+    if name is None:
+        return None
+    st = case.structs[name]
+    rtstruct_path = case.metadata.get("rtstruct_source_path")
+
+    if getattr(st, "is_loaded", True) or not rtstruct_path:
+        mask = sitk.GetImageFromArray(st.mask.astype(np.uint8))
+        mask.CopyInformation(ct_img)
+        return mask
+
+    sx, sy, sz = ct_img.GetSpacing()
+    nx, ny, nz = ct_img.GetSize()
+    fx, fy = (max(1, int(round(float(grid_mm) / s))) for s in (sx, sy))
+    spacing = (sx * fx, sy * fy, sz)
+    direction = np.asarray(ct_img.GetDirection(), dtype=float).reshape(3, 3)
+    # Mismo convenio que BinShrink: el centro del voxel grueso es el del bloque
+    origin = np.asarray(ct_img.GetOrigin(), dtype=float) + direction @ (
+        np.array([(fx - 1) * sx, (fy - 1) * sy, 0.0]) / 2.0
+    )
+    size = (-(-nx // fx), -(-ny // fy), nz)
+    arr = rasterize_contours(
+        read_roi_contours(rtstruct_path, name), size, spacing, tuple(origin), ct_img.GetDirection()
+    )
+    mask = sitk.GetImageFromArray(arr)
+    mask.SetSpacing(spacing)
+    mask.SetOrigin(tuple(float(v) for v in origin))
+    mask.SetDirection(ct_img.GetDirection())
+    return mask
+
+
+# ============================================================
+# 1) Calibración HU del CBCT
+# ============================================================
+
+def check_cbct_hu_calibration(cbct: CBCTSeries, profile: Optional[str] = None) -> CheckResult:
+    """
+    Aire (percentil bajo) y agua (mediana en ventana) del CBCT frente a
+    los valores esperados; el hueso (mediana > bone_min_hu) se informa.
+    No se relee el volumen: se usa cbct.histogram.
+    """
+    cfg = get_cbct_hu_config(profile)
+    stats = hu_calibration_stats(cbct.histogram, cfg)
+
+    air_hu = float(stats["air_hu"])
+    water_hu = float(stats["water_hu"])
+    num_w = int(stats["num_water_voxels"])
+    min_water_voxels = int(cfg.get("min_water_voxels", 1000))
+
+    air_status = classify_hu_deviation(
+        air_hu, float(cfg.get("air_expected_hu", -1000.0)),
+        float(cfg.get("air_warn_tolerance_hu", 80.0)), float(cfg.get("air_tolerance_hu", 120.0)),
+    )
+    if num_w < min_water_voxels:
+        water_status = "NO_INFO"
+    else:
+        water_status = classify_hu_deviation(
+            water_hu, float(cfg.get("water_expected_hu", 0.0)),
+            float(cfg.get("water_warn_tolerance_hu", 40.0)), float(cfg.get("water_tolerance_hu", 80.0)),
+        )
+
+    details: Dict[str, Any] = {
+        **stats,
+        "air_status": air_status,
+        "water_status": water_status,
+        "cbct_folder": cbct.source_folder,
+        "profile": profile,
+        "config_used": cfg,
+    }
+
+    if water_status == "NO_INFO":
+        scenario = "WARN"
+        passed = False
+        score = float(cfg.get("score_no_info", 0.8))
+        msg = (
+            f"CBCT: voxeles insuficientes en la ventana de agua ({num_w} < {min_water_voxels}); "
+            f"HU aire ≈ {air_hu:.1f} HU ({air_status})."
+        )
+    else:
+        worst = _worst((air_status, water_status))
+        scenario = {"OK": "OK", "WARN": "WARN", "FAIL": "BAD"}[worst]
+        passed = worst != "FAIL"
+        score = float(cfg.get({"OK": "score_ok", "WARN": "score_warn", "FAIL": "score_fail"}[worst], 1.0))
+        msg = (
+            f"CBCT: HU aire ≈ {air_hu:.1f} ({air_status}), agua ≈ {water_hu:.1f} ({water_status}), "
+            f"hueso ≈ {stats['bone_hu']:.0f} HU."
+        )
+
+    rec = format_recommendations_text(get_cbct_recommendations("HU", scenario))
+    return CheckResult(
+        name="CBCT HU (air/water)",
+        passed=passed,
+        score=score,
+        message=msg,
+        details=details,
+        group="CBCT",
+        recommendation=rec,
+    )
+
+
+# ============================================================
+# 2) Registro + acuerdo de HU CBCT vs CT dentro del BODY
+# ============================================================
+
+def _paired_median_diff(cbct: np.ndarray, ct: np.ndarray, sel: np.ndarray) -> Dict[str, Any]:
+    n = int(np.count_nonzero(sel))
+    if n == 0:
+        return {"n_voxels": 0, "median_diff_hu": float("nan"),
+                "ct_median_hu": float("nan"), "cbct_median_hu": float("nan")}
+    a, b = cbct[sel], ct[sel]
+    return {
+        "n_voxels": n,
+        "median_diff_hu": float(np.median(a - b)),
+        "ct_median_hu": float(np.median(b)),
+        "cbct_median_hu": float(np.median(a)),
+    }
+
+
+def check_cbct_ct_agreement(
+    case: Case,
+    cbct: CBCTSeries,
+    profile: Optional[str] = None,
+    registration: Optional[RigidRegistrationResult] = None,
+) -> CheckResult:
+    """
+    Registra el CBCT al CT (si no se pasa registration) y compara HU
+    dentro del BODY en un grid grueso del CT:
+
+      - tejido blando: voxeles con HU del CT en soft_tissue_window_hu.
+      - hueso: voxeles con HU del CT >= bone_min_hu.
+
+    Severidad por |mediana(CBCT - CT)| en cada clase; un desplazamiento
+    del registro por encima de shift_warn_mm / rotation_warn_deg sólo
+    añade un WARN informativo (posicionamiento, no calibración).
+    """
+    cfg = get_cbct_ct_agreement_config(profile)
+    score_no_info = float(cfg.get("score_no_info", 0.8))
+
+    ct_img = _ct_image(case)
+    body = _body_mask_image(
+        case, ct_img, cfg.get("body_name_patterns", ["BODY"]),
+        grid_mm=min(float(cfg.get("registration_grid_mm", 4.0)), float(cfg.get("comparison_grid_mm", 3.0))),
+    )
+    if body is None:
+        return CheckResult(
+            name="CBCT vs CT HU",
+            passed=False,
+            score=score_no_info,
+            message="No se encontró BODY en el caso: no se puede comparar CBCT vs CT.",
+            details={"profile": profile, "config_used": cfg},
+            group="CBCT",
+            recommendation=format_recommendations_text(
+                get_cbct_recommendations("AGREEMENT", "NO_INFO")
+            ),
+        )
+
+    cbct_img = cbct.to_sitk()
+    if registration is None:
+        registration = register_cbct_to_ct(
+            ct_img, cbct_img, body_mask=body,
+            grid_mm=float(cfg.get("registration_grid_mm", 4.0)),
+            max_iterations=int(cfg.get("registration_max_iterations", 100)),
+            sampling_fraction=float(cfg.get("registration_sampling_fraction", 0.02)),
+        )
+
+    # Grid de comparación: ambos volúmenes reducidos con la misma media por
+    # bloques (mismo efecto de volumen parcial); fuera del FOV del CBCT → NaN
+    grid_mm = float(cfg.get("comparison_grid_mm", 3.0))
+    ref = downsample_image(ct_img, grid_mm)
+    ct_c = sitk.GetArrayFromImage(ref)
+    body_c = sitk.GetArrayFromImage(
+        sitk.Resample(body, ref, sitk.Transform(), sitk.sitkNearestNeighbor, 0, sitk.sitkUInt8)
+    ).astype(bool)
+    cbct_c = resample_cbct_to_ct(downsample_image(cbct_img, grid_mm), ref, registration.transform, default_value=float("nan"))
+    valid = body_c & np.isfinite(cbct_c)
+
+    soft_lo, soft_hi = (float(v) for v in cfg.get("soft_tissue_window_hu", (-200, 200)))
+    bone_min = float(cfg.get("bone_min_hu", 300))
+    soft = _paired_median_diff(cbct_c, ct_c, valid & (ct_c >= soft_lo) & (ct_c <= soft_hi))
+    bone = _paired_median_diff(cbct_c, ct_c, valid & (ct_c >= bone_min))
+
+    min_voxels = int(cfg.get("min_voxels", 500))
+    statuses: Dict[str, str] = {}
+    issues: List[str] = []
+    for label, res, warn_key, max_key in (
+        ("tejido blando", soft, "soft_tissue_warn_diff_hu", "soft_tissue_max_diff_hu"),
+        ("hueso", bone, "bone_warn_diff_hu", "bone_max_diff_hu"),
+    ):
+        if res["n_voxels"] < min_voxels:
+            statuses[label] = "NO_INFO"
+            continue
+        st = classify_hu_deviation(
+            res["median_diff_hu"], 0.0, float(cfg.get(warn_key)), float(cfg.get(max_key))
+        )
+        statuses[label] = st
+        if st != "OK":
+            issues.append(f"{label}: ΔHU mediana {res['median_diff_hu']:+.1f} ({st})")
+
+    shift_mm = float(np.linalg.norm(registration.translation_mm))
+    max_rot = float(max(abs(a) for a in registration.rotation_deg))
+    reg_status = "OK"
+    if shift_mm > float(cfg.get("shift_warn_mm", 5.0)) or max_rot > float(cfg.get("rotation_warn_deg", 2.0)):
+        reg_status = "WARN"
+        issues.append(f"registro: desplazamiento {shift_mm:.1f} mm, rotación máx {max_rot:.1f}°")
+
+    details: Dict[str, Any] = {
+        "soft_tissue": soft,
+        "bone": bone,
+        "statuses": statuses,
+        "registration": registration.to_dict(),
+        "registration_status": reg_status,
+        "n_compared_voxels": int(np.count_nonzero(valid)),
+        "profile": profile,
+        "config_used": cfg,
+    }
+
+    if all(s == "NO_INFO" for s in statuses.values()):
+        passed, score, scenario = False, score_no_info, "NO_INFO"
+        msg = "CBCT vs CT: voxeles insuficientes dentro del BODY y del FOV del CBCT."
+    else:
+        worst = _worst([*statuses.values(), reg_status])
+        scenario = {"OK": "OK", "WARN": "WARN", "FAIL": "BAD"}[worst]
+        passed = worst != "FAIL"
+        score = float(cfg.get({"OK": "score_ok", "WARN": "score_warn", "FAIL": "score_fail"}[worst], 1.0))
+        if issues:
+            msg = "CBCT vs CT: " + " ; ".join(issues)
+        else:
+            msg = (
+                f"CBCT vs CT dentro del BODY: ΔHU tejido blando {soft['median_diff_hu']:+.1f}, "
+                f"hueso {bone['median_diff_hu']:+.1f} HU (registro {shift_mm:.1f} mm)."
+            )
+
+    rec = format_recommendations_text(get_cbct_recommendations("AGREEMENT", scenario))
+    return CheckResult(
+        name="CBCT vs CT HU",
+        passed=passed,
+        score=score,
+        message=msg,
+        details=details,
+        group="CBCT",
+        recommendation=rec,
+    )
+
+
+# ============================================================
+# 3) Orquestador
+# ============================================================
+
+def run_cbct_qa(
+    case: Case,
+    cbct: CBCTSeries,
+    profile: Optional[str] = None,
+) -> List[CheckResult]:
+    """Calibración HU del CBCT y acuerdo con el CT de planificación."""
+    return [
+        check_cbct_hu_calibration(cbct, profile),
+        check_cbct_ct_agreement(case, cbct, profile),
+    ]
+
+
+def run_cbct_qa_from_folder(
+    case: Case,
+    cbct_folder: str,
+    profile: Optional[str] = None,
+) -> List[CheckResult]:
+    """Lee la serie CBCT en streaming y ejecuta run_cbct_qa."""
+    return run_cbct_qa(case, load_cbct_series(cbct_folder), profile)
@@ -0,0 +1,250 @@
+# src/ml/crop.py
+
+"""
+Recorte al cuerpo (o PTV + margen) y remuestreo isótropo de los datos de
+entrenamiento / inferencia.
+
+El FOV completo del CT incluye aire y mesa que no aportan nada al modelo;
+recortar al bounding box de BODY suele quitar el 50-70 % de los voxeles.
+CropTransform describe el paso CT → grid del modelo:
+
+  1. recorte del grid del CT a una región (z, y, x) de índices;
+  2. opcionalmente, remuestreo del recorte a un spacing fijo (p.ej.
+     isótropo de 2.5 mm) con SimpleITK, manteniendo el origen del
+     primer voxel del recorte.
+
+apply() lleva un volumen del grid del CT al del modelo e invert() pega
+una predicción de vuelta en el grid completo del CT (fuera del recorte
+queda fill_value). to_meta() / from_meta() lo guardan en meta.json del
+shard (clave "crop_transform").
+
+Spacing, origen y dirección siguen la convención de SimpleITK (x, y, z);
+formas e índices de los arrays, la de numpy (z, y, x).
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import SimpleITK as sitk
+
+from core.geometry import mask_bbox_slices
+
+
+# -------------------------------------------
+# Región de recorte
+# -------------------------------------------
+
+def crop_region_from_mask(mask, ct_spacing, margin_mm=10.0):
+    """
+    Bounding box (z, y, x) de una máscara ampliado margin_mm (spacing
+    en convención SimpleITK: sx, sy, sz). None si la máscara está vacía.
+    """
+    sx, sy, sz = (float(s) for s in ct_spacing)
+    margin_vox = tuple(int(np.ceil(float(margin_mm) / s)) for s in (sz, sy, sx))
+    return mask_bbox_slices(np.asarray(mask) > 0, margin_vox)
+
+
+def cropped_origin(ct_origin, ct_spacing, ct_direction, region):
+    """Origen (x, y, z) del primer voxel de region en coordenadas del paciente."""
+    index_xyz = np.array([region[2].start, region[1].start, region[0].start], dtype=float)
+    direction = np.asarray(ct_direction, dtype=float).reshape(3, 3)
+    offset = direction @ (index_xyz * np.asarray(ct_spacing, dtype=float))
+    return tuple(float(o) for o in np.asarray(ct_origin, dtype=float) + offset)
+
+
+def _as_spacing(spacing):
+    if spacing is None:
+        return None
+    if np.isscalar(spacing):
+        return (float(spacing),) * 3
+    return tuple(float(s) for s in spacing)
+
+
+# -------------------------------------------
+# Transformación CT ↔ grid del modelo
+# -------------------------------------------
+
+@dataclass
+class CropTransform:
+    """Recorte (y remuestreo opcional) del grid del CT al grid del modelo."""
+    full_shape: Tuple[int, int, int]        # (Z, Y, X) del CT
+    start: Tuple[int, int, int]             # primer voxel del recorte (z, y, x)
+    crop_shape: Tuple[int, int, int]        # (z, y, x) del recorte
+    spacing: Tuple[float, float, float]     # spacing del CT (sx, sy, sz)
+    origin: Tuple[float, float, float]      # origen del CT (x, y, z)
+    direction: Tuple[float, ...]            # dirección del CT (9 valores)
+    out_spacing: Optional[Tuple[float, float, float]] = None  # None = sin remuestreo
+
+    @property
+    def region(self):
+        """Slices (z, y, x) del recorte en el grid del CT."""
+        return tuple(slice(s, s + n) for s, n in zip(self.start, self.crop_shape))
+
+    @property
+    def crop_origin(self):
+        """Origen físico (x, y, z) del recorte (y del grid del modelo)."""
+        return cropped_origin(self.origin, self.spacing, self.direction, self.region)
+
+    @property
+    def model_spacing(self):
+        return self.out_spacing if self.out_spacing is not None else self.spacing
+
+    @property
+    def out_shape(self):
+        """Forma (z, y, x) del grid del modelo: mismo extent que el recorte."""
+        if self.out_spacing is None:
+            return tuple(self.crop_shape)
+        extent_zyx = np.array(self.crop_shape) * np.array(self.spacing[::-1])
+        n = np.ceil(extent_zyx / np.array(self.out_spacing[::-1]) - 1e-6)
+        return tuple(int(v) for v in np.maximum(n, 1))
+
+    @property
+    def voxel_fraction(self):
+        """Voxeles del grid del modelo / voxeles del CT completo."""
+        return float(np.prod(self.out_shape)) / float(np.prod(self.full_shape))
+
+    # --- geometría SimpleITK -------------------------------------------
+
+    def model_grid(self):
+        """(size xyz, spacing, origin, direction) del grid del modelo."""
+        return (
+            tuple(reversed(self.out_shape)),
+            self.model_spacing,
+            self.crop_origin,
+            tuple(self.direction),
+        )
+
+    def _image(self, array, spacing, origin):
+        img = sitk.GetImageFromArray(np.ascontiguousarray(array))
+        img.SetSpacing([float(s) for s in spacing])
+        img.SetOrigin([float(o) for o in origin])
+        img.SetDirection([float(d) for d in self.direction])
+        return img
+
+    @staticmethod
+    def _resample(img, size, spacing, origin, direction, interpolator, default_value):
+        resampler = sitk.ResampleImageFilter()
+        resampler.SetSize([int(v) for v in size])
+        resampler.SetOutputSpacing([float(v) for v in spacing])
+        resampler.SetOutputOrigin([float(v) for v in origin])
+        resampler.SetOutputDirection([float(v) for v in direction])
+        resampler.SetInterpolator(interpolator)
+        resampler.SetTransform(sitk.Transform())
+        resampler.SetDefaultPixelValue(float(default_value))
+        return sitk.GetArrayFromImage(resampler.Execute(img))
+
+    # --- CT → modelo ---------------------------------------------------
+
+    def apply(self, volume, interpolation="linear", default_value=0.0):
+        """
+        Volumen [Z, Y, X] del grid del CT → grid del modelo.
+
+        interpolation: "linear" (CT, dosis) o "nearest" (máscaras /
+        label maps). Sin out_spacing sólo se recorta (copia).
+        """
+        volume = np.asarray(volume)
+        if tuple(volume.shape) != tuple(self.full_shape):
+            raise ValueError(f"Volumen {volume.shape} y CT {self.full_shape} deben compartir grid")
+        crop = volume[self.region]
+        if self.out_spacing is None:
+            return np.array(crop)
+
+        interp = sitk.sitkNearestNeighbor if interpolation == "nearest" else sitk.sitkLinear
+        src = crop.astype(np.float32) if interp == sitk.sitkLinear else crop
+        if src.dtype == bool:
+            src = src.astype(np.uint8)
+        img = self._image(src, self.spacing, self.crop_origin)
+        out = self._resample(img, *self.model_grid(), interp, default_value)
+        return out.astype(volume.dtype, copy=False) if interp == sitk.sitkNearestNeighbor else out
+
+    # --- modelo → CT ---------------------------------------------------
+
+    def invert(self, volume, fill_value=0.0, dtype=np.float32):
+        """
+        Predicción [z, y, x] (o [K, z, y, x]) en el grid del modelo →
+        grid completo del CT (linear); fuera del recorte, fill_value.
+        """
+        volume = np.asarray(volume)
+        if volume.ndim == 4:
+            return np.stack([self.invert(v, fill_value, dtype) for v in volume])
+        if tuple(volume.shape) != tuple(self.out_shape):
+            raise ValueError(f"Predicción {volume.shape} y grid del modelo {self.out_shape} no coinciden")
+
+        if self.out_spacing is None:
+            crop = volume
+        else:
+            img = self._image(volume.astype(np.float32), self.model_spacing, self.crop_origin)
+            crop = self._resample(
+                img, tuple(reversed(self.crop_shape)), self.spacing, self.crop_origin,
+                self.direction, sitk.sitkLinear, fill_value,
+            )
+        out = np.full(self.full_shape, fill_value, dtype=dtype)
+        out[self.region] = crop
+        return out
+
+    # --- meta.json -----------------------------------------------------
+
+    def to_meta(self):
+        return {
+            "full_shape": [int(n) for n in self.full_shape],
+            "start": [int(s) for s in self.start],
+            "crop_shape": [int(n) for n in self.crop_shape],
+            "spacing": [float(s) for s in self.spacing],
+            "origin": [float(o) for o in self.origin],
+            "direction": [float(d) for d in self.direction],
+            "out_spacing": None if self.out_spacing is None else [float(s) for s in self.out_spacing],
+        }
+
+    @classmethod
+    def from_meta(cls, meta):
+        """CropTransform desde to_meta() o desde el meta.json completo de un shard."""
+        if "crop_transform" in meta:
+            meta = meta["crop_transform"]
+        return cls(
+            full_shape=tuple(int(n) for n in meta["full_shape"]),
+            start=tuple(int(s) for s in meta["start"]),
+            crop_shape=tuple(int(n) for n in meta["crop_shape"]),
+            spacing=tuple(float(s) for s in meta["spacing"]),
+            origin=tuple(float(o) for o in meta["origin"]),
+            direction=tuple(float(d) for d in meta["direction"]),
+            out_spacing=_as_spacing(meta.get("out_spacing")),
+        )
+
+
+def make_crop_transform(full_shape, spacing, origin, direction, region=None, out_spacing=None):
+    """
+    CropTransform para un CT (geometría SimpleITK) y una región (z, y, x)
+    de make_crop_region / crop_region_from_mask; None = todo el volumen.
+    out_spacing: escalar (isótropo), (sx, sy, sz) o None.
+    """
+    full_shape = tuple(int(n) for n in full_shape)
+    if region is None:
+        region = tuple(slice(0, n) for n in full_shape)
+    return CropTransform(
+        full_shape=full_shape,
+        start=tuple(int(sl.start) for sl in region),
+        crop_shape=tuple(int(sl.stop - sl.start) for sl in region),
+        spacing=tuple(float(s) for s in spacing),
+        origin=tuple(float(o) for o in origin),
+        direction=tuple(float(d) for d in direction),
+        out_spacing=_as_spacing(out_spacing),
+    )
+
+
+def make_crop_region(masks, ct_spacing, margin_mm=10.0):
+    """
+    Unión de los bounding boxes de varias máscaras (p.ej. todos los PTV)
+    ampliada margin_mm. None si todas están vacías.
+    """
+    lo, hi = None, None
+    for mask in masks:
+        sl = crop_region_from_mask(mask, ct_spacing, margin_mm)
+        if sl is None:
+            continue
+        starts, stops = [s.start for s in sl], [s.stop for s in sl]
+        lo = starts if lo is None else [min(a, b) for a, b in zip(lo, starts)]
+        hi = stops if hi is None else [max(a, b) for a, b in zip(hi, stops)]
+    if lo is None:
+        return None
+    return tuple(slice(a, b) for a, b in zip(lo, hi))
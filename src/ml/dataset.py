@@ -3,49 +3,309 @@
 import os
 import numpy as np
 import torch
-from torch.utils.data import Dataset
+from torch.utils.data import Dataset, get_worker_info
+
+from core.naming import StructCategory, normalize_structure_name
+from ml.shards import DoseShard, is_shard_dir, list_shards, pack_label_bits
+
+
+MASK_ENCODINGS = ("dense", "bits")
+
+
+# -------------------------------------------
+# Codificación compacta de las máscaras
+# -------------------------------------------
+
+def compact_input(ct, label_bits, n_rois):
+    """
+    Muestra X en formato compacto (mask_encoding="bits"): dict con el CT
+    normalizado [1, z, y, x] float32, el label map de bits [z, y, x] y el
+    nº de ROIs. El collate por defecto de DataLoader apila los dicts.
+    """
+    return {
+        "ct": torch.from_numpy(np.ascontiguousarray(ct, dtype=np.float32)).unsqueeze(0),
+        "labels": torch.from_numpy(np.ascontiguousarray(label_bits)),
+        "n_rois": int(n_rois),
+    }
+
+
+def expand_label_bits(labels, n_rois, dtype=torch.float32):
+    """Label map de bits [B, z, y, x] → one-hot [B, R, z, y, x] (0/1) en dtype."""
+    shifts = torch.arange(n_rois, device=labels.device, dtype=labels.dtype)
+    bits = (labels.unsqueeze(1) >> shifts.view(1, -1, 1, 1, 1)) & 1
+    return bits.to(dtype)
+
+
+def expand_inputs(X, device=None, dtype=torch.float32):
+    """
+    Entrada del modelo [B, C, z, y, x] a partir de un batch de
+    DataLoader. Con mask_encoding="bits" el batch es un dict y las
+    máscaras se expanden aquí, en el proceso principal (y en el device si
+    se indica): por los workers sólo viaja 1 entero por voxel en vez de R
+    floats. Con "dense" X se devuelve tal cual (movido al device).
+    """
+    if not isinstance(X, dict):
+        return X.to(device=device, dtype=dtype) if device is not None else X
+    ct = X["ct"].to(device=device, dtype=dtype, non_blocking=True)
+    labels = X["labels"].to(device=device, non_blocking=True)
+    n_rois = int(X["n_rois"].reshape(-1)[0]) if torch.is_tensor(X["n_rois"]) else int(X["n_rois"])
+    return torch.cat([ct, expand_label_bits(labels, n_rois, dtype)], dim=1)
 
 
 class DoseDataset(Dataset):
     """
-    Dataset para cargar archivos .npz procesados, con:
-      - X: [C, Z, Y, X]
-      - Y: [Z, Y, X]
+    Dataset sobre los shards de ml.shards (uno por paciente), con:
+      - X: [C, Z, Y, X]  CT normalizado + máscaras de roi_order
+      - Y: [1, Z, Y, X]  dosis en Gy
+
+    Los shards se abren con memory-map en el primer acceso de cada worker
+    y se decodifican al pedir la muestra: la RAM depende del batch y no
+    del tamaño del dataset, y los workers no pasan el tiempo en zlib.
 
-    Por ahora carga volúmenes completos.
-    Si tienes problemas de memoria, luego cambiamos a patches 3D.
+    Los .npz del formato anterior (prepare_patient antiguo) se siguen
+    leyendo si no hay shard con el mismo ID.
+
+    Con mask_encoding="bits" X es un dict compacto (compact_input) y el
+    one-hot se construye en el bucle de entrenamiento con expand_inputs.
     """
 
-    def __init__(self, data_dir, patient_ids=None):
+    def __init__(self, data_dir, patient_ids=None, mask_encoding="dense"):
         """
         Parámetros:
-          data_dir: carpeta con archivos .npz (ej. "../data_processed")
-          patient_ids: lista de IDs (sin extensión) o None para usar todos
+          data_dir: carpeta con shards (ej. "../data_processed")
+          patient_ids: lista de IDs o None para usar todos
+          mask_encoding: "dense" (X [C, Z, Y, X] float32) o "bits"
         """
+        if mask_encoding not in MASK_ENCODINGS:
+            raise ValueError(f"mask_encoding debe ser uno de {MASK_ENCODINGS}")
         self.data_dir = data_dir
+        self.mask_encoding = mask_encoding
 
         if patient_ids is None:
-            # Buscar todos los .npz
-            all_files = [f for f in os.listdir(data_dir) if f.endswith(".npz")]
-            self.patient_ids = [os.path.splitext(f)[0] for f in all_files]
+            # Shards (carpetas con meta.json) + .npz antiguos
+            ids = set()
+            for name in os.listdir(data_dir):
+                if name.startswith("."):
+                    continue  # shards a medio escribir (ml.shards.write_shard)
+                path = os.path.join(data_dir, name)
+                if is_shard_dir(path):
+                    ids.add(name)
+                elif name.endswith(".npz"):
+                    ids.add(os.path.splitext(name)[0])
+            self.patient_ids = list(ids)
         else:
             self.patient_ids = patient_ids
 
         self.patient_ids = sorted(self.patient_ids)
+        self._shards = {}
 
     def __len__(self):
         return len(self.patient_ids)
 
+    def shard(self, idx):
+        """DoseShard del paciente idx (None si sólo existe el .npz antiguo)."""
+        pid = self.patient_ids[idx]
+        if pid not in self._shards:
+            shard_dir = os.path.join(self.data_dir, pid)
+            self._shards[pid] = DoseShard(shard_dir) if is_shard_dir(shard_dir) else None
+        return self._shards[pid]
+
     def __getitem__(self, idx):
         pid = self.patient_ids[idx]
-        npz_path = os.path.join(self.data_dir, pid + ".npz")
+        shard = self.shard(idx)
 
-        data = np.load(npz_path, allow_pickle=True)
-        X = data["X"]  # [C, Z, Y, X]
-        Y = data["Y"]  # [Z, Y, X]
+        bits = self.mask_encoding == "bits"
+        if shard is not None:
+            Y = shard.read_dose()   # [Z, Y, X]
+            if bits:
+                X_t = compact_input(shard.read_ct(), shard.read_label_bits(), len(shard.roi_order))
+            else:
+                X = shard.read_input()  # [C, Z, Y, X]
+        else:
+            with np.load(os.path.join(self.data_dir, pid + ".npz")) as data:
+                X = data["X"]
+                Y = data["Y"]
+            if bits:
+                X_t = compact_input(X[0], pack_label_bits(X[1:] > 0.5), X.shape[0] - 1)
 
         # Convertir a tensores PyTorch
-        X_t = torch.from_numpy(X).float()
+        if not bits:
+            X_t = torch.from_numpy(X).float()
         Y_t = torch.from_numpy(Y).float().unsqueeze(0)  # [1, Z, Y, X] como canal de salida
 
         return X_t, Y_t, pid
+
+
+class DosePatchDataset(Dataset):
+    """
+    Parches 3D de tamaño fijo sacados de los shards (ml.shards) para
+    entrenar UNet3D sin cargar volúmenes completos:
+      - X: [C, pz, py, px]
+      - Y: [1, pz, py, px]
+
+    Cada muestra es un parche de un paciente (patches_per_patient por
+    paciente y época). Con probabilidad foreground_ratio el centro se
+    elige en el "foreground" (voxeles de PTV o con dosis >=
+    high_dose_fraction · Dmax); si no, uniforme en el volumen.
+
+    Los parches se leen directamente de los memory-maps del shard (sólo
+    la región), así que el collate por defecto de DataLoader sólo apila
+    parches. Los parches que se salen del volumen se rellenan con aire
+    (CT = -1), máscaras y dosis a 0.
+
+    Con mask_encoding="bits" las máscaras viajan como label map de bits
+    (compact_input) y se expanden con expand_inputs tras el DataLoader.
+    """
+
+    def __init__(
+        self,
+        data_dir,
+        patient_ids=None,
+        patch_size=(64, 64, 64),
+        patches_per_patient=8,
+        foreground_ratio=0.7,
+        high_dose_fraction=0.8,
+        ptv_rois=None,
+        fg_stride=4,
+        mask_encoding="dense",
+    ):
+        """
+        Parámetros:
+          data_dir: carpeta con shards (ej. "../data_processed")
+          patient_ids: lista de IDs o None para usar todos los shards
+          patch_size: (pz, py, px); múltiplos de 8 para UNet3D
+          patches_per_patient: parches por paciente en cada época
+          foreground_ratio: fracción de parches centrados en PTV / alta dosis
+          high_dose_fraction: umbral de alta dosis relativo a Dmax del shard
+          ptv_rois: ROIs de roi_order que cuentan como PTV (None = las de
+                    categoría PTV según core.naming)
+          fg_stride: submuestreo (voxeles) de la lista de centros foreground
+          mask_encoding: "dense" (X [C, pz, py, px] float32) o "bits"
+        """
+        if mask_encoding not in MASK_ENCODINGS:
+            raise ValueError(f"mask_encoding debe ser uno de {MASK_ENCODINGS}")
+        self.data_dir = data_dir
+        self.mask_encoding = mask_encoding
+        ids = list_shards(data_dir) if patient_ids is None else patient_ids
+        self.patient_ids = sorted(ids)
+        self.patch_size = tuple(int(p) for p in patch_size)
+        self.patches_per_patient = int(patches_per_patient)
+        self.foreground_ratio = float(foreground_ratio)
+        self.high_dose_fraction = float(high_dose_fraction)
+        self.ptv_rois = list(ptv_rois) if ptv_rois is not None else None
+        self.fg_stride = max(1, int(fg_stride))
+
+        self._shards = {}
+        self._foreground = {}
+        self._rng = None
+        self._rng_seed = None
+
+    def __len__(self):
+        return len(self.patient_ids) * self.patches_per_patient
+
+    # --- acceso a shards ---------------------------------------------
+
+    def shard(self, pid):
+        if pid not in self._shards:
+            self._shards[pid] = DoseShard(os.path.join(self.data_dir, pid))
+        return self._shards[pid]
+
+    def _generator(self):
+        """RNG por worker (semilla de DataLoader), para no repetir parches."""
+        info = get_worker_info()
+        seed = info.seed if info is not None else torch.initial_seed()
+        if self._rng is None or self._rng_seed != seed:
+            self._rng = np.random.default_rng(seed)
+            self._rng_seed = seed
+        return self._rng
+
+    def _ptv_channels(self, shard):
+        if self.ptv_rois is not None:
+            return [i for i, n in enumerate(shard.roi_order) if n in self.ptv_rois]
+        return [
+            i for i, n in enumerate(shard.roi_order)
+            if normalize_structure_name(n).category == StructCategory.PTV
+        ]
+
+    def foreground_centers(self, pid):
+        """
+        Coordenadas (z, y, x) [N, 3] de los voxeles foreground en una
+        rejilla de paso fg_stride. Se calcula una vez por shard y worker.
+        """
+        if pid in self._foreground:
+            return self._foreground[pid]
+
+        shard = self.shard(pid)
+        st = self.fg_stride
+        grid = (slice(None, None, st),) * 3
+        dose = shard.read_dose(grid)
+        dmax = float(shard.meta.get("dose_max_gy") or dose.max(initial=0.0))
+        fg = dose >= self.high_dose_fraction * dmax if dmax > 0 else np.zeros(dose.shape, bool)
+
+        channels = self._ptv_channels(shard)
+        if channels:
+            fg |= shard.read_masks(grid, channels).any(axis=0) > 0
+
+        centers = (np.argwhere(fg) * st).astype(np.int32)
+        self._foreground[pid] = centers
+        return centers
+
+    # --- muestreo ------------------------------------------------------
+
+    def sample_center(self, pid, rng):
+        shard = self.shard(pid)
+        if rng.random() < self.foreground_ratio:
+            centers = self.foreground_centers(pid)
+            if centers.shape[0]:
+                c = centers[rng.integers(centers.shape[0])]
+                jitter = rng.integers(0, self.fg_stride, size=3)
+                return np.minimum(c + jitter, np.array(shard.shape) - 1)
+        return np.array([rng.integers(n) for n in shard.shape])
+
+    def read_patch(self, pid, center):
+        """
+        X [C, pz, py, px], Y [pz, py, px] centrados en center (z, y, x).
+        Con mask_encoding="bits", X es (ct [pz, py, px], label_bits [pz, py, px]).
+        """
+        shard = self.shard(pid)
+        region, dst = [], []
+        for c, p, n in zip(center, self.patch_size, shard.shape):
+            start = int(c) - p // 2
+            if n >= p:
+                start = min(max(start, 0), n - p)
+            lo, hi = max(start, 0), min(start + p, n)
+            region.append(slice(lo, hi))
+            dst.append(slice(lo - start, hi - start))
+        region, dst = tuple(region), tuple(dst)
+
+        bits = self.mask_encoding == "bits"
+        x = (shard.read_ct(region), shard.read_label_bits(region)) if bits else shard.read_input(region)
+        y = shard.read_dose(region)
+        if y.shape == self.patch_size:
+            return x, y
+
+        Y = np.zeros(self.patch_size, dtype=np.float32)
+        Y[dst] = y
+        if bits:
+            ct = np.full(self.patch_size, -1.0, dtype=np.float32)
+            ct[dst] = x[0]
+            labels = np.zeros(self.patch_size, dtype=x[1].dtype)
+            labels[dst] = x[1]
+            return (ct, labels), Y
+
+        X = np.zeros((x.shape[0],) + self.patch_size, dtype=np.float32)
+        X[0] = -1.0
+        X[(slice(None),) + dst] = x
+        return X, Y
+
+    def __getitem__(self, idx):
+        pid = self.patient_ids[idx // self.patches_per_patient]
+        center = self.sample_center(pid, self._generator())
+        X, Y = self.read_patch(pid, center)
+
+        if self.mask_encoding == "bits":
+            X_t = compact_input(X[0], X[1], len(self.shard(pid).roi_order))
+        else:
+            X_t = torch.from_numpy(X)
+        Y_t = torch.from_numpy(Y).unsqueeze(0)
+        return X_t, Y_t, pid
@@ -0,0 +1,416 @@
+# src/ml/export.py
+
+"""
+Exportación del modelo de dosis para inferencia (servidor de QA).
+
+    python -m ml.export --checkpoint ../models/best.pt --out ../models/dose_int8.ts \
+        --quantize static --calib-dir ../data_processed --benchmark
+
+  - TorchScript (.ts): torch.jit.trace + freeze sobre un tile de tamaño
+    fijo (el de ml.inference.predict_volume). Opcionalmente cuantizado
+    int8 estático (FX graph mode: Conv3d + BN + ReLU fusionados,
+    observadores calibrados con parches de unos pocos shards).
+  - ONNX (.onnx, dependencia opcional onnx / onnxruntime): export del
+    modelo float y, opcionalmente, cuantización estática QDQ de
+    onnxruntime con la misma calibración.
+
+En los dos formatos los metadatos de entrada (roi_order, ventana de HU,
+spacing de entrenamiento, tile) viajan dentro del fichero, así que
+ml.kb.load_dose_model carga un .ts / .onnx igual que un checkpoint de
+save_dose_model y el check de dosis KB puede usar el modelo exportado sin cambios.
+
+La cuantización dinámica de PyTorch sólo cubre Linear / RNN; UNet3D es
+todo Conv3d, así que sólo se ofrece la estática.
+
+benchmark_export compara latencia por tile y por volumen y el error de
+dosis (Gy) del modelo exportado frente al float sobre shards.
+"""
+
+import argparse
+import copy
+import json
+import os
+import time
+import warnings
+import zipfile
+
+import numpy as np
+import torch
+
+from ml.dataset import DosePatchDataset
+from ml.inference import predict_shard
+from ml.shards import DoseShard, list_shards
+
+
+EXPORT_FORMATS = ("torchscript", "onnx")
+TORCHSCRIPT_EXTS = (".ts", ".torchscript")
+ONNX_EXT = ".onnx"
+META_FILENAME = "kb_meta.json"
+
+
+# -------------------------------------------
+# Calibración
+# -------------------------------------------
+
+def calibration_tiles(data_dir, patient_ids=None, tile_size=(64, 128, 128), tiles_per_shard=4, seed=0):
+    """
+    Tiles de entrada [1, C, tz, ty, tx] para calibrar la cuantización,
+    muestreados como en entrenamiento (mayoría en PTV / alta dosis).
+    """
+    ds = DosePatchDataset(data_dir, patient_ids, patch_size=tile_size,
+                          patches_per_patient=tiles_per_shard)
+    rng = np.random.default_rng(seed)
+    tiles = []
+    for pid in ds.patient_ids:
+        for _ in range(tiles_per_shard):
+            X, _ = ds.read_patch(pid, ds.sample_center(pid, rng))
+            tiles.append(X[None])
+    return tiles
+
+
+# -------------------------------------------
+# Cuantización int8 (PyTorch)
+# -------------------------------------------
+
+def quantize_static(model, calib_tiles, backend="x86"):
+    """
+    Copia int8 de model con cuantización estática FX: fusiona Conv3d +
+    BN + ReLU, calibra los observadores con calib_tiles y convierte.
+    Upsample trilinear y pad se ejecutan en float entre quant / dequant.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    torch.backends.quantized.engine = backend
+    float_model = copy.deepcopy(model).eval()
+    example = torch.from_numpy(calib_tiles[0])
+    with warnings.catch_warnings():
+        # torch.ao.quantization avisa de su migración a torchao en cada llamada
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        prepared = prepare_fx(float_model, get_default_qconfig_mapping(backend), (example,))
+        with torch.no_grad():
+            for tile in calib_tiles:
+                prepared(torch.from_numpy(tile))
+        return convert_fx(prepared).eval()
+
+
+# -------------------------------------------
+# TorchScript
+# -------------------------------------------
+
+def export_torchscript(model, path, n_channels, tile_size, meta):
+    """Traza y congela model sobre un tile [1, C, *tile_size] y lo guarda con meta."""
+    example = torch.zeros((1, n_channels) + tuple(tile_size), dtype=torch.float32)
+    with warnings.catch_warnings(), torch.no_grad():
+        warnings.simplefilter("ignore", FutureWarning)
+        traced = torch.jit.trace(model.eval(), example)
+        traced = torch.jit.freeze(traced)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    traced.save(tmp, _extra_files={META_FILENAME: json.dumps(meta)})
+    os.replace(tmp, path)
+    return path
+
+
+def _read_torchscript_meta(path):
+    """meta de un .ts sin cargar el modelo (el archivo es un zip con extra/<nombre>)."""
+    with zipfile.ZipFile(path) as zf:
+        for name in zf.namelist():
+            if name.endswith("/extra/" + META_FILENAME):
+                return json.loads(zf.read(name).decode("utf-8"))
+    return {}
+
+
+def load_torchscript(path):
+    """(ScriptModule, meta) de un fichero de export_torchscript."""
+    meta = _read_torchscript_meta(path)
+    # Los pesos int8 se empaquetan al cargar con el engine activo
+    if meta.get("quant_backend"):
+        torch.backends.quantized.engine = meta["quant_backend"]
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        model = torch.jit.load(path, map_location="cpu")
+    return model.eval(), meta
+
+
+# -------------------------------------------
+# ONNX (opcional)
+# -------------------------------------------
+
+class OnnxDoseModel(torch.nn.Module):
+    """
+    Sesión de onnxruntime con la interfaz de un nn.Module (tensor de
+    entrada → tensor de salida), para usarla en predict_volume.
+    """
+
+    def __init__(self, path, num_threads=None):
+        super().__init__()
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def forward(self, x):
+        x = np.ascontiguousarray(x.detach().cpu().numpy(), dtype=np.float32)
+        return torch.from_numpy(self.session.run(None, {self.input_name: x})[0])
+
+
+def export_onnx(model, path, n_channels, tile_size, meta, calib_tiles=None, opset=17):
+    """
+    Exporta model (float) a ONNX con el batch dinámico. Con calib_tiles se
+    cuantiza después con onnxruntime (estática, QDQ, pesos int8).
+    """
+    try:
+        import onnx
+    except ImportError as e:
+        raise ImportError("La exportación a ONNX necesita los paquetes onnx y onnxruntime") from e
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    example = torch.zeros((1, n_channels) + tuple(tile_size), dtype=torch.float32)
+    float_path = path + ".float.tmp" if calib_tiles else path + ".tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            model.eval(), (example,), float_path,
+            input_names=["x"], output_names=["dose"],
+            dynamic_axes={"x": {0: "batch"}, "dose": {0: "batch"}},
+            opset_version=opset, dynamo=False,
+        )
+
+    out_tmp = float_path
+    if calib_tiles:
+        from onnxruntime.quantization import (
+            CalibrationDataReader, QuantFormat, QuantType, quantize_static as ort_quantize_static,
+        )
+
+        class _Reader(CalibrationDataReader):
+            def __init__(self, tiles):
+                self._it = iter({"x": t.astype(np.float32)} for t in tiles)
+
+            def get_next(self):
+                return next(self._it, None)
+
+        out_tmp = path + ".tmp"
+        ort_quantize_static(
+            float_path, out_tmp, _Reader(calib_tiles),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+        )
+        os.remove(float_path)
+
+    proto = onnx.load(out_tmp)
+    entry = proto.metadata_props.add()
+    entry.key, entry.value = META_FILENAME, json.dumps(meta)
+    onnx.save(proto, out_tmp)
+    os.replace(out_tmp, path)
+    return path
+
+
+def load_onnx(path, num_threads=None):
+    """(OnnxDoseModel, meta) de un fichero de export_onnx."""
+    model = OnnxDoseModel(path, num_threads=num_threads)
+    props = model.session.get_modelmeta().custom_metadata_map
+    meta = json.loads(props[META_FILENAME]) if META_FILENAME in props else {}
+    return model, meta
+
+
+def load_exported(path):
+    """(modelo, meta) de un .ts o .onnx exportado."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext in TORCHSCRIPT_EXTS:
+        return load_torchscript(path)
+    if ext == ONNX_EXT:
+        return load_onnx(path)
+    raise ValueError(f"Formato de modelo exportado no reconocido: {path}")
+
+
+def is_exported_model(path):
+    ext = os.path.splitext(path)[1].lower()
+    return ext in TORCHSCRIPT_EXTS or ext == ONNX_EXT
+
+
+# -------------------------------------------
+# Export de un checkpoint
+# -------------------------------------------
+
+def export_dose_model(
+    checkpoint,
+    out_path,
+    fmt=None,
+    quantize=None,
+    calib_dir=None,
+    calib_ids=None,
+    tiles_per_shard=4,
+    tile_size=(64, 128, 128),
+    backend="x86",
+):
+    """
+    Exporta un checkpoint de ml.kb.save_dose_model.
+
+    Parámetros:
+      checkpoint: ruta del .pt (best.pt / last.pt de ml.train)
+      out_path: destino (.ts o .onnx)
+      fmt: "torchscript" / "onnx" (None = según la extensión de out_path)
+      quantize: None o "static" (int8, necesita calib_dir)
+      calib_dir, calib_ids: shards para la calibración
+      tiles_per_shard: tiles de calibración por shard
+      tile_size: tile fijo de la inferencia por ventana deslizante
+      backend: engine cuantizado de PyTorch ("x86", "fbgemm", "qnnpack")
+
+    Devuelve:
+      ruta del modelo exportado
+    """
+    from ml.kb import load_dose_model
+
+    if fmt is None:
+        fmt = "onnx" if out_path.lower().endswith(ONNX_EXT) else "torchscript"
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"fmt debe ser uno de {EXPORT_FORMATS}")
+    if quantize not in (None, "static"):
+        raise ValueError("quantize debe ser None o 'static' (UNet3D no tiene capas para la dinámica)")
+    if quantize and not calib_dir:
+        raise ValueError("La cuantización estática necesita calib_dir con shards")
+
+    loaded = load_dose_model(checkpoint)
+    n_channels = 1 + len(loaded.roi_order)
+    tile_size = tuple(int(t) for t in tile_size)
+    meta = {
+        "roi_order": loaded.roi_order,
+        "n_channels": n_channels,
+        "base_filters": int(loaded.meta.get("base_filters", 16)),
+        "hu_min": loaded.hu_min,
+        "hu_max": loaded.hu_max,
+        "spacing_mm": list(loaded.spacing_mm) if loaded.spacing_mm is not None else None,
+        "tile_size": list(tile_size),
+        "source_checkpoint": os.path.basename(loaded.path),
+        "source_hash": loaded.model_hash,
+        "format": fmt,
+        "quantize": quantize,
+    }
+
+    calib = None
+    if quantize:
+        calib = calibration_tiles(calib_dir, calib_ids, tile_size, tiles_per_shard)
+        meta["calibration_tiles"] = len(calib)
+
+    if fmt == "onnx":
+        return export_onnx(loaded.model, out_path, n_channels, tile_size, meta, calib_tiles=calib)
+
+    model = loaded.model
+    if quantize:
+        model = quantize_static(model, calib, backend=backend)
+        meta["quant_backend"] = backend
+    return export_torchscript(model, out_path, n_channels, tile_size, meta)
+
+
+# -------------------------------------------
+# Benchmark frente al modelo float
+# -------------------------------------------
+
+def _tile_latency_ms(model, n_channels, tile_size, repeats):
+    x = torch.zeros((1, n_channels) + tuple(tile_size), dtype=torch.float32)
+    times = []
+    with torch.inference_mode():
+        model(x)  # calentamiento (freeze / prepack / sesión)
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            model(x)
+            times.append(time.perf_counter() - t0)
+    return 1000.0 * float(np.median(times))
+
+
+def benchmark_export(checkpoint, exported_path, data_dir, patient_ids=None, overlap=0.25,
+                     batch_size=1, repeats=3, num_threads=None):
+    """
+    Latencia (mediana por tile, total por shard) y error de dosis del
+    modelo exportado frente al float del checkpoint.
+
+    Errores en Gy sobre el volumen predicho: máximo, medio y medio en
+    la región de alta dosis (dosis float >= 50 % de su máximo).
+    """
+    from ml.kb import load_dose_model
+
+    reference = load_dose_model(checkpoint)
+    exported, meta = load_exported(exported_path)
+    tile_size = tuple(meta.get("tile_size", (64, 128, 128)))
+    n_channels = 1 + len(reference.roi_order)
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+    report = {
+        "exported": os.path.basename(exported_path),
+        "format": meta.get("format"),
+        "quantize": meta.get("quantize"),
+        "tile_size": list(tile_size),
+        "tile_ms_float": _tile_latency_ms(reference.model, n_channels, tile_size, repeats),
+        "tile_ms_exported": _tile_latency_ms(exported, n_channels, tile_size, repeats),
+        "shards": [],
+    }
+    report["tile_speedup"] = report["tile_ms_float"] / max(report["tile_ms_exported"], 1e-9)
+
+    ids = list_shards(data_dir) if patient_ids is None else list(patient_ids)
+    for pid in ids:
+        shard = DoseShard(os.path.join(data_dir, pid))
+        row = {"patient_id": pid, "shape": list(shard.shape)}
+        preds = {}
+        for label, model in (("float", reference.model), ("exported", exported)):
+            t0 = time.perf_counter()
+            preds[label] = predict_shard(model, shard, tile_size=tile_size, overlap=overlap,
+                                         batch_size=batch_size)
+            row[f"seconds_{label}"] = time.perf_counter() - t0
+        diff = np.abs(preds["exported"] - preds["float"])
+        high = preds["float"] >= 0.5 * float(preds["float"].max())
+        row.update({
+            "dose_max_float_gy": float(preds["float"].max()),
+            "abs_err_max_gy": float(diff.max()),
+            "abs_err_mean_gy": float(diff.mean()),
+            "abs_err_mean_high_dose_gy": float(diff[high].mean()) if high.any() else 0.0,
+        })
+        report["shards"].append(row)
+    return report
+
+
+# -------------------------------------------
+# CLI
+# -------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportación (TorchScript / ONNX, int8) del modelo de dosis")
+    parser.add_argument("--checkpoint", required=True, help="checkpoint de save_dose_model")
+    parser.add_argument("--out", required=True, help="destino .ts o .onnx")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default=None)
+    parser.add_argument("--quantize", choices=("none", "static"), default="none")
+    parser.add_argument("--calib-dir", default=None, help="carpeta de shards para calibrar")
+    parser.add_argument("--calib-ids", nargs="*", default=None)
+    parser.add_argument("--tiles-per-shard", type=int, default=4)
+    parser.add_argument("--tile-size", type=int, nargs=3, default=(64, 128, 128))
+    parser.add_argument("--backend", default="x86", help="engine cuantizado de PyTorch")
+    parser.add_argument("--benchmark", action="store_true", help="comparar con el modelo float")
+    parser.add_argument("--bench-dir", default=None, help="shards del benchmark (por defecto, calib-dir)")
+    parser.add_argument("--bench-ids", nargs="*", default=None)
+    parser.add_argument("--threads", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    path = export_dose_model(
+        args.checkpoint, args.out, fmt=args.format,
+        quantize=None if args.quantize == "none" else args.quantize,
+        calib_dir=args.calib_dir, calib_ids=args.calib_ids,
+        tiles_per_shard=args.tiles_per_shard, tile_size=args.tile_size, backend=args.backend,
+    )
+    print(f"✅ Exportado {path}")
+
+    bench_dir = args.bench_dir or args.calib_dir
+    if args.benchmark:
+        if not bench_dir:
+            raise SystemExit("--benchmark necesita --bench-dir o --calib-dir")
+        report = benchmark_export(args.checkpoint, path, bench_dir, args.bench_ids,
+                                  num_threads=args.threads)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# src/ml/inference.py
+
+"""
+Inferencia de UNet3D en CPU por ventana deslizante.
+
+Un volumen de pelvis completo a base_filters=16 necesita varios GB de
+activaciones, así que la dosis se predice por tiles:
+
+  - Tiles de tamaño fijo (múltiplos de 8 para los 3 downsamplings de
+    UNet3D) con solape configurable; el último tile de cada eje se apoya
+    en el borde para cubrir el volumen sin salirse.
+  - Cada predicción se pondera con un mapa gaussiano centrado en el tile
+    (los bordes del tile, con menos contexto, pesan menos) y el resultado
+    es Σ w·pred / Σ w.
+  - Los tiles se leen bajo demanda con una función region → X (p.ej.
+    DoseShard.read_input sobre memory-maps, o el CT / máscaras del Case),
+    así que en memoria sólo viven los acumuladores de salida y un batch
+    de tiles.
+  - torch.inference_mode y número de hilos intra-op configurable
+    (torch.set_num_threads, restaurado al terminar).
+
+estimate_tile_memory_mb da una cota aproximada del pico de activaciones
+por tile; con memory_budget_mb el batch se reduce hasta caber.
+"""
+
+import itertools
+
+import numpy as np
+import torch
+
+from ml.crop import CropTransform, cropped_origin, make_crop_transform
+from ml.shards import normalize_ct
+
+
+# -------------------------------------------
+# Tiles y pesos
+# -------------------------------------------
+
+def gaussian_importance_map(tile_size, sigma_scale=0.125, min_weight=1e-3):
+    """
+    Mapa de pesos [tz, ty, tx] gaussiano centrado en el tile, con
+    sigma = sigma_scale · tamaño por eje, normalizado a máximo 1.
+    """
+    axes = []
+    for n in tile_size:
+        c = (n - 1) / 2.0
+        sigma = max(sigma_scale * n, 1e-6)
+        axes.append(np.exp(-0.5 * ((np.arange(n) - c) / sigma) ** 2))
+    w = axes[0][:, None, None] * axes[1][None, :, None] * axes[2][None, None, :]
+    w = w / w.max()
+    return np.maximum(w, min_weight).astype(np.float32)
+
+
+def tile_starts(n, tile, overlap):
+    """Inicios de los tiles a lo largo de un eje de longitud n."""
+    if n <= tile:
+        return [0]
+    step = max(1, int(round(tile * (1.0 - float(overlap)))))
+    starts = list(range(0, n - tile + 1, step))
+    if starts[-1] != n - tile:
+        starts.append(n - tile)
+    return starts
+
+
+def estimate_tile_memory_mb(tile_size, n_channels, base_filters=16, batch_size=1):
+    """
+    Estimación (MB) del pico de memoria de UNet3D para un batch de tiles
+    en inference_mode: entrada + skips de los 4 niveles + la
+    concatenación, las dos convoluciones del último Up y los buffers de
+    conv3d a resolución completa (~10 · base_filters floats por voxel,
+    calibrado con un tile 64×128×128), más ~1/7 de los niveles
+    inferiores.
+    """
+    voxels = float(np.prod(tile_size))
+    floats = voxels * (n_channels + 10.0 * base_filters * 8.0 / 7.0)
+    return batch_size * floats * 4.0 / 2 ** 20
+
+
+def _model_base_filters(model):
+    conv = getattr(getattr(model, "inc", None), "net", None)
+    if conv is not None and hasattr(conv[0], "out_channels"):
+        return int(conv[0].out_channels)
+    return 16
+
+
+# -------------------------------------------
+# Ventana deslizante
+# -------------------------------------------
+
+def predict_volume(
+    model,
+    read_region,
+    shape,
+    n_channels,
+    tile_size=(64, 128, 128),
+    overlap=0.5,
+    batch_size=2,
+    num_threads=None,
+    memory_budget_mb=None,
+    pad_values=None,
+    sigma_scale=0.125,
+):
+    """
+    Predicción de un volumen completo por tiles.
+
+    Parámetros:
+      model: red (p.ej. UNet3D) en CPU; se pone en eval()
+      read_region: función (slice_z, slice_y, slice_x) → X [C, z, y, x]
+      shape: (Z, Y, X) del volumen
+      n_channels: canales de entrada C
+      tile_size: (tz, ty, tx); si el volumen es menor, el tile se rellena
+      overlap: solape relativo entre tiles (0 ≤ overlap < 1)
+      batch_size: tiles por forward
+      num_threads: hilos intra-op de torch (None = no se cambia)
+      memory_budget_mb: si se da, batch_size se reduce para que
+                        estimate_tile_memory_mb quepa (mínimo 1)
+      pad_values: valor de relleno por canal cuando un tile sobresale
+                  (por defecto -1 para el CT normalizado y 0 el resto)
+      sigma_scale: anchura del mapa gaussiano (relativa al tile)
+
+    Devuelve:
+      pred: numpy [Z, Y, X] float32 (o [K, Z, Y, X] si la red saca K > 1
+            canales)
+    """
+    shape = tuple(int(s) for s in shape)
+    tile = tuple(int(t) for t in tile_size)
+    if not 0.0 <= float(overlap) < 1.0:
+        raise ValueError("overlap debe estar en [0, 1)")
+
+    if memory_budget_mb is not None:
+        per_tile = estimate_tile_memory_mb(tile, n_channels, _model_base_filters(model))
+        fit = int(float(memory_budget_mb) // max(per_tile, 1e-6))
+        if fit < 1:
+            raise ValueError(
+                f"Un tile {tile} necesita ~{per_tile:.0f} MB (> {memory_budget_mb} MB); "
+                "reduce tile_size"
+            )
+        batch_size = min(int(batch_size), fit)
+    batch_size = max(1, int(batch_size))
+
+    if pad_values is None:
+        pad_values = [-1.0] + [0.0] * (n_channels - 1)
+    pad_values = np.asarray(pad_values, dtype=np.float32).reshape(-1, 1, 1, 1)
+
+    weight = gaussian_importance_map(tile, sigma_scale)
+    starts = [tile_starts(n, t, overlap) for n, t in zip(shape, tile)]
+    positions = list(itertools.product(*starts))
+
+    out = None
+    wsum = np.zeros(shape, dtype=np.float32)
+
+    prev_threads = torch.get_num_threads()
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+    was_training = model.training
+    model.eval()
+    try:
+        with torch.inference_mode():
+            for b0 in range(0, len(positions), batch_size):
+                batch_pos = positions[b0:b0 + batch_size]
+                batch = np.empty((len(batch_pos), n_channels) + tile, dtype=np.float32)
+                regions = []
+                for i, start in enumerate(batch_pos):
+                    region = tuple(slice(s, min(s + t, n)) for s, t, n in zip(start, tile, shape))
+                    x = read_region(*region)
+                    if x.shape[1:] != tile:
+                        batch[i] = pad_values
+                        batch[(i, slice(None)) + tuple(slice(0, d) for d in x.shape[1:])] = x
+                    else:
+                        batch[i] = x
+                    regions.append(region)
+
+                pred = model(torch.from_numpy(batch)).float().numpy()
+                if out is None:
+                    out = np.zeros((pred.shape[1],) + shape, dtype=np.float32)
+
+                for i, region in enumerate(regions):
+                    local = tuple(slice(0, r.stop - r.start) for r in region)
+                    w = weight[local]
+                    out[(slice(None),) + region] += pred[(i, slice(None)) + local] * w
+                    wsum[region] += w
+    finally:
+        if num_threads:
+            torch.set_num_threads(prev_threads)
+        model.train(was_training)
+
+    out /= np.maximum(wsum, 1e-8)
+    return out[0] if out.shape[0] == 1 else out
+
+
+def predict_array(model, X, **kwargs):
+    """predict_volume sobre un tensor de entrada X [C, Z, Y, X] ya en memoria."""
+    X = np.asarray(X, dtype=np.float32)
+    return predict_volume(
+        model, lambda zs, ys, xs: X[:, zs, ys, xs], X.shape[1:], X.shape[0], **kwargs
+    )
+
+
+def predict_shard(model, shard, to_ct_space=False, **kwargs):
+    """
+    predict_volume leyendo los tiles de un DoseShard (memory-map). Con
+    to_ct_space=True la predicción se pega en el grid completo del CT
+    original usando la transformación de recorte del shard (ml.crop).
+    """
+    pred = predict_volume(
+        model,
+        lambda zs, ys, xs: shard.read_input((zs, ys, xs)),
+        shard.shape,
+        1 + len(shard.roi_order),
+        **kwargs,
+    )
+    if to_ct_space and "crop_transform" in shard.meta:
+        pred = CropTransform.from_meta(shard.meta).invert(pred)
+    return pred
+
+
+def case_model_transform(case, out_spacing=None, region=None):
+    """
+    CropTransform de la región (z, y, x) del CT de un Case (None = todo
+    el volumen) al grid en el que se entrenó el modelo (out_spacing,
+    (sx, sy, sz); None = grid del CT). full_shape es la propia región,
+    así que apply / invert trabajan sobre ct[region].
+
+    Si hay que remuestrear y el Case no trae la geometría del CT
+    (metadata "ct_origin" / "ct_direction") se lanza ValueError.
+    """
+    shape = tuple(case.ct_hu.shape)
+    if region is None:
+        region = tuple(slice(0, n) for n in shape)
+    crop_shape = tuple(s.stop - s.start for s in region)
+    spacing = tuple(float(s) for s in reversed(case.ct_spacing))   # (sx, sy, sz)
+    if out_spacing is not None and np.isscalar(out_spacing):
+        out_spacing = (float(out_spacing),) * 3
+    if out_spacing is not None and np.allclose(out_spacing, spacing, rtol=0.0, atol=1e-3):
+        out_spacing = None
+    if out_spacing is None:
+        return make_crop_transform(crop_shape, spacing, (0.0, 0.0, 0.0), np.eye(3).ravel())
+
+    origin = case.metadata.get("ct_origin")
+    direction = case.metadata.get("ct_direction")
+    if origin is None or direction is None:
+        raise ValueError(
+            f"El modelo espera spacing {out_spacing} mm y el caso no tiene la geometría "
+            f"del CT (ct_origin / ct_direction) para remuestrear"
+        )
+    return make_crop_transform(
+        crop_shape, spacing, cropped_origin(origin, spacing, direction, region), direction,
+        out_spacing=out_spacing,
+    )
+
+
+def predict_case_dose(model, case, roi_order, hu_min=-1000, hu_max=2000, spacing_mm=None, **kwargs):
+    """
+    Dosis predicha [Z, Y, X] (Gy) para un Case en el grid del CT, con los
+    canales de roi_order (las ROIs que falten van vacías). El resultado
+    puede ir a case.metadata["dose_eval_gy"] para el check de gamma.
+
+    spacing_mm: spacing de entrenamiento del modelo (ml.kb.LoadedDoseModel.
+    spacing_mm); el CT y las máscaras se remuestrean a ese grid y la
+    predicción se devuelve al del CT.
+    """
+    transform = case_model_transform(case, spacing_mm)
+    ct = transform.apply(case.ct_hu, "linear", default_value=hu_min)
+    masks = [transform.apply(case.structs[n].mask, "nearest") if n in case.structs else None
+             for n in roi_order]
+
+    def read_region(zs, ys, xs):
+        x = np.zeros((1 + len(masks), zs.stop - zs.start, ys.stop - ys.start, xs.stop - xs.start),
+                     dtype=np.float32)
+        x[0] = normalize_ct(ct[zs, ys, xs], hu_min, hu_max)
+        for i, m in enumerate(masks):
+            if m is not None:
+                x[1 + i] = m[zs, ys, xs]
+        return x
+
+    pred = predict_volume(model, read_region, ct.shape, 1 + len(masks), **kwargs)
+    return transform.invert(pred)
@@ -0,0 +1,336 @@
+# src/ml/kb.py
+
+"""
+Predicción de dosis "knowledge-based" (KB) con UNet3D para el QA.
+
+El check de dosis KB (qa.checks.dose.check_oars_dvh_kb) compara los DVH
+de OARs del plan con los de la dosis predicha por el modelo entrenado:
+si un OAR recibe bastante más de lo que el modelo considera alcanzable,
+el plan probablemente se puede mejorar.
+
+Para que el check quepa en cada /run:
+
+  - Checkpoint autocontenido (save_dose_model): state_dict + roi_order,
+    nº de canales, base_filters, ventana de HU y spacing de los shards de
+    entrenamiento (spacing_mm; None = grid nativo del CT). load_dose_model lo carga
+    una sola vez por proceso (worker) y lo reutiliza mientras el fichero
+    no cambie (ruta, tamaño, mtime); el hash del modelo es el SHA-1 del
+    fichero.
+  - La entrada se construye con ml.preprocessing.build_input_tensor por
+    tiles (ml.inference.predict_volume) y sólo dentro del bounding box de
+    PTVs + OARs con un margen, no en todo el CT. Si el modelo se entrenó
+    a otro spacing, la región se remuestrea a ese grid
+    (ml.inference.case_model_transform) y la predicción se devuelve al
+    del CT; si no se puede, IncompatibleModelError.
+  - Las predicciones se cachean por (hash del caso, hash del modelo) en
+    memoria del proceso y, opcionalmente, en disco (cache_dir, float16).
+    El hash del caso cubre CT, spacing y las máscaras usadas como canales.
+  - Los DVH de la dosis predicha salen de una core.dvh.DVHCache sobre el
+    recorte, guardada en el Case como la de la dosis del plan.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import torch
+
+from core.dvh import DVHCache
+from core.geometry import mask_bbox_slices
+from core.naming import StructCategory, is_helper_structure, normalize_structure_name
+from ml.export import is_exported_model, load_exported
+from ml.inference import case_model_transform, predict_volume
+from ml.models import UNet3D
+from ml.preprocessing import build_input_tensor
+
+
+KB_CHECKPOINT_VERSION = 1
+PREDICTION_CACHE_SIZE = 8
+
+_MODELS = {}
+_PREDICTIONS = OrderedDict()
+_LOCK = threading.Lock()
+
+
+class IncompatibleModelError(ValueError):
+    """El caso no se puede llevar al grid de entrada del modelo."""
+
+
+# -------------------------------------------
+# Checkpoint del modelo
+# -------------------------------------------
+
+def save_dose_model(path, model, roi_order, hu_min=-1000, hu_max=2000, spacing_mm=None,
+                    state_dict=None, **extra):
+    """
+    Guarda un UNet3D con lo necesario para reconstruir su entrada:
+    roi_order (canales 1..R), ventana de HU, spacing de entrenamiento
+    ((sx, sy, sz) mm; None = grid nativo de cada CT) y arquitectura.
+
+    state_dict: copia ya hecha de los pesos (p.ej. para guardar desde un
+    hilo mientras el modelo sigue entrenando); None = model.state_dict().
+    La escritura es atómica (fichero temporal + os.replace).
+    """
+    base_filters = int(model.inc.net[0].out_channels)
+    ckpt = {
+        "version": KB_CHECKPOINT_VERSION,
+        "state_dict": model.state_dict() if state_dict is None else state_dict,
+        "roi_order": list(roi_order),
+        "n_channels": 1 + len(roi_order),
+        "base_filters": base_filters,
+        "hu_min": float(hu_min),
+        "hu_max": float(hu_max),
+        "spacing_mm": _spacing_list(spacing_mm),
+    }
+    ckpt.update(extra)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    torch.save(ckpt, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def _spacing_list(spacing):
+    if spacing is None:
+        return None
+    if np.isscalar(spacing):
+        return [float(spacing)] * 3
+    return [float(s) for s in spacing]
+
+
+@dataclass
+class LoadedDoseModel:
+    """Modelo cargado (eval, CPU) y metadatos de su entrada."""
+    model: torch.nn.Module
+    roi_order: list
+    hu_min: float
+    hu_max: float
+    model_hash: str
+    path: str
+    spacing_mm: Optional[tuple] = None   # (sx, sy, sz) de entrenamiento; None = grid del CT
+    meta: dict = field(default_factory=dict)
+
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def load_dose_model(path):
+    """
+    Carga (una vez por proceso) un checkpoint de save_dose_model o un
+    modelo exportado con ml.export (.ts / .onnx). Se recarga sólo si el
+    fichero cambia de tamaño o mtime.
+    """
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    with _LOCK:
+        cached = _MODELS.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+    if is_exported_model(path):
+        # TorchScript / ONNX de ml.export: los metadatos van en el fichero
+        model, ckpt = load_exported(path)
+    else:
+        ckpt = torch.load(path, map_location="cpu", weights_only=True)
+        model = UNet3D(int(ckpt["n_channels"]), base_filters=int(ckpt.get("base_filters", 16)))
+        model.load_state_dict(ckpt["state_dict"])
+        model.eval()
+
+    loaded = LoadedDoseModel(
+        model=model,
+        roi_order=list(ckpt["roi_order"]),
+        hu_min=float(ckpt.get("hu_min", -1000)),
+        hu_max=float(ckpt.get("hu_max", 2000)),
+        model_hash=_file_sha1(path),
+        path=path,
+        spacing_mm=tuple(ckpt["spacing_mm"]) if ckpt.get("spacing_mm") is not None else None,
+        meta={k: v for k, v in ckpt.items() if k not in ("state_dict", "optimizer")},
+    )
+    with _LOCK:
+        _MODELS[path] = (stamp, loaded)
+    return loaded
+
+
+# -------------------------------------------
+# Entrada del modelo desde un Case
+# -------------------------------------------
+
+def match_roi_channels(case, roi_order):
+    """
+    {roi del modelo: nombre de estructura del caso}, emparejando por
+    nombre exacto o, si no, por canonical de core.naming.
+    """
+    by_canonical = {}
+    for name in case.structs:
+        by_canonical.setdefault(normalize_structure_name(name).canonical, name)
+    out = {}
+    for roi in roi_order:
+        if roi in case.structs:
+            out[roi] = roi
+        else:
+            name = by_canonical.get(normalize_structure_name(roi).canonical)
+            if name is not None:
+                out[roi] = name
+    return out
+
+
+def _region_of_interest(case, margin_mm):
+    """Unión de bounding boxes de PTVs + OARs (no auxiliares) ampliada margin_mm."""
+    lo, hi = None, None
+    for name, st in case.structs.items():
+        if is_helper_structure(name):
+            continue
+        if normalize_structure_name(name).category not in (StructCategory.PTV, StructCategory.OAR):
+            continue
+        sl = mask_bbox_slices(st.mask) if st.mask is not None else None
+        if sl is None:
+            continue
+        starts, stops = [s.start for s in sl], [s.stop for s in sl]
+        lo = starts if lo is None else [min(a, b) for a, b in zip(lo, starts)]
+        hi = stops if hi is None else [max(a, b) for a, b in zip(hi, stops)]
+    if lo is None:
+        return None
+    margin = [int(np.ceil(float(margin_mm) / float(s))) for s in case.ct_spacing]
+    shape = case.ct_hu.shape
+    return tuple(
+        slice(max(a - m, 0), min(b + m, n)) for a, b, m, n in zip(lo, hi, margin, shape)
+    )
+
+
+def case_hash(case, roi_map, region):
+    """
+    SHA-1 del CT, spacing, región y máscaras de los canales del modelo
+    (cada máscara se empaqueta sólo en su bounding box).
+    """
+    h = hashlib.sha1()
+    h.update(repr((tuple(case.ct_hu.shape), tuple(float(s) for s in case.ct_spacing),
+                   tuple((s.start, s.stop) for s in region))).encode("utf-8"))
+    h.update(memoryview(np.ascontiguousarray(case.ct_hu)).cast("B"))
+    for roi in sorted(roi_map):
+        mask = case.structs[roi_map[roi]].mask
+        sl = mask_bbox_slices(mask)
+        h.update(repr((roi, None if sl is None else [(s.start, s.stop) for s in sl])).encode("utf-8"))
+        if sl is not None:
+            h.update(np.packbits(np.ascontiguousarray(mask[sl], dtype=bool)).tobytes())
+    return h.hexdigest()
+
+
+# -------------------------------------------
+# Predicción cacheada
+# -------------------------------------------
+
+@dataclass
+class KBPrediction:
+    """
+    Dosis predicha (Gy) en el recorte `region` del grid del CT.
+    """
+    dose: np.ndarray
+    region: tuple
+    roi_map: dict
+    key: tuple
+
+    def dvh_cache(self, case):
+        """
+        DVHCache de la dosis predicha para este Case, guardada en
+        case.metadata["kb_dvh_cache"] igual que core.dvh.get_dvh_cache.
+        """
+        cache = case.metadata.get("kb_dvh_cache")
+        if not isinstance(cache, DVHCache) or cache.dose is not self.dose:
+            cache = DVHCache(self.dose, case.ct_spacing)
+            case.metadata["kb_dvh_cache"] = cache
+        return cache
+
+    def structure_histogram(self, case, name, mask):
+        """DVH predicho de una estructura (máscara en el grid completo del CT)."""
+        return self.dvh_cache(case).structure(name, mask[self.region])
+
+
+def predict_case_kb_dose(
+    case,
+    loaded,
+    margin_mm=20.0,
+    tile_size=(64, 128, 128),
+    overlap=0.25,
+    batch_size=1,
+    num_threads=None,
+    memory_budget_mb=None,
+    cache_dir=None,
+):
+    """
+    Predicción KB para un Case (None si no tiene PTVs / OARs). Se
+    reutiliza de la caché en memoria o en disco si el par (caso, modelo)
+    ya se predijo.
+
+    La red ve la región al spacing con el que se entrenó
+    (loaded.spacing_mm) y la dosis se devuelve al grid del CT antes de
+    construir los DVH. IncompatibleModelError si no se puede remuestrear.
+    """
+    region = _region_of_interest(case, margin_mm)
+    if region is None:
+        return None
+    try:
+        transform = case_model_transform(case, loaded.spacing_mm, region)
+    except ValueError as exc:
+        raise IncompatibleModelError(str(exc)) from exc
+    roi_map = match_roi_channels(case, loaded.roi_order)
+    key = (case_hash(case, roi_map, region), loaded.model_hash)
+
+    with _LOCK:
+        cached = _PREDICTIONS.get(key)
+        if cached is not None:
+            _PREDICTIONS.move_to_end(key)
+            return cached
+
+    dose = None
+    disk_path = None
+    if cache_dir:
+        disk_path = os.path.join(cache_dir, f"kb_{key[0][:16]}_{key[1][:16]}.npy")
+        if os.path.isfile(disk_path):
+            dose = np.load(disk_path).astype(np.float32)
+
+    if dose is None:
+        # recorte del CT (y remuestreo al spacing del modelo si hace falta)
+        ct = transform.apply(case.ct_hu[region], "linear", default_value=loaded.hu_min)
+        masks = {roi: transform.apply(case.structs[name].mask[region], "nearest")
+                 for roi, name in roi_map.items()}
+
+        def read_region(zs, ys, xs):
+            sl = (zs, ys, xs)
+            tile_masks = {roi: m[sl] for roi, m in masks.items()}
+            return build_input_tensor(ct[sl], tile_masks, loaded.roi_order,
+                                      hu_min=loaded.hu_min, hu_max=loaded.hu_max)
+
+        dose = predict_volume(
+            loaded.model, read_region, ct.shape, 1 + len(loaded.roi_order),
+            tile_size=tile_size, overlap=overlap, batch_size=batch_size,
+            num_threads=num_threads, memory_budget_mb=memory_budget_mb,
+        )
+        dose = transform.invert(np.clip(dose, 0.0, None))
+        if disk_path is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = disk_path + ".tmp.npy"
+            np.save(tmp, dose.astype(np.float16))
+            os.replace(tmp, disk_path)
+
+    pred = KBPrediction(
+        dose=dose,
+        region=region,
+        roi_map=roi_map,
+        key=key,
+    )
+    with _LOCK:
+        _PREDICTIONS[key] = pred
+        _PREDICTIONS.move_to_end(key)
+        while len(_PREDICTIONS) > PREDICTION_CACHE_SIZE:
+            _PREDICTIONS.popitem(last=False)
+    return pred
@@ -3,15 +3,25 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
 
 
 class DoubleConv(nn.Module):
     """
     Bloque: (Conv3D -> BN -> ReLU) x 2
+
+    Con gradient_checkpointing=True (sólo en entrenamiento) las
+    activaciones internas del bloque no se guardan para el backward: se
+    recalculan, cambiando memoria por más cómputo. En el recálculo se
+    restauran los buffers de BatchNorm (running_mean / running_var /
+    num_batches_tracked), que si no se actualizarían dos veces por batch;
+    la salida no cambia porque en train BN normaliza con las
+    estadísticas del batch.
     """
 
     def __init__(self, in_channels, out_channels):
         super().__init__()
+        self.gradient_checkpointing = False
         self.net = nn.Sequential(
             nn.Conv3d(in_channels, out_channels, kernel_size=3, padding=1),
             nn.BatchNorm3d(out_channels),
@@ -21,7 +31,33 @@ class DoubleConv(nn.Module):
             nn.ReLU(inplace=True),
         )
 
+    def _forward_checkpointed(self, x):
+        first_call = [True]
+
+        def run(inp):
+            if first_call[0]:
+                first_call[0] = False
+                return self.net(inp)
+            # Recálculo en el backward: BN no debe volver a actualizar sus buffers
+            bn_buffers = [
+                buf for m in self.net.modules() if isinstance(m, nn.modules.batchnorm._BatchNorm)
+                for buf in m.buffers()
+            ]
+            saved = [buf.clone() for buf in bn_buffers]
+            try:
+                return self.net(inp)
+            finally:
+                # finally: el recálculo no reentrante puede cortarse a mitad
+                # (early stop) en cuanto tiene los tensores que necesita
+                with torch.no_grad():
+                    for buf, old in zip(bn_buffers, saved):
+                        buf.copy_(old)
+
+        return checkpoint(run, x, use_reentrant=False)
+
     def forward(self, x):
+        if self.gradient_checkpointing and self.training and torch.is_grad_enabled():
+            return self._forward_checkpointed(x)
         return self.net(x)
 
 
@@ -108,6 +144,13 @@ class UNet3D(nn.Module):
 
         self.outc = OutConv(base_filters, n_classes)
 
+    def set_gradient_checkpointing(self, enabled=True):
+        """Activa / desactiva el checkpoint de gradientes en todos los DoubleConv."""
+        for m in self.modules():
+            if isinstance(m, DoubleConv):
+                m.gradient_checkpointing = bool(enabled)
+        return self
+
     def forward(self, x):
         x1 = self.inc(x)
         x2 = self.down1(x1)
@@ -0,0 +1,285 @@
+# src/ml/pipeline.py
+
+"""
+Preprocesado de una cohorte completa: DICOM de data_root → shards.
+
+    python -m ml.pipeline --data-root ../data_raw --out-dir ../data_processed \
+        --rois PTV Rectum Bladder --workers 4 --crop body --spacing 2.5
+
+  - Cada paciente se procesa con ml.preprocessing.prepare_patient en un
+    ProcessPoolExecutor (lectura DICOM, rasterizado de contornos y
+    remuestreo de la dosis son CPU-bound y no comparten estado).
+  - Los shards se escriben de forma atómica (ml.shards.write_shard), así
+    que un paciente interrumpido no deja un shard a medias.
+  - out_dir/manifest.json guarda, por paciente, el SHA-1 de sus ficheros
+    de entrada y de los parámetros de preprocesado. Al relanzar sólo se
+    procesan los pacientes nuevos, con entradas cambiadas, con parámetros
+    distintos, sin shard o que fallaron la vez anterior.
+  - Para no releer todos los DICOM en cada pasada, el hash de cada
+    fichero se reutiliza mientras su tamaño y mtime no cambien.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ml.preprocessing import list_patients, prepare_patient
+from ml.shards import SHARD_VERSION, is_shard_dir
+
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+# -------------------------------------------
+# Manifest
+# -------------------------------------------
+
+def load_manifest(out_dir):
+    """Manifest de out_dir ({"version", "patients": {...}}); vacío si no existe."""
+    path = os.path.join(out_dir, MANIFEST_FILENAME)
+    if os.path.isfile(path):
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            manifest.setdefault("patients", {})
+            return manifest
+    return {"version": MANIFEST_VERSION, "patients": {}}
+
+
+def save_manifest(out_dir, manifest):
+    """Escribe el manifest de forma atómica (fichero temporal + os.replace)."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, MANIFEST_FILENAME)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def patient_input_files(data_root, patient_id):
+    """Ficheros de entrada de un paciente (rutas relativas a su carpeta)."""
+    root = os.path.join(data_root, patient_id)
+    files = ["RTSTRUCT.dcm", "RTDOSE.dcm"]
+    ct_folder = os.path.join(root, "CT")
+    files += sorted(os.path.join("CT", name) for name in os.listdir(ct_folder))
+    return [f for f in files if os.path.isfile(os.path.join(root, f))]
+
+
+def hash_patient_inputs(data_root, patient_id, previous=None):
+    """
+    {ruta relativa: {"size", "mtime_ns", "sha1"}} de las entradas del
+    paciente. Los ficheros cuyo tamaño y mtime coinciden con `previous`
+    (entrada anterior del manifest) no se vuelven a leer.
+    """
+    previous = previous or {}
+    root = os.path.join(data_root, patient_id)
+    out = {}
+    for rel in patient_input_files(data_root, patient_id):
+        st = os.stat(os.path.join(root, rel))
+        old = previous.get(rel)
+        if old and old.get("size") == st.st_size and old.get("mtime_ns") == st.st_mtime_ns:
+            out[rel] = old
+            continue
+        out[rel] = {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha1": _file_sha1(os.path.join(root, rel)),
+        }
+    return out
+
+
+def inputs_digest(files):
+    """Hash único de todas las entradas (sólo contenido, no mtime)."""
+    h = hashlib.sha1()
+    for rel in sorted(files):
+        h.update(f"{rel}:{files[rel]['sha1']}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def params_digest(params):
+    """Hash de los parámetros de preprocesado (+ versión del formato de shard)."""
+    payload = json.dumps({"shard_version": SHARD_VERSION, **params}, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def needs_processing(entry, out_dir, patient_id, input_hash, params_hash):
+    """True si el paciente no tiene un shard válido para estas entradas y parámetros."""
+    if not entry or entry.get("status") != "ok":
+        return True
+    if entry.get("inputs_sha1") != input_hash or entry.get("params_sha1") != params_hash:
+        return True
+    return not is_shard_dir(os.path.join(out_dir, patient_id))
+
+
+# -------------------------------------------
+# Ejecución
+# -------------------------------------------
+
+def _process_one(data_root, patient_id, out_dir, params):
+    """Worker: prepara un paciente y devuelve (patient_id, shard | None, error, segundos)."""
+    t0 = time.perf_counter()
+    try:
+        shard = prepare_patient(data_root, patient_id, out_dir=out_dir, **params)
+        return patient_id, shard, None, time.perf_counter() - t0
+    except Exception as e:
+        return patient_id, None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+
+
+def run_pipeline(
+    data_root,
+    out_dir,
+    roi_order,
+    patient_ids=None,
+    workers=None,
+    dose_dtype="float16",
+    crop=None,
+    crop_margin_mm=10.0,
+    target_spacing_mm=None,
+    hu_min=-1000,
+    hu_max=2000,
+    force=False,
+):
+    """
+    Preprocesa la cohorte de data_root en out_dir.
+
+    Parámetros:
+      data_root: carpeta con un subdirectorio por paciente (CT/, RTSTRUCT.dcm, RTDOSE.dcm)
+      out_dir: carpeta de shards (y manifest.json)
+      roi_order: estructuras para los canales de máscara
+      patient_ids: lista de IDs o None para todos los de list_patients
+      workers: procesos del pool (None = os.cpu_count(); 1 = en serie)
+      dose_dtype, crop, crop_margin_mm, target_spacing_mm, hu_min, hu_max:
+        ver prepare_patient
+      force: reprocesar aunque el manifest diga que está al día
+
+    Devuelve:
+      dict {"processed": [...], "skipped": [...], "failed": {id: error}}
+    """
+    params = {
+        "roi_order": list(roi_order),
+        "dose_dtype": str(dose_dtype),
+        "crop": crop,
+        "crop_margin_mm": float(crop_margin_mm),
+        "target_spacing_mm": target_spacing_mm,
+        "hu_min": float(hu_min),
+        "hu_max": float(hu_max),
+    }
+    params_hash = params_digest(params)
+
+    manifest = load_manifest(out_dir)
+    entries = manifest["patients"]
+    ids = list_patients(data_root) if patient_ids is None else list(patient_ids)
+
+    summary = {"processed": [], "skipped": [], "failed": {}}
+    todo = {}
+    for pid in ids:
+        entry = entries.get(pid, {})
+        files = hash_patient_inputs(data_root, pid, entry.get("files"))
+        input_hash = inputs_digest(files)
+        if not force and not needs_processing(entry, out_dir, pid, input_hash, params_hash):
+            entry["files"] = files  # mtimes al día: la próxima vez no se rehashea
+            summary["skipped"].append(pid)
+            continue
+        todo[pid] = (files, input_hash)
+
+    if summary["skipped"]:
+        save_manifest(out_dir, manifest)
+    print(f"[pipeline] {len(ids)} pacientes: {len(todo)} por procesar, "
+          f"{len(summary['skipped'])} al día")
+
+    def record(pid, shard, error, seconds):
+        files, input_hash = todo[pid]
+        entries[pid] = {
+            "status": "ok" if error is None else "error",
+            "files": files,
+            "inputs_sha1": input_hash,
+            "params_sha1": params_hash,
+            "shard": os.path.basename(shard) if shard else None,
+            "error": error,
+            "seconds": round(seconds, 2),
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        # Se guarda tras cada paciente: si se interrumpe, lo hecho no se repite
+        save_manifest(out_dir, manifest)
+        if error is None:
+            summary["processed"].append(pid)
+        else:
+            summary["failed"][pid] = error
+            print(f"❌ {pid}: {error}")
+
+    workers = (os.cpu_count() or 1) if workers is None else max(1, int(workers))
+    if workers == 1 or len(todo) <= 1:
+        for pid in todo:
+            record(*_process_one(data_root, pid, out_dir, params))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            futures = [pool.submit(_process_one, data_root, pid, out_dir, params) for pid in todo]
+            for fut in as_completed(futures):
+                record(*fut.result())
+
+    print(f"[pipeline] procesados {len(summary['processed'])}, "
+          f"omitidos {len(summary['skipped'])}, fallidos {len(summary['failed'])}")
+    return summary
+
+
+# -------------------------------------------
+# CLI
+# -------------------------------------------
+
+def _spacing_arg(values):
+    if not values:
+        return None
+    if len(values) not in (1, 3):
+        raise SystemExit("--spacing espera 1 valor (isótropo) o 3 (sx sy sz)")
+    return values[0] if len(values) == 1 else list(values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Preprocesado de la cohorte DICOM → shards")
+    parser.add_argument("--data-root", required=True, help="carpeta con un subdirectorio por paciente")
+    parser.add_argument("--out-dir", required=True, help="carpeta de shards")
+    parser.add_argument("--rois", nargs="+", required=True, help="estructuras de los canales de máscara")
+    parser.add_argument("--patients", nargs="*", default=None, help="IDs concretos (por defecto, todos)")
+    parser.add_argument("--workers", type=int, default=None, help="procesos (por defecto, nº de CPUs)")
+    parser.add_argument("--dose-dtype", choices=("float16", "float32"), default="float16")
+    parser.add_argument("--crop", choices=("none", "body", "ptv"), default="none",
+                        help="recorte al bounding box de BODY o de los PTV")
+    parser.add_argument("--crop-margin-mm", type=float, default=10.0)
+    parser.add_argument("--spacing", type=float, nargs="+", default=None,
+                        help="spacing destino en mm (1 valor = isótropo, o sx sy sz)")
+    parser.add_argument("--hu-min", type=float, default=-1000)
+    parser.add_argument("--hu-max", type=float, default=2000)
+    parser.add_argument("--force", action="store_true", help="reprocesar aunque esté al día")
+    args = parser.parse_args(argv)
+
+    summary = run_pipeline(
+        args.data_root,
+        args.out_dir,
+        args.rois,
+        patient_ids=args.patients,
+        workers=args.workers,
+        dose_dtype=args.dose_dtype,
+        crop=None if args.crop == "none" else args.crop,
+        crop_margin_mm=args.crop_margin_mm,
+        target_spacing_mm=_spacing_arg(args.spacing),
+        hu_min=args.hu_min,
+        hu_max=args.hu_max,
+        force=args.force,
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
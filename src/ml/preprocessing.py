@@ -3,35 +3,24 @@
 import os
 import numpy as np
 
-from dicom_io import load_ct_series, load_rtdose, load_rtstruct
-
-
-# -------------------------------------------
-# Normalización del CT
-# -------------------------------------------
-
-def normalize_ct(ct_array, hu_min=-1000, hu_max=2000):
-    """
-    Normaliza el CT de HU a [-1, 1].
-
-    Parámetros:
-      ct_array: numpy array [Z, Y, X] en HU
-      hu_min, hu_max: límites de recorte
-
-    Devuelve:
-      ct_norm: numpy array [Z, Y, X] en float32, rango [-1,1]
-    """
-    ct = np.clip(ct_array, hu_min, hu_max)
-    ct = (ct - hu_min) / (hu_max - hu_min)  # [0,1]
-    ct = 2.0 * ct - 1.0                     # [-1,1]
-    return ct.astype(np.float32)
+from core.dicom_io import (
+    load_ct_series,
+    load_rtdose,
+    load_rtstruct,
+    read_rtstruct_roi_names,
+    resample_dose_to_ct,
+    resample_dose_to_grid,
+)
+from core.naming import StructCategory, is_helper_structure, normalize_structure_name
+from ml.crop import make_crop_region, make_crop_transform
+from ml.shards import normalize_ct, write_shard
 
 
 # -------------------------------------------
 # Construcción del tensor de entrada X
 # -------------------------------------------
 
-def build_input_tensor(ct_array, masks, roi_order):
+def build_input_tensor(ct_array, masks, roi_order, hu_min=-1000, hu_max=2000):
     """
     Construye el tensor de entrada X con forma [C, Z, Y, X]:
 
@@ -43,11 +32,12 @@ def build_input_tensor(ct_array, masks, roi_order):
       masks: dict {nombre_roi: mask_array [Z, Y, X] (0/1)}
       roi_order: lista de nombres de estructuras, ej:
                  ["PTV", "Rectum", "Bladder"]
+      hu_min, hu_max: ventana de normalización del CT
 
     Devuelve:
       X: numpy array [C, Z, Y, X] en float32
     """
-    ct_norm = normalize_ct(ct_array)
+    ct_norm = normalize_ct(ct_array, hu_min, hu_max)
     channels = [ct_norm]  # canal 0
 
     for roi_name in roi_order:
@@ -62,66 +52,156 @@ def build_input_tensor(ct_array, masks, roi_order):
     return X
 
 
+# -------------------------------------------
+# Geometría: dosis al grid del CT y ROIs de recorte
+# -------------------------------------------
+
+def dose_on_ct_grid(ct_image, dose_image, dose_array):
+    """
+    Dosis [Z, Y, X] en Gy en el grid del CT. Si RTDOSE ya comparte grid
+    con el CT se devuelve tal cual; si no, se remuestrea (lineal, 0 Gy
+    fuera del grid de dosis).
+    """
+    same_grid = (
+        tuple(dose_image.GetSize()) == tuple(ct_image.GetSize())
+        and np.allclose(dose_image.GetSpacing(), ct_image.GetSpacing(), atol=1e-4)
+        and np.allclose(dose_image.GetOrigin(), ct_image.GetOrigin(), atol=1e-3)
+        and np.allclose(dose_image.GetDirection(), ct_image.GetDirection(), atol=1e-6)
+    )
+    if same_grid:
+        return dose_array
+    _, dose_resampled = resample_dose_to_ct(ct_image, dose_image)
+    return dose_resampled
+
+
+def find_body_roi(roi_names):
+    """Primera ROI de categoría BODY (BODY, External, Outline...) o None."""
+    for name in roi_names:
+        if normalize_structure_name(name).category == StructCategory.BODY:
+            return name
+    return None
+
+
+def find_ptv_rois(roi_names):
+    """ROIs de categoría PTV (sin auxiliares)."""
+    return [
+        name for name in roi_names
+        if not is_helper_structure(name)
+        and normalize_structure_name(name).category == StructCategory.PTV
+    ]
+
+
+CROP_MODES = (None, "body", "ptv")
+
+
 # -------------------------------------------
 # Preparar un paciente (CT + máscaras + dosis)
 # -------------------------------------------
 
-def prepare_patient(data_root, patient_id, roi_order, out_dir):
+def prepare_patient(
+    data_root,
+    patient_id,
+    roi_order,
+    out_dir,
+    dose_dtype="float16",
+    crop=None,
+    crop_margin_mm=10.0,
+    target_spacing_mm=None,
+    hu_min=-1000,
+    hu_max=2000,
+):
     """
     Prepara un paciente para el modelo:
 
-      - Carga CT, RTSTRUCT (masks) y RTDOSE.
-      - Comprueba que CT y dosis tienen la misma forma (por ahora).
-      - Construye:
-          X: [C, Z, Y, X] = CT normalizado + máscaras de roi_order
-          Y: [Z, Y, X] = dosis en Gy
-      - Guarda en un archivo .npz comprimido.
+      - Carga CT, RTSTRUCT (sólo las máscaras de roi_order y las que pida
+        el recorte) y RTDOSE.
+      - Opcionalmente recorta al bounding box de BODY (crop="body") o de
+        los PTV (crop="ptv") + crop_margin_mm, y remuestrea el recorte a
+        target_spacing_mm (ver ml.crop.CropTransform). La dosis se lleva
+        al grid final con una sola interpolación.
+      - Guarda un shard sin comprimir (ver ml.shards): CT int16 en HU,
+        máscaras de roi_order empaquetadas a bits y dosis en Gy, con la
+        transformación en meta.json ("crop_transform") para poder pegar
+        las predicciones en el grid del CT.
+        DoseDataset lo abre con memory-map y construye X / Y al leer.
 
     Parámetros:
       data_root: ruta raíz de los datos raw (ej. "../data_raw")
       patient_id: carpeta del paciente (ej. "patient_001")
       roi_order: lista de estructuras para canales (sin incluir CT)
-      out_dir: ruta donde se guardarán los .npz (ej. "../data_processed")
+      out_dir: ruta donde se guardarán los shards (ej. "../data_processed")
+      dose_dtype: "float16" o "float32" para la dosis
+      crop: None (FOV completo), "body" o "ptv"
+      crop_margin_mm: margen del recorte
+      target_spacing_mm: None (spacing del CT), escalar (isótropo) o (sx, sy, sz)
+      hu_min, hu_max: normalización del CT guardada en el shard
 
     Devuelve:
-      out_path si se guardó el paciente, None si se omitió.
+      ruta del shard.
     """
+    if crop not in CROP_MODES:
+        raise ValueError(f"crop debe ser uno de {CROP_MODES}, no {crop!r}")
+
     ct_folder = os.path.join(data_root, patient_id, "CT")
     rtstruct_path = os.path.join(data_root, patient_id, "RTSTRUCT.dcm")
     rtdose_path = os.path.join(data_root, patient_id, "RTDOSE.dcm")
 
     # Carga de datos DICOM
     ct_img, ct_array, ct_spacing, ct_origin, ct_direction = load_ct_series(ct_folder)
-    dose_array, dose_spacing = load_rtdose(rtdose_path)
-    masks = load_rtstruct(rtstruct_path, ct_folder)
-
-    # Comprobamos que CT y dosis tienen misma forma
-    if ct_array.shape != dose_array.shape:
-        print(f"⚠️ {patient_id}: CT y DOSE tienen formas distintas, se omite por ahora.")
-        print(f"   CT   shape: {ct_array.shape}, spacing: {ct_spacing}")
-        print(f"   Dose shape: {dose_array.shape}, spacing: {dose_spacing}")
-        return None
-
-    # Construir X e Y
-    X = build_input_tensor(ct_array, masks, roi_order)
-    Y = dose_array.astype(np.float32)
-
-    # Crear carpeta de salida y guardar
-    os.makedirs(out_dir, exist_ok=True)
-    out_path = os.path.join(out_dir, f"{patient_id}.npz")
-
-    np.savez_compressed(
-        out_path,
-        X=X,
-        Y=Y,
-        ct_spacing=np.array(ct_spacing, dtype=np.float32),
-        dose_spacing=np.array(dose_spacing, dtype=np.float32),
-        origin=np.array(ct_origin, dtype=np.float32),
-        direction=np.array(ct_direction, dtype=np.float32),
-        roi_order=np.array(roi_order)
+    dose_img, dose_array, dose_spacing, _, _ = load_rtdose(rtdose_path)
+
+    crop_rois = []
+    if crop == "body":
+        body_name = find_body_roi(read_rtstruct_roi_names(rtstruct_path))
+        crop_rois = [body_name] if body_name is not None else []
+    elif crop == "ptv":
+        crop_rois = find_ptv_rois(read_rtstruct_roi_names(rtstruct_path))
+    wanted = list(roi_order) + [n for n in crop_rois if n not in roi_order]
+    masks = load_rtstruct(rtstruct_path, ct_folder, roi_names=wanted)
+
+    region = None
+    if crop is not None:
+        region = make_crop_region(
+            [masks[n] for n in crop_rois if n in masks], ct_spacing, crop_margin_mm
+        )
+        if region is None:
+            print(f"⚠️ {patient_id}: sin máscara para crop={crop!r}, se guarda el FOV completo.")
+
+    transform = make_crop_transform(
+        ct_array.shape, ct_spacing, ct_origin, ct_direction,
+        region=region, out_spacing=target_spacing_mm,
+    )
+
+    ct_model = transform.apply(ct_array, "linear")
+    masks_model = {name: transform.apply(masks[name], "nearest") for name in roi_order if name in masks}
+    if transform.out_spacing is None:
+        dose_model = transform.apply(dose_on_ct_grid(ct_img, dose_img, dose_array))
+    else:
+        _, dose_model = resample_dose_to_grid(dose_img, *transform.model_grid())
+
+    out_path = write_shard(
+        out_dir,
+        patient_id,
+        ct_model,
+        masks_model,
+        roi_order,
+        dose_model,
+        transform.model_spacing,
+        transform.crop_origin,
+        ct_direction,
+        dose_dtype=dose_dtype,
+        hu_min=hu_min,
+        hu_max=hu_max,
+        extra_meta={
+            "dose_spacing": [float(s) for s in dose_spacing],
+            "crop": crop,
+            "crop_rois": [n for n in crop_rois if n in masks] if region is not None else [],
+            "crop_transform": transform.to_meta(),
+        },
     )
 
-    print(f"✅ Guardado {out_path}  |  X shape: {X.shape}, Y shape: {Y.shape}")
+    print(f"✅ Guardado {out_path}  |  shape: {ct_model.shape} "
+          f"({100.0 * transform.voxel_fraction:.1f}% del CT), ROIs: {len(roi_order)}")
     return out_path
 
 
@@ -0,0 +1,292 @@
+# src/ml/shards.py
+
+"""
+Formato de shard sin comprimir para DoseDataset (un shard por paciente).
+
+Cada shard es una carpeta <out_dir>/<patient_id>/ con:
+
+  - ct.npy     int16 [Z, Y, X] en HU (se normaliza al leer)
+  - masks.npy  uint8 [R, Z, Y, ceil(X/8)]: una máscara por ROI de
+               roi_order, empaquetada a bits a lo largo de X (np.packbits)
+  - dose.npy   float16 o float32 [Z, Y, X] en Gy
+  - meta.json  índice del shard: forma, spacing, origen, dirección,
+               roi_order, tipos y parámetros de normalización del CT
+
+write_shard escribe en una carpeta temporal junto al destino y la
+renombra al final, así que un shard a medias (proceso matado, disco
+lleno) nunca aparece como válido.
+
+Los .npy se abren con mmap_mode="r": leer un paciente (o una región) sólo
+toca las páginas de disco necesarias, sin zlib ni pickle, y el
+empaquetado por X permite decodificar subvolúmenes sin desempaquetar la
+máscara entera.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+SHARD_VERSION = 1
+
+META_FILENAME = "meta.json"
+CT_FILENAME = "ct.npy"
+MASKS_FILENAME = "masks.npy"
+DOSE_FILENAME = "dose.npy"
+
+
+# -------------------------------------------
+# Normalización del CT
+# -------------------------------------------
+
+def normalize_ct(ct_array, hu_min=-1000, hu_max=2000):
+    """
+    Normaliza el CT de HU a [-1, 1].
+
+    Parámetros:
+      ct_array: numpy array [Z, Y, X] en HU
+      hu_min, hu_max: límites de recorte
+
+    Devuelve:
+      ct_norm: numpy array [Z, Y, X] en float32, rango [-1,1]
+    """
+    ct = np.clip(ct_array, hu_min, hu_max).astype(np.float32)
+    ct = (ct - hu_min) / (hu_max - hu_min)  # [0,1]
+    ct = 2.0 * ct - 1.0                     # [-1,1]
+    return ct.astype(np.float32, copy=False)
+
+
+# -------------------------------------------
+# Label map de bits (máscaras solapadas en un entero por voxel)
+# -------------------------------------------
+
+def label_bits_dtype(n_rois):
+    """Entero más pequeño con n_rois bits (uint8 hasta 8 ROIs)."""
+    for dtype in (np.uint8, np.int16, np.int32, np.int64):
+        if n_rois <= 8 * np.dtype(dtype).itemsize - (dtype is not np.uint8):
+            return np.dtype(dtype)
+    raise ValueError(f"Demasiadas ROIs para un label map de bits: {n_rois} (> 63)")
+
+
+def pack_label_bits(masks):
+    """[R, z, y, x] (0/1) → label map [z, y, x] con el bit i = máscara i."""
+    masks = np.asarray(masks)
+    out = np.zeros(masks.shape[1:], dtype=label_bits_dtype(masks.shape[0]))
+    for i in range(masks.shape[0]):
+        out |= (masks[i] > 0).astype(out.dtype) << out.dtype.type(i)
+    return out
+
+
+# -------------------------------------------
+# Escritura
+# -------------------------------------------
+
+def write_shard(
+    out_dir,
+    patient_id,
+    ct_array,
+    masks,
+    roi_order,
+    dose_array,
+    ct_spacing,
+    ct_origin,
+    ct_direction,
+    dose_dtype="float16",
+    hu_min=-1000,
+    hu_max=2000,
+    extra_meta=None,
+):
+    """
+    Escribe el shard de un paciente.
+
+    Parámetros:
+      out_dir: carpeta de shards (ej. "../data_processed")
+      patient_id: nombre del shard (subcarpeta)
+      ct_array: [Z, Y, X] en HU
+      masks: dict {nombre_roi: mask [Z, Y, X] (0/1)}; las ROIs de
+             roi_order que falten se guardan vacías
+      roi_order: lista de estructuras (canales 1..R de X)
+      dose_array: [Z, Y, X] en Gy, en el mismo grid que el CT
+      ct_spacing, ct_origin, ct_direction: geometría del CT (SimpleITK)
+      dose_dtype: "float16" (por defecto, error relativo < 0.05 %) o "float32"
+      hu_min, hu_max: normalización del CT que aplicará el lector
+      extra_meta: dict opcional que se añade a meta.json
+
+    Devuelve:
+      ruta de la carpeta del shard
+    """
+    if np.dtype(dose_dtype) not in (np.dtype(np.float16), np.dtype(np.float32)):
+        raise ValueError(f"dose_dtype debe ser float16 o float32, no {dose_dtype!r}")
+
+    shape = tuple(int(s) for s in ct_array.shape)
+    if tuple(dose_array.shape) != shape:
+        raise ValueError(f"Dosis {dose_array.shape} y CT {shape} deben compartir grid")
+
+    os.makedirs(out_dir, exist_ok=True)
+    final_dir = os.path.join(out_dir, patient_id)
+    shard_dir = tempfile.mkdtemp(prefix=f".{patient_id}.", suffix=".tmp", dir=out_dir)
+    os.chmod(shard_dir, 0o755)
+    try:
+        _write_shard_files(shard_dir, patient_id, shape, ct_array, masks, roi_order,
+                           dose_array, ct_spacing, ct_origin, ct_direction,
+                           dose_dtype, hu_min, hu_max, extra_meta)
+        _replace_dir(shard_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(shard_dir, ignore_errors=True)
+        raise
+
+    return final_dir
+
+
+def _replace_dir(src, dst):
+    """Renombra src → dst; si dst ya existe se aparta antes y se borra después."""
+    if not os.path.exists(dst):
+        os.replace(src, dst)
+        return
+    old = tempfile.mkdtemp(prefix=f".{os.path.basename(dst)}.", suffix=".old",
+                           dir=os.path.dirname(dst))
+    os.rmdir(old)
+    os.replace(dst, old)
+    try:
+        os.replace(src, dst)
+    except OSError:
+        os.replace(old, dst)
+        raise
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _write_shard_files(shard_dir, patient_id, shape, ct_array, masks, roi_order,
+                       dose_array, ct_spacing, ct_origin, ct_direction,
+                       dose_dtype, hu_min, hu_max, extra_meta):
+    ct = np.clip(np.rint(ct_array), np.iinfo(np.int16).min, np.iinfo(np.int16).max)
+    np.save(os.path.join(shard_dir, CT_FILENAME), ct.astype(np.int16))
+
+    packed_x = (shape[2] + 7) // 8
+    packed = np.zeros((len(roi_order),) + shape[:2] + (packed_x,), dtype=np.uint8)
+    for i, roi_name in enumerate(roi_order):
+        m = masks.get(roi_name)
+        if m is not None:
+            packed[i] = np.packbits(np.asarray(m) > 0, axis=-1)
+    np.save(os.path.join(shard_dir, MASKS_FILENAME), packed)
+
+    np.save(os.path.join(shard_dir, DOSE_FILENAME), np.asarray(dose_array).astype(dose_dtype))
+
+    meta = {
+        "version": SHARD_VERSION,
+        "patient_id": patient_id,
+        "shape": list(shape),
+        "roi_order": list(roi_order),
+        "ct_spacing": [float(s) for s in ct_spacing],
+        "ct_origin": [float(o) for o in ct_origin],
+        "ct_direction": [float(d) for d in ct_direction],
+        "hu_min": float(hu_min),
+        "hu_max": float(hu_max),
+        "dose_dtype": np.dtype(dose_dtype).name,
+        "dose_max_gy": float(np.max(dose_array)) if np.size(dose_array) else 0.0,
+    }
+    if extra_meta:
+        meta.update(extra_meta)
+    # meta.json al final: is_shard_dir sólo es True con todos los .npy escritos
+    with open(os.path.join(shard_dir, META_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+# -------------------------------------------
+# Lectura
+# -------------------------------------------
+
+def is_shard_dir(path):
+    """True si path es una carpeta de shard (tiene meta.json)."""
+    return os.path.isfile(os.path.join(path, META_FILENAME))
+
+
+def list_shards(data_dir):
+    """IDs (nombres de carpeta) de los shards de data_dir, ordenados."""
+    return sorted(
+        name for name in os.listdir(data_dir)
+        if not name.startswith(".") and is_shard_dir(os.path.join(data_dir, name))
+    )
+
+
+def _full_region(shape):
+    return tuple(slice(0, n) for n in shape)
+
+
+class DoseShard:
+    """
+    Shard abierto con memory-map. Los .npy se mapean en el primer acceso y
+    cada read_* decodifica sólo la región pedida (tupla de 3 slices z, y,
+    x, con paso opcional; None = volumen completo).
+    """
+
+    def __init__(self, shard_dir):
+        self.shard_dir = shard_dir
+        with open(os.path.join(shard_dir, META_FILENAME), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.patient_id = self.meta.get("patient_id", os.path.basename(shard_dir))
+        self.shape = tuple(self.meta["shape"])
+        self.roi_order = list(self.meta["roi_order"])
+        self._arrays = {}
+
+    def _array(self, filename):
+        arr = self._arrays.get(filename)
+        if arr is None:
+            arr = np.load(os.path.join(self.shard_dir, filename), mmap_mode="r")
+            self._arrays[filename] = arr
+        return arr
+
+    def _region(self, region):
+        if region is None:
+            return _full_region(self.shape)
+        out = []
+        for sl, n in zip(region, self.shape):
+            start, stop, step = sl.indices(n)
+            if step < 1:
+                raise ValueError("Las regiones de un shard deben tener paso positivo")
+            out.append(slice(start, max(stop, start), step))
+        return tuple(out)
+
+    def read_ct(self, region=None):
+        """CT normalizado a [-1, 1] (float32)."""
+        zs, ys, xs = self._region(region)
+        ct = self._array(CT_FILENAME)[zs, ys, xs]
+        return normalize_ct(ct, self.meta["hu_min"], self.meta["hu_max"])
+
+    def _unpack_masks(self, region, channels):
+        zs, ys, xs = self._region(region)
+        b0, b1 = xs.start // 8, (xs.stop + 7) // 8
+        packed = self._array(MASKS_FILENAME)
+        packed = packed[:, zs, ys, b0:b1] if channels is None else packed[list(channels)][:, zs, ys, b0:b1]
+        bits = np.unpackbits(packed, axis=-1)
+        off = xs.start - 8 * b0
+        return bits[..., off:off + (xs.stop - xs.start):xs.step]
+
+    def read_masks(self, region=None, channels=None):
+        """Máscaras [R, z, y, x] en float32 (0/1); channels = índices de roi_order."""
+        return self._unpack_masks(region, channels).astype(np.float32)
+
+    def read_label_bits(self, region=None, channels=None):
+        """
+        Máscaras como un único label map de bits [z, y, x]: el bit i vale 1
+        si el voxel está en la ROI channels[i] (por defecto roi_order[i]).
+        Admite solapes; ver label_bits_dtype para el tipo entero.
+        """
+        bits = self._unpack_masks(region, channels)
+        return pack_label_bits(bits)
+
+    def read_dose(self, region=None):
+        """Dosis en Gy (float32)."""
+        zs, ys, xs = self._region(region)
+        return np.array(self._array(DOSE_FILENAME)[zs, ys, xs], dtype=np.float32)
+
+    def read_input(self, region=None):
+        """Tensor de entrada X [C, z, y, x]: CT normalizado + máscaras."""
+        ct = self.read_ct(region)
+        masks = self.read_masks(region)
+        X = np.empty((1 + masks.shape[0],) + ct.shape, dtype=np.float32)
+        X[0] = ct
+        X[1:] = masks
+        return X
@@ -0,0 +1,442 @@
+# src/ml/train.py
+
+"""
+Entrenamiento de UNet3D en CPU con torch.distributed (backend gloo).
+
+    # un nodo, 4 procesos
+    python -m ml.train --data-dir ../data_processed --out-dir ../models --nproc 4
+
+    # varios nodos (torchrun fija RANK / WORLD_SIZE / MASTER_ADDR ...)
+    torchrun --nnodes 2 --nproc-per-node 4 --rdzv-endpoint host:29500 \
+        -m ml.train --data-dir ../data_processed --out-dir ../models
+
+  - Un proceso por réplica con DistributedDataParallel; cada rank lee su
+    parte de los parches (DistributedSampler sobre DosePatchDataset) y
+    usa cpu_count / procesos-por-nodo hilos intra-op.
+  - Máscaras como label map de bits (mask_encoding="bits") expandidas a
+    one-hot en el proceso de entrenamiento (ml.dataset.expand_inputs).
+  - bf16 opcional con torch.autocast("cpu"); la pérdida se calcula en
+    float32.
+  - Gradient checkpointing opcional en los DoubleConv
+    (UNet3D.set_gradient_checkpointing).
+  - Checkpoints asíncronos: el rank 0 copia los pesos y el optimizador y
+    un hilo los escribe con ml.kb.save_dose_model (last.pt con estado
+    para reanudar, best.pt sólo con pesos), mientras sigue el
+    entrenamiento. Los dos son cargables por ml.kb.load_dose_model.
+  - Métricas por época en out_dir/train_metrics.jsonl: muestras/s
+    (global), tiempo por fase (datos, forward, backward + allreduce,
+    optimizador, checkpoint), pico de RSS por proceso y pérdidas.
+"""
+
+import argparse
+import json
+import os
+import resource
+import socket
+import threading
+import time
+from collections import defaultdict
+
+import torch
+import torch.distributed as dist
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
+
+from ml.dataset import DosePatchDataset, expand_inputs
+from ml.kb import save_dose_model
+from ml.models import UNet3D
+from ml.shards import DoseShard, list_shards
+
+
+PHASES = ("data", "forward", "backward", "optimizer", "checkpoint")
+
+
+# -------------------------------------------
+# Proceso distribuido
+# -------------------------------------------
+
+def init_distributed():
+    """
+    Inicializa el grupo gloo si el entorno lo define (torchrun o
+    launch_local). Devuelve (rank, world_size, local_world_size).
+    """
+    world_size = int(os.environ.get("WORLD_SIZE", "1"))
+    if world_size > 1 and not dist.is_initialized():
+        dist.init_process_group(backend="gloo")
+    rank = dist.get_rank() if dist.is_initialized() else 0
+    local_world = int(os.environ.get("LOCAL_WORLD_SIZE", str(world_size)))
+    return rank, world_size, local_world
+
+
+def _all_reduce(values, op="sum"):
+    """all_reduce ("sum" / "max") de una lista de floats (no-op sin grupo distribuido)."""
+    t = torch.tensor(values, dtype=torch.float64)
+    if dist.is_initialized():
+        dist.all_reduce(t, op=dist.ReduceOp.MAX if op == "max" else dist.ReduceOp.SUM)
+    return t.tolist()
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso (MB; ru_maxrss está en KB en Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+# -------------------------------------------
+# Checkpoints asíncronos
+# -------------------------------------------
+
+def _cpu_copy(obj):
+    """Copia profunda de un state_dict (tensores clonados) para escribirlo en otro hilo."""
+    if torch.is_tensor(obj):
+        return obj.detach().clone()
+    if isinstance(obj, dict):
+        return {k: _cpu_copy(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_cpu_copy(v) for v in obj)
+    return obj
+
+
+class AsyncCheckpointer:
+    """
+    Escribe checkpoints en un hilo de fondo. save() sólo copia el estado
+    (rápido) y espera a que termine la escritura anterior, así que como
+    mucho hay una escritura en curso.
+    """
+
+    def __init__(self, model, roi_order, hu_min, hu_max, spacing_mm=None):
+        self.model = model
+        self.roi_order = list(roi_order)
+        self.hu_min, self.hu_max = hu_min, hu_max
+        self.spacing_mm = spacing_mm
+        self._thread = None
+        self.error = None
+
+    def save(self, writes):
+        """writes: lista de (ruta, state_dict, extra) que se escriben en orden."""
+        self.wait()
+        writes = [(path, _cpu_copy(sd), _cpu_copy(extra)) for path, sd, extra in writes]
+
+        def _write():
+            try:
+                for path, sd, extra in writes:
+                    save_dose_model(path, self.model, self.roi_order, hu_min=self.hu_min,
+                                    hu_max=self.hu_max, spacing_mm=self.spacing_mm,
+                                    state_dict=sd, **extra)
+            except Exception as e:  # se relanza en wait()
+                self.error = e
+
+        self._thread = threading.Thread(target=_write, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+
+def training_spacing(data_dir, patient_ids):
+    """
+    Spacing (sx, sy, sz) del grid de los shards (crop_transform.out_spacing
+    de ml.preprocessing), o None si están en el grid nativo de cada CT.
+    Todos los shards deben compartirlo: el modelo sólo sirve a ese grid.
+    """
+    spacings = {}
+    for pid in patient_ids:
+        ct_meta = DoseShard(os.path.join(data_dir, pid)).meta.get("crop_transform") or {}
+        out = ct_meta.get("out_spacing")
+        spacings.setdefault(None if out is None else tuple(float(s) for s in out), pid)
+    if len(spacings) > 1:
+        found = ", ".join(f"{sp or 'CT'} ({pid})" for sp, pid in spacings.items())
+        raise ValueError(f"Los shards no comparten spacing: {found}")
+    return next(iter(spacings), None)
+
+
+# -------------------------------------------
+# Bucle de entrenamiento
+# -------------------------------------------
+
+def _run_epoch(model, loader, criterion, device, bf16, optimizer=None, max_steps=None):
+    """
+    Una pasada por loader (entrenamiento si hay optimizer). Devuelve
+    (suma de pérdidas, nº de muestras, tiempos por fase).
+    """
+    training = optimizer is not None
+    model.train(training)
+    times = defaultdict(float)
+    loss_sum, n_samples = 0.0, 0
+
+    t0 = time.perf_counter()
+    for step, (X, Y, _) in enumerate(loader):
+        if max_steps is not None and step >= max_steps:
+            break
+        X = expand_inputs(X, device)
+        Y = Y.to(device)
+        t1 = time.perf_counter()
+        times["data"] += t1 - t0
+
+        with torch.set_grad_enabled(training), torch.autocast("cpu", dtype=torch.bfloat16, enabled=bf16):
+            pred = model(X)
+        loss = criterion(pred.float(), Y)
+        t2 = time.perf_counter()
+        times["forward"] += t2 - t1
+
+        if training:
+            optimizer.zero_grad(set_to_none=True)
+            loss.backward()
+            t3 = time.perf_counter()
+            times["backward"] += t3 - t2
+            optimizer.step()
+            times["optimizer"] += time.perf_counter() - t3
+
+        loss_sum += float(loss.detach()) * X.size(0)
+        n_samples += X.size(0)
+        t0 = time.perf_counter()
+
+    return loss_sum, n_samples, times
+
+
+def train(
+    data_dir,
+    out_dir,
+    patient_ids=None,
+    val_ids=None,
+    epochs=20,
+    batch_size=2,
+    lr=1e-4,
+    base_filters=16,
+    patch_size=(64, 64, 64),
+    patches_per_patient=8,
+    num_workers=2,
+    bf16=False,
+    grad_checkpointing=False,
+    threads=None,
+    max_steps=None,
+    resume=None,
+    seed=0,
+):
+    """
+    Entrena UNet3D sobre los shards de data_dir (llamar en cada rank).
+
+    Parámetros:
+      data_dir: carpeta de shards (ml.shards / ml.pipeline)
+      out_dir: carpeta de checkpoints (last.pt, best.pt) y train_metrics.jsonl
+      patient_ids / val_ids: IDs de entrenamiento / validación (None =
+                             todos los shards para entrenar, sin validación)
+      epochs, batch_size (por rank), lr
+      base_filters: anchura de UNet3D
+      patch_size, patches_per_patient: ver DosePatchDataset
+      num_workers: workers de DataLoader por rank
+      bf16: autocast bfloat16 en CPU
+      grad_checkpointing: checkpoint de gradientes en los DoubleConv
+      threads: hilos intra-op por rank (None = cpu_count / procesos del nodo)
+      max_steps: límite de pasos por época (benchmarks)
+      resume: ruta de un last.pt para continuar
+      seed: semilla base (cada rank usa seed + rank)
+
+    Devuelve:
+      lista de métricas por época (en todos los ranks)
+    """
+    rank, world_size, local_world = init_distributed()
+    torch.manual_seed(seed + rank)
+    threads = threads or max(1, (os.cpu_count() or 1) // max(local_world, 1))
+    torch.set_num_threads(int(threads))
+    device = torch.device("cpu")
+
+    ids = sorted(patient_ids) if patient_ids is not None else list_shards(data_dir)
+    val_ids = sorted(val_ids or [])
+    ids = [pid for pid in ids if pid not in val_ids]
+    first = DoseShard(os.path.join(data_dir, ids[0]))
+    roi_order = first.roi_order
+    hu_min, hu_max = first.meta["hu_min"], first.meta["hu_max"]
+    spacing_mm = training_spacing(data_dir, ids + val_ids)
+
+    def _loader(pids, shuffle):
+        ds = DosePatchDataset(data_dir, pids, patch_size=patch_size,
+                              patches_per_patient=patches_per_patient, mask_encoding="bits")
+        sampler = DistributedSampler(ds, shuffle=shuffle, seed=seed) if world_size > 1 else None
+        loader = DataLoader(
+            ds, batch_size=batch_size, sampler=sampler, shuffle=shuffle and sampler is None,
+            num_workers=num_workers, persistent_workers=num_workers > 0, drop_last=shuffle,
+        )
+        return loader, sampler
+
+    train_loader, train_sampler = _loader(ids, shuffle=True)
+    val_loader = _loader(val_ids, shuffle=False)[0] if val_ids else None
+
+    net = UNet3D(n_channels=1 + len(roi_order), n_classes=1, base_filters=base_filters)
+    net.set_gradient_checkpointing(grad_checkpointing)
+    optimizer = torch.optim.Adam(net.parameters(), lr=lr)
+    start_epoch, best_loss = 1, float("inf")
+    if resume:
+        ckpt = torch.load(resume, map_location="cpu", weights_only=True)
+        net.load_state_dict(ckpt["state_dict"])
+        if "optimizer" in ckpt:
+            optimizer.load_state_dict(ckpt["optimizer"])
+        start_epoch = int(ckpt.get("epoch", 0)) + 1
+        best_loss = float(ckpt.get("best_loss", best_loss))
+    model = DistributedDataParallel(net) if world_size > 1 else net
+    criterion = nn.MSELoss()
+
+    checkpointer = AsyncCheckpointer(net, roi_order, hu_min, hu_max, spacing_mm) if rank == 0 else None
+    metrics_path = os.path.join(out_dir, "train_metrics.jsonl")
+    if rank == 0:
+        os.makedirs(out_dir, exist_ok=True)
+        print(f"[train] world_size={world_size}, hilos/rank={threads}, bf16={bf16}, "
+              f"grad_ckpt={grad_checkpointing}, ROIs={roi_order}, spacing={spacing_mm or 'CT'}, "
+              f"{len(ids)} pacientes")
+
+    history = []
+    for epoch in range(start_epoch, epochs + 1):
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
+        t_epoch = time.perf_counter()
+        loss_sum, n, times = _run_epoch(model, train_loader, criterion, device, bf16,
+                                        optimizer=optimizer, max_steps=max_steps)
+        train_seconds = time.perf_counter() - t_epoch
+
+        val_loss = None
+        if val_loader is not None:
+            v_sum, v_n, _ = _run_epoch(model, val_loader, criterion, device, bf16, max_steps=max_steps)
+            v_sum, v_n = _all_reduce([v_sum, v_n])
+            val_loss = v_sum / max(v_n, 1)
+
+        loss_sum, n = _all_reduce([loss_sum, n])
+        train_loss = loss_sum / max(n, 1)
+        phase = _all_reduce([times[p] for p in PHASES], "max")
+        rss = _all_reduce([peak_rss_mb()], "max")[0]
+        slowest = _all_reduce([train_seconds], "max")[0]
+
+        record = {
+            "epoch": epoch,
+            "world_size": world_size,
+            "threads_per_rank": int(threads),
+            "bf16": bool(bf16),
+            "grad_checkpointing": bool(grad_checkpointing),
+            "batch_size_per_rank": int(batch_size),
+            "patch_size": list(patch_size),
+            "samples": int(n),
+            "train_loss": train_loss,
+            "val_loss": val_loss,
+            "epoch_seconds": slowest,
+            "samples_per_sec": n / max(slowest, 1e-9),
+            "phase_seconds": dict(zip(PHASES, phase)),
+            "peak_rss_mb": rss,
+        }
+
+        if rank == 0:
+            t_ckpt = time.perf_counter()
+            score = val_loss if val_loss is not None else train_loss
+            meta = dict(epoch=epoch, train_loss=train_loss, val_loss=val_loss)
+            writes = []
+            if score < best_loss:
+                best_loss = score
+                writes.append((os.path.join(out_dir, "best.pt"), net.state_dict(), meta))
+            writes.append((os.path.join(out_dir, "last.pt"), net.state_dict(),
+                           dict(meta, optimizer=optimizer.state_dict(), best_loss=best_loss)))
+            checkpointer.save(writes)
+            # sólo la copia del estado bloquea; la escritura sigue en el hilo
+            record["phase_seconds"]["checkpoint"] = time.perf_counter() - t_ckpt
+
+            with open(metrics_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            val_txt = f", val {val_loss:.5f}" if val_loss is not None else ""
+            print(f"[train] época {epoch}: loss {train_loss:.5f}{val_txt} | "
+                  f"{record['samples_per_sec']:.2f} muestras/s | pico RSS {rss:.0f} MB | "
+                  + " ".join(f"{k} {v:.1f}s" for k, v in record["phase_seconds"].items()))
+        history.append(record)
+
+    if checkpointer is not None:
+        checkpointer.wait()
+    if dist.is_initialized():
+        dist.barrier()
+    return history
+
+
+# -------------------------------------------
+# Lanzamiento en un nodo y CLI
+# -------------------------------------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _spawn_entry(local_rank, nproc, port, kwargs):
+    os.environ.update({
+        "MASTER_ADDR": "127.0.0.1",
+        "MASTER_PORT": str(port),
+        "RANK": str(local_rank),
+        "LOCAL_RANK": str(local_rank),
+        "WORLD_SIZE": str(nproc),
+        "LOCAL_WORLD_SIZE": str(nproc),
+    })
+    try:
+        train(**kwargs)
+    finally:
+        if dist.is_initialized():
+            dist.destroy_process_group()
+
+
+def launch_local(nproc, **kwargs):
+    """Lanza train() en nproc procesos de este nodo (sin torchrun)."""
+    if nproc <= 1:
+        return train(**kwargs)
+    torch.multiprocessing.spawn(_spawn_entry, args=(nproc, _free_port(), kwargs), nprocs=nproc)
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Entrenamiento distribuido (CPU, gloo) de UNet3D")
+    parser.add_argument("--data-dir", required=True, help="carpeta de shards")
+    parser.add_argument("--out-dir", required=True, help="checkpoints y métricas")
+    parser.add_argument("--val", nargs="*", default=None, help="IDs de validación")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=2, help="por rank")
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--base-filters", type=int, default=16)
+    parser.add_argument("--patch-size", type=int, nargs=3, default=(64, 64, 64))
+    parser.add_argument("--patches-per-patient", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2, help="workers de DataLoader por rank")
+    parser.add_argument("--bf16", action="store_true")
+    parser.add_argument("--grad-checkpointing", action="store_true")
+    parser.add_argument("--threads", type=int, default=None, help="hilos intra-op por rank")
+    parser.add_argument("--max-steps", type=int, default=None, help="pasos por época (benchmark)")
+    parser.add_argument("--resume", default=None, help="last.pt para continuar")
+    parser.add_argument("--nproc", type=int, default=1, help="procesos en este nodo (sin torchrun)")
+    args = parser.parse_args(argv)
+
+    kwargs = dict(
+        data_dir=args.data_dir,
+        out_dir=args.out_dir,
+        val_ids=args.val,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        lr=args.lr,
+        base_filters=args.base_filters,
+        patch_size=tuple(args.patch_size),
+        patches_per_patient=args.patches_per_patient,
+        num_workers=args.workers,
+        bf16=args.bf16,
+        grad_checkpointing=args.grad_checkpointing,
+        threads=args.threads,
+        max_steps=args.max_steps,
+        resume=args.resume,
+    )
+    if "WORLD_SIZE" in os.environ:  # torchrun
+        try:
+            train(**kwargs)
+        finally:
+            if dist.is_initialized():
+                dist.destroy_process_group()
+    else:
+        launch_local(args.nproc, **kwargs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+# src/planning/bev.py
+
+"""
+planning/bev.py
+===============
+
+Beam's-eye-view (BEV): proyección de PTV y OARs sobre la apertura de
+cada control point.
+
+Geometría (IEC 61217, rotaciones positivas dextrógiras):
+
+  - DICOM (LPS) → sistema paciente IEC según la posición del paciente
+    (HFS, HFP, FFS, FFP).
+  - Mesa: rotación de PatientSupportAngle alrededor de Z_f.
+  - Gantry: rotación de GantryAngle alrededor de Y_f (a 0° la fuente está
+    en +Z_f, a 90° en +X_f).
+  - Colimador: rotación de BeamLimitingDeviceAngle alrededor de Z_g.
+
+Las matrices paciente → colimador se construyen para todos los CP de un
+beam a la vez ([n_cp, 3, 3]) y todos los puntos de todas las estructuras
+se proyectan en un solo einsum. La proyección es divergente (desde la
+fuente a SAD) sobre el plano del isocentro, donde DICOM define mandíbulas
+y láminas, así que el test "dentro de la apertura" reutiliza la apertura
+efectiva de core.control_points (MLC ∩ mandíbulas).
+
+Las estructuras se representan con una nube de puntos muestreada de su
+máscara (sample_mm), de modo que las fracciones por CP son fracciones de
+volumen:
+
+  - ptv_coverage[PTV][cp]: fracción del volumen del PTV cuya proyección
+    cae dentro de la apertura.
+  - oar_in_field[OAR][cp]: fracción del volumen del OAR dentro del campo.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.case import BeamInfo, Case, ControlPointArrays
+from core.control_points import effective_leaf_openings, mlc_strip_bounds
+from core.geometry import mask_bbox_slices
+from core.naming import StructCategory, is_helper_structure, normalize_structure_name
+
+
+DEFAULT_SAD_MM = 1000.0
+
+# DICOM (x, y, z) LPS → sistema paciente IEC (X: izq. paciente en HFS,
+# Y: hacia el gantry, Z: hacia arriba)
+_PATIENT_TO_IEC = {
+    "HFS": np.array([[1, 0, 0], [0, 0, 1], [0, -1, 0]], dtype=np.float64),
+    "HFP": np.array([[-1, 0, 0], [0, 0, 1], [0, 1, 0]], dtype=np.float64),
+    "FFS": np.array([[-1, 0, 0], [0, 0, -1], [0, -1, 0]], dtype=np.float64),
+    "FFP": np.array([[1, 0, 0], [0, 0, -1], [0, 1, 0]], dtype=np.float64),
+}
+
+
+# =====================================================
+# 1) Matrices de rotación vectorizadas
+# =====================================================
+
+def _rot_z(angles_rad: np.ndarray) -> np.ndarray:
+    c, s = np.cos(angles_rad), np.sin(angles_rad)
+    r = np.zeros(angles_rad.shape + (3, 3))
+    r[..., 0, 0], r[..., 0, 1] = c, -s
+    r[..., 1, 0], r[..., 1, 1] = s, c
+    r[..., 2, 2] = 1.0
+    return r
+
+
+def _rot_y(angles_rad: np.ndarray) -> np.ndarray:
+    c, s = np.cos(angles_rad), np.sin(angles_rad)
+    r = np.zeros(angles_rad.shape + (3, 3))
+    r[..., 0, 0], r[..., 0, 2] = c, s
+    r[..., 2, 0], r[..., 2, 2] = -s, c
+    r[..., 1, 1] = 1.0
+    return r
+
+
+def patient_to_bld_matrices(
+    gantry_deg: np.ndarray,
+    collimator_deg: np.ndarray,
+    couch_deg: np.ndarray,
+    patient_position: str = "HFS",
+) -> np.ndarray:
+    """
+    Matrices [n_cp, 3, 3] que llevan un vector DICOM (relativo al
+    isocentro) al sistema del colimador (beam limiting device):
+
+        R = Rz(colim)^T · Ry(gantry)^T · Rz(mesa) · M_paciente
+
+    Z_bld apunta hacia la fuente; X_bld / Y_bld son los ejes de
+    mandíbulas y láminas en el plano del isocentro.
+    """
+    pos = (patient_position or "HFS").strip().upper()
+    if pos not in _PATIENT_TO_IEC:
+        raise ValueError(f"Posición de paciente no soportada: {patient_position!r}")
+
+    g = np.radians(np.asarray(gantry_deg, dtype=np.float64))
+    c = np.radians(np.asarray(collimator_deg, dtype=np.float64))
+    t = np.radians(np.asarray(couch_deg, dtype=np.float64))
+
+    r_couch = _rot_z(t) @ _PATIENT_TO_IEC[pos]
+    r_gantry_t = np.swapaxes(_rot_y(g), -1, -2)
+    r_coll_t = np.swapaxes(_rot_z(c), -1, -2)
+    return r_coll_t @ r_gantry_t @ r_couch
+
+
+def project_points_bev(
+    points_mm: np.ndarray,
+    isocenter_mm: Sequence[float],
+    rotations: np.ndarray,
+    sad_mm: float = DEFAULT_SAD_MM,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Proyección divergente de puntos DICOM [n, 3] sobre el plano del
+    isocentro de cada CP.
+
+    Devuelve (u, v, valid), cada uno [n_cp, n]: coordenadas X_bld / Y_bld
+    en el plano del isocentro (mm) y si el punto está delante de la fuente.
+    """
+    rel = (np.asarray(points_mm, dtype=np.float32)
+           - np.asarray(isocenter_mm, dtype=np.float32)[None, :])
+    q = np.einsum("cij,nj->cin", rotations.astype(np.float32), rel, optimize=True)
+    depth = np.float32(sad_mm) - q[:, 2, :]          # distancia a la fuente en Z_bld
+    valid = depth > 1.0
+    mag = np.float32(sad_mm) / np.where(valid, depth, np.float32(sad_mm))
+    return q[:, 0, :] * mag, q[:, 1, :] * mag, valid
+
+
+# =====================================================
+# 2) Test de apertura (MLC ∩ mandíbulas)
+# =====================================================
+
+def points_in_aperture(
+    u: np.ndarray,
+    v: np.ndarray,
+    cpa: ControlPointArrays,
+) -> Optional[np.ndarray]:
+    """
+    Máscara [n_cp, n] de puntos proyectados (u = X_bld, v = Y_bld) dentro
+    de la apertura efectiva de cada CP. Sin MLC se usa el rectángulo de
+    mandíbulas; None si el beam no define ninguna de las dos cosas.
+    """
+    strips = mlc_strip_bounds(cpa)
+    openings = effective_leaf_openings(cpa)
+    if strips is not None and openings is not None:
+        axis, _, bounds = strips
+        bounds_lo, bounds_hi, left, right = openings
+        along, perp = (u, v) if axis == "X" else (v, u)
+
+        idx = np.searchsorted(bounds, perp, side="right") - 1
+        in_range = (idx >= 0) & (idx < bounds.size - 1)
+        idx = np.clip(idx, 0, bounds.size - 2)
+
+        lo = np.take_along_axis(bounds_lo, idx, axis=1)
+        hi = np.take_along_axis(bounds_hi, idx, axis=1)
+        a = np.take_along_axis(left, idx, axis=1)
+        b = np.take_along_axis(right, idx, axis=1)
+        return in_range & (perp >= lo) & (perp < hi) & (along > a) & (along < b)
+
+    if cpa.jaw_x_mm is not None and cpa.jaw_y_mm is not None:
+        jx, jy = cpa.jaw_x_mm, cpa.jaw_y_mm
+        return (
+            (u > jx[:, :1]) & (u < jx[:, 1:])
+            & (v > jy[:, :1]) & (v < jy[:, 1:])
+        )
+
+    return None
+
+
+# =====================================================
+# 3) Nubes de puntos de estructuras
+# =====================================================
+
+def structure_sample_points(
+    mask: np.ndarray,
+    spacing_zyx: Sequence[float],
+    origin_xyz: Sequence[float],
+    sample_mm: float = 3.0,
+    max_points: int = 4000,
+) -> np.ndarray:
+    """
+    Puntos DICOM (x, y, z) [n, 3] que muestrean el volumen de una máscara
+    en una rejilla de ~sample_mm (submuestreo por pasos enteros sobre su
+    bounding box). Si salen más de max_points se toma un subconjunto
+    equiespaciado.
+    """
+    sl = mask_bbox_slices(mask)
+    if sl is None:
+        return np.zeros((0, 3), dtype=np.float32)
+
+    steps = [max(1, int(round(float(sample_mm) / float(s)))) for s in spacing_zyx]
+    sub = mask[sl][::steps[0], ::steps[1], ::steps[2]]
+    idx = np.argwhere(sub)
+    if idx.shape[0] == 0:
+        # Estructura más fina que la rejilla: todos sus voxeles
+        idx = np.argwhere(mask[sl])
+        steps = [1, 1, 1]
+    if idx.shape[0] > max_points:
+        idx = idx[np.linspace(0, idx.shape[0] - 1, int(max_points)).astype(np.int64)]
+
+    start = np.array([s.start for s in sl], dtype=np.float64)
+    zyx = (idx * np.asarray(steps) + start) * np.asarray(spacing_zyx, dtype=np.float64)
+    ox, oy, oz = (float(o) for o in origin_xyz)
+    return np.stack([zyx[:, 2] + ox, zyx[:, 1] + oy, zyx[:, 0] + oz], axis=1).astype(np.float32)
+
+
+def _default_structure_names(case: Case) -> Tuple[List[str], List[str]]:
+    """PTVs y OARs clínicos del caso (sin anillos ni estructuras auxiliares)."""
+    ptvs: List[str] = []
+    oars: List[str] = []
+    for name in case.structs.keys():
+        if is_helper_structure(name):
+            continue
+        cat = normalize_structure_name(name).category
+        if cat == StructCategory.PTV:
+            ptvs.append(name)
+        elif cat == StructCategory.OAR:
+            oars.append(name)
+    return ptvs, oars
+
+
+# =====================================================
+# 4) BEV por beam
+# =====================================================
+
+def control_point_weights(cpa: ControlPointArrays) -> np.ndarray:
+    """
+    Peso relativo de cada CP: la mitad del meterset de los segmentos
+    adyacentes (suma 1). Uniforme si el beam no acumula meterset.
+    """
+    cum = np.asarray(cpa.cum_meterset_weight, dtype=np.float64)
+    n = cum.size
+    w = np.zeros(n)
+    if n > 1:
+        seg = np.clip(np.diff(cum), 0.0, None)
+        w[:-1] += 0.5 * seg
+        w[1:] += 0.5 * seg
+    total = w.sum()
+    return w / total if total > 0 else np.full(n, 1.0 / max(n, 1))
+
+
+@dataclass
+class BeamBEV:
+    """
+    Resultado BEV de un beam: ángulos y fracciones por CP ([n_cp]).
+    """
+    beam_number: int
+    beam_name: str
+    gantry_deg: np.ndarray
+    collimator_deg: np.ndarray
+    couch_deg: np.ndarray
+    cp_weights: np.ndarray
+    ptv_coverage: Dict[str, np.ndarray] = field(default_factory=dict)
+    oar_in_field: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def summary(self) -> Dict[str, Any]:
+        """Media ponderada por meterset y mínimo / máximo por estructura."""
+        def _stats(arr: np.ndarray) -> Dict[str, float]:
+            return {
+                "weighted_mean": float(np.dot(self.cp_weights, arr)),
+                "min": float(arr.min()) if arr.size else float("nan"),
+                "max": float(arr.max()) if arr.size else float("nan"),
+            }
+        return {
+            "beam_number": self.beam_number,
+            "beam_name": self.beam_name,
+            "num_control_points": int(self.gantry_deg.size),
+            "ptv_coverage": {k: _stats(v) for k, v in self.ptv_coverage.items()},
+            "oar_in_field": {k: _stats(v) for k, v in self.oar_in_field.items()},
+        }
+
+
+def compute_beam_bev(
+    beam: BeamInfo,
+    isocenter_mm: Sequence[float],
+    ptv_points: Dict[str, np.ndarray],
+    oar_points: Dict[str, np.ndarray],
+    sad_mm: float = DEFAULT_SAD_MM,
+    patient_position: str = "HFS",
+) -> Optional[BeamBEV]:
+    """
+    BEV de un beam: todas las nubes de puntos se proyectan juntas sobre
+    todos los CP. None si el beam no tiene CP o no define apertura.
+    """
+    cpa = beam.control_points
+    if cpa is None or len(cpa) == 0:
+        return None
+
+    names = list(ptv_points) + list(oar_points)
+    clouds = [ptv_points[n] if n in ptv_points else oar_points[n] for n in names]
+    sizes = [c.shape[0] for c in clouds]
+    offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+    all_pts = np.concatenate(clouds, axis=0) if clouds else np.zeros((0, 3), np.float32)
+
+    iso = cpa.isocenter_mm if cpa.isocenter_mm is not None else isocenter_mm
+    rot = patient_to_bld_matrices(cpa.gantry_deg, cpa.collimator_deg, cpa.couch_deg, patient_position)
+    u, v, valid = project_points_bev(all_pts, iso, rot, sad_mm)
+    inside = points_in_aperture(u, v, cpa)
+    if inside is None:
+        return None
+    inside &= valid
+
+    # Fracción por estructura = media de una columna de bloques contiguos
+    counts = np.add.reduceat(inside, offsets[:-1], axis=1, dtype=np.int32) if all_pts.shape[0] else None
+    result = BeamBEV(
+        beam_number=beam.beam_number,
+        beam_name=beam.beam_name,
+        gantry_deg=np.asarray(cpa.gantry_deg),
+        collimator_deg=np.asarray(cpa.collimator_deg),
+        couch_deg=np.asarray(cpa.couch_deg),
+        cp_weights=control_point_weights(cpa),
+    )
+    for k, (name, n) in enumerate(zip(names, sizes)):
+        frac = (counts[:, k] / n).astype(np.float32) if n else np.zeros(len(cpa), np.float32)
+        if name in ptv_points:
+            result.ptv_coverage[name] = frac
+        else:
+            result.oar_in_field[name] = frac
+    return result
+
+
+def compute_plan_bev(
+    case: Case,
+    ptv_names: Optional[Sequence[str]] = None,
+    oar_names: Optional[Sequence[str]] = None,
+    sample_mm: float = 3.0,
+    max_points: int = 4000,
+    sad_mm: float = DEFAULT_SAD_MM,
+    patient_position: Optional[str] = None,
+) -> List[BeamBEV]:
+    """
+    BEV de todos los beams de tratamiento del plan (los que no tienen MU,
+    p.ej. setup / kV CBCT, se omiten).
+
+    Por defecto se usan los PTVs y OARs clínicos del caso; patient_position
+    sale de case.metadata["patient_position"] si existe (HFS si no).
+    """
+    plan = case.plan
+    if plan is None or not plan.beams:
+        return []
+
+    default_ptvs, default_oars = _default_structure_names(case)
+    ptv_names = list(ptv_names) if ptv_names is not None else default_ptvs
+    oar_names = list(oar_names) if oar_names is not None else default_oars
+    position = patient_position or case.metadata.get("patient_position") or "HFS"
+
+    spacing = case.ct_spacing
+    origin = case.metadata.get("ct_origin", (0.0, 0.0, 0.0))
+
+    def _clouds(names: Sequence[str]) -> Dict[str, np.ndarray]:
+        out = {}
+        for name in names:
+            st = case.structs.get(name)
+            if st is None:
+                continue
+            pts = structure_sample_points(st.mask, spacing, origin, sample_mm, max_points)
+            if pts.shape[0]:
+                out[name] = pts
+        return out
+
+    ptv_points = _clouds(ptv_names)
+    oar_points = _clouds(oar_names)
+
+    results: List[BeamBEV] = []
+    for beam in plan.beams:
+        if not beam.monitor_units:
+            continue
+        bev = compute_beam_bev(
+            beam, plan.isocenter_mm, ptv_points, oar_points, sad_mm, position
+        )
+        if bev is not None:
+            results.append(bev)
+    return results
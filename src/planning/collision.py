@@ -0,0 +1,336 @@
+# src/planning/collision.py
+
+"""
+planning/collision.py
+=====================
+
+Cribado de colisiones gantry/mesa–paciente antes del tratamiento.
+
+La superficie del paciente (BODY) y de la mesa (COUCH) se extrae una sola
+vez como nube de puntos diezmada (voxeles de borde sobre una rejilla de
+~decimate_mm). Para cada control point la nube se lleva al sistema del
+colimador con las mismas matrices vectorizadas que el BEV
+(planning.bev.patient_to_bld_matrices), así que las rotaciones de mesa
+(couch kicks) entran solas.
+
+Modelos de máquina (qa.config.MACHINE_PROFILES):
+
+  - C_ARM: el cabezal es un cilindro de radio head_radius_mm cuya cara
+    está a head_clearance_mm del isocentro, en el eje del haz. Sólo los
+    puntos a más de head_clearance_mm - search_margin_mm del isocentro
+    pueden acercarse al cabezal; sobre esa cáscara se construye un
+    KD-tree (scipy.spatial.cKDTree, opcional) que selecciona, para todos
+    los CP en una sola consulta, los candidatos cercanos al cabezal. La
+    distancia exacta al cilindro se calcula sólo sobre ellos.
+  - RING (Halcyon / Ethos): el gantry está encerrado en un anillo de
+    radio bore_radius_mm; la holgura es bore - distancia radial al eje de
+    rotación, independiente del ángulo de gantry.
+
+Holgura <= 0 → el modelo predice contacto. Sin scipy se calcula la
+distancia exacta a todos los puntos (mismo resultado, más lento).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.case import BeamInfo, Case
+from core.geometry import mask_bbox_slices
+from core.naming import StructCategory, normalize_structure_name
+from planning.bev import patient_to_bld_matrices
+
+try:  # dependencia opcional: sólo acelera la búsqueda de candidatos
+    from scipy.spatial import cKDTree
+except ImportError:  # pragma: no cover
+    cKDTree = None
+
+
+# =====================================================
+# 1) Superficie diezmada
+# =====================================================
+
+def surface_points_from_mask(
+    mask: np.ndarray,
+    spacing_zyx: Sequence[float],
+    origin_xyz: Sequence[float],
+    decimate_mm: float = 5.0,
+) -> np.ndarray:
+    """
+    Puntos DICOM (x, y, z) [n, 3] de la superficie de una máscara.
+
+    La máscara se submuestrea por pasos enteros (~decimate_mm) sobre su
+    bounding box y se toman los voxeles con algún vecino-6 fuera.
+    """
+    sl = mask_bbox_slices(mask)
+    if sl is None:
+        return np.zeros((0, 3), dtype=np.float32)
+
+    steps = [max(1, int(round(float(decimate_mm) / float(s)))) for s in spacing_zyx]
+    sub = mask[sl][::steps[0], ::steps[1], ::steps[2]].astype(bool, copy=False)
+    pad = np.pad(sub, 1, constant_values=False)
+    interior = (
+        pad[:-2, 1:-1, 1:-1] & pad[2:, 1:-1, 1:-1]
+        & pad[1:-1, :-2, 1:-1] & pad[1:-1, 2:, 1:-1]
+        & pad[1:-1, 1:-1, :-2] & pad[1:-1, 1:-1, 2:]
+    )
+    idx = np.argwhere(sub & ~interior)
+
+    start = np.array([s.start for s in sl], dtype=np.float64)
+    zyx = (idx * np.asarray(steps) + start) * np.asarray(spacing_zyx, dtype=np.float64)
+    ox, oy, oz = (float(o) for o in origin_xyz)
+    return np.stack([zyx[:, 2] + ox, zyx[:, 1] + oy, zyx[:, 0] + oz], axis=1).astype(np.float32)
+
+
+@dataclass
+class SurfaceCloud:
+    """
+    Nube de superficie (paciente + mesa). labels[i] indexa names: de qué
+    estructura viene cada punto.
+
+    far_shell() guarda, por isocentro, los puntos lejanos al isocentro y
+    su KD-tree; es lo único que puede acercarse a un cabezal C-arm.
+    """
+    points_mm: np.ndarray
+    labels: np.ndarray
+    names: List[str]
+    _shells: Dict[Tuple, Tuple[np.ndarray, Any]] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_case(
+        cls,
+        case: Case,
+        categories: Sequence[StructCategory] = (StructCategory.BODY, StructCategory.COUCH),
+        decimate_mm: float = 5.0,
+    ) -> "SurfaceCloud":
+        origin = case.metadata.get("ct_origin", (0.0, 0.0, 0.0))
+        clouds, labels, names = [], [], []
+        for name in case.structs.keys():
+            if normalize_structure_name(name).category not in categories:
+                continue
+            pts = surface_points_from_mask(case.structs[name].mask, case.ct_spacing, origin, decimate_mm)
+            if pts.shape[0] == 0:
+                continue
+            labels.append(np.full(pts.shape[0], len(names), dtype=np.int32))
+            clouds.append(pts)
+            names.append(name)
+        points = np.concatenate(clouds) if clouds else np.zeros((0, 3), np.float32)
+        lab = np.concatenate(labels) if labels else np.zeros(0, np.int32)
+        return cls(points_mm=points, labels=lab, names=names)
+
+    def far_shell(self, isocenter_mm: np.ndarray, min_distance_mm: float) -> Tuple[np.ndarray, Any]:
+        """
+        (índices de los puntos a >= min_distance_mm del isocentro, KD-tree
+        sobre ellos o None sin scipy). Se calcula una vez por isocentro.
+        """
+        key = (tuple(np.round(np.asarray(isocenter_mm, dtype=float), 3)), round(float(min_distance_mm), 3))
+        if key not in self._shells:
+            dist = np.linalg.norm(self.points_mm - np.asarray(isocenter_mm, dtype=np.float32), axis=1)
+            idx = np.flatnonzero(dist >= min_distance_mm)
+            tree = cKDTree(self.points_mm[idx]) if (cKDTree is not None and idx.size) else None
+            self._shells[key] = (idx, tree)
+        return self._shells[key]
+
+
+# =====================================================
+# 2) Holgura por control point
+# =====================================================
+
+def _cylinder_distance(q: np.ndarray, clearance_mm: float, radius_mm: float) -> np.ndarray:
+    """
+    Distancia con signo de puntos en coordenadas del colimador (q[..., 3],
+    Z hacia la fuente) a un cilindro semi-infinito de radio radius_mm con
+    la cara en z = clearance_mm. Negativa dentro del cilindro.
+    """
+    r = np.hypot(q[..., 0], q[..., 1])
+    dz = clearance_mm - q[..., 2]           # > 0: por debajo de la cara
+    dr = r - radius_mm                      # > 0: fuera del radio
+    outside = np.where(
+        dz > 0,
+        np.where(dr > 0, np.hypot(dr, dz), dz),
+        dr,
+    )
+    inside = (dz <= 0) & (dr <= 0)
+    return np.where(inside, -np.minimum(-dz, -dr), outside)
+
+
+@dataclass
+class BeamClearance:
+    """Holgura (mm) por CP de un beam y punto/estructura más cercanos."""
+    beam_number: int
+    beam_name: str
+    gantry_deg: np.ndarray
+    couch_deg: np.ndarray
+    clearance_mm: np.ndarray
+    closest_structure: List[Optional[str]] = field(default_factory=list)
+    closest_point_mm: Optional[np.ndarray] = None
+
+    def summary(self) -> Dict[str, Any]:
+        k = int(np.argmin(self.clearance_mm)) if self.clearance_mm.size else None
+        return {
+            "beam_number": self.beam_number,
+            "beam_name": self.beam_name,
+            "num_control_points": int(self.clearance_mm.size),
+            "min_clearance_mm": float(self.clearance_mm[k]) if k is not None else None,
+            "gantry_at_min_deg": float(self.gantry_deg[k]) if k is not None else None,
+            "couch_at_min_deg": float(self.couch_deg[k]) if k is not None else None,
+            "closest_structure": self.closest_structure[k] if k is not None else None,
+            "closest_point_mm": (
+                tuple(float(v) for v in self.closest_point_mm[k])
+                if k is not None and self.closest_point_mm is not None else None
+            ),
+        }
+
+
+def _c_arm_clearance(
+    cloud: SurfaceCloud,
+    rot: np.ndarray,
+    iso: np.ndarray,
+    clearance_mm: float,
+    radius_mm: float,
+    search_margin_mm: float,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (holgura [n_cp], índice del punto más cercano [n_cp], -1 si ninguno
+    está a menos de search_margin_mm; entonces la holgura es el margen).
+
+    Un punto a < m del cabezal está a >= clearance - m del isocentro, así
+    que sólo se consulta esa "cáscara" lejana de la nube.
+    """
+    n_cp = rot.shape[0]
+    clr = np.full(n_cp, float(search_margin_mm))
+    best = np.full(n_cp, -1, dtype=np.int64)
+
+    shell_idx, tree = cloud.far_shell(iso, max(clearance_mm - search_margin_mm, 0.0))
+    if shell_idx.size == 0:
+        return clr, best
+    pts = cloud.points_mm[shell_idx].astype(np.float64)
+
+    if tree is None:
+        # Sin KD-tree: distancia exacta a toda la cáscara
+        q = np.einsum("cij,nj->cni", rot, pts - iso)
+        d = _cylinder_distance(q, clearance_mm, radius_mm)
+        k = np.argmin(d, axis=1)
+        dmin = d[np.arange(n_cp), k]
+        near = dmin <= search_margin_mm
+        clr[near] = dmin[near]
+        best[near] = shell_idx[k[near]]
+        return clr, best
+
+    # Centro de la cara del cabezal en coordenadas DICOM, para todos los CP
+    # (R es ortogonal: R^T lleva del colimador al paciente). Un punto a < m
+    # del cabezal cumple r < R + m y clearance - m < z <= |p - iso|, así
+    # que cae en el cilindro truncado a la altura h que alcanza la cáscara;
+    # la bola de radio su semidiagonal hypot(R + m, max(h, m)) lo contiene.
+    centers = iso + np.einsum("cji,j->ci", rot, np.array([0.0, 0.0, clearance_mm]))
+    h = float(np.sqrt(np.max(np.sum((pts - iso) ** 2, axis=1)))) - clearance_mm
+    ball = float(np.hypot(radius_mm + search_margin_mm, max(h, search_margin_mm)))
+    lists = tree.query_ball_point(centers, r=ball)
+
+    sizes = np.fromiter((len(l) for l in lists), dtype=np.int64, count=n_cp)
+    if sizes.sum() == 0:
+        return clr, best
+
+    cand = np.fromiter((i for l in lists for i in l), dtype=np.int64, count=int(sizes.sum()))
+    cp_of = np.repeat(np.arange(n_cp), sizes)
+    q = np.einsum("kij,kj->ki", rot[cp_of], pts[cand] - iso)
+    d = _cylinder_distance(q, clearance_mm, radius_mm)
+
+    # Mínimo por CP sobre bloques contiguos de candidatos, y su posición
+    has = sizes > 0
+    offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])[has]
+    dmin = np.minimum.reduceat(d, offsets)
+    is_min = d == np.repeat(dmin, sizes[has])
+    pos = -np.maximum.reduceat(np.where(is_min, -np.arange(d.size), -d.size), offsets)
+
+    near = dmin <= search_margin_mm
+    rows = np.flatnonzero(has)[near]
+    clr[rows] = dmin[near]
+    best[rows] = shell_idx[cand[pos[near]]]
+    return clr, best
+
+
+def compute_beam_clearance(
+    beam: BeamInfo,
+    cloud: SurfaceCloud,
+    isocenter_mm: Sequence[float],
+    machine: Dict[str, Any],
+    patient_position: str = "HFS",
+    search_margin_mm: float = 100.0,
+) -> Optional[BeamClearance]:
+    """
+    Holgura cabezal/anillo–superficie en cada CP de un beam.
+    None si el beam no tiene CP o no hay superficie.
+    """
+    cpa = beam.control_points
+    if cpa is None or len(cpa) == 0 or cloud.points_mm.shape[0] == 0:
+        return None
+
+    iso = np.asarray(
+        cpa.isocenter_mm if cpa.isocenter_mm is not None else isocenter_mm, dtype=np.float64
+    )
+    rot = patient_to_bld_matrices(cpa.gantry_deg, cpa.collimator_deg, cpa.couch_deg, patient_position)
+
+    if str(machine.get("gantry_type", "C_ARM")).upper() == "RING":
+        # Distancia radial al eje de rotación del gantry (Y_f) en el
+        # sistema fijo: sólo depende de la mesa, una vez por ángulo de mesa
+        couch_u, inv = np.unique(np.asarray(cpa.couch_deg, dtype=np.float64), return_inverse=True)
+        zeros = np.zeros(couch_u.size)
+        fixed = patient_to_bld_matrices(zeros, zeros, couch_u, patient_position)
+        q = np.einsum("cij,nj->cni", fixed, cloud.points_mm.astype(np.float64) - iso)
+        radial = np.hypot(q[..., 0], q[..., 2])
+        far = np.argmax(radial, axis=1)
+        best = far[inv]
+        clr = float(machine.get("bore_radius_mm", 500.0)) - radial[np.arange(couch_u.size), far][inv]
+    else:
+        clr, best = _c_arm_clearance(
+            cloud, rot, iso,
+            float(machine.get("head_clearance_mm", 400.0)),
+            float(machine.get("head_radius_mm", 350.0)),
+            float(search_margin_mm),
+        )
+
+    return BeamClearance(
+        beam_number=beam.beam_number,
+        beam_name=beam.beam_name,
+        gantry_deg=np.asarray(cpa.gantry_deg),
+        couch_deg=np.asarray(cpa.couch_deg),
+        clearance_mm=np.asarray(clr, dtype=np.float32),
+        closest_structure=[cloud.names[cloud.labels[i]] if i >= 0 else None for i in best],
+        closest_point_mm=np.where(
+            (best >= 0)[:, None], cloud.points_mm[np.maximum(best, 0)], np.nan
+        ),
+    )
+
+
+def compute_plan_clearance(
+    case: Case,
+    machine: Dict[str, Any],
+    beams: Optional[Sequence[BeamInfo]] = None,
+    decimate_mm: float = 5.0,
+    include_couch: bool = True,
+    search_margin_mm: float = 100.0,
+    patient_position: Optional[str] = None,
+) -> Tuple[List[BeamClearance], SurfaceCloud]:
+    """
+    Holgura por CP de todos los beams (por defecto los del plan). La nube
+    de superficie se construye una vez y se comparte entre beams.
+    """
+    plan = case.plan
+    if plan is None:
+        return [], SurfaceCloud(np.zeros((0, 3), np.float32), np.zeros(0, np.int32), [])
+
+    cats = (StructCategory.BODY, StructCategory.COUCH) if include_couch else (StructCategory.BODY,)
+    cloud = SurfaceCloud.from_case(case, cats, decimate_mm)
+    position = patient_position or case.metadata.get("patient_position") or "HFS"
+
+    results: List[BeamClearance] = []
+    for beam in (beams if beams is not None else plan.beams):
+        res = compute_beam_clearance(
+            beam, cloud, plan.isocenter_mm, machine, position, search_margin_mm
+        )
+        if res is not None:
+            results.append(res)
+    return results, cloud
@@ -0,0 +1,516 @@
+# src/planning/drr.py
+
+"""
+planning/drr.py
+===============
+
+DRR (digitally reconstructed radiograph) a partir de case.ct_hu para los
+campos de setup y los ángulos de inicio de los arcos; base del chequeo
+visual de isocentro en la UI.
+
+Geometría: la misma que planning.bev (matrices paciente → colimador de
+patient_to_bld_matrices). La imagen se define en el plano del isocentro
+(u = X_bld, v = Y_bld, en mm), así que una proyección BEV de PTV/OARs o
+de la apertura se superpone directamente sobre el DRR:
+
+  - fila 0 = v máximo (arriba), columna 0 = u mínimo;
+  - la fuente está en Z_bld = +SAD.
+
+Atenuación: μ = μ_agua · max(0, 1 + HU / 1000), de modo que aire y el
+padding del CT (< -1000 HU) no contribuyen. El DRR es la integral de
+línea ∫ μ dl (adimensional); to_uint8() la pasa a escala de grises.
+
+Ray casting (método de Joseph en factorización shear-warp):
+
+  - Se elige el eje principal del volumen (el más alineado con el haz) y
+    cada rayo se muestrea exactamente en los planos de cortes de ese eje,
+    con interpolación bilineal dentro del corte.
+  - Los rayos se parametrizan por su intersección con un plano intermedio
+    paralelo a los cortes (a través del isocentro), en una rejilla de
+    paso 1 voxel. Entre planos paralelos la proyección cónica es escala +
+    traslación, así que en cada corte las coordenadas de muestreo son
+    separables: una lerp sobre filas enteras y otra sobre columnas, para
+    bloques de cortes a la vez (vectorizado con gathers de NumPy).
+  - La longitud de paso por corte es constante a lo largo de cada rayo y
+    se aplica una sola vez al final.
+  - Warp final del plano intermedio al detector (512×512 por defecto) con
+    una interpolación bilineal por píxel.
+
+Los bloques de cortes se reparten en un ThreadPoolExecutor (NumPy libera
+el GIL en los gathers y la aritmética, como en core.gamma).
+
+Caché:
+  - El volumen de atenuación (recortado al bounding box del paciente y
+    reagrupado a ~grid_mm) se guarda por huella del CT.
+  - Cada DRR se guarda por (huella del CT, ángulos, isocentro, geometría).
+  - La huella (SHA-1 de los datos, spacing y origen) se memoiza por objeto
+    array: el CT del Case se trata como de sólo lectura.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.case import BeamInfo, Case
+from core.geometry import mask_bbox_slices
+from planning.bev import DEFAULT_SAD_MM, patient_to_bld_matrices
+
+
+DEFAULT_FOV_MM = 400.0
+DEFAULT_NPIX = 512
+DEFAULT_GRID_MM = 2.0
+DEFAULT_MU_WATER_PER_MM = 0.02     # ~70 keV (kV de imagen)
+BODY_HU_THRESHOLD = -800.0         # recorte del volumen al paciente + mesa
+
+VOLUME_CACHE_SIZE = 2
+DRR_CACHE_SIZE = 64
+
+
+# =====================================================
+# 1) Huella del CT y cachés
+# =====================================================
+
+_FINGERPRINTS: Dict[int, Tuple[Any, str]] = {}
+_VOLUME_CACHE: "OrderedDict[Tuple, AttenuationVolume]" = OrderedDict()
+_DRR_CACHE: "OrderedDict[Tuple, np.ndarray]" = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+
+def ct_fingerprint(
+    ct_hu: np.ndarray,
+    spacing_zyx: Sequence[float],
+    origin_xyz: Sequence[float],
+) -> str:
+    """
+    SHA-1 de la forma, tipo, datos, spacing y origen del CT. Se memoiza
+    por objeto array (mientras siga vivo; al liberarse, un callback del
+    weakref borra la entrada), así que recalcular DRRs del mismo Case no
+    vuelve a recorrer los datos.
+    """
+    geom = repr((
+        tuple(ct_hu.shape), str(ct_hu.dtype),
+        tuple(round(float(s), 6) for s in spacing_zyx),
+        tuple(round(float(o), 6) for o in origin_xyz),
+    ))
+    memo = _FINGERPRINTS.get(id(ct_hu))
+    if memo is not None and memo[0]() is ct_hu and memo[1].startswith(geom):
+        return memo[1][len(geom):]
+
+    h = hashlib.sha1(geom.encode("utf-8"))
+    h.update(memoryview(np.ascontiguousarray(ct_hu)).cast("B"))
+    digest = h.hexdigest()
+    key = id(ct_hu)
+
+    def _forget(dead_ref, key=key):
+        # El array se liberó: se quita su entrada (salvo que el id ya se
+        # haya reutilizado para otro array con su propia entrada)
+        memo = _FINGERPRINTS.get(key)
+        if memo is not None and memo[0] is dead_ref:
+            _FINGERPRINTS.pop(key, None)
+
+    try:
+        ref = weakref.ref(ct_hu, _forget)
+    except TypeError:
+        return digest
+    _FINGERPRINTS[key] = (ref, geom + digest)
+    return digest
+
+
+def _cache_get(cache: OrderedDict, key: Tuple) -> Any:
+    with _CACHE_LOCK:
+        value = cache.get(key)
+        if value is not None:
+            cache.move_to_end(key)
+        return value
+
+
+def _cache_put(cache: OrderedDict, key: Tuple, value: Any, max_size: int) -> None:
+    with _CACHE_LOCK:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+
+def clear_drr_cache() -> None:
+    """Vacía las cachés de volúmenes, DRRs y huellas."""
+    with _CACHE_LOCK:
+        _VOLUME_CACHE.clear()
+        _DRR_CACHE.clear()
+        _FINGERPRINTS.clear()
+
+
+# =====================================================
+# 2) Volumen de atenuación
+# =====================================================
+
+@dataclass
+class AttenuationVolume:
+    """
+    μ relativo al agua (1 + HU/1000, ≥ 0) recortado al paciente, reagrupado
+    a ~grid_mm y con un borde de un voxel a 0 (los rayos que salen del
+    volumen muestrean ceros).
+
+    origin_xyz es la posición DICOM del voxel [0, 0, 0] de mu.
+    """
+    mu: np.ndarray                          # [nz, ny, nx] float32
+    spacing_zyx: Tuple[float, float, float]
+    origin_xyz: Tuple[float, float, float]
+    fingerprint: str
+    _by_axis: Dict[int, np.ndarray] = field(default_factory=dict, repr=False)
+
+    def along_axis(self, axis: int) -> np.ndarray:
+        """Copia contigua con `axis` como primer eje (el resto en orden)."""
+        if axis == 0:
+            return self.mu
+        arr = self._by_axis.get(axis)
+        if arr is None:
+            arr = np.ascontiguousarray(np.moveaxis(self.mu, axis, 0))
+            self._by_axis[axis] = arr
+        return arr
+
+
+def _bin_volume(vol: np.ndarray, factors: Sequence[int]) -> np.ndarray:
+    """Media por bloques enteros (se descartan los voxeles sobrantes del final)."""
+    fz, fy, fx = (int(f) for f in factors)
+    if fz == fy == fx == 1:
+        return vol
+    nz, ny, nx = (s // f for s, f in zip(vol.shape, (fz, fy, fx)))
+    vol = vol[: nz * fz, : ny * fy, : nx * fx]
+    return vol.reshape(nz, fz, ny, fy, nx, fx).mean(axis=(1, 3, 5), dtype=np.float32)
+
+
+def prepare_attenuation_volume(
+    ct_hu: np.ndarray,
+    spacing_zyx: Sequence[float],
+    origin_xyz: Sequence[float],
+    grid_mm: Optional[float] = DEFAULT_GRID_MM,
+    fingerprint: Optional[str] = None,
+) -> AttenuationVolume:
+    """
+    Construye (o recupera de la caché) el volumen de atenuación de un CT.
+    Con grid_mm cada eje se reagrupa por el factor entero que acerca su
+    spacing a grid_mm sin pasarse; None mantiene la resolución nativa.
+    """
+    spacing = tuple(float(s) for s in spacing_zyx)
+    origin = tuple(float(o) for o in origin_xyz)
+    fp = fingerprint or ct_fingerprint(ct_hu, spacing, origin)
+    key = (fp, float(grid_mm or 0.0))
+    cached = _cache_get(_VOLUME_CACHE, key)
+    if cached is not None:
+        return cached
+
+    sl = mask_bbox_slices(ct_hu > BODY_HU_THRESHOLD)
+    if sl is None:
+        sl = tuple(slice(0, n) for n in ct_hu.shape)
+
+    factors = [max(1, int(float(grid_mm) // s)) if grid_mm else 1 for s in spacing]
+    mu = np.clip(ct_hu[sl].astype(np.float32) * np.float32(1e-3) + np.float32(1.0), 0.0, None)
+    mu = _bin_volume(mu, factors)
+    mu = np.pad(mu, 1, mode="constant").astype(np.float32, copy=False)
+
+    new_spacing = tuple(s * f for s, f in zip(spacing, factors))
+    # Centro del primer bloque, menos el borde añadido
+    start_zyx = [
+        (s.start + 0.5 * (f - 1)) * sp - nsp
+        for s, f, sp, nsp in zip(sl, factors, spacing, new_spacing)
+    ]
+    volume = AttenuationVolume(
+        mu=mu,
+        spacing_zyx=new_spacing,
+        origin_xyz=(origin[0] + start_zyx[2], origin[1] + start_zyx[1], origin[2] + start_zyx[0]),
+        fingerprint=fp,
+    )
+    _cache_put(_VOLUME_CACHE, key, volume, VOLUME_CACHE_SIZE)
+    return volume
+
+
+# =====================================================
+# 3) Ray casting
+# =====================================================
+
+def _detector_axes(npix: int, fov_mm: float) -> Tuple[np.ndarray, np.ndarray, float]:
+    """Coordenadas u (columnas) y v (filas, de arriba a abajo) de los píxeles."""
+    px = float(fov_mm) / int(npix)
+    centers = (np.arange(int(npix)) + 0.5) * px - 0.5 * float(fov_mm)
+    return centers, centers[::-1].copy(), px
+
+
+def _lerp_indices(coords: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Índice inferior y fracción para interpolar en [0, n-1] (fuera → borde nulo)."""
+    c = np.clip(coords, 0.0, n - 1.0)
+    i0 = np.minimum(c.astype(np.int64), n - 2)
+    return i0, (c - i0).astype(np.float32)
+
+
+def _march_slices(
+    vol: np.ndarray,
+    ks: np.ndarray,
+    lam: np.ndarray,
+    b_coords: np.ndarray,
+    c_coords: np.ndarray,
+    s_b: float,
+    s_c: float,
+) -> np.ndarray:
+    """
+    Suma de las muestras bilineales de los cortes ks ([K]) para la rejilla
+    intermedia (b_coords × c_coords). lam[k] es la escala del corte k
+    respecto al plano intermedio.
+    """
+    _, nb, nc = vol.shape
+    bi0, bf = _lerp_indices(s_b + lam[:, None] * (b_coords[None, :] - s_b), nb)
+    ci0, cf = _lerp_indices(s_c + lam[:, None] * (c_coords[None, :] - s_c), nc)
+
+    kk = ks[:, None]
+    rows = vol[kk, bi0] * (1.0 - bf)[..., None] + vol[kk, bi0 + 1] * bf[..., None]  # [K, Mb, nc]
+    c0 = np.take_along_axis(rows, ci0[:, None, :], axis=2)
+    c1 = np.take_along_axis(rows, ci0[:, None, :] + 1, axis=2)
+    cf = cf[:, None, :]
+    return (c0 * (1.0 - cf) + c1 * cf).sum(axis=0, dtype=np.float32)
+
+
+def _bilinear_2d(img: np.ndarray, r: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """Muestreo bilineal de img en coordenadas continuas (fuera → 0)."""
+    padded = np.pad(img, 1, mode="constant")
+    ri, rf = _lerp_indices(r + 1.0, padded.shape[0])
+    ci, cf = _lerp_indices(c + 1.0, padded.shape[1])
+    top = padded[ri, ci] * (1.0 - cf) + padded[ri, ci + 1] * cf
+    bot = padded[ri + 1, ci] * (1.0 - cf) + padded[ri + 1, ci + 1] * cf
+    return top * (1.0 - rf) + bot * rf
+
+
+def cast_drr(
+    volume: AttenuationVolume,
+    rotation: np.ndarray,
+    isocenter_mm: Sequence[float],
+    sad_mm: float = DEFAULT_SAD_MM,
+    fov_mm: float = DEFAULT_FOV_MM,
+    npix: int = DEFAULT_NPIX,
+    mu_water_per_mm: float = DEFAULT_MU_WATER_PER_MM,
+    slab_size: int = 8,
+    n_workers: Optional[int] = None,
+) -> np.ndarray:
+    """
+    Integral de línea [npix, npix] (float32) para una matriz paciente →
+    colimador ([3, 3], ver planning.bev.patient_to_bld_matrices).
+    """
+    rot_t = np.asarray(rotation, dtype=np.float64).T
+    iso = np.asarray(isocenter_mm, dtype=np.float64)
+    spacing = np.asarray(volume.spacing_zyx, dtype=np.float64)
+    origin_zyx = np.asarray(volume.origin_xyz, dtype=np.float64)[::-1]
+
+    def to_index(p_xyz: np.ndarray) -> np.ndarray:
+        return (p_xyz[..., ::-1] - origin_zyx) / spacing
+
+    src = to_index(iso + rot_t @ np.array([0.0, 0.0, float(sad_mm)]))
+    iso_idx = to_index(iso)
+
+    # Eje principal: el de mayor componente del rayo central en índices
+    axis = int(np.argmax(np.abs(iso_idx - src)))
+    b_ax, c_ax = [a for a in range(3) if a != axis]
+    vol = volume.along_axis(axis)
+    n_a, nb, nc = vol.shape
+    k0 = float(iso_idx[axis])
+    s_a, s_b, s_c = float(src[axis]), float(src[b_ax]), float(src[c_ax])
+
+    # Intersección de los rayos de los píxeles con el plano intermedio k0
+    u, v, _ = _detector_axes(npix, fov_mm)
+    uu, vv = np.meshgrid(u, v)
+    pix = to_index(iso + np.stack([uu, vv, np.zeros_like(uu)], axis=-1) @ rot_t.T)
+    t0 = (k0 - s_a) / (pix[..., axis] - s_a)
+    qb = s_b + t0 * (pix[..., b_ax] - s_b)
+    qc = s_c + t0 * (pix[..., c_ax] - s_c)
+
+    # Cortes delante de la fuente y su escala respecto al plano intermedio
+    ks = np.arange(n_a, dtype=np.int64)
+    lam = (ks - s_a) / (k0 - s_a)
+    keep = lam > 0
+    ks, lam = ks[keep], lam[keep]
+    out = np.zeros((int(npix), int(npix)), dtype=np.float32)
+    if ks.size == 0:
+        return out
+
+    # Rejilla intermedia (paso 1 voxel): cobertura del detector ∩ preimagen
+    # del volumen en el rango de escalas
+    def grid(q: np.ndarray, s: float, n: int) -> np.ndarray:
+        pre = [s + (edge - s) / l for edge in (0.0, n - 1.0) for l in (lam.min(), lam.max())]
+        lo = max(np.floor(q.min()) - 1.0, np.floor(min(pre)) - 1.0)
+        hi = min(np.ceil(q.max()) + 1.0, np.ceil(max(pre)) + 1.0)
+        return np.arange(lo, hi + 1.0) if hi > lo else np.zeros(0)
+
+    b_coords, c_coords = grid(qb, s_b, nb), grid(qc, s_c, nc)
+    if b_coords.size < 2 or c_coords.size < 2:
+        return out
+
+    slabs = [(i, min(i + int(slab_size), ks.size)) for i in range(0, ks.size, int(slab_size))]
+
+    def run_slab(i0: int, i1: int) -> np.ndarray:
+        return _march_slices(vol, ks[i0:i1], lam[i0:i1], b_coords, c_coords, s_b, s_c)
+
+    workers = n_workers or os.cpu_count() or 1
+    if workers > 1 and len(slabs) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            partial = list(pool.map(lambda s: run_slab(*s), slabs))
+    else:
+        partial = [run_slab(*s) for s in slabs]
+    line = np.sum(partial, axis=0, dtype=np.float32)
+
+    # Longitud (mm) por corte de cada rayo de la rejilla intermedia
+    db = (b_coords - s_b) / (k0 - s_a)
+    dc = (c_coords - s_c) / (k0 - s_a)
+    step_mm = np.sqrt(
+        spacing[axis] ** 2
+        + (db[:, None] * spacing[b_ax]) ** 2
+        + (dc[None, :] * spacing[c_ax]) ** 2
+    ).astype(np.float32)
+    line *= step_mm * np.float32(mu_water_per_mm)
+
+    out[:] = _bilinear_2d(line, qb - b_coords[0], qc - c_coords[0])
+    return out
+
+
+# =====================================================
+# 4) DRRs del plan
+# =====================================================
+
+@dataclass
+class DRR:
+    """
+    DRR en el plano del isocentro: image[fila, columna] con fila 0 en
+    v = +fov/2 y columna 0 en u = -fov/2 (mm, ejes X_bld / Y_bld).
+    """
+    image: np.ndarray
+    gantry_deg: float
+    collimator_deg: float
+    couch_deg: float
+    fov_mm: float
+    pixel_mm: float
+    beam_number: Optional[int] = None
+    beam_name: Optional[str] = None
+    kind: str = ""                     # "SETUP", "ARC_START" o "FIELD"
+
+    def extent_mm(self) -> Tuple[float, float, float, float]:
+        """(u_min, u_max, v_min, v_max) para superponer proyecciones BEV."""
+        h = 0.5 * self.fov_mm
+        return (-h, h, -h, h)
+
+    def to_uint8(self, low_pct: float = 1.0, high_pct: float = 99.5) -> np.ndarray:
+        """Escala de grises (hueso claro) con ventana por percentiles."""
+        img = self.image
+        lo, hi = np.percentile(img, [low_pct, high_pct])
+        if hi <= lo:
+            return np.zeros(img.shape, dtype=np.uint8)
+        return (np.clip((img - lo) / (hi - lo), 0.0, 1.0) * 255.0).astype(np.uint8)
+
+
+def compute_drr(
+    case: Case,
+    gantry_deg: float,
+    collimator_deg: float = 0.0,
+    couch_deg: float = 0.0,
+    isocenter_mm: Optional[Sequence[float]] = None,
+    patient_position: Optional[str] = None,
+    sad_mm: float = DEFAULT_SAD_MM,
+    fov_mm: float = DEFAULT_FOV_MM,
+    npix: int = DEFAULT_NPIX,
+    grid_mm: Optional[float] = DEFAULT_GRID_MM,
+    mu_water_per_mm: float = DEFAULT_MU_WATER_PER_MM,
+    n_workers: Optional[int] = None,
+) -> DRR:
+    """
+    DRR del CT del caso para unos ángulos dados. Por defecto el isocentro
+    es el del plan y la posición del paciente la de case.metadata (HFS si
+    no hay). Los resultados se cachean por (huella del CT, ángulos).
+    """
+    if isocenter_mm is None:
+        if case.plan is None:
+            raise ValueError("compute_drr necesita isocenter_mm o un plan con isocentro")
+        isocenter_mm = case.plan.isocenter_mm
+    position = (patient_position or case.metadata.get("patient_position") or "HFS").strip().upper()
+    spacing = tuple(float(s) for s in case.ct_spacing)
+    origin = tuple(float(o) for o in case.metadata.get("ct_origin", (0.0, 0.0, 0.0)))
+
+    ct = case.ct_hu
+    fp = ct_fingerprint(ct, spacing, origin)
+    angles = tuple(round(float(a), 1) for a in (gantry_deg, collimator_deg, couch_deg))
+    key = (
+        fp, angles, tuple(round(float(x), 2) for x in isocenter_mm), position,
+        float(sad_mm), float(fov_mm), int(npix), float(grid_mm or 0.0), float(mu_water_per_mm),
+    )
+
+    image = _cache_get(_DRR_CACHE, key)
+    if image is None:
+        volume = prepare_attenuation_volume(ct, spacing, origin, grid_mm, fingerprint=fp)
+        rot = patient_to_bld_matrices(
+            np.array([angles[0]]), np.array([angles[1]]), np.array([angles[2]]), position
+        )[0]
+        image = cast_drr(
+            volume, rot, isocenter_mm, sad_mm, fov_mm, npix, mu_water_per_mm,
+            n_workers=n_workers,
+        )
+        image.setflags(write=False)
+        _cache_put(_DRR_CACHE, key, image, DRR_CACHE_SIZE)
+
+    return DRR(
+        image=image,
+        gantry_deg=angles[0],
+        collimator_deg=angles[1],
+        couch_deg=angles[2],
+        fov_mm=float(fov_mm),
+        pixel_mm=float(fov_mm) / int(npix),
+    )
+
+
+def _beam_kind(beam: BeamInfo) -> str:
+    if not beam.monitor_units:
+        return "SETUP"
+    return "ARC_START" if beam.is_arc else "FIELD"
+
+
+def compute_plan_drrs(
+    case: Case,
+    include_setup: bool = True,
+    **kwargs: Any,
+) -> List[DRR]:
+    """
+    Un DRR por beam en la geometría de su primer control point: campos de
+    setup / imagen (sin MU), inicio de cada arco y campos estáticos.
+    kwargs se pasan a compute_drr (fov_mm, npix, grid_mm, ...).
+    """
+    plan = case.plan
+    if plan is None or not plan.beams:
+        return []
+
+    results: List[DRR] = []
+    for beam in plan.beams:
+        kind = _beam_kind(beam)
+        if kind == "SETUP" and not include_setup:
+            continue
+        cpa = beam.control_points
+        if cpa is not None and len(cpa) > 0:
+            gantry = float(cpa.gantry_deg[0])
+            coll = float(cpa.collimator_deg[0])
+            couch = float(cpa.couch_deg[0])
+            iso = cpa.isocenter_mm if cpa.isocenter_mm is not None else plan.isocenter_mm
+        elif beam.gantry_start is not None:
+            gantry = float(beam.gantry_start)
+            coll = float(beam.collimator_angle or 0.0)
+            couch = float(beam.couch_angle or 0.0)
+            iso = plan.isocenter_mm
+        else:
+            continue
+        drr = compute_drr(case, gantry, coll, couch, isocenter_mm=iso, **kwargs)
+        drr.beam_number = beam.beam_number
+        drr.beam_name = beam.beam_name
+        drr.kind = kind
+        results.append(drr)
+    return results
@@ -94,6 +94,29 @@ def get_effective_configs() -> Dict[str, Any]:
     }
 
 
+def get_enabled_check_ids(eff: Optional[Dict[str, Any]] = None) -> set:
+    """
+    Devuelve el conjunto de ids "<sección>.<check_key>" activos según la
+    config efectiva (base + overrides). Un check está activo si lo está él
+    y también su sección.
+
+    Es lo que se pasa a qa.engine.evaluate_case(enabled_checks=...).
+    """
+    if eff is None:
+        eff = get_effective_configs()
+    sections_cfg = eff["sections"]
+    checks_cfg = eff["checks"]
+
+    enabled: set = set()
+    for section, checks in checks_cfg.items():
+        if not sections_cfg.get(section, {}).get("enabled", True):
+            continue
+        for check_key, cfg in checks.items():
+            if cfg.get("enabled", True):
+                enabled.add(f"{section}.{check_key}")
+    return enabled
+
+
 def build_ui_config() -> Dict[str, Any]:
     """
     Devuelve una estructura pensada para la UI de Settings.
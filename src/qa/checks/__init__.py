@@ -1,33 +1,118 @@
 # src/qa/checks/__init__.py
 
-from typing import List
+from typing import List, Optional, Set
 from core.case import Case, CheckResult
-
-from .ct import run_ct_checks
-from .structures import run_structures_checks
-from .plan import run_plan_checks
-from .dose import run_dose_checks
+from core.naming import StructCategory
+from core.build_case import PreviewDataUnavailable
+from qa.config import get_global_check_config
+
+from .registry import (
+    CheckSpec,
+    get_required_inputs,
+    collect_struct_categories,
+    is_check_enabled,
+    run_check_specs,
+    REQ_CT_HEADER,
+    REQ_STRUCT_NAMES,
+    REQ_PLAN,
+)
+from .ct import run_ct_checks, CT_CHECK_SPECS
+from .structures import run_structures_checks, STRUCTURES_CHECK_SPECS
+from .plan import run_plan_checks, PLAN_CHECK_SPECS
+from .dose import run_dose_checks, DOSE_CHECK_SPECS
 # (si tienes otros grupos, añádelos aquí)
 
 
-def run_all_checks(case: Case) -> List[CheckResult]:
+# Todos los checks registrados, en orden de ejecución
+ALL_CHECK_SPECS: List[CheckSpec] = [
+    *CT_CHECK_SPECS,
+    *STRUCTURES_CHECK_SPECS,
+    *PLAN_CHECK_SPECS,
+    *DOSE_CHECK_SPECS,
+]
+
+
+def get_struct_categories_for_checks(enabled_checks: Optional[Set[str]] = None) -> Set[StructCategory]:
+    """
+    Categorías de estructura cuyas máscaras necesitan los checks activos
+    (para build_lazy_case_from_dicom(struct_categories=...)).
+    """
+    return collect_struct_categories(ALL_CHECK_SPECS, enabled_checks)
+
+
+# Requisitos que se resuelven sólo con cabeceras DICOM (vista previa)
+PREVIEW_INPUTS = frozenset({REQ_CT_HEADER, REQ_STRUCT_NAMES, REQ_PLAN})
+
+
+def get_preview_check_specs(enabled_checks: Optional[Set[str]] = None) -> List[CheckSpec]:
+    """
+    Checks activos que se pueden evaluar sólo con cabeceras: todos sus
+    `requires` están en PREVIEW_INPUTS (los `optional` se ignoran; p.ej.
+    la prescripción compara con el DVH sólo si hay dosis).
+    """
+    return [
+        spec for spec in ALL_CHECK_SPECS
+        if is_check_enabled(spec, enabled_checks)
+        and set(spec.requires) <= PREVIEW_INPUTS
+    ]
+
+
+# Score de un check que la vista previa no pudo evaluar (como NO_INFO)
+PREVIEW_UNAVAILABLE_SCORE = 0.8
+
+
+def _preview_unavailable_result(spec: CheckSpec, error: Exception) -> CheckResult:
+    check_cfg = get_global_check_config().get(spec.section, {}).get(spec.check_key, {})
+    return CheckResult(
+        name=check_cfg.get("result_name", spec.check_id),
+        passed=True,
+        score=PREVIEW_UNAVAILABLE_SCORE,
+        message="No disponible en vista previa: el check necesita datos que sólo carga el QA completo.",
+        details={"check_id": spec.check_id, "preview_unavailable": True, "error": str(error)},
+        group=spec.section,
+    )
+
+
+def run_preview_checks(case: Case, enabled_checks: Optional[Set[str]] = None) -> List[CheckResult]:
+    """
+    Ejecuta sólo los checks de cabecera (ver get_preview_check_specs),
+    en el mismo orden que run_all_checks.
+
+    Si un check pide algo que el Case de vista previa no tiene (p.ej.
+    una máscara aunque no declare REQ_STRUCT_MASKS), devuelve un
+    resultado "no disponible en vista previa" en vez de abortar.
+    """
+    results: List[CheckResult] = []
+    for spec in get_preview_check_specs(enabled_checks):
+        try:
+            results.append(spec.func(case))
+        except PreviewDataUnavailable as e:
+            results.append(_preview_unavailable_result(spec, e))
+    return results
+
+
+def run_all_checks(case: Case, enabled_checks: Optional[Set[str]] = None) -> List[CheckResult]:
     """
     Orquestador global de checks.
     Devuelve la lista de todos los CheckResult que luego verá la UI.
+
+    enabled_checks: ids "<sección>.<check_key>" a ejecutar. None = todos.
+    Los checks desactivados no se ejecutan, así que con un LazyCase
+    tampoco se cargan los datos que sólo ellos necesitaban.
     """
     results: List[CheckResult] = []
 
     # CT
-    results.extend(run_ct_checks(case))
+    results.extend(run_ct_checks(case, enabled_checks))
 
     # Structures
-    results.extend(run_structures_checks(case))
+    results.extend(run_structures_checks(case, enabled_checks))
 
     # Plan
-    results.extend(run_plan_checks(case))
+    results.extend(run_plan_checks(case, enabled_checks))
 
     # Dose
-    results.extend(run_dose_checks(case))
+    results.extend(run_dose_checks(case, enabled_checks))
 
     # Otros grupos, si tienes
     # results.extend(run_other_checks(case))
@@ -2,10 +2,17 @@
 
 from __future__ import annotations
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 import numpy as np
 
 from core.case import Case, CheckResult
+from core.hu_stats import compute_hu_histogram, hu_calibration_stats
+from .registry import (
+    CheckSpec,
+    run_check_specs,
+    REQ_CT_HEADER,
+    REQ_CT_PIXELS,
+)
 from qa.config import (
     get_ct_geometry_config,
     get_ct_hu_config,
@@ -57,7 +64,8 @@ def check_ct_geometry(case: Case) -> CheckResult:
 
     Este check se maneja de forma binaria (OK / FAIL).
     """
-    ct = case.ct_hu
+    # Sólo geometría: en un LazyCase sale de las cabeceras, sin leer píxeles
+    shape = case.ct_shape
     spacing = case.ct_spacing  # (dz, dy, dx)
 
     profile = _get_ct_profile(case)
@@ -80,15 +88,15 @@ def check_ct_geometry(case: Case) -> CheckResult:
     issues: List[str] = []
 
     # 1) Dimensionalidad
-    if len(ct.shape) != required_dim:
+    if len(shape) != required_dim:
         issues.append(
-            f"CT no tiene dimensionalidad requerida: shape={ct.shape}, "
+            f"CT no tiene dimensionalidad requerida: shape={shape}, "
             f"se esperaba {required_dim}D."
         )
 
     # Nº de slices (z)
-    if len(ct.shape) >= 1:
-        nz = ct.shape[0]
+    if len(shape) >= 1:
+        nz = shape[0]
         if nz < min_slices or nz > max_slices:
             issues.append(
                 f"Número de slices (z) = {nz} fuera del rango razonable "
@@ -138,7 +146,7 @@ def check_ct_geometry(case: Case) -> CheckResult:
         score=score,
         message=msg,
         details={
-            "shape": ct.shape,
+            "shape": shape,
             "spacing": spacing,
             "ct_profile": profile,
             "config_used": cfg,
@@ -158,14 +166,15 @@ def check_ct_hu_water_air(case: Case) -> CheckResult:
 
       - Aire: HU en la cola baja del histograma (percentil configurable).
       - Agua/tejido blando: HU en una ventana [min,max] alrededor de 0 HU.
+      - Las estadísticas salen de un histograma entero (core.hu_stats),
+        el mismo que usa la QA de CBCT (hypersight).
       - Permite distinguir entre OK / WARN / FAIL según desviaciones.
     """
-    ct = case.ct_hu.astype(float)
+    ct = case.ct_hu
     profile = _get_ct_profile(case)
     cfg = get_ct_hu_config(profile)
 
-    vals = ct.flatten()
-    if vals.size == 0:
+    if ct.size == 0:
         # No hay información útil
         score_no_info = float(cfg.get("score_no_info", 0.8))
         rec_texts = get_ct_recommendations("HU", "BAD")
@@ -203,12 +212,15 @@ def check_ct_hu_water_air(case: Case) -> CheckResult:
 
     issues: List[str] = []
 
+    # Histograma entero de HU acumulado corte a corte (core.hu_stats),
+    # sin copiar el volumen a float
+    stats = hu_calibration_stats(compute_hu_histogram(ct), cfg)
+
     # Aire: percentil bajo
-    air_hu = float(np.percentile(vals, air_pct))
+    air_hu = float(stats["air_hu"])
 
     # Agua/tejido blando: valores en ventana [-200,200] HU (configurable)
-    water_mask = (vals >= w_min) & (vals <= w_max)
-    num_w = int(water_mask.sum())
+    num_w = int(stats["num_water_voxels"])
 
     water_hu = float("nan")
     no_info_water = False
@@ -222,8 +234,7 @@ def check_ct_hu_water_air(case: Case) -> CheckResult:
         )
         no_info_water = True
     else:
-        water_vals = vals[water_mask]
-        water_hu = float(np.median(water_vals))
+        water_hu = float(stats["water_hu"])
         delta_w = abs(water_hu - water_expected)
 
         if delta_w <= water_warn_tol:
@@ -333,10 +344,9 @@ def check_ct_fov_minimum(case: Case) -> CheckResult:
       - WARN: FOV < min_fov pero a no más de warn_margin_mm
       - FAIL: FOV < min_fov - warn_margin_mm
     """
-    ct = case.ct_hu
     spacing = case.ct_spacing  # (dz, dy, dx)
     dz, dy, dx = spacing
-    _, ny, nx = ct.shape
+    _, ny, nx = case.ct_shape
 
     profile = _get_ct_profile(case)
     cfg = get_ct_fov_config(profile)
@@ -643,21 +653,26 @@ def check_patient_not_clipped(case: Case) -> CheckResult:
 # 6) Orquestador de checks de CT
 # ============================================================
 
-def run_ct_checks(case: Case) -> List[CheckResult]:
+CT_CHECK_SPECS: List[CheckSpec] = [
+    CheckSpec("CT", "CT_GEOMETRY", check_ct_geometry, requires=(REQ_CT_HEADER,)),
+    CheckSpec("CT", "CT_HU", check_ct_hu_water_air, requires=(REQ_CT_PIXELS,)),
+    CheckSpec("CT", "CT_FOV", check_ct_fov_minimum, requires=(REQ_CT_HEADER,)),
+    CheckSpec("CT", "CT_COUCH", check_ct_couch_presence, requires=(REQ_CT_PIXELS,)),
+    CheckSpec("CT", "CT_CLIPPING", check_patient_not_clipped, requires=(REQ_CT_PIXELS,)),
+]
+
+
+def run_ct_checks(case: Case, enabled_checks: Optional[Set[str]] = None) -> List[CheckResult]:
     """
     Orquestador de checks de CT.
 
-    Actualmente ejecuta:
+    Actualmente ejecuta (en este orden, ver CT_CHECK_SPECS):
       - check_ct_geometry
       - check_ct_hu_water_air
       - check_ct_fov_minimum
       - check_ct_couch_presence
       - check_patient_not_clipped
+
+    enabled_checks: ids "CT.<check_key>" a ejecutar (None = todos).
     """
-    results: List[CheckResult] = []
-    results.append(check_ct_geometry(case))
-    results.append(check_ct_hu_water_air(case))
-    results.append(check_ct_fov_minimum(case))
-    results.append(check_ct_couch_presence(case))
-    results.append(check_patient_not_clipped(case))
-    return results
+    return run_check_specs(case, CT_CHECK_SPECS, enabled_checks)
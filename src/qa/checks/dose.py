@@ -11,26 +11,54 @@ Aquí viven cosas como:
   - check_dose_loaded          → verificar que hay RTDOSE asociado
   - check_ptv_coverage         → D95 del PTV, etc.
   - check_ptv_homogeneity      → HI_RTOG y (D2−D98)/D50
-  - check_hotspots_global      → Dmax global, V110%
-  - check_ptv_conformity_paddick → CI de Paddick
+  - check_hotspots_global      → Dmax global, V110%, localización de hot/cold spots
+  - check_ptv_conformity_paddick → CI de Paddick, R50%, GI y D2cm
   - check_oars_dvh_basic       → DVH básicos de OARs (Rectum, Bladder, FemHeads)
+  - check_dose_gamma           → gamma 3D frente a una dosis recalculada/predicha
+  - check_oars_dvh_eqd2        → límites DVH de OARs en EQD2 (α/β por estructura)
+  - check_oars_dvh_kb          → DVH de OARs frente a la dosis predicha (UNet3D)
 
 Los umbrales y configuraciones vienen de qa.config:
   - HOTSPOT_CONFIG
   - DVH_LIMITS
   - PTV_HOMOGENEITY_CONFIG
   - PTV_CONFORMITY_CONFIG
+  - DOSE_GAMMA_CONFIG
+  - DVH_LIMITS_EQD2 / ALPHA_BETA_CONFIG
+  - DOSE_KB_CONFIG
   - perfiles por sitio (SITE_PROFILES)
   - recomendaciones (DOSE_RECOMMENDATIONS)
 """
 
 from __future__ import annotations
 
-from typing import List, Dict, Optional
+import re
+from typing import List, Dict, Optional, Set
 import numpy as np
 
 from core.case import Case, CheckResult, StructureInfo
-from core.naming import infer_site_from_structs
+from core.dose_regions import DoseRegion, find_cold_regions, find_hot_regions
+from core.dvh import DoseHistogram, get_dvh_cache
+from core.gamma import compute_gamma, downsample_to_grid
+from core.geometry import distance_from_mask_mm
+from core.radiobiology import alpha_beta_for_structure, eqd2_histogram
+from .registry import (
+    CheckSpec,
+    run_check_specs,
+    REQ_CT_HEADER,
+    REQ_CT_PIXELS,
+    REQ_STRUCT_NAMES,
+    REQ_STRUCT_MASKS,
+    REQ_PLAN,
+    REQ_DOSE,
+)
+from core.naming import (
+    find_primary_ptv,
+    infer_site_from_structs,
+    is_helper_structure,
+    normalize_structure_name,
+    StructCategory,
+)
 from qa.config import (
     get_hotspot_config,
     get_dvh_limits_for_structs,
@@ -39,6 +67,12 @@ from qa.config import (
     format_recommendations_text,
     get_ptv_homogeneity_config_for_site,
     get_ptv_conformity_config_for_site,
+    get_dose_gamma_config_for_site,
+    get_alpha_beta_config_for_site,
+    get_dvh_eqd2_limits_for_site,
+    get_oar_dvh_eqd2_config_for_site,
+    get_fractionation_schemes_for_site,
+    get_dose_kb_config_for_site,
 )
 
 
@@ -103,23 +137,128 @@ def _get_prescription_dose(case: Case,
     return 0.0
 
 
-def _find_ptv_struct(case: Case) -> Optional[StructureInfo]:
+def _is_hypofractionated(case: Case, cfg: Dict) -> bool:
     """
-    Encuentra un PTV "principal" de forma sencilla:
-      - cualquier estructura cuyo nombre contenga 'PTV' (en mayúsculas),
-      - si hay varias, elige la de mayor volumen.
+    True si la dosis por fracción del plan alcanza
+    cfg["sbrt_min_dose_per_fraction_gy"] (los límites de gradiente tipo
+    SBRT sólo se aplican entonces). Sin plan o sin umbral → False.
     """
-    candidates: List[StructureInfo] = []
-    for name, st in case.structs.items():
-        if "PTV" in name.upper():
-            candidates.append(st)
+    min_dpf = cfg.get("sbrt_min_dose_per_fraction_gy")
+    plan = getattr(case, "plan", None)
+    if min_dpf is None or plan is None or not plan.dose_per_fraction_gy:
+        return False
+    return float(plan.dose_per_fraction_gy) >= float(min_dpf)
+
+
+def _compute_dose_gradient_metrics(
+    dose: np.ndarray,
+    ptv_mask: np.ndarray,
+    spacing: tuple,
+    presc: float,
+    total_hist: DoseHistogram,
+    tv_vox: int,
+    piv_vox: float,
+    cfg: Dict,
+) -> Dict[str, Optional[float]]:
+    """
+    Métricas de caída de dosis fuera del PTV:
 
-    if not candidates:
-        return None
+      - R50 = V(50 % Rx) / TV
+      - GI_Paddick = V(50 % Rx) / V(100 % Rx)
+      - D2cm: dosis máxima en la corteza a d2cm_distance_mm del PTV
+        (grosor d2cm_shell_mm), en Gy y en % de Rx.
+
+    Los volúmenes de isodosis salen del histograma total; la corteza, de
+    una transformada de distancia sobre el bounding box del PTV ampliado
+    (core.geometry.distance_from_mask_mm), no del volumen completo.
+    """
+    out: Dict[str, Optional[float]] = {
+        "V50_vox": None, "R50": None, "GI_Paddick": None,
+        "D2cm_Gy": None, "D2cm_pct": None,
+    }
+    if presc <= 0 or tv_vox <= 0:
+        return out
+
+    v50 = total_hist.volume_at_least(float(cfg.get("gradient_isodose_rel", 0.5)) * presc)
+    out["V50_vox"] = v50
+    out["R50"] = v50 / tv_vox
+    out["GI_Paddick"] = v50 / piv_vox if piv_vox > 0 else None
+
+    d_mm = float(cfg.get("d2cm_distance_mm", 20.0))
+    shell_mm = float(cfg.get("d2cm_shell_mm", 3.0))
+    res = distance_from_mask_mm(ptv_mask, spacing, d_mm + shell_mm)
+    if res is not None:
+        sl, dist = res
+        shell = (dist >= d_mm) & (dist < d_mm + shell_mm)
+        if shell.any():
+            d2cm = float(dose[sl][shell].max())
+            out["D2cm_Gy"] = d2cm
+            out["D2cm_pct"] = d2cm / presc * 100.0
+    return out
+
+
+def _describe_region(region: DoseRegion) -> str:
+    """Texto corto de una región: volumen, posición y estructura principal."""
+    txt = f"{region.volume_cc:.2f} cc"
+    if region.centroid_mm is not None:
+        x, y, z = region.centroid_mm
+        txt += f" en ({x:.0f}, {y:.0f}, {z:.0f}) mm"
+    if region.overlaps:
+        name, frac = next(iter(region.overlaps.items()))
+        txt += f", {frac*100:.0f}% en {name}"
+    return txt
+
+
+def _localize_dose_regions(
+    case: Case,
+    dose: np.ndarray,
+    presc: float,
+    ptv: Optional[StructureInfo],
+    conf: Dict,
+) -> tuple:
+    """
+    Localiza hotspots (D >= Vhot_rel·Rx) y zonas frías del PTV
+    (D < cold_rel·Rx) como componentes conexas (core.dose_regions),
+    etiquetando sólo el recorte que contiene los candidatos.
 
-    # Elegimos la de mayor volumen
-    candidates.sort(key=lambda s: s.volume_cc, reverse=True)
-    return candidates[0]
+    Devuelve ({"hot_regions": [...], "cold_regions": [...]}, mensajes).
+    """
+    spacing = case.ct_spacing
+    origin = case.metadata.get("ct_origin")
+    min_cc = float(conf.get("min_region_cc", 0.05))
+    max_n = int(conf.get("max_regions_reported", 5))
+
+    # Estructuras clínicas para los solapes (sin BODY / helpers)
+    structs = {
+        name: st.mask
+        for name, st in case.structs.items()
+        if not is_helper_structure(name)
+        and normalize_structure_name(name).category
+        in (StructCategory.PTV, StructCategory.CTV, StructCategory.OAR)
+    }
+
+    hot = find_hot_regions(
+        dose, float(conf.get("Vhot_rel", 1.10)) * presc, spacing, origin,
+        structs=structs, min_volume_cc=min_cc, max_regions=max_n,
+    )
+    cold: List[DoseRegion] = []
+    if ptv is not None:
+        cold = find_cold_regions(
+            dose, ptv.mask, float(conf.get("cold_rel", 0.95)) * presc, spacing, origin,
+            structs={k: v for k, v in structs.items() if k != ptv.name},
+            min_volume_cc=min_cc, max_regions=max_n,
+        )
+
+    msgs: List[str] = []
+    if hot:
+        msgs.append(f"{len(hot)} región(es) caliente(s); mayor: {_describe_region(hot[0])}.")
+    if cold:
+        msgs.append(f"{len(cold)} zona(s) fría(s) en {ptv.name}; mayor: {_describe_region(cold[0])}.")
+
+    return {
+        "hot_regions": [r.to_dict() for r in hot],
+        "cold_regions": [r.to_dict() for r in cold],
+    }, msgs
 
 
 def _find_oar_candidate(case: Case, patterns: List[str]) -> Optional[StructureInfo]:
@@ -163,7 +302,8 @@ def check_dose_loaded(case: Case) -> CheckResult:
             recommendation=rec,
         )
 
-    if dose.shape != case.ct_hu.shape:
+    ct_shape = case.ct_shape
+    if tuple(dose.shape) != tuple(ct_shape):
         rec_texts = get_dose_recommendations("DOSE_LOADED", "SHAPE_MISMATCH")
         rec = format_recommendations_text(rec_texts)
 
@@ -173,9 +313,9 @@ def check_dose_loaded(case: Case) -> CheckResult:
             score=0.4,
             message=(
                 f"Se encontró dosis (shape={dose.shape}) pero no coincide con el CT "
-                f"(shape={case.ct_hu.shape}). Revisar resample de dosis al grid del CT."
+                f"(shape={ct_shape}). Revisar resample de dosis al grid del CT."
             ),
-            details={"dose_shape": dose.shape, "ct_shape": case.ct_hu.shape},
+            details={"dose_shape": dose.shape, "ct_shape": ct_shape},
             group="Dose",
             recommendation=rec,
         )
@@ -203,7 +343,7 @@ def check_ptv_coverage(case: Case,
     """
     Evalúa la cobertura del PTV principal mediante D95.
 
-    - Busca un PTV principal (_find_ptv_struct).
+    - Busca un PTV principal (core.naming.find_primary_ptv).
     - Extrae la dosis en el PTV.
     - Calcula:
         D95 (Gy)
@@ -230,7 +370,7 @@ def check_ptv_coverage(case: Case,
             recommendation=rec,
         )
 
-    ptv = _find_ptv_struct(case)
+    ptv = find_primary_ptv(case.structs)
     if ptv is None:
         rec_texts = get_dose_recommendations("PTV_COVERAGE", "NO_PTV")
         rec = format_recommendations_text(rec_texts)
@@ -375,7 +515,7 @@ def check_ptv_homogeneity(case: Case) -> CheckResult:
             recommendation=rec,
         )
 
-    ptv = _find_ptv_struct(case)
+    ptv = find_primary_ptv(case.structs)
     if ptv is None:
         rec_texts = get_dose_recommendations("PTV_HOMOGENEITY", "NO_PTV")
         rec = format_recommendations_text(rec_texts)
@@ -565,6 +705,9 @@ def check_hotspots_global(case: Case) -> CheckResult:
     - Calcula:
         Dmax_global
         Vhot (p.ej. V110%)
+    - Localiza (si hotspot.localize_regions) las regiones conexas calientes
+      y las zonas frías del PTV, con volumen, posición y estructuras que
+      solapan (details["hot_regions"] / details["cold_regions"]).
     """
 
     dose = _get_dose_array(case)
@@ -582,8 +725,7 @@ def check_hotspots_global(case: Case) -> CheckResult:
             recommendation=rec,
         )
 
-    dose_vals = dose.flatten()
-    if dose_vals.size == 0:
+    if dose.size == 0:
         rec_texts = get_dose_recommendations("GLOBAL_HOTSPOTS", "EMPTY_DOSE")
         rec = format_recommendations_text(rec_texts)
 
@@ -597,12 +739,15 @@ def check_hotspots_global(case: Case) -> CheckResult:
             recommendation=rec,
         )
 
-    Dmax_global = float(dose_vals.max())
+    Dmax_global = float(dose.max())
+    dvh_cache = get_dvh_cache(case)
 
     # ---------- Prescripción ----------
-    ptv = _find_ptv_struct(case)
-    ptv_dose_vals = dose[ptv.mask.astype(bool)] if ptv is not None else np.array([])
-    presc = _get_prescription_dose(case, ptv_dose_vals)
+    ptv = find_primary_ptv(case.structs)
+    presc = _get_prescription_dose(case)
+    if presc <= 0 and ptv is not None:
+        # Mismo criterio que _get_prescription_dose: percentil 98 en el PTV
+        presc = dvh_cache.structure(ptv.name, ptv.mask).dose_at_volume(0.02)
 
     if presc <= 0:
         msg = (
@@ -636,7 +781,7 @@ def check_hotspots_global(case: Case) -> CheckResult:
     score_fail = float(hotspot_conf.get("score_fail", 0.3))
 
     rel_Dmax = Dmax_global / presc
-    Vhot = _compute_Vx(dose_vals, Vhot_rel * presc) * 100.0
+    Vhot = dvh_cache.total().fraction_at_least(Vhot_rel * presc) * 100.0
 
     # Etiqueta humana para el Vhot (p.ej. "V110%")
     Vhot_label = f"V{int(round(Vhot_rel * 100))}%"
@@ -664,6 +809,13 @@ def check_hotspots_global(case: Case) -> CheckResult:
             f"{Vhot_label}={Vhot:.2f}% del volumen. Revisar hotspots."
         )
 
+    # ---------- Localización de regiones calientes / frías ----------
+    regions: Dict[str, List[Dict]] = {}
+    if hotspot_conf.get("localize_regions", True):
+        regions, loc_msgs = _localize_dose_regions(case, dose, presc, ptv, hotspot_conf)
+        if loc_msgs:
+            msg += " " + " ".join(loc_msgs)
+
     rec_texts = get_dose_recommendations("GLOBAL_HOTSPOTS", scenario)
     rec = format_recommendations_text(rec_texts)
 
@@ -677,6 +829,7 @@ def check_hotspots_global(case: Case) -> CheckResult:
             "prescription_Gy": presc,
             "rel_Dmax": rel_Dmax,
             Vhot_label: Vhot,
+            **regions,
         },
         group="Dose",
         recommendation=rec,
@@ -701,6 +854,10 @@ def check_ptv_conformity_paddick(case: Case) -> CheckResult:
         dose >= prescription_isodose_rel * Rx
 
     con prescription_isodose_rel configurado por sitio en PTV_CONFORMITY_CONFIG.
+
+    Además reporta métricas de gradiente (R50%, GI de Paddick, D2cm; ver
+    _compute_dose_gradient_metrics). Sus límites sólo puntúan si están
+    configurados y el plan es hipofraccionado (estilo RTOG 0915/0813).
     """
     dose = _get_dose_array(case)
     if dose is None:
@@ -716,7 +873,7 @@ def check_ptv_conformity_paddick(case: Case) -> CheckResult:
             recommendation=rec,
         )
 
-    ptv = _find_ptv_struct(case)
+    ptv = find_primary_ptv(case.structs)
     if ptv is None:
         rec_texts = get_dose_recommendations("PTV_CONFORMITY", "NO_PTV")
         rec = format_recommendations_text(rec_texts)
@@ -744,8 +901,15 @@ def check_ptv_conformity_paddick(case: Case) -> CheckResult:
             recommendation=rec,
         )
 
-    ptv_dose_vals = dose[ptv_mask]
-    presc = _get_prescription_dose(case, ptv_dose_vals)
+    # Las isodosis salen de los histogramas cacheados (core.dvh), sin
+    # umbralizar la matriz completa en cada check.
+    dvh_cache = get_dvh_cache(case)
+    ptv_hist = dvh_cache.structure(ptv.name, ptv_mask)
+
+    presc = _get_prescription_dose(case)
+    if presc <= 0:
+        # Mismo criterio que _get_prescription_dose: percentil 98 en el PTV
+        presc = ptv_hist.dose_at_volume(0.02)
 
     site = infer_site_from_structs(case.structs.keys())
     cfg = get_ptv_conformity_config_for_site(site)
@@ -777,17 +941,23 @@ def check_ptv_conformity_paddick(case: Case) -> CheckResult:
         )
 
     # Volúmenes en voxeles (el factor de volumen de voxel se cancela en el CI)
-    TV = int(ptv_mask.sum())
+    total_hist = dvh_cache.total()
+
+    TV = ptv_hist.n_voxels
 
     iso_th = iso_rel * presc
-    piv_mask = dose >= iso_th
-    PIV = int(piv_mask.sum())
-    TV_PIV = int(np.logical_and(ptv_mask, piv_mask).sum())
+    PIV = total_hist.volume_at_least(iso_th)
+    TV_PIV = ptv_hist.volume_at_least(iso_th)
 
     CI = None
     if TV > 0 and PIV > 0 and TV_PIV > 0:
         CI = (TV_PIV ** 2) / (TV * PIV)
 
+    # Gradiente de dosis: R50%, GI de Paddick y D2cm
+    gradient = _compute_dose_gradient_metrics(
+        dose, ptv_mask, case.ct_spacing, presc, total_hist, TV, PIV, cfg
+    )
+
     if CI is None:
         rec_texts = get_dose_recommendations("PTV_CONFORMITY", "NO_INFO")
         rec = format_recommendations_text(rec_texts)
@@ -805,6 +975,7 @@ def check_ptv_conformity_paddick(case: Case) -> CheckResult:
                 "PIV_vox": PIV,
                 "TV_PIV_vox": TV_PIV,
                 "CI_Paddick": None,
+                **gradient,
                 "iso_rel": iso_rel,
                 "prescription_Gy": presc,
                 "config_used": cfg,
@@ -816,23 +987,52 @@ def check_ptv_conformity_paddick(case: Case) -> CheckResult:
     ci_ok_min = float(cfg.get("ci_ok_min", 0.75))
     ci_warn_min = float(cfg.get("ci_warn_min", 0.65))
 
-    if CI >= ci_ok_min:
-        scenario = "OK"
-        passed = True
-        score = score_ok
-    elif CI >= ci_warn_min:
-        scenario = "WARN"
-        passed = True
-        score = score_warn
-    else:
-        scenario = "FAIL"
-        passed = False
-        score = score_fail
+    severity = "OK"  # OK, WARN, FAIL
+    order = ["OK", "WARN", "FAIL"]
+
+    def worsen(current: str, new_level: str) -> str:
+        return order[max(order.index(current), order.index(new_level))]
+
+    if CI < ci_warn_min:
+        severity = worsen(severity, "FAIL")
+    elif CI < ci_ok_min:
+        severity = worsen(severity, "WARN")
+
+    # Límites de gradiente (estilo SBRT): sólo si están configurados y el
+    # plan es hipofraccionado (dosis por fracción >= sbrt_min_dose_per_fraction_gy)
+    gradient_msgs: List[str] = []
+    if _is_hypofractionated(case, cfg):
+        for key, label, ok_key, warn_key in (
+            ("R50", "R50%", "r50_max_ok", "r50_max_warn"),
+            ("GI_Paddick", "GI", "gi_max_ok", "gi_max_warn"),
+            ("D2cm_pct", "D2cm(%Rx)", "d2cm_max_pct_ok", "d2cm_max_pct_warn"),
+        ):
+            val = gradient.get(key)
+            lim_ok, lim_warn = cfg.get(ok_key), cfg.get(warn_key)
+            if val is None or lim_ok is None:
+                continue
+            if lim_warn is not None and val > float(lim_warn):
+                severity = worsen(severity, "FAIL")
+                gradient_msgs.append(f"{label}={val:.2f} > {float(lim_warn):.2f}")
+            elif val > float(lim_ok):
+                severity = worsen(severity, "WARN")
+                gradient_msgs.append(f"{label}={val:.2f} > {float(lim_ok):.2f}")
+
+    scenario = severity
+    passed = scenario != "FAIL"
+    score = {"OK": score_ok, "WARN": score_warn, "FAIL": score_fail}[scenario]
 
     msg = (
-        f"CI_Paddick≈{CI:.3f} (TV={TV} vox, PIV={PIV} vox, TV∩PIV={TV_PIV} vox) "
+        f"CI_Paddick≈{CI:.3f} (TV={TV} vox, PIV={PIV:.0f} vox, TV∩PIV={TV_PIV:.0f} vox) "
         f"para isodosis ≥{iso_rel*100:.0f}% de Rx≈{presc:.2f} Gy."
     )
+    if gradient.get("R50") is not None:
+        msg += f" R50%≈{gradient['R50']:.2f}, GI≈{gradient['GI_Paddick']:.2f}"
+        if gradient.get("D2cm_pct") is not None:
+            msg += f", D2cm≈{gradient['D2cm_pct']:.1f}% Rx"
+        msg += "."
+    if gradient_msgs:
+        msg += " Gradiente fuera de límites: " + "; ".join(gradient_msgs) + "."
 
     rec_texts = get_dose_recommendations("PTV_CONFORMITY", scenario)
     rec = format_recommendations_text(rec_texts)
@@ -848,6 +1048,8 @@ def check_ptv_conformity_paddick(case: Case) -> CheckResult:
             "PIV_vox": PIV,
             "TV_PIV_vox": TV_PIV,
             "CI_Paddick": CI,
+            **gradient,
+            "gradient_issues": gradient_msgs,
             "iso_rel": iso_rel,
             "prescription_Gy": presc,
             "config_used": cfg,
@@ -1031,26 +1233,543 @@ def check_oars_dvh_basic(case: Case) -> CheckResult:
 
 
 # =====================================================
-# 7) Orquestador de checks de dosis
+# 7) Gamma frente a dosis recalculada / predicha
+# =====================================================
+
+def check_dose_gamma(case: Case) -> CheckResult:
+    """
+    Compara la dosis del TPS (case.metadata["dose_gy"]) con una segunda
+    distribución en el mismo grid:
+
+        case.metadata["dose_eval_gy"]       → np.ndarray [z,y,x] en Gy
+        case.metadata["dose_eval_source"]   → etiqueta opcional
+                                              ("recalc", "UNet3D", ...)
+
+    p.ej. un recálculo independiente o la predicción de ml.models.UNet3D.
+    Calcula el índice gamma 3D (core.gamma) con el criterio de
+    DOSE_GAMMA_CONFIG (por defecto 3 %/2 mm global, umbral 10 %) sobre un
+    grid submuestreado a ~grid_mm, y puntúa por pass rate.
+
+    Si no hay dosis de comparación el check es informativo (NO_EVAL).
+    """
+    dose = _get_dose_array(case)
+    if dose is None:
+        rec_texts = get_dose_recommendations("DOSE_GAMMA", "NO_DOSE")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="Dose gamma",
+            passed=False,
+            score=0.2,
+            message="No hay dosis cargada; no se puede calcular gamma.",
+            details={},
+            group="Dose",
+            recommendation=rec,
+        )
+
+    site = infer_site_from_structs(case.structs.keys())
+    cfg = get_dose_gamma_config_for_site(site)
+
+    score_ok = float(cfg.get("score_ok", 1.0))
+    score_warn = float(cfg.get("score_warn", 0.6))
+    score_fail = float(cfg.get("score_fail", 0.2))
+    score_no_info = float(cfg.get("score_no_info", 0.8))
+
+    dose_eval = case.metadata.get("dose_eval_gy", None)
+    source = case.metadata.get("dose_eval_source", "dose_eval_gy")
+    if dose_eval is None or np.shape(dose_eval) != np.shape(dose):
+        scenario = "NO_EVAL" if dose_eval is None else "GRID_MISMATCH"
+        rec_texts = get_dose_recommendations("DOSE_GAMMA", scenario)
+        rec = format_recommendations_text(rec_texts)
+        if dose_eval is None:
+            msg = "No hay dosis de comparación (recálculo/predicción); gamma no evaluado."
+        else:
+            msg = (
+                f"La dosis de comparación ({source}) tiene forma {np.shape(dose_eval)} "
+                f"distinta de la dosis del TPS {np.shape(dose)}; gamma no evaluado."
+            )
+        return CheckResult(
+            name="Dose gamma",
+            passed=True,
+            score=score_no_info,
+            message=msg,
+            details={"dose_eval_source": source, "config_used": cfg},
+            group="Dose",
+            recommendation=rec,
+        )
+
+    ref, spacing = downsample_to_grid(dose, case.ct_spacing, cfg.get("grid_mm"))
+    ev, _ = downsample_to_grid(dose_eval, case.ct_spacing, cfg.get("grid_mm"))
+
+    # Normalización global: Dmax de la referencia o, si se pide, la Rx del plan
+    presc = _get_prescription_dose(case) if cfg.get("normalize_to_prescription", False) else 0.0
+
+    result = compute_gamma(
+        ref,
+        ev,
+        spacing,
+        dose_pct=float(cfg.get("dose_pct", 3.0)),
+        dta_mm=float(cfg.get("dta_mm", 2.0)),
+        low_dose_threshold_pct=float(cfg.get("low_dose_threshold_pct", 10.0)),
+        local=bool(cfg.get("local", False)),
+        norm_dose_gy=presc if presc > 0 else None,
+        max_gamma=float(cfg.get("max_gamma", 2.0)),
+        step_fraction=int(cfg.get("step_fraction", 3)),
+    )
+
+    pass_ok = float(cfg.get("min_pass_rate_ok", 95.0))
+    pass_warn = float(cfg.get("min_pass_rate_warn", 90.0))
+    pr = result.pass_rate
+
+    if result.n_evaluated == 0:
+        scenario, passed, score = "NO_EVAL", True, score_no_info
+    elif pr >= pass_ok:
+        scenario, passed, score = "OK", True, score_ok
+    elif pr >= pass_warn:
+        scenario, passed, score = "WARN", True, score_warn
+    else:
+        scenario, passed, score = "FAIL", False, score_fail
+
+    mode = "local" if result.local else "global"
+    msg = (
+        f"Gamma {result.dose_pct:g}%/{result.dta_mm:g} mm {mode} vs {source}: "
+        f"pass rate={pr:.1f}% (γ medio={result.mean_gamma:.2f}, "
+        f"γ95={result.gamma_p95:.2f}, {result.n_evaluated} voxeles ≥"
+        f"{result.low_dose_threshold_pct:g}%)."
+    )
+
+    rec_texts = get_dose_recommendations("DOSE_GAMMA", scenario)
+    rec = format_recommendations_text(rec_texts)
+
+    return CheckResult(
+        name="Dose gamma",
+        passed=passed,
+        score=score,
+        message=msg,
+        details={
+            **result.to_dict(),
+            "dose_eval_source": source,
+            "grid_spacing_mm": spacing,
+            "config_used": cfg,
+        },
+        group="Dose",
+        recommendation=rec,
+    )
+
+
+# =====================================================
+# 8) DVH de OARs en EQD2
 # =====================================================
 
-def run_dose_checks(case: Case) -> List[CheckResult]:
+_EQD2_METRIC_RE = re.compile(r"^V(\d+(?:\.\d+)?)_%$")
+
+
+def _eqd2_metric(hist: DoseHistogram, key: str) -> Optional[float]:
+    """
+    Valor de una métrica DVH ("V<x>_%", "Dmax_Gy", "Dmean_Gy") sobre un
+    histograma (ya convertido a EQD2). None si la clave no se reconoce.
+    """
+    if key == "Dmax_Gy":
+        return hist.max_dose_gy
+    if key == "Dmean_Gy":
+        return hist.mean_dose_gy()
+    m = _EQD2_METRIC_RE.match(key)
+    if m:
+        return hist.fraction_at_least(float(m.group(1))) * 100.0
+    return None
+
+
+def check_oars_dvh_eqd2(case: Case) -> CheckResult:
+    """
+    Evalúa límites DVH de OARs escritos en EQD2 (DVH_LIMITS_EQD2), con el
+    nº de fracciones del plan y α/β por estructura (ALPHA_BETA_CONFIG).
+
+    Los DVH físicos salen de la cache de histogramas (core.dvh) y se
+    convierten a EQD2 transformando sólo las aristas de los bins
+    (core.radiobiology.eqd2_histogram), sin recorrer la matriz de dosis.
+    Así los mismos límites valen para 39, 20 o 5 fracciones.
+    """
+    dose = _get_dose_array(case)
+    if dose is None:
+        rec_texts = get_dose_recommendations("OAR_DVH_EQD2", "NO_DOSE")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="OAR DVH (EQD2)",
+            passed=False,
+            score=0.2,
+            message="No hay dosis cargada, no se pueden evaluar OARs en EQD2.",
+            details={},
+            group="Dose",
+            recommendation=rec,
+        )
+
+    site = infer_site_from_structs(case.structs.keys())
+    cfg = get_oar_dvh_eqd2_config_for_site(site)
+    score_no_info = float(cfg.get("score_no_info", 0.8))
+
+    plan = getattr(case, "plan", None)
+    n_fx = plan.num_fractions if plan is not None else None
+    if not n_fx or n_fx <= 0:
+        rec_texts = get_dose_recommendations("OAR_DVH_EQD2", "NO_INFO")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="OAR DVH (EQD2)",
+            passed=True,
+            score=score_no_info,
+            message="Número de fracciones desconocido; no se convierte la dosis a EQD2.",
+            details={"config_used": cfg},
+            group="Dose",
+            recommendation=rec,
+        )
+
+    limits = get_dvh_eqd2_limits_for_site(site)
+    ab_cfg = get_alpha_beta_config_for_site(site)
+    dvh_cache = get_dvh_cache(case)
+    tol = float(cfg.get("tolerance", 0.0))
+
+    # Esquema de fraccionamiento reconocido (informativo)
+    scheme_label = None
+    if plan.total_dose_gy:
+        for sch in get_fractionation_schemes_for_site(site or ""):
+            if sch["fx"] == n_fx and abs(sch["total"] - plan.total_dose_gy) < 0.01 * sch["total"]:
+                scheme_label = sch["label"]
+                break
+
+    metrics: Dict[str, Dict[str, float]] = {}
+    issues: List[str] = []
+    num_constraints = 0
+    num_violations = 0
+
+    for name, st in case.structs.items():
+        norm = normalize_structure_name(name)
+        if norm.category != StructCategory.OAR:
+            continue
+        canon = norm.canonical
+        lim = limits.get(canon) or limits.get(canon[:-2] if canon.endswith(("_L", "_R")) else "")
+        if not lim:
+            continue
+
+        ab = alpha_beta_for_structure(name, ab_cfg)
+        hist = eqd2_histogram(dvh_cache.structure(name, st.mask), n_fx, ab)
+        if hist.n_voxels == 0:
+            continue
+
+        entry: Dict[str, float] = {"alpha_beta_Gy": ab}
+        for key, max_val in lim.items():
+            val = _eqd2_metric(hist, key)
+            if val is None:
+                continue
+            entry[key] = val
+            num_constraints += 1
+            if val > float(max_val) + tol:
+                num_violations += 1
+                unit = "%" if key.endswith("_%") else " Gy"
+                issues.append(f"{name} {key}(EQD2)={val:.1f}{unit} > {float(max_val):.1f}{unit}")
+        metrics[name] = entry
+
+    base_details = {
+        "num_fractions": n_fx,
+        "dose_per_fraction_Gy": plan.dose_per_fraction_gy,
+        "scheme": scheme_label,
+        "metrics": metrics,
+        "config_used": cfg,
+    }
+
+    if num_constraints == 0:
+        rec_texts = get_dose_recommendations("OAR_DVH_EQD2", "NO_CONSTRAINTS")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="OAR DVH (EQD2)",
+            passed=True,
+            score=score_no_info,
+            message="No hay OARs con límites DVH en EQD2 configurados para este sitio.",
+            details=base_details,
+            group="Dose",
+            recommendation=rec,
+        )
+
+    frac_viol = num_violations / num_constraints
+    if num_violations == 0:
+        scenario, passed, score = "OK", True, float(cfg.get("score_ok", 1.0))
+    elif frac_viol <= float(cfg.get("frac_viol_warn", 0.33)):
+        scenario, passed, score = "WARN", True, float(cfg.get("score_warn", 0.6))
+    else:
+        scenario, passed, score = "FAIL", False, float(cfg.get("score_fail", 0.3))
+
+    fx_txt = f"{n_fx} fx" + (f", {scheme_label}" if scheme_label else "")
+    if num_violations == 0:
+        msg = f"DVH de OARs en EQD2 dentro de límites ({num_constraints} restricciones, {fx_txt})."
+    else:
+        msg = (
+            f"{num_violations}/{num_constraints} restricciones DVH en EQD2 superadas "
+            f"({fx_txt}): " + " | ".join(issues)
+        )
+
+    rec_texts = get_dose_recommendations("OAR_DVH_EQD2", scenario)
+    rec = format_recommendations_text(rec_texts)
+
+    return CheckResult(
+        name="OAR DVH (EQD2)",
+        passed=passed,
+        score=score,
+        message=msg,
+        details={
+            **base_details,
+            "num_constraints": num_constraints,
+            "num_violations": num_violations,
+            "issues": issues,
+        },
+        group="Dose",
+        recommendation=rec,
+    )
+
+
+# =====================================================
+# 9) DVH de OARs frente a la predicción KB (UNet3D)
+# =====================================================
+
+_KB_DX_RE = re.compile(r"^D(\d+(?:\.\d+)?)_Gy$")
+
+
+def _kb_metric(hist: DoseHistogram, key: str) -> Optional[float]:
+    """Métrica "Dmean_Gy", "Dmax_Gy" o "D<x>_Gy" (x en % de volumen)."""
+    if key == "Dmean_Gy":
+        return hist.mean_dose_gy()
+    if key == "Dmax_Gy":
+        return hist.max_dose_gy
+    m = _KB_DX_RE.match(key)
+    if m:
+        return hist.dose_at_volume(float(m.group(1)) / 100.0)
+    return None
+
+
+def check_oars_dvh_kb(case: Case) -> CheckResult:
+    """
+    Compara los DVH de OARs del plan con los de la dosis predicha por el
+    modelo KB (UNet3D, ver ml.kb) y marca los OARs en los que el plan
+    da bastante más dosis de la alcanzable (Dmean / D2% por defecto).
+
+    El modelo se carga una vez por worker y la predicción se cachea por
+    (hash del caso, hash del modelo), así que tras la primera ejecución
+    el check sólo calcula histogramas. Sin modelo configurado (o sin
+    PyTorch, o si el caso no se puede llevar al grid de entrenamiento
+    del modelo) el check es informativo (NO_MODEL).
+    """
+    dose = _get_dose_array(case)
+    if dose is None:
+        rec_texts = get_dose_recommendations("OAR_DVH_KB", "NO_DOSE")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="OAR DVH vs KB prediction",
+            passed=False,
+            score=0.2,
+            message="No hay dosis cargada, no se puede comparar con la predicción.",
+            details={},
+            group="Dose",
+            recommendation=rec,
+        )
+
+    site = infer_site_from_structs(case.structs.keys())
+    cfg = get_dose_kb_config_for_site(site)
+    score_no_info = float(cfg.get("score_no_info", 0.8))
+
+    model_path = cfg.get("model_path")
+    loaded = None
+    pred = None
+    load_error = None
+    if model_path:
+        try:
+            from ml.kb import IncompatibleModelError, load_dose_model, predict_case_kb_dose
+            loaded = load_dose_model(model_path)
+        except (ImportError, OSError, RuntimeError, KeyError) as exc:
+            load_error = f"{type(exc).__name__}: {exc}"
+
+    if loaded is not None:
+        try:
+            pred = predict_case_kb_dose(
+                case,
+                loaded,
+                margin_mm=float(cfg.get("margin_mm", 20.0)),
+                tile_size=tuple(cfg.get("tile_size", (64, 128, 128))),
+                overlap=float(cfg.get("overlap", 0.25)),
+                batch_size=int(cfg.get("batch_size", 1)),
+                num_threads=cfg.get("num_threads"),
+                memory_budget_mb=cfg.get("memory_budget_mb"),
+                cache_dir=cfg.get("cache_dir"),
+            )
+        except IncompatibleModelError as exc:
+            # el modelo no es aplicable a este caso (p.ej. grid de entrenamiento)
+            load_error = f"modelo incompatible con el caso: {exc}"
+            loaded = None
+
+    if loaded is None:
+        rec_texts = get_dose_recommendations("OAR_DVH_KB", "NO_MODEL")
+        rec = format_recommendations_text(rec_texts)
+        msg = (
+            "No hay modelo de predicción de dosis configurado."
+            if not model_path
+            else f"No se pudo usar el modelo de predicción ({load_error})."
+        )
+        return CheckResult(
+            name="OAR DVH vs KB prediction",
+            passed=True,
+            score=score_no_info,
+            message=msg,
+            details={"model_path": model_path, "error": load_error, "config_used": cfg},
+            group="Dose",
+            recommendation=rec,
+        )
+
+    dvh_cache = get_dvh_cache(case)
+    min_cc = float(cfg.get("min_volume_cc", 1.0))
+    metric_keys = list(cfg.get("metrics", ["Dmean_Gy", "D2_Gy"]))
+
+    metrics: Dict[str, Dict[str, Dict[str, float]]] = {}
+    worst = None   # (exceso, oar, métrica, plan, pred)
+    if pred is not None:
+        for name, st in case.structs.items():
+            if is_helper_structure(name):
+                continue
+            if normalize_structure_name(name).category != StructCategory.OAR:
+                continue
+            hist_plan = dvh_cache.structure(name, st.mask)
+            if hist_plan.volume_cc < min_cc:
+                continue
+            hist_pred = pred.structure_histogram(case, name, st.mask)
+
+            entry: Dict[str, Dict[str, float]] = {}
+            for key in metric_keys:
+                v_plan = _kb_metric(hist_plan, key)
+                v_pred = _kb_metric(hist_pred, key)
+                if v_plan is None or v_pred is None:
+                    continue
+                excess = v_plan - v_pred
+                entry[key] = {"plan": v_plan, "predicted": v_pred, "excess": excess}
+                if worst is None or excess > worst[0]:
+                    worst = (excess, name, key, v_plan, v_pred)
+            if entry:
+                metrics[name] = entry
+
+    base_details = {
+        "model_path": loaded.path,
+        "model_hash": loaded.model_hash[:12],
+        "roi_channels": pred.roi_map if pred is not None else {},
+        "metrics": metrics,
+        "config_used": cfg,
+    }
+
+    if worst is None:
+        rec_texts = get_dose_recommendations("OAR_DVH_KB", "NO_OARS")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="OAR DVH vs KB prediction",
+            passed=True,
+            score=score_no_info,
+            message="No hay OARs clínicos que comparar con la predicción.",
+            details=base_details,
+            group="Dose",
+            recommendation=rec,
+        )
+
+    warn_gy = float(cfg.get("excess_warn_gy", 3.0))
+    fail_gy = float(cfg.get("excess_fail_gy", 6.0))
+    flagged = sorted(
+        (
+            (e["excess"], oar, key)
+            for oar, entry in metrics.items()
+            for key, e in entry.items()
+            if e["excess"] >= warn_gy
+        ),
+        reverse=True,
+    )
+
+    excess, oar, key, v_plan, v_pred = worst
+    if excess >= fail_gy:
+        scenario, passed, score = "FAIL", False, float(cfg.get("score_fail", 0.3))
+    elif excess >= warn_gy:
+        scenario, passed, score = "WARN", True, float(cfg.get("score_warn", 0.6))
+    else:
+        scenario, passed, score = "OK", True, float(cfg.get("score_ok", 1.0))
+
+    if scenario == "OK":
+        msg = (
+            f"DVH de {len(metrics)} OARs en línea con la predicción "
+            f"(exceso máx. {excess:+.1f} Gy, {oar} {key})."
+        )
+    else:
+        msg = (
+            f"{len(flagged)} métricas de OAR superan la predicción en ≥ {warn_gy:.1f} Gy; "
+            f"peor: {oar} {key} = {v_plan:.1f} Gy (predicho {v_pred:.1f}, {excess:+.1f} Gy)."
+        )
+
+    rec_texts = get_dose_recommendations("OAR_DVH_KB", scenario)
+    rec = format_recommendations_text(rec_texts)
+
+    return CheckResult(
+        name="OAR DVH vs KB prediction",
+        passed=passed,
+        score=score,
+        message=msg,
+        details={
+            **base_details,
+            "worst_excess_Gy": excess,
+            "flagged": [f"{o} {k} {e:+.1f} Gy" for e, o, k in flagged],
+        },
+        group="Dose",
+        recommendation=rec,
+    )
+
+
+# =====================================================
+# 10) Orquestador de checks de dosis
+# =====================================================
+
+DOSE_CHECK_SPECS: List[CheckSpec] = [
+    CheckSpec("Dose", "DOSE_LOADED", check_dose_loaded,
+              requires=(REQ_DOSE, REQ_CT_HEADER)),
+    CheckSpec("Dose", "PTV_COVERAGE", check_ptv_coverage,
+              requires=(REQ_DOSE, REQ_STRUCT_MASKS), optional=(REQ_PLAN,),
+              struct_categories=(StructCategory.PTV,)),
+    CheckSpec("Dose", "PTV_HOMOGENEITY", check_ptv_homogeneity,
+              requires=(REQ_DOSE, REQ_STRUCT_MASKS), optional=(REQ_PLAN,),
+              struct_categories=(StructCategory.PTV,)),
+    CheckSpec("Dose", "GLOBAL_HOTSPOTS", check_hotspots_global,
+              requires=(REQ_DOSE, REQ_STRUCT_MASKS), optional=(REQ_PLAN,),
+              struct_categories=(StructCategory.PTV, StructCategory.CTV, StructCategory.OAR)),
+    CheckSpec("Dose", "PTV_CONFORMITY", check_ptv_conformity_paddick,
+              requires=(REQ_DOSE, REQ_STRUCT_MASKS), optional=(REQ_PLAN,),
+              struct_categories=(StructCategory.PTV,)),
+    CheckSpec("Dose", "OAR_DVH_BASIC", check_oars_dvh_basic,
+              requires=(REQ_DOSE, REQ_STRUCT_MASKS),
+              struct_categories=(StructCategory.OAR,)),
+    CheckSpec("Dose", "DOSE_GAMMA", check_dose_gamma,
+              requires=(REQ_DOSE, REQ_CT_HEADER, REQ_STRUCT_NAMES), optional=(REQ_PLAN,)),
+    CheckSpec("Dose", "OAR_DVH_EQD2", check_oars_dvh_eqd2,
+              requires=(REQ_DOSE, REQ_STRUCT_MASKS), optional=(REQ_PLAN,),
+              struct_categories=(StructCategory.OAR,)),
+    CheckSpec("Dose", "OAR_DVH_KB", check_oars_dvh_kb,
+              requires=(REQ_DOSE, REQ_CT_PIXELS, REQ_STRUCT_MASKS),
+              struct_categories=(StructCategory.PTV, StructCategory.OAR)),
+]
+
+
+def run_dose_checks(
+    case: Case,
+    enabled_checks: Optional[Set[str]] = None,
+) -> List[CheckResult]:
     """
     Orquestador de checks de dosis.
 
-    Por ahora ejecuta:
+    Por ahora ejecuta (ver DOSE_CHECK_SPECS):
       - check_dose_loaded
       - check_ptv_coverage
       - check_ptv_homogeneity
       - check_hotspots_global
       - check_ptv_conformity_paddick
       - check_oars_dvh_basic
+      - check_dose_gamma
+      - check_oars_dvh_eqd2
+      - check_oars_dvh_kb
+
+    enabled_checks: ids "Dose.<check_key>" a ejecutar (None = todos).
     """
-    results: List[CheckResult] = []
-    results.append(check_dose_loaded(case))
-    results.append(check_ptv_coverage(case))
-    results.append(check_ptv_homogeneity(case))
-    results.append(check_hotspots_global(case))
-    results.append(check_ptv_conformity_paddick(case))
-    results.append(check_oars_dvh_basic(case))
-    return results
+    return run_check_specs(case, DOSE_CHECK_SPECS, enabled_checks)
@@ -1,11 +1,26 @@
 from __future__ import annotations
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 import numpy as np
 
 from core.case import Case, CheckResult, StructureInfo, BeamInfo
+from core.plan_complexity import compute_plan_complexity
+from core.delivery import (
+    compute_leaf_kinematics,
+    estimate_beam_delivery,
+    leaf_pair_gaps_mm,
+)
 from .structures import _find_ptv_struct
-from core.naming import normalize_structure_name, infer_site_from_structs
+from .registry import (
+    CheckSpec,
+    run_check_specs,
+    REQ_CT_HEADER,
+    REQ_STRUCT_NAMES,
+    REQ_STRUCT_MASKS,
+    REQ_PLAN,
+    REQ_DOSE,
+)
+from core.naming import normalize_structure_name, infer_site_from_structs, StructCategory
 from qa.config import (
     get_plan_tech_config_for_site,
     get_beam_geom_config_for_site,
@@ -16,9 +31,14 @@ from qa.config import (
     format_recommendations_text,
     get_prescription_config_for_site,
     get_plan_mu_config_for_site,
+    get_plan_beam_on_time_config_for_site,
     get_plan_modulation_config_for_site,
     get_angular_pattern_config_for_site,  # <--- NUEVO
+    get_plan_deliverability_config_for_site,
+    get_plan_collision_config_for_site,
+    match_machine_profile,
 )
+from planning.collision import compute_plan_clearance
 
 
 # =====================================================
@@ -759,7 +779,8 @@ def check_prescription_consistency(case: Case) -> CheckResult:
     dvh_status = "NO_INFO"
     dvh_d50 = None
     dose_vol = case.metadata.get("dose_gy", None)
-    ptv = _find_ptv_struct(case)
+    # Sólo buscamos el PTV (que requiere máscaras) si hay dosis con la que comparar
+    ptv = _find_ptv_struct(case) if dose_vol is not None else None
 
     if dose_vol is not None and ptv is not None and ptv.mask is not None:
         idx = np.argwhere(ptv.mask)
@@ -845,10 +866,12 @@ def check_prescription_consistency(case: Case) -> CheckResult:
 
 def check_plan_mu_sanity(case: Case) -> CheckResult:
     """
-    Calcula MU totales y MU por Gy y los compara con un rango típico
-    definido por sitio y técnica.
+    Calcula MU totales por fracción (BeamMeterset de cada beam clínico) y
+    MU por Gy (por fracción) y los compara con un rango típico definido por
+    sitio y técnica.
 
-    Usa PLAN_MU_CONFIG[site].
+    Usa PLAN_MU_CONFIG[site][technique] (un VMAT con FFF lleva bastantes
+    más MU/Gy que un plan estático).
     """
     if case.plan is None:
         rec_texts = get_plan_recommendations("PLAN_MU", "NO_PLAN")
@@ -864,7 +887,8 @@ def check_plan_mu_sanity(case: Case) -> CheckResult:
         )
 
     site = infer_site_from_structs(list(case.structs.keys()))
-    cfg = get_plan_mu_config_for_site(site)
+    technique = case.plan.technique
+    cfg = get_plan_mu_config_for_site(site, technique)
 
     min_mu_per_gy = float(cfg.get("min_mu_per_gy", 30.0))
     max_mu_per_gy = float(cfg.get("max_mu_per_gy", 300.0))
@@ -923,7 +947,13 @@ def check_plan_mu_sanity(case: Case) -> CheckResult:
             recommendation=rec,
         )
 
-    mu_per_gy = float(total_mu / total_dose)
+    # BeamMeterset es MU por fracción: MU/Gy = MU por fracción / dosis por fracción
+    dose_per_fx = case.plan.dose_per_fraction_gy
+    if not dose_per_fx and case.plan.num_fractions:
+        dose_per_fx = total_dose / case.plan.num_fractions
+    if not dose_per_fx:
+        dose_per_fx = total_dose
+    mu_per_gy = float(total_mu / dose_per_fx)
 
     # Clasificación
     if min_mu_per_gy <= mu_per_gy <= max_mu_per_gy:
@@ -980,7 +1010,9 @@ def check_plan_mu_sanity(case: Case) -> CheckResult:
         message=msg,
         details={
             "site_inferred": site,
+            "technique": technique,
             "total_dose_gy": total_dose,
+            "dose_per_fraction_gy": dose_per_fx,
             "total_mu": total_mu,
             "mu_per_gy": mu_per_gy,
             "config_used": cfg,
@@ -990,6 +1022,157 @@ def check_plan_mu_sanity(case: Case) -> CheckResult:
     )
 
 
+# =====================================================
+# 6b) Tiempo de haz estimado (beam-on)
+# =====================================================
+
+def check_beam_on_time(case: Case) -> CheckResult:
+    """
+    Estima el tiempo de haz por fracción integrando, arco a arco, los
+    pesos de meterset de los control points contra los límites de tasa
+    de dosis, velocidad de gantry y velocidad de láminas de la máquina
+    (MACHINE_PROFILES, core.delivery.estimate_beam_delivery). Si la
+    máquina no tiene perfil el check queda en NO_INFO.
+
+    Usa PLAN_BEAM_ON_TIME_CONFIG[site].
+    """
+    if case.plan is None:
+        rec_texts = get_plan_recommendations("BEAM_ON_TIME", "NO_PLAN")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="Beam-on time",
+            passed=False,
+            score=0.2,
+            message="No hay RTPLAN cargado; no se puede estimar el tiempo de haz.",
+            details={},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    site = infer_site_from_structs(list(case.structs.keys()))
+    cfg = get_plan_beam_on_time_config_for_site(site)
+
+    max_t_ok = float(cfg.get("max_beam_on_time_s_ok", 300.0))
+    max_t_warn = float(cfg.get("max_beam_on_time_s_warn", 600.0))
+    overhead_s = float(cfg.get("beam_overhead_s", 20.0))
+
+    score_ok = float(cfg.get("score_ok", 1.0))
+    score_warn = float(cfg.get("score_warn", 0.7))
+    score_fail = float(cfg.get("score_fail", 0.4))
+    score_no_info = float(cfg.get("score_no_info", 0.8))
+
+    machine_name = case.plan.machine_name or case.metadata.get("machine_name")
+    machine = match_machine_profile(machine_name)
+    if machine is None:
+        rec_texts = get_plan_recommendations("BEAM_ON_TIME", "NO_MACHINE")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="Beam-on time",
+            passed=True,
+            score=score_no_info,
+            message=(
+                f"Máquina '{machine_name or 'sin nombre'}' sin perfil en MACHINE_PROFILES; "
+                "no se estima el tiempo de haz."
+            ),
+            details={"site_inferred": site, "machine_name": machine_name},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    max_gantry = float(machine.get("max_gantry_speed_deg_s", 6.0))
+    max_dr = float(machine.get("max_dose_rate_mu_min", 600.0))
+    max_speed = machine.get("max_leaf_speed_mm_s")
+
+    ignore_pats = ["CBCT", "KV", "IMAGING"]
+    clinical_beams = _get_clinical_beams(case, ignore_pats)
+
+    per_beam: list[Dict[str, Any]] = []
+    missing: list[str] = []
+    for b in clinical_beams:
+        if b.control_points is None or not b.monitor_units:
+            missing.append(b.beam_name)
+            continue
+        dose_rate = min(b.control_points.dose_rate_set_mu_min or max_dr, max_dr)
+        est = estimate_beam_delivery(
+            b.control_points, b.monitor_units, max_gantry, dose_rate, max_speed
+        )
+        if est is None:
+            missing.append(b.beam_name)
+            continue
+        per_beam.append({
+            "beam_name": b.beam_name,
+            "monitor_units": float(b.monitor_units),
+            "beam_on_time_s": est["beam_on_time_s"],
+            "limited_by": est["limited_by"],
+            "mean_dose_rate_mu_min": est["mean_dose_rate_mu_min"],
+            "mean_gantry_speed_deg_s": est["mean_gantry_speed_deg_s"],
+        })
+
+    if not per_beam:
+        rec_texts = get_plan_recommendations("BEAM_ON_TIME", "NO_INFO")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="Beam-on time",
+            passed=True,
+            score=score_no_info,
+            message="No hay MU por beam / control points para estimar el tiempo de haz.",
+            details={"site_inferred": site, "beams_without_info": missing},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    total_s = float(sum(pb["beam_on_time_s"] for pb in per_beam))
+    total_mu = float(sum(pb["monitor_units"] for pb in per_beam))
+    session_s = total_s + overhead_s * max(len(per_beam) - 1, 0)
+
+    if total_s <= max_t_ok:
+        scenario = "OK"
+        passed = True
+        score = score_ok
+        msg = f"Tiempo de haz estimado ≈ {total_s / 60.0:.1f} min por fracción ({total_mu:.0f} MU)."
+    elif total_s <= max_t_warn:
+        scenario = "WARN"
+        passed = True
+        score = score_warn
+        msg = (
+            f"Tiempo de haz estimado algo largo ≈ {total_s / 60.0:.1f} min "
+            f"(> {max_t_ok / 60.0:.1f} min)."
+        )
+    else:
+        scenario = "LONG_DELIVERY"
+        passed = False
+        score = score_fail
+        msg = (
+            f"Tiempo de haz estimado muy largo ≈ {total_s / 60.0:.1f} min "
+            f"(> {max_t_warn / 60.0:.1f} min)."
+        )
+    if missing:
+        msg += f" Sin información en: {', '.join(missing)}."
+
+    rec_texts = get_plan_recommendations("BEAM_ON_TIME", scenario)
+    rec = format_recommendations_text(rec_texts)
+
+    return CheckResult(
+        name="Beam-on time",
+        passed=passed,
+        score=score,
+        message=msg,
+        details={
+            "site_inferred": site,
+            "machine": machine.get("machine_id"),
+            "machine_name": machine_name,
+            "total_mu": total_mu,
+            "beam_on_time_s": total_s,
+            "estimated_session_time_s": session_s,
+            "per_beam": per_beam,
+            "beams_without_info": missing,
+            "config_used": cfg,
+        },
+        group="Plan",
+        recommendation=rec,
+    )
+
+
 # =====================================================
 # 7) Complejidad / modulación del plan
 # =====================================================
@@ -1001,6 +1184,8 @@ def check_plan_modulation_complexity(case: Case) -> CheckResult:
       - Nº de control points por arco
       - Apertura media del MLC (área media de campo útil)
       - Variabilidad de la apertura (coeficiente de variación)
+      - MCS, fracción de aperturas pequeñas y métrica de borde
+        (core.plan_complexity, ponderadas por MU)
 
     Usa PLAN_MODULATION_CONFIG[site].
     """
@@ -1092,11 +1277,11 @@ def check_plan_modulation_complexity(case: Case) -> CheckResult:
         # Opción A: el beam trae una lista de aperturas precalculadas
         apert_beam = getattr(b, "aperture_areas_cm2", None)
         if apert_beam is not None:
-            for a in apert_beam:
-                try:
-                    areas.append(float(a))
-                except Exception:
-                    continue
+            try:
+                arr_beam = np.asarray(apert_beam, dtype=float).ravel()
+                areas.extend(arr_beam[np.isfinite(arr_beam)].tolist())
+            except Exception:
+                pass
         # Opción B: cada CP trae un atributo mlc_aperture_area_cm2
         elif cps is not None:
             for cp in cps:
@@ -1110,6 +1295,11 @@ def check_plan_modulation_complexity(case: Case) -> CheckResult:
     num_arcs = len(arcs)
     cp_per_arc = float(total_cps / num_arcs) if num_arcs > 0 else 0.0
 
+    # Métricas de complejidad sobre los arrays de control points
+    small_ap_mm = float(cfg.get("small_aperture_mm", 10.0))
+    complexity = compute_plan_complexity(arcs, small_aperture_mm=small_ap_mm)
+    plan_cx = complexity["plan"]
+
     mean_area = None
     std_area = None
     cv_area = None
@@ -1169,6 +1359,44 @@ def check_plan_modulation_complexity(case: Case) -> CheckResult:
             )
             severity = worsen(severity, "WARN")
 
+    # 3) MCS, aperturas pequeñas y métrica de borde (si hay MLC)
+    if plan_cx is not None:
+        min_mcs_ok = float(cfg.get("min_mcs_ok", 0.2))
+        min_mcs_warn = float(cfg.get("min_mcs_warn", 0.1))
+        max_sas_ok = float(cfg.get("max_small_aperture_fraction_ok", 0.3))
+        max_sas_warn = float(cfg.get("max_small_aperture_fraction_warn", 0.5))
+        max_edge_ok = cfg.get("max_edge_metric_mm1_ok")
+        max_edge_warn = cfg.get("max_edge_metric_mm1_warn")
+
+        mcs = plan_cx["mcs"]
+        sas = plan_cx["small_aperture_fraction"]
+        edge = plan_cx["edge_metric_mm1"]
+
+        if mcs < min_mcs_warn:
+            issues.append(f"MCS muy bajo (≈{mcs:.2f} < {min_mcs_warn}): modulación muy alta.")
+            severity = "FAIL"
+        elif mcs < min_mcs_ok:
+            issues.append(f"MCS bajo (≈{mcs:.2f} < {min_mcs_ok}).")
+            severity = worsen(severity, "WARN")
+
+        if sas > max_sas_warn:
+            issues.append(
+                f"Fracción de aperturas < {small_ap_mm:.0f} mm muy alta (≈{sas:.2f} > {max_sas_warn})."
+            )
+            severity = "FAIL"
+        elif sas > max_sas_ok:
+            issues.append(
+                f"Fracción de aperturas < {small_ap_mm:.0f} mm alta (≈{sas:.2f} > {max_sas_ok})."
+            )
+            severity = worsen(severity, "WARN")
+
+        if max_edge_warn is not None and edge > float(max_edge_warn):
+            issues.append(f"Métrica de borde muy alta (≈{edge:.3f} mm⁻¹ > {max_edge_warn}).")
+            severity = "FAIL"
+        elif max_edge_ok is not None and edge > float(max_edge_ok):
+            issues.append(f"Métrica de borde alta (≈{edge:.3f} mm⁻¹ > {max_edge_ok}).")
+            severity = worsen(severity, "WARN")
+
     # Resultado global
     if severity == "FAIL":
         scenario = "HIGH_MODULATION"
@@ -1203,6 +1431,410 @@ def check_plan_modulation_complexity(case: Case) -> CheckResult:
             "mean_aperture_cm2": mean_area,
             "std_aperture_cm2": std_area,
             "cv_aperture": cv_area,
+            "complexity": plan_cx,
+            "complexity_per_beam": [bc.to_dict() for bc in complexity["beams"]],
+            "config_used": cfg,
+        },
+        group="Plan",
+        recommendation=rec,
+    )
+
+
+# =====================================================
+# 7b) Entregabilidad del MLC (velocidad / aceleración / gap)
+# =====================================================
+
+def check_plan_deliverability(case: Case) -> CheckResult:
+    """
+    Revisa si el movimiento de láminas es compatible con la máquina:
+
+      - recorrido de láminas por grado y por segundo, con el tiempo de
+        cada segmento limitado por velocidad de gantry y tasa de dosis
+        (core.delivery);
+      - segmentos "limitados por láminas" (velocidad requerida > máxima);
+      - aceleración de láminas entre segmentos;
+      - gap mínimo entre láminas opuestas abiertas y solapes.
+
+    Límites físicos desde MACHINE_PROFILES (según TreatmentMachineName y
+    MACHINE_NAME_ALIASES; máquina sin perfil → NO_INFO); tolerancias desde
+    PLAN_DELIVERABILITY_CONFIG[site].
+    """
+    if case.plan is None:
+        rec_texts = get_plan_recommendations("PLAN_DELIVERABILITY", "NO_PLAN")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="MLC deliverability",
+            passed=False,
+            score=0.2,
+            message="No hay RTPLAN cargado; no se puede evaluar la entregabilidad del MLC.",
+            details={},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    site = infer_site_from_structs(list(case.structs.keys()))
+    cfg = get_plan_deliverability_config_for_site(site)
+
+    lim_ok = float(cfg.get("max_leaf_limited_fraction_ok", 0.50))
+    lim_warn = float(cfg.get("max_leaf_limited_fraction_warn", 0.80))
+    acc_ok = float(cfg.get("max_accel_exceed_fraction_ok", 0.05))
+    acc_warn = float(cfg.get("max_accel_exceed_fraction_warn", 0.15))
+    overlap_tol = float(cfg.get("overlap_tol_mm", 0.05))
+    gap_tol = 1e-3  # posiciones en float32
+
+    score_ok = float(cfg.get("score_ok", 1.0))
+    score_warn = float(cfg.get("score_warn", 0.7))
+    score_fail = float(cfg.get("score_fail", 0.3))
+    score_no_info = float(cfg.get("score_no_info", 0.8))
+
+    machine_name = case.plan.machine_name or case.metadata.get("machine_name")
+    machine = match_machine_profile(machine_name)
+    if machine is None:
+        rec_texts = get_plan_recommendations("PLAN_DELIVERABILITY", "NO_MACHINE")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="MLC deliverability",
+            passed=True,
+            score=score_no_info,
+            message=(
+                f"Máquina '{machine_name or 'sin nombre'}' sin perfil en MACHINE_PROFILES; "
+                "no se evalúa la entregabilidad del MLC."
+            ),
+            details={"site_inferred": site, "machine_name": machine_name},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    max_gantry = float(machine.get("max_gantry_speed_deg_s", 6.0))
+    max_dr = float(machine.get("max_dose_rate_mu_min", 600.0))
+    max_speed = float(machine.get("max_leaf_speed_mm_s", 25.0))
+    max_accel = float(machine.get("max_leaf_accel_mm_s2", 250.0))
+    min_gap = float(machine.get("min_leaf_gap_mm", 0.5))
+
+    ignore_pats = ["CBCT", "KV", "IMAGING"]
+    beams = [
+        b for b in _get_clinical_beams(case, ignore_pats)
+        if b.control_points is not None and b.control_points.mlc_mm
+    ]
+
+    if not beams:
+        rec_texts = get_plan_recommendations("PLAN_DELIVERABILITY", "NO_INFO")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="MLC deliverability",
+            passed=True,
+            score=score_no_info,
+            message="No hay posiciones de MLC por control point en los beams clínicos.",
+            details={"site_inferred": site, "machine": machine.get("machine_id")},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    per_beam: list[Dict[str, Any]] = []
+    n_seg_total = 0
+    n_limited_total = 0
+    n_trans_total = 0
+    n_accel_total = 0
+    n_overlap_cps = 0
+    n_small_gap_cps = 0
+    mu_known = True
+
+    for b in beams:
+        cpa = b.control_points
+        dose_rate = min(cpa.dose_rate_set_mu_min or max_dr, max_dr)
+        beam_mu = getattr(b, "monitor_units", None)
+        mu_known = mu_known and bool(beam_mu)
+
+        kin = compute_leaf_kinematics(cpa, max_gantry, dose_rate, beam_mu)
+        gaps = leaf_pair_gaps_mm(cpa)
+        if kin is None or gaps is None:
+            continue
+
+        with np.errstate(invalid="ignore"):
+            seg_speed = np.nanmax(
+                np.where(np.isfinite(kin["speed_mm_s"]), kin["speed_mm_s"], -np.inf), axis=1
+            )
+            seg_accel = np.nanmax(
+                np.where(np.isfinite(kin["accel_mm_s2"]), kin["accel_mm_s2"], -np.inf), axis=1
+            ) if kin["accel_mm_s2"].size else np.zeros(0)
+
+        valid_seg = np.isfinite(seg_speed)
+        limited = valid_seg & (seg_speed > max_speed)
+        # Aceleración: fracción de (transición, lámina) en movimiento sobre
+        # el límite; un único pico aislado no debería marcar el segmento.
+        accel = kin["accel_mm_s2"]
+        travel = kin["travel_mm"]
+        moving = (travel[1:] > 0) | (travel[:-1] > 0)
+        with np.errstate(invalid="ignore"):
+            accel_exceed = moving & np.isfinite(accel) & (accel > max_accel)
+        valid_trans = np.isfinite(seg_accel)
+
+        overlap_cp = (gaps < -overlap_tol).any(axis=1)
+        small_gap_cp = ((gaps > overlap_tol) & (gaps < min_gap - gap_tol)).any(axis=1)
+
+        n_seg_total += int(valid_seg.sum())
+        n_limited_total += int(limited.sum())
+        n_trans_total += int(moving.sum())
+        n_accel_total += int(accel_exceed.sum())
+        n_overlap_cps += int(overlap_cp.sum())
+        n_small_gap_cps += int(small_gap_cp.sum())
+
+        per_deg = kin["travel_per_deg_mm"]
+        per_beam.append({
+            "beam_name": b.beam_name,
+            "num_segments": int(valid_seg.sum()),
+            "max_leaf_travel_per_deg_mm": (
+                float(np.nanmax(per_deg)) if np.isfinite(per_deg).any() else None
+            ),
+            "max_leaf_speed_mm_s": float(seg_speed[valid_seg].max()) if valid_seg.any() else None,
+            "max_leaf_accel_mm_s2": (
+                float(seg_accel[valid_trans].max()) if valid_trans.any() else None
+            ),
+            "leaf_limited_segments": int(limited.sum()),
+            "accel_exceed_leaf_moves": int(accel_exceed.sum()),
+            "overlap_cps": int(overlap_cp.sum()),
+            "small_gap_cps": int(small_gap_cp.sum()),
+            "min_open_gap_mm": (
+                float(gaps[gaps > overlap_tol].min()) if (gaps > overlap_tol).any() else None
+            ),
+            "dose_rate_mu_min": dose_rate,
+            "monitor_units": beam_mu,
+        })
+
+    limited_frac = n_limited_total / n_seg_total if n_seg_total else 0.0
+    accel_frac = n_accel_total / n_trans_total if n_trans_total else 0.0
+
+    issues: list[str] = []
+    severity = "OK"
+    order = ["OK", "WARN", "FAIL"]
+    def worsen(current: str, new_level: str) -> str:
+        return order[max(order.index(current), order.index(new_level))]
+
+    if n_overlap_cps > 0:
+        issues.append(f"Láminas opuestas solapadas en {n_overlap_cps} control points.")
+        severity = "FAIL"
+
+    # Sin MU por beam los tiempos sólo los limita el gantry y velocidades y
+    # aceleraciones salen sobreestimadas: como mucho WARN.
+    kin_fail = "FAIL" if mu_known else "WARN"
+
+    if limited_frac > lim_warn:
+        issues.append(
+            f"{limited_frac:.0%} de los segmentos exigen velocidad de lámina > {max_speed:.0f} mm/s."
+        )
+        severity = worsen(severity, kin_fail)
+    elif limited_frac > lim_ok:
+        issues.append(
+            f"{limited_frac:.0%} de los segmentos limitados por velocidad de lámina "
+            f"(> {max_speed:.0f} mm/s)."
+        )
+        severity = worsen(severity, "WARN")
+
+    if accel_frac > acc_warn:
+        issues.append(
+            f"{accel_frac:.0%} de los movimientos de lámina con aceleración > {max_accel:.0f} mm/s²."
+        )
+        severity = worsen(severity, kin_fail)
+    elif accel_frac > acc_ok:
+        issues.append(
+            f"{accel_frac:.0%} de los movimientos de lámina con aceleración alta "
+            f"(> {max_accel:.0f} mm/s²)."
+        )
+        severity = worsen(severity, "WARN")
+
+    if n_small_gap_cps > 0:
+        issues.append(
+            f"Gap entre láminas opuestas < {min_gap} mm en {n_small_gap_cps} control points."
+        )
+        severity = worsen(severity, "WARN")
+
+    if severity == "FAIL":
+        scenario = "NOT_DELIVERABLE"
+        passed = False
+        score = score_fail
+    elif severity == "WARN":
+        scenario = "WARN"
+        passed = True
+        score = score_warn
+    else:
+        scenario = "OK"
+        passed = True
+        score = score_ok
+
+    msg = "Movimiento de MLC dentro de los límites de la máquina."
+    if issues:
+        msg = " ; ".join(issues)
+    if not mu_known:
+        msg += " (MU por beam no disponibles: tiempos limitados sólo por gantry.)"
+
+    rec_texts = get_plan_recommendations("PLAN_DELIVERABILITY", scenario)
+    rec = format_recommendations_text(rec_texts)
+
+    return CheckResult(
+        name="MLC deliverability",
+        passed=passed,
+        score=score,
+        message=msg,
+        details={
+            "site_inferred": site,
+            "machine": machine.get("machine_id"),
+            "machine_name": machine_name,
+            "limits": {
+                "max_gantry_speed_deg_s": max_gantry,
+                "max_dose_rate_mu_min": max_dr,
+                "max_leaf_speed_mm_s": max_speed,
+                "max_leaf_accel_mm_s2": max_accel,
+                "min_leaf_gap_mm": min_gap,
+                "max_leaf_travel_per_deg_mm": max_speed / max_gantry,
+            },
+            "leaf_limited_fraction": limited_frac,
+            "accel_exceed_fraction": accel_frac,
+            "overlap_cps": n_overlap_cps,
+            "small_gap_cps": n_small_gap_cps,
+            "mu_known": mu_known,
+            "per_beam": per_beam,
+            "config_used": cfg,
+        },
+        group="Plan",
+        recommendation=rec,
+    )
+
+
+# =====================================================
+# 7c) Colisiones gantry–paciente/mesa
+# =====================================================
+
+def check_plan_collision(case: Case) -> CheckResult:
+    """
+    Criba colisiones del gantry con el paciente (BODY) y la mesa (COUCH)
+    en cada control point de los beams clínicos (planning.collision):
+
+      - C-arm: holgura del cabezal (cilindro a head_clearance_mm del
+        isocentro) frente a la superficie, con rotaciones de mesa.
+      - Anillo (Halcyon / Ethos): holgura radial frente al bore.
+
+    Geometría de la máquina desde MACHINE_PROFILES (máquina sin perfil en
+    MACHINE_NAME_ALIASES → NO_INFO); holguras mínimas desde
+    PLAN_COLLISION_CONFIG[site]. La superficie se limita a la extensión
+    del CT, así que un OK no sustituye al dry run en casos dudosos.
+    """
+    if case.plan is None:
+        rec_texts = get_plan_recommendations("PLAN_COLLISION", "NO_PLAN")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="Gantry collision clearance",
+            passed=False,
+            score=0.2,
+            message="No hay RTPLAN cargado; no se pueden cribar colisiones.",
+            details={},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    site = infer_site_from_structs(list(case.structs.keys()))
+    cfg = get_plan_collision_config_for_site(site)
+
+    ok_mm = float(cfg.get("min_clearance_mm_ok", 50.0))
+    warn_mm = float(cfg.get("min_clearance_mm_warn", 20.0))
+    margin_mm = float(cfg.get("search_margin_mm", 100.0))
+
+    score_ok = float(cfg.get("score_ok", 1.0))
+    score_warn = float(cfg.get("score_warn", 0.6))
+    score_fail = float(cfg.get("score_fail", 0.2))
+    score_no_info = float(cfg.get("score_no_info", 0.8))
+
+    machine_name = case.plan.machine_name or case.metadata.get("machine_name")
+    machine = match_machine_profile(machine_name)
+    if machine is None:
+        rec_texts = get_plan_recommendations("PLAN_COLLISION", "NO_MACHINE")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="Gantry collision clearance",
+            passed=True,
+            score=score_no_info,
+            message=(
+                f"Máquina '{machine_name or 'sin nombre'}' sin perfil en MACHINE_PROFILES; "
+                "se desconoce su geometría y no se criban colisiones."
+            ),
+            details={"site_inferred": site, "machine_name": machine_name},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    ignore_pats = ["CBCT", "KV", "IMAGING"]
+    beams = [b for b in _get_clinical_beams(case, ignore_pats) if b.control_points is not None]
+
+    results, cloud = compute_plan_clearance(
+        case,
+        machine,
+        beams=beams,
+        decimate_mm=float(cfg.get("decimate_mm", 5.0)),
+        include_couch=bool(cfg.get("include_couch", True)),
+        search_margin_mm=margin_mm,
+    )
+
+    if not results:
+        rec_texts = get_plan_recommendations("PLAN_COLLISION", "NO_INFO")
+        rec = format_recommendations_text(rec_texts)
+        return CheckResult(
+            name="Gantry collision clearance",
+            passed=True,
+            score=score_no_info,
+            message="Sin superficie BODY/mesa o sin control points: no se cribaron colisiones.",
+            details={"site_inferred": site, "machine": machine.get("machine_id")},
+            group="Plan",
+            recommendation=rec,
+        )
+
+    per_beam = [r.summary() for r in results]
+    worst = min(per_beam, key=lambda s: s["min_clearance_mm"])
+    min_clr = float(worst["min_clearance_mm"])
+    n_tight = int(sum(int((r.clearance_mm < ok_mm).sum()) for r in results))
+
+    where = (
+        f"'{worst['beam_name']}' gantry {worst['gantry_at_min_deg']:.0f}°, "
+        f"mesa {worst['couch_at_min_deg']:.0f}° ({worst['closest_structure']})"
+    )
+    if min_clr < warn_mm:
+        scenario = "COLLISION"
+        passed = False
+        score = score_fail
+        msg = f"Holgura mínima {min_clr:.0f} mm < {warn_mm:.0f} mm en {where}: posible colisión."
+    elif min_clr < ok_mm:
+        scenario = "WARN"
+        passed = True
+        score = score_warn
+        msg = (
+            f"Holgura mínima {min_clr:.0f} mm (< {ok_mm:.0f} mm) en {where}; "
+            f"{n_tight} control points con holgura reducida."
+        )
+    else:
+        scenario = "OK"
+        passed = True
+        score = score_ok
+        # En C-arm las holguras > search_margin_mm no se calculan con precisión
+        capped = str(machine.get("gantry_type", "C_ARM")).upper() != "RING" and min_clr >= margin_mm
+        shown = f"≥ {margin_mm:.0f}" if capped else f"{min_clr:.0f}"
+        msg = f"Holgura mínima {shown} mm en todos los control points ({machine.get('machine_id')})."
+
+    rec_texts = get_plan_recommendations("PLAN_COLLISION", scenario)
+    rec = format_recommendations_text(rec_texts)
+
+    return CheckResult(
+        name="Gantry collision clearance",
+        passed=passed,
+        score=score,
+        message=msg,
+        details={
+            "site_inferred": site,
+            "machine": machine.get("machine_id"),
+            "machine_name": machine_name,
+            "gantry_type": machine.get("gantry_type", "C_ARM"),
+            "min_clearance_mm": min_clr,
+            "tight_control_points": n_tight,
+            "surface_points": int(cloud.points_mm.shape[0]),
+            "surface_structures": cloud.names,
+            "per_beam": per_beam,
             "config_used": cfg,
         },
         group="Plan",
@@ -1449,20 +2081,43 @@ def check_angular_pattern(case: Case) -> CheckResult:
 # 9) Punto de entrada de este módulo
 # =====================================================
 
-def run_plan_checks(case: Case) -> List[CheckResult]:
+PLAN_CHECK_SPECS: List[CheckSpec] = [
+    CheckSpec("Plan", "ISO_PTV", check_isocenter_vs_ptv,
+              requires=(REQ_PLAN, REQ_STRUCT_MASKS, REQ_CT_HEADER),
+              struct_categories=(StructCategory.PTV,)),
+    CheckSpec("Plan", "PLAN_TECH", check_plan_technique,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES)),
+    CheckSpec("Plan", "BEAM_GEOM", check_beam_geometry,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES)),
+    CheckSpec("Plan", "FRACTIONATION", check_fractionation_reasonableness,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES)),
+    CheckSpec("Plan", "PRESCRIPTION", check_prescription_consistency,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES),
+              optional=(REQ_DOSE, REQ_STRUCT_MASKS),
+              struct_categories=(StructCategory.PTV,)),
+    CheckSpec("Plan", "PLAN_MU", check_plan_mu_sanity,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES)),
+    CheckSpec("Plan", "BEAM_ON_TIME", check_beam_on_time,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES)),
+    CheckSpec("Plan", "PLAN_MODULATION", check_plan_modulation_complexity,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES)),
+    CheckSpec("Plan", "PLAN_DELIVERABILITY", check_plan_deliverability,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES)),
+    CheckSpec("Plan", "PLAN_COLLISION", check_plan_collision,
+              requires=(REQ_PLAN, REQ_STRUCT_MASKS, REQ_CT_HEADER),
+              struct_categories=(StructCategory.BODY, StructCategory.COUCH)),
+    CheckSpec("Plan", "ANGULAR_PATTERN", check_angular_pattern,
+              requires=(REQ_PLAN, REQ_STRUCT_NAMES)),
+]
+
+
+def run_plan_checks(
+    case: Case,
+    enabled_checks: Optional[Set[str]] = None,
+) -> List[CheckResult]:
     """
     Ejecuta todos los checks relacionados con el plan (RTPLAN).
+
+    enabled_checks: ids "Plan.<check_key>" a ejecutar (None = todos).
     """
-    results: List[CheckResult] = []
-    results.append(check_isocenter_vs_ptv(case))
-    results.append(check_plan_technique(case))
-    results.append(check_beam_geometry(case))
-    results.append(check_fractionation_reasonableness(case))
-
-    # Nuevos checks
-    results.append(check_prescription_consistency(case))
-    results.append(check_plan_mu_sanity(case))
-    results.append(check_plan_modulation_complexity(case))
-    results.append(check_angular_pattern(case))  # <--- NUEVO
-
-    return results
+    return run_check_specs(case, PLAN_CHECK_SPECS, enabled_checks)
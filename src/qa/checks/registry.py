@@ -0,0 +1,121 @@
+# src/qa/checks/registry.py
+
+"""
+checks/registry.py
+==================
+
+Registro declarativo de checks: qué función implementa cada check de
+GLOBAL_CHECK_CONFIG y qué datos del Case necesita.
+
+Cada submódulo (ct, structures, plan, dose) declara su lista de CheckSpec
+(CT_CHECK_SPECS, STRUCTURES_CHECK_SPECS, ...) y su orquestador run_*_checks
+la recorre con run_check_specs(), saltando los checks desactivados.
+
+Los ids siguen el mismo convenio que la UI ("<sección>.<check_key>", ver
+build_ui_checks_metadata en qa.config), así que el conjunto de checks
+activos sale directamente de la config efectiva.
+
+Los requisitos (REQ_*) permiten saber, antes de correr nada, qué partes
+del caso hay que leer: con un LazyCase, un perfil de QA sin checks de CT
+no llega a leer los píxeles del CT.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from core.case import Case, CheckResult
+from core.naming import StructCategory
+
+
+# =====================================================
+# Requisitos de datos de un check
+# =====================================================
+
+REQ_CT_HEADER = "ct_header"        # shape / spacing / origen del CT
+REQ_CT_PIXELS = "ct_pixels"        # volumen HU completo
+REQ_STRUCT_NAMES = "struct_names"  # sólo nombres de ROIs
+REQ_STRUCT_MASKS = "struct_masks"  # máscaras (volúmenes, centroides, solapes)
+REQ_PLAN = "plan"                  # RTPLAN parseado
+REQ_DOSE = "dose"                  # RTDOSE remuestreada al CT
+
+
+@dataclass(frozen=True)
+class CheckSpec:
+    """
+    Declaración de un check ejecutable.
+
+    - section / check_key: claves en GLOBAL_CHECK_CONFIG.
+    - func: función check_*(case) -> CheckResult.
+    - requires: datos del Case que el check necesita (REQ_*).
+    - optional: datos que usa si están disponibles, pero sin los que
+      igualmente devuelve un resultado útil.
+    - struct_categories: categorías de estructura (core.naming) cuyas
+      máscaras usa el check. Sirve para rasterizar por adelantado sólo
+      esas; el resto queda disponible bajo demanda.
+    """
+    section: str
+    check_key: str
+    func: Callable[[Case], CheckResult]
+    requires: Tuple[str, ...] = ()
+    optional: Tuple[str, ...] = ()
+    struct_categories: Tuple[StructCategory, ...] = ()
+
+    @property
+    def check_id(self) -> str:
+        return f"{self.section}.{self.check_key}"
+
+
+def is_check_enabled(spec: CheckSpec, enabled_checks: Optional[Set[str]]) -> bool:
+    """
+    enabled_checks=None significa "todos" (comportamiento histórico).
+    """
+    return enabled_checks is None or spec.check_id in enabled_checks
+
+
+def run_check_specs(
+    case: Case,
+    specs: Iterable[CheckSpec],
+    enabled_checks: Optional[Set[str]] = None,
+) -> List[CheckResult]:
+    """
+    Ejecuta, en orden, los checks de `specs` que estén activos.
+    """
+    results: List[CheckResult] = []
+    for spec in specs:
+        if not is_check_enabled(spec, enabled_checks):
+            continue
+        results.append(spec.func(case))
+    return results
+
+
+def get_required_inputs(
+    specs: Iterable[CheckSpec],
+    enabled_checks: Optional[Set[str]] = None,
+) -> Set[str]:
+    """
+    Unión de los requisitos (REQ_*) de los checks activos.
+    """
+    required: Set[str] = set()
+    for spec in specs:
+        if is_check_enabled(spec, enabled_checks):
+            required.update(spec.requires)
+    return required
+
+
+def collect_struct_categories(
+    specs: Iterable[CheckSpec],
+    enabled_checks: Optional[Set[str]] = None,
+) -> Set[StructCategory]:
+    """
+    Unión de las categorías de estructura cuyas máscaras usan los checks
+    activos. HELPER nunca se incluye: los checks las excluyen por nombre
+    y sólo se rasterizan si alguien las pide explícitamente.
+    """
+    cats: Set[StructCategory] = set()
+    for spec in specs:
+        if is_check_enabled(spec, enabled_checks):
+            cats.update(spec.struct_categories)
+    cats.discard(StructCategory.HELPER)
+    return cats
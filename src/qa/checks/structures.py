@@ -2,14 +2,22 @@
 
 from __future__ import annotations
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Set
 import numpy as np
 
 from core.case import Case, CheckResult, StructureInfo
+from .registry import (
+    CheckSpec,
+    run_check_specs,
+    REQ_STRUCT_NAMES,
+    REQ_STRUCT_MASKS,
+)
 from core.naming import (
     group_structures_by_canonical,
     choose_primary_structure,
+    find_primary_ptv,
     infer_site_from_structs,
+    normalize_structure_name,
     StructCategory,
 )
 from qa.config import (
@@ -45,13 +53,24 @@ def _match_structs_by_patterns(struct_names: List[str], patterns: List[str]) ->
 
 def _find_largest_struct_by_patterns(case: Case, patterns: List[str]) -> StructureInfo | None:
     """
-    Devuelve la estructura de mayor volumen cuyo nombre matchee alguno de los patrones.
+    Devuelve la estructura de mayor volumen cuyo nombre matchee alguno de los patrones,
+    priorizando las que no son HELPER según core.naming.
     """
     struct_names = list(case.structs.keys())
     matches = _match_structs_by_patterns(struct_names, patterns)
     if not matches:
         return None
 
+    # Igual que choose_primary_structure: si hay candidatas no-HELPER
+    # (anillos, _OPT, crops...), sólo se comparan ésas. Así tampoco se
+    # rasterizan helpers en un LazyCase sólo para ordenar por volumen.
+    non_helper = [
+        n for n in matches
+        if normalize_structure_name(n).category != StructCategory.HELPER
+    ]
+    if non_helper:
+        matches = non_helper
+
     candidates: List[StructureInfo] = [case.structs[n] for n in matches]
     candidates.sort(key=lambda s: s.volume_cc, reverse=True)
     return candidates[0]
@@ -59,30 +78,10 @@ def _find_largest_struct_by_patterns(case: Case, patterns: List[str]) -> Structu
 
 def _find_ptv_struct(case: Case) -> StructureInfo | None:
     """
-    Intenta encontrar el PTV principal.
-
-    Estrategia actual:
-      1) Buscar estructuras cuyo nombre contenga 'PTV'.
-      2) Excluir estructuras típicamente auxiliares (RING, OPTI, etc.).
-      3) De las restantes, escoger la de mayor volumen (volume_cc).
+    PTV principal del caso (core.naming.find_primary_ptv): el de mayor
+    volumen entre los que contienen 'PTV', sin auxiliares (RING, OPT, zPTV...).
     """
-    candidates: List[StructureInfo] = []
-
-    for name, st in case.structs.items():
-        up = name.upper()
-        if "PTV" not in up:
-            continue
-        # Excluir auxiliares
-        if any(bad in up for bad in ["RING", "OPT", "OPTI", "ZPTV"]):
-            continue
-        candidates.append(st)
-
-    if not candidates:
-        return None
-
-    # El PTV principal se toma como el de mayor volumen
-    candidates.sort(key=lambda s: s.volume_cc, reverse=True)
-    return candidates[0]
+    return find_primary_ptv(case.structs)
 
 
 # =====================================================
@@ -893,17 +892,33 @@ def check_laterality_consistency(case: Case) -> CheckResult:
 # 7) Punto de entrada de este módulo
 # =====================================================
 
-def run_structures_checks(case: Case) -> List[CheckResult]:
+STRUCTURES_CHECK_SPECS: List[CheckSpec] = [
+    CheckSpec("Structures", "MANDATORY_STRUCTURES", check_mandatory_structures,
+              requires=(REQ_STRUCT_NAMES,)),
+    CheckSpec("Structures", "PTV_VOLUME", check_ptv_volume,
+              requires=(REQ_STRUCT_MASKS,),
+              struct_categories=(StructCategory.PTV,)),
+    CheckSpec("Structures", "PTV_INSIDE_BODY", check_ptv_inside_body,
+              requires=(REQ_STRUCT_MASKS,),
+              struct_categories=(StructCategory.PTV, StructCategory.BODY)),
+    CheckSpec("Structures", "STRUCT_OVERLAP", check_ptv_oar_overlap,
+              requires=(REQ_STRUCT_MASKS,),
+              struct_categories=(StructCategory.PTV, StructCategory.OAR)),
+    CheckSpec("Structures", "DUPLICATE_STRUCTURES", check_duplicate_structures,
+              requires=(REQ_STRUCT_NAMES,)),
+    CheckSpec("Structures", "LATERALITY", check_laterality_consistency,
+              requires=(REQ_STRUCT_MASKS,),
+              struct_categories=(StructCategory.OAR,)),
+]
+
+
+def run_structures_checks(
+    case: Case,
+    enabled_checks: Optional[Set[str]] = None,
+) -> List[CheckResult]:
     """
     Ejecuta todos los checks relacionados con estructuras (RTSTRUCT).
-    """
-    results: List[CheckResult] = []
 
-    results.append(check_mandatory_structures(case))
-    results.append(check_ptv_volume(case))
-    results.append(check_ptv_inside_body(case))
-    results.append(check_ptv_oar_overlap(case))
-    results.append(check_duplicate_structures(case))
-    results.append(check_laterality_consistency(case))
-
-    return results
+    enabled_checks: ids "Structures.<check_key>" a ejecutar (None = todos).
+    """
+    return run_check_specs(case, STRUCTURES_CHECK_SPECS, enabled_checks)
@@ -239,11 +239,29 @@ GLOBAL_CHECK_CONFIG: Dict[str, Dict[str, CheckConfig]] = {
             "weight": 0.8,
             "description": "MU totales y MU/Gy dentro del rango esperado.",
         },
+        "BEAM_ON_TIME": {
+            "result_name": "Beam-on time",
+            "enabled": True,
+            "weight": 0.5,
+            "description": "Tiempo de haz estimado por fracción (tasa de dosis, gantry y láminas).",
+        },
         "PLAN_MODULATION": {
             "result_name": "Plan modulation complexity",
             "enabled": True,
             "weight": 0.8,
-            "description": "Complejidad/modulación del plan (CP, aperturas MLC).",
+            "description": "Complejidad/modulación del plan (CP, aperturas MLC, MCS).",
+        },
+        "PLAN_DELIVERABILITY": {
+            "result_name": "MLC deliverability",
+            "enabled": True,
+            "weight": 0.8,
+            "description": "Velocidad/aceleración de láminas y gap mínimo frente a los límites de la máquina.",
+        },
+        "PLAN_COLLISION": {
+            "result_name": "Gantry collision clearance",
+            "enabled": True,
+            "weight": 1.0,
+            "description": "Holgura cabezal/anillo frente a paciente (BODY) y mesa en cada control point.",
         },
         "ANGULAR_PATTERN": {
             "result_name": "Angular pattern",
@@ -285,7 +303,7 @@ GLOBAL_CHECK_CONFIG: Dict[str, Dict[str, CheckConfig]] = {
             "result_name": "PTV conformity (Paddick)",
             "enabled": True,
             "weight": 1.0,
-            "description": "Índice de conformidad de Paddick para el PTV.",
+            "description": "Conformidad de Paddick y gradiente de dosis (R50%, GI, D2cm) del PTV.",
         },
         "PTV_HOMOGENEITY": {
             "result_name": "PTV homogeneity",
@@ -293,6 +311,29 @@ GLOBAL_CHECK_CONFIG: Dict[str, Dict[str, CheckConfig]] = {
             "weight": 1.0,
             "description": "Índices de homogeneidad del PTV (HI_RTOG, (D2–D98)/D50).",
         },
+        "DOSE_GAMMA": {
+            "result_name": "Dose gamma",
+            # Apagado hasta que algo rellene case.metadata["dose_eval_gy"]
+            # (recálculo o predicción); sin ella sólo daría NO_EVAL.
+            "enabled": False,
+            "weight": 1.0,
+            "description": "Gamma 3D frente a una dosis recalculada o predicha (si existe).",
+        },
+        "OAR_DVH_EQD2": {
+            "result_name": "OAR DVH (EQD2)",
+            "enabled": True,
+            "weight": 1.2,
+            "description": "Límites DVH de OARs en EQD2 con el fraccionamiento del plan.",
+        },
+
+        "OAR_DVH_KB": {
+            "result_name": "OAR DVH vs KB prediction",
+            # Apagado hasta configurar DOSE_KB_CONFIG["model_path"]; sin
+            # modelo sólo daría NO_MODEL.
+            "enabled": False,
+            "weight": 1.0,
+            "description": "DVH de OARs frente a la dosis alcanzable predicha por el modelo (UNet3D).",
+        },
     },
 
     # ----------------------
@@ -760,6 +801,138 @@ CT_CLIPPING_RECOMMEND = {
     }
 }
 
+# ============================================================
+# B.7) CBCT HYPERSIGHT — CALIBRACIÓN HU Y ACUERDO CON EL CT
+#      (usado por hypersight.qa, fuera del registro de checks del CT)
+# ============================================================
+
+CBCT_HU_CONFIG = {
+    "DEFAULT": {
+        # Mismas claves que CT_HU_CONFIG (core.hu_stats.hu_calibration_stats)
+        "air_expected_hu": -1000,
+        "air_warn_tolerance_hu": 80,
+        "air_tolerance_hu": 120,
+        "air_percentile": 1.0,
+        "air_min_valid_hu": -1200,   # ignora el padding fuera del FOV
+
+        "water_expected_hu": 0,
+        "water_warn_tolerance_hu": 40,
+        "water_tolerance_hu": 80,
+
+        "water_window_min_hu": -200,
+        "water_window_max_hu": 200,
+        "min_water_voxels": 1000,
+
+        # Hueso: sólo se informa (el valor depende de la anatomía)
+        "bone_min_hu": 300,
+
+        "score_ok": 1.0,
+        "score_warn": 0.6,
+        "score_fail": 0.4,
+        "score_no_info": 0.8,
+    },
+}
+
+def get_cbct_hu_config(profile: Optional[str]) -> Dict[str, Any]:
+    """
+    Config de calibración HU (aire/agua/hueso) del CBCT por perfil.
+    Si profile es None o desconocido → usa DEFAULT.
+    """
+    key = _normalize_profile_key(profile)
+    return CBCT_HU_CONFIG.get(key, CBCT_HU_CONFIG["DEFAULT"])
+
+
+CBCT_CT_AGREEMENT_CONFIG = {
+    "DEFAULT": {
+        "body_name_patterns": ["BODY", "EXTERNAL", "OUTER_CONTOUR"],
+
+        # Registro rígido (hypersight.registration)
+        "registration_grid_mm": 4.0,
+        "registration_max_iterations": 100,
+        "registration_sampling_fraction": 0.02,
+
+        # Comparación de HU dentro del BODY, en un grid de comparison_grid_mm
+        "comparison_grid_mm": 3.0,
+        "soft_tissue_window_hu": (-200, 200),
+        "bone_min_hu": 300,
+        "min_voxels": 500,
+        "soft_tissue_warn_diff_hu": 25,
+        "soft_tissue_max_diff_hu": 50,
+        "bone_warn_diff_hu": 80,
+        "bone_max_diff_hu": 150,
+
+        # Desplazamiento del registro (sólo informativo → WARN)
+        "shift_warn_mm": 5.0,
+        "rotation_warn_deg": 2.0,
+
+        "score_ok": 1.0,
+        "score_warn": 0.6,
+        "score_fail": 0.4,
+        "score_no_info": 0.8,
+    },
+}
+
+def get_cbct_ct_agreement_config(profile: Optional[str]) -> Dict[str, Any]:
+    """
+    Config de registro CBCT→CT y de comparación de HU dentro del BODY.
+    """
+    key = _normalize_profile_key(profile)
+    return CBCT_CT_AGREEMENT_CONFIG.get(key, CBCT_CT_AGREEMENT_CONFIG["DEFAULT"])
+
+
+CBCT_RECOMMENDATIONS = {
+    "HU": {
+        "OK": {
+            "physicist": "HU de aire y agua del CBCT dentro de tolerancia.",
+            "radonc": "La calibración HU del CBCT es consistente.",
+        },
+        "WARN": {
+            "physicist": (
+                "Desviación moderada de HU en el CBCT. Revisar la calibración HU "
+                "del HyperSight y el protocolo de adquisición usado."
+            ),
+            "radonc": "El CBCT muestra HU algo desviados; física lo revisará.",
+        },
+        "BAD": {
+            "physicist": (
+                "HU del CBCT fuera de tolerancia. No usar el CBCT para recálculo de "
+                "dosis hasta verificar la calibración con maniquí."
+            ),
+            "radonc": "La calibración HU del CBCT no es fiable. Consultar a física.",
+        },
+    },
+    "AGREEMENT": {
+        "OK": {
+            "physicist": "Los HU del CBCT y del CT de planificación concuerdan dentro del BODY.",
+            "radonc": "CBCT y CT de planificación son consistentes.",
+        },
+        "WARN": {
+            "physicist": (
+                "Diferencias moderadas de HU CBCT vs CT. Revisar registro, cambios "
+                "anatómicos (gas, llenado vesical) y artefactos."
+            ),
+            "radonc": "Hay diferencias moderadas entre CBCT y CT; valorar cambios anatómicos.",
+        },
+        "BAD": {
+            "physicist": (
+                "Diferencias de HU CBCT vs CT fuera de tolerancia. Verificar el "
+                "registro y la calibración antes de cualquier uso dosimétrico."
+            ),
+            "radonc": "CBCT y CT difieren de forma relevante. Consultar a física.",
+        },
+        "NO_INFO": {
+            "physicist": "No se pudo comparar CBCT vs CT (falta BODY o voxeles suficientes).",
+            "radonc": "Comparación CBCT/CT no disponible.",
+        },
+    },
+}
+
+def get_cbct_recommendations(check_key: str, scenario: str) -> Dict[str, str]:
+    """
+    {rol: texto} para la QA de CBCT (claves HU / AGREEMENT).
+    """
+    return CBCT_RECOMMENDATIONS.get(check_key, {}).get((scenario or "").upper(), {})
+
 # ============================================================
 # C) CONFIGURACIÓN DE STRUCTURES
 #    - Estructuras obligatorias
@@ -1500,11 +1673,29 @@ PLAN_CHECK_CONFIG: Dict[str, Dict[str, Any]] = {
         "weight": 0.8,
         "description": "MU totales y MU/Gy dentro del rango esperado.",
     },
+    "BEAM_ON_TIME": {
+        "result_name": "Beam-on time",
+        "enabled": True,
+        "weight": 0.5,
+        "description": "Tiempo de haz estimado por fracción (tasa de dosis, gantry y láminas).",
+    },
     "PLAN_MODULATION": {
         "result_name": "Plan modulation complexity",
         "enabled": True,
         "weight": 0.8,
-        "description": "Complejidad/modulación del plan (CP, aperturas MLC).",
+        "description": "Complejidad/modulación del plan (CP, aperturas MLC, MCS).",
+    },
+    "PLAN_DELIVERABILITY": {
+        "result_name": "MLC deliverability",
+        "enabled": True,
+        "weight": 0.8,
+        "description": "Velocidad/aceleración de láminas y gap mínimo frente a los límites de la máquina.",
+    },
+    "PLAN_COLLISION": {
+        "result_name": "Gantry collision clearance",
+        "enabled": True,
+        "weight": 1.0,
+        "description": "Holgura cabezal/anillo frente a paciente (BODY) y mesa en cada control point.",
     },
     "ANGULAR_PATTERN": {
         "result_name": "Angular pattern",
@@ -1571,7 +1762,7 @@ def get_fractionation_schemes_for_site(site: str) -> List[FractionationScheme]:
     Si no se encuentra, devuelve lista vacía.
     """
     key = _normalize_site_key(site)
-    return COMMON_SCHEMES.get(key, COMMON_SCHEMES["DEFAULT"])
+    return COMMON_SCHEMES.get(key, [])
 
 # ------------------------------------------------------------
 # 3) Configuración de técnica de plan por sitio
@@ -1747,40 +1938,137 @@ def get_prescription_config_for_site(site: str | None) -> Dict[str, Any]:
 # 6) Config: MU totales / MU por Gy (plan efficiency / sanity)
 # ------------------------------------------------------------
 
-PLAN_MU_CONFIG: Dict[str, Dict[str, Any]] = {
+PLAN_MU_CONFIG: Dict[str, Dict[str, Dict[str, Any]]] = {
+    # MU/Gy = MU por fracción (BeamMeterset) / dosis por fracción.
+    #
+    # Los rangos dependen mucho de la técnica: un 3D-CRT/estático ronda
+    # 100-200 MU/Gy, mientras que un VMAT modulado con 6X-FFF (Halcyon,
+    # máquina por defecto del servicio) da típicamente 250-450 MU/Gy.
+    # Por eso, como en ANGULAR_PATTERN_CONFIG, se indexa por sitio y
+    # técnica (case.plan.technique), con "ANY" como fallback.
+    "DEFAULT": {
+        # VMAT genérico (incluye Halcyon 6X-FFF)
+        "VMAT": {
+            "min_mu_per_gy": 80.0,
+            "max_mu_per_gy": 500.0,
+            "warn_margin_rel": 0.2,   # 20%
+            "score_ok": 1.0,
+            "score_warn": 0.7,
+            "score_fail": 0.3,
+            "score_no_info": 0.8,
+        },
+        # Fallback: campos estáticos / IMRT / 3D-CRT
+        "ANY": {
+            "min_mu_per_gy": 30.0,
+            "max_mu_per_gy": 300.0,
+
+            # Margen relativo para WARN vs FAIL
+            "warn_margin_rel": 0.2,   # 20%
+
+            "score_ok": 1.0,
+            "score_warn": 0.7,
+            "score_fail": 0.3,
+            "score_no_info": 0.8,
+        },
+    },
+
+    "PROSTATE": {
+        # Próstata VMAT en Halcyon (2 arcos, 6X-FFF): ~300-450 MU/Gy;
+        # en TrueBeam con filtro, ~200-300 MU/Gy.
+        "VMAT": {
+            "min_mu_per_gy": 150.0,
+            "max_mu_per_gy": 500.0,
+            "warn_margin_rel": 0.2,
+            "score_ok": 1.0,
+            "score_warn": 0.7,
+            "score_fail": 0.3,
+            "score_no_info": 0.8,
+        },
+        # Próstata IMRT / estático (ajusta a tu servicio)
+        "ANY": {
+            "min_mu_per_gy": 50.0,
+            "max_mu_per_gy": 250.0,
+            "warn_margin_rel": 0.2,
+            "score_ok": 1.0,
+            "score_warn": 0.7,
+            "score_fail": 0.3,
+            "score_no_info": 0.8,
+        },
+    },
+}
+
+
+def get_plan_mu_config_for_site(
+    site: Optional[str],
+    technique: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Devuelve configuración MU/Gy para el sitio y la técnica.
+
+    Prioridad:
+      1) PLAN_MU_CONFIG[site_upper][tech_upper]
+      2) PLAN_MU_CONFIG[site_upper]['ANY']
+      3) PLAN_MU_CONFIG['DEFAULT'][tech_upper]
+      4) PLAN_MU_CONFIG['DEFAULT']['ANY']
+    """
+    site_key = (site or "DEFAULT").upper()
+    tech_key = (technique or "ANY").upper()
+
+    site_cfg = PLAN_MU_CONFIG.get(site_key)
+    default_site_cfg = PLAN_MU_CONFIG["DEFAULT"]
+
+    if site_cfg is not None:
+        if tech_key in site_cfg:
+            return site_cfg[tech_key]
+        if "ANY" in site_cfg:
+            return site_cfg["ANY"]
+
+    if tech_key in default_site_cfg:
+        return default_site_cfg[tech_key]
+    return default_site_cfg["ANY"]
+
+
+# ------------------------------------------------------------
+# 6b) Config: tiempo de haz estimado (beam-on) por fracción
+#
+# El tiempo se estima con core.delivery.estimate_beam_delivery usando los
+# límites de MACHINE_PROFILES (tasa de dosis, gantry, láminas).
+# ------------------------------------------------------------
+
+PLAN_BEAM_ON_TIME_CONFIG: Dict[str, Dict[str, Any]] = {
     "DEFAULT": {
-        # Rango razonable de MU/Gy para planes fotones tipo IMRT/VMAT.
-        "min_mu_per_gy": 30.0,
-        "max_mu_per_gy": 300.0,
+        # Tiempo de haz total por fracción (s)
+        "max_beam_on_time_s_ok": 300.0,
+        "max_beam_on_time_s_warn": 600.0,
 
-        # Margen relativo para WARN vs FAIL
-        "warn_margin_rel": 0.2,   # 20%
+        # Tiempo muerto estimado entre beams (mode-up, giro sin haz), sólo
+        # para el tiempo de sesión informativo.
+        "beam_overhead_s": 20.0,
 
         "score_ok": 1.0,
         "score_warn": 0.7,
-        "score_fail": 0.3,
+        "score_fail": 0.4,
         "score_no_info": 0.8,
     },
 
     "PROSTATE": {
-        # Para próstata VMAT/IMRT típico (ajusta a tu servicio/Halcyon)
-        "min_mu_per_gy": 50.0,
-        "max_mu_per_gy": 250.0,
-        "warn_margin_rel": 0.2,
+        "max_beam_on_time_s_ok": 180.0,
+        "max_beam_on_time_s_warn": 360.0,
+        "beam_overhead_s": 20.0,
         "score_ok": 1.0,
         "score_warn": 0.7,
-        "score_fail": 0.3,
+        "score_fail": 0.4,
         "score_no_info": 0.8,
     },
 }
 
 
-def get_plan_mu_config_for_site(site: str | None) -> Dict[str, Any]:
+def get_plan_beam_on_time_config_for_site(site: str | None) -> Dict[str, Any]:
     """
-    Devuelve configuración MU/Gy para el sitio.
+    Devuelve configuración de tiempo de haz estimado para el sitio.
     """
     site_up = (site or "DEFAULT").upper()
-    return PLAN_MU_CONFIG.get(site_up, PLAN_MU_CONFIG["DEFAULT"])
+    return PLAN_BEAM_ON_TIME_CONFIG.get(site_up, PLAN_BEAM_ON_TIME_CONFIG["DEFAULT"])
 
 
 # ------------------------------------------------------------
@@ -1802,6 +2090,18 @@ PLAN_MODULATION_CONFIG: Dict[str, Dict[str, Any]] = {
         "max_area_cv_ok": 0.8,      # > 0.8 → modulación muy variable
         "max_area_cv_warn": 1.2,
 
+        # Métricas de complejidad (core.plan_complexity), ponderadas por MU:
+        # MCS ∈ [0, 1]; 1 = campo abierto, → 0 = modulación extrema.
+        "min_mcs_ok": 0.2,
+        "min_mcs_warn": 0.1,
+        # Fracción de pares de láminas abiertos con gap < small_aperture_mm
+        "small_aperture_mm": 10.0,
+        "max_small_aperture_fraction_ok": 0.3,
+        "max_small_aperture_fraction_warn": 0.5,
+        # Métrica de borde (perímetro/área, mm⁻¹). None = sólo se reporta.
+        "max_edge_metric_mm1_ok": None,
+        "max_edge_metric_mm1_warn": None,
+
         "score_ok": 1.0,
         "score_warn": 0.7,
         "score_fail": 0.3,
@@ -1816,6 +2116,13 @@ PLAN_MODULATION_CONFIG: Dict[str, Dict[str, Any]] = {
         "min_mean_area_cm2_warn": 15.0,
         "max_area_cv_ok": 0.8,
         "max_area_cv_warn": 1.2,
+        "min_mcs_ok": 0.2,
+        "min_mcs_warn": 0.1,
+        "small_aperture_mm": 10.0,
+        "max_small_aperture_fraction_ok": 0.3,
+        "max_small_aperture_fraction_warn": 0.5,
+        "max_edge_metric_mm1_ok": None,
+        "max_edge_metric_mm1_warn": None,
         "score_ok": 1.0,
         "score_warn": 0.7,
         "score_fail": 0.3,
@@ -1832,6 +2139,85 @@ def get_plan_modulation_config_for_site(site: str | None) -> Dict[str, Any]:
     return PLAN_MODULATION_CONFIG.get(site_up, PLAN_MODULATION_CONFIG["DEFAULT"])
 
 
+# ------------------------------------------------------------
+# 7b) Config: entregabilidad del MLC (velocidad / aceleración / gap)
+#
+# Los límites físicos (velocidad de gantry, tasa de dosis, velocidad y
+# aceleración de láminas, gap mínimo) vienen de MACHINE_PROFILES; aquí
+# sólo se decide qué fracción de segmentos fuera de límite es tolerable.
+# ------------------------------------------------------------
+
+PLAN_DELIVERABILITY_CONFIG: Dict[str, Dict[str, Any]] = {
+    "DEFAULT": {
+        # Fracción de segmentos en los que las láminas necesitarían ir más
+        # rápido que su máximo (la máquina tendría que frenar gantry/tasa).
+        # En VMAT clínico es habitual un 20-40 %.
+        "max_leaf_limited_fraction_ok": 0.50,
+        "max_leaf_limited_fraction_warn": 0.80,
+
+        # Fracción de movimientos de lámina (lámina × transición entre
+        # segmentos) con aceleración > límite de la máquina
+        "max_accel_exceed_fraction_ok": 0.05,
+        "max_accel_exceed_fraction_warn": 0.15,
+
+        # Tolerancia (mm) para considerar solape de láminas opuestas
+        "overlap_tol_mm": 0.05,
+
+        "score_ok": 1.0,
+        "score_warn": 0.7,
+        "score_fail": 0.3,
+        "score_no_info": 0.8,
+    },
+}
+
+
+def get_plan_deliverability_config_for_site(site: str | None) -> Dict[str, Any]:
+    """
+    Devuelve configuración de entregabilidad del MLC para el sitio.
+    """
+    site_up = (site or "DEFAULT").upper()
+    return PLAN_DELIVERABILITY_CONFIG.get(site_up, PLAN_DELIVERABILITY_CONFIG["DEFAULT"])
+
+
+# ------------------------------------------------------------
+# 7c) Config: cribado de colisiones gantry–paciente/mesa
+#
+# La geometría del gantry (C-arm: distancia y radio del cabezal; anillo:
+# radio libre del bore) viene de MACHINE_PROFILES; aquí van la
+# resolución de la superficie y las holguras mínimas aceptables.
+# ------------------------------------------------------------
+
+PLAN_COLLISION_CONFIG: Dict[str, Dict[str, Any]] = {
+    "DEFAULT": {
+        # Superficie BODY (+ COUCH) diezmada a ~decimate_mm
+        "decimate_mm": 5.0,
+        "include_couch": True,
+
+        # Holgura mínima (mm) entre cabezal/anillo y superficie.
+        # El modelo de cabezal es aproximado: tolerancias generosas.
+        "min_clearance_mm_ok": 50.0,
+        "min_clearance_mm_warn": 20.0,
+
+        # Holguras mayores que esto no se calculan con precisión (se
+        # informan como "> margen")
+        "search_margin_mm": 100.0,
+
+        "score_ok": 1.0,
+        "score_warn": 0.6,
+        "score_fail": 0.2,
+        "score_no_info": 0.8,
+    },
+}
+
+
+def get_plan_collision_config_for_site(site: str | None) -> Dict[str, Any]:
+    """
+    Devuelve configuración del cribado de colisiones para el sitio.
+    """
+    site_up = (site or "DEFAULT").upper()
+    return PLAN_COLLISION_CONFIG.get(site_up, PLAN_COLLISION_CONFIG["DEFAULT"])
+
+
 # ------------------------------------------------------------
 # 8) Config: patrones angulares por sitio y técnica
 # ------------------------------------------------------------
@@ -2049,7 +2435,10 @@ def get_fractionation_scoring_for_site(site: str | None) -> Dict[str, float]:
 #   - "FRACTIONATION"
 #   - "PRESCRIPTION"
 #   - "PLAN_MU"
+#   - "BEAM_ON_TIME"
 #   - "PLAN_MODULATION"
+#   - "PLAN_DELIVERABILITY"
+#   - "PLAN_COLLISION"
 #   - "ANGULAR_PATTERN"
 #
 # role:
@@ -2341,6 +2730,66 @@ PLAN_RECOMMENDATIONS: Dict[str, Dict[str, Dict[str, str]]] = {
         },
     },
 
+    # 6b) Tiempo de haz estimado
+    "BEAM_ON_TIME": {
+        "NO_PLAN": {
+            "physicist": (
+                "No se pudo estimar el tiempo de haz porque no hay RTPLAN cargado."
+            ),
+            "radonc": (
+                "Sin plan cargado, el sistema no puede estimar la duración del tratamiento."
+            ),
+        },
+        "NO_INFO": {
+            "physicist": (
+                "Faltan MU por beam o control points para estimar el tiempo de haz. "
+                "Revisa FractionGroupSequence/BeamMeterset en el RTPLAN exportado."
+            ),
+            "radonc": (
+                "El sistema no puede estimar cuánto durará cada sesión con este plan."
+            ),
+        },
+        "NO_MACHINE": {
+            "physicist": (
+                "La máquina del plan (TreatmentMachineName) no corresponde a ningún perfil de "
+                "MACHINE_PROFILES. Añade su nombre a MACHINE_NAME_ALIASES para usar sus "
+                "límites de gantry, tasa de dosis y láminas."
+            ),
+            "radonc": (
+                "El sistema no reconoce la máquina del plan y no estima la duración de la sesión."
+            ),
+        },
+        "OK": {
+            "physicist": (
+                "Tiempo de haz estimado dentro de lo esperado para este sitio y máquina."
+            ),
+            "radonc": (
+                "La duración estimada de la irradiación por sesión es la habitual."
+            ),
+        },
+        "WARN": {
+            "physicist": (
+                "Tiempo de haz por encima de lo típico. Revisa MU, modulación y si los "
+                "segmentos quedan limitados por láminas o por tasa de dosis."
+            ),
+            "radonc": (
+                "Cada sesión será algo más larga de lo habitual; valora con el físico "
+                "si afecta a la inmovilización o al movimiento intrafracción."
+            ),
+        },
+        "LONG_DELIVERY": {
+            "physicist": (
+                "Tiempo de haz muy largo: probable exceso de MU o modulación, o "
+                "demasiados arcos. Considera reoptimizar (restricciones de MU, "
+                "suavizado de MLC) para mejorar robustez y capacidad de la agenda."
+            ),
+            "radonc": (
+                "La irradiación por sesión es muy larga, lo que aumenta el riesgo de "
+                "movimiento del paciente. Coméntalo con el físico."
+            ),
+        },
+    },
+
     # 7) Complejidad / modulación del plan
     "PLAN_MODULATION": {
         "NO_PLAN": {
@@ -2392,6 +2841,113 @@ PLAN_RECOMMENDATIONS: Dict[str, Dict[str, Dict[str, str]]] = {
         },
     },
 
+    # 7b) Entregabilidad del MLC
+    "PLAN_DELIVERABILITY": {
+        "NO_PLAN": {
+            "physicist": (
+                "No se pudo evaluar la entregabilidad del MLC porque no hay RTPLAN cargado."
+            ),
+            "radonc": (
+                "Sin plan cargado, el sistema no puede revisar si el MLC puede entregar el plan."
+            ),
+        },
+        "NO_INFO": {
+            "physicist": (
+                "No hay posiciones de MLC por control point en los beams clínicos. "
+                "Revisa la exportación del RTPLAN."
+            ),
+            "radonc": (
+                "El sistema no puede revisar el movimiento de láminas de este plan."
+            ),
+        },
+        "NO_MACHINE": {
+            "physicist": (
+                "La máquina del plan (TreatmentMachineName) no corresponde a ningún perfil de "
+                "MACHINE_PROFILES. Añade su nombre a MACHINE_NAME_ALIASES para comparar el "
+                "movimiento de láminas con sus límites reales."
+            ),
+            "radonc": (
+                "El sistema no reconoce la máquina del plan y no revisa el movimiento de láminas."
+            ),
+        },
+        "OK": {
+            "physicist": (
+                "Velocidades, aceleraciones y gaps de láminas dentro de los límites de la máquina."
+            ),
+            "radonc": (
+                "El movimiento del MLC es compatible con la máquina de tratamiento."
+            ),
+        },
+        "WARN": {
+            "physicist": (
+                "Algunos segmentos exigen velocidades/aceleraciones de lámina al límite o gaps "
+                "muy pequeños: la máquina frenará gantry o tasa de dosis. Considera suavizar "
+                "la modulación (restricciones de MLC, más CP) y revisa el QA específico."
+            ),
+            "radonc": (
+                "El plan exige mucho al MLC; es entregable pero más lento y sensible. "
+                "Coméntalo con el físico si se observa en varios casos."
+            ),
+        },
+        "NOT_DELIVERABLE": {
+            "physicist": (
+                "Láminas opuestas solapadas o gran parte de los segmentos fuera de los límites "
+                "del MLC. Reoptimiza o recalcula la secuencia de MLC antes de aprobar."
+            ),
+            "radonc": (
+                "El plan presenta movimientos de MLC que la máquina probablemente no puede "
+                "entregar como está. Requiere revisión del físico antes del tratamiento."
+            ),
+        },
+    },
+
+    # 7c) Colisiones gantry–paciente/mesa
+    "PLAN_COLLISION": {
+        "NO_PLAN": {
+            "physicist": "No hay RTPLAN cargado; no se puede cribar colisiones.",
+            "radonc": "Sin plan cargado no se revisan posibles colisiones.",
+        },
+        "NO_INFO": {
+            "physicist": (
+                "No hay BODY (ni mesa) o control points para cribar colisiones. "
+                "Revisa el RTSTRUCT y la exportación del RTPLAN."
+            ),
+            "radonc": "El sistema no pudo revisar colisiones para este plan.",
+        },
+        "NO_MACHINE": {
+            "physicist": (
+                "La máquina del plan (TreatmentMachineName) no corresponde a ningún perfil de "
+                "MACHINE_PROFILES, así que se desconoce su geometría (C-arm / anillo). Añade su "
+                "nombre a MACHINE_NAME_ALIASES o verifica las colisiones con un dry run."
+            ),
+            "radonc": "El sistema no reconoce la máquina del plan y no revisa colisiones.",
+        },
+        "OK": {
+            "physicist": (
+                "Holgura cabezal/anillo–paciente/mesa suficiente en todos los control points "
+                "(superficie limitada a la extensión del CT)."
+            ),
+            "radonc": "No se prevén colisiones del gantry con el paciente o la mesa.",
+        },
+        "WARN": {
+            "physicist": (
+                "Holgura reducida en algunos ángulos. Considera un dry run del arco/mesa "
+                "antes del primer tratamiento, especialmente con rotaciones de mesa."
+            ),
+            "radonc": "Algunos ángulos pasan cerca del paciente o la mesa; física lo comprobará.",
+        },
+        "COLLISION": {
+            "physicist": (
+                "El modelo predice contacto o holgura crítica. Revisa isocentro, ángulos de "
+                "gantry/mesa y haz un dry run obligatorio antes de tratar."
+            ),
+            "radonc": (
+                "Riesgo de colisión del gantry con el paciente o la mesa. Requiere revisión "
+                "del plan antes del tratamiento."
+            ),
+        },
+    },
+
     # 8) Patrones angulares (IMRT/3D-CRT/VMAT)
     "ANGULAR_PATTERN": {
         "NO_PLAN": {
@@ -2529,7 +3085,7 @@ DOSE_CHECK_CONFIG: Dict[str, Dict[str, Any]] = {
         "result_name": "PTV conformity (Paddick)",
         "enabled": True,
         "weight": 1.0,
-        "description": "Índice de conformidad de Paddick para el PTV.",
+        "description": "Conformidad de Paddick y gradiente de dosis (R50%, GI, D2cm) del PTV.",
     },
     "PTV_HOMOGENEITY": {
         "result_name": "PTV homogeneity",
@@ -2537,6 +3093,28 @@ DOSE_CHECK_CONFIG: Dict[str, Dict[str, Any]] = {
         "weight": 1.0,
         "description": "Índices de homogeneidad del PTV (HI_RTOG, (D2–D98)/D50).",
     },
+    "DOSE_GAMMA": {
+        "result_name": "Dose gamma",
+        # Apagado hasta que algo rellene case.metadata["dose_eval_gy"]
+        # (recálculo o predicción); sin ella sólo daría NO_EVAL.
+        "enabled": False,
+        "weight": 1.0,
+        "description": "Gamma 3D frente a una dosis recalculada o predicha (si existe).",
+    },
+    "OAR_DVH_EQD2": {
+        "result_name": "OAR DVH (EQD2)",
+        "enabled": True,
+        "weight": 1.2,
+        "description": "Límites DVH de OARs en EQD2 con el fraccionamiento del plan.",
+    },
+    "OAR_DVH_KB": {
+        "result_name": "OAR DVH vs KB prediction",
+        # Apagado hasta configurar DOSE_KB_CONFIG["model_path"]; sin
+        # modelo sólo daría NO_MODEL.
+        "enabled": False,
+        "weight": 1.0,
+        "description": "DVH de OARs frente a la dosis alcanzable predicha por el modelo (UNet3D).",
+    },
 }
 
 
@@ -2726,7 +3304,7 @@ PTV_COVERAGE_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
 #      - recomendaciones
 # ------------------------------------------------------------
 
-HOTSPOT_CONFIG: Dict[str, float] = {
+HOTSPOT_CONFIG: Dict[str, Any] = {
     # Máximo permitido para Dmax global, relativo a la prescripción
     "max_rel_hotspot": 1.10,       # 110 %
     # Umbral relativo para el volumen "Vhot" (típicamente V110%)
@@ -2737,10 +3315,17 @@ HOTSPOT_CONFIG: Dict[str, float] = {
     "score_ok": 1.0,
     "score_warn": 0.6,
     "score_fail": 0.3,
+    # Localización de regiones (componentes conexas, core.dose_regions):
+    #  - hot: D >= Vhot_rel·Rx en todo el grid
+    #  - cold: D < cold_rel·Rx dentro del PTV
+    "localize_regions": True,
+    "cold_rel": 0.95,
+    "min_region_cc": 0.05,
+    "max_regions_reported": 5,
 }
 
 
-def get_hotspot_config() -> Dict[str, float]:
+def get_hotspot_config() -> Dict[str, Any]:
     """Devuelve la configuración actual de hotspots globales."""
     return HOTSPOT_CONFIG
 
@@ -3070,7 +3655,7 @@ PTV_HOMOGENEITY_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
 
 # ------------------------------------------------------------
 # 2.6) PTV_CONFORMITY (Paddick)
-#      - thresholds de CI
+#      - thresholds de CI y de gradiente (R50%, GI, D2cm)
 #      - textos cortos
 #      - recomendaciones
 # ------------------------------------------------------------
@@ -3086,6 +3671,19 @@ PTV_CONFORMITY_CONFIG: Dict[str, Dict[str, Any]] = {
         "score_warn": 0.7,
         "score_fail": 0.3,
         "score_no_info": 0.8,
+        # Gradiente de dosis (R50%, GI de Paddick, D2cm). Se reportan
+        # siempre; los límites (None = sin límite) sólo puntúan en planes
+        # con dosis por fracción >= sbrt_min_dose_per_fraction_gy.
+        "gradient_isodose_rel": 0.5,
+        "d2cm_distance_mm": 20.0,
+        "d2cm_shell_mm": 3.0,
+        "sbrt_min_dose_per_fraction_gy": 5.0,
+        "r50_max_ok": None,
+        "r50_max_warn": None,
+        "gi_max_ok": None,
+        "gi_max_warn": None,
+        "d2cm_max_pct_ok": None,
+        "d2cm_max_pct_warn": None,
     },
     "PROSTATE": {
         "prescription_isodose_rel": 1.0,
@@ -3095,6 +3693,19 @@ PTV_CONFORMITY_CONFIG: Dict[str, Dict[str, Any]] = {
         "score_warn": 0.7,
         "score_fail": 0.3,
         "score_no_info": 0.8,
+        # Gradiente de dosis (R50%, GI de Paddick, D2cm). Se reportan
+        # siempre; los límites (None = sin límite) sólo puntúan en planes
+        # con dosis por fracción >= sbrt_min_dose_per_fraction_gy.
+        "gradient_isodose_rel": 0.5,
+        "d2cm_distance_mm": 20.0,
+        "d2cm_shell_mm": 3.0,
+        "sbrt_min_dose_per_fraction_gy": 5.0,
+        "r50_max_ok": 5.0,
+        "r50_max_warn": 6.0,
+        "gi_max_ok": None,
+        "gi_max_warn": None,
+        "d2cm_max_pct_ok": 70.0,
+        "d2cm_max_pct_warn": 85.0,
     },
 }
 
@@ -3174,8 +3785,9 @@ PTV_CONFORMITY_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
     },
     "WARN": {
         "physicist": (
-            "El índice de conformidad de Paddick es algo inferior al rango óptimo; revisar si "
-            "hay exceso de volumen sano en la isodosis o sacrificio de cobertura."
+            "El índice de conformidad de Paddick es algo inferior al rango óptimo, o el "
+            "gradiente de dosis (R50%, GI, D2cm) supera el límite orientativo; revisar si "
+            "hay exceso de volumen sano en la isodosis intermedia o sacrificio de cobertura."
         ),
         "radonc": (
             "La conformidad del plan es moderada; podría haber algo de irradiación innecesaria "
@@ -3184,8 +3796,10 @@ PTV_CONFORMITY_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
     },
     "FAIL": {
         "physicist": (
-            "El índice de conformidad de Paddick es claramente bajo. La isodosis de "
-            "prescripción no se ajusta bien al PTV; recomendable replantear el plan."
+            "El índice de conformidad de Paddick es claramente bajo o la caída de dosis fuera "
+            "del PTV (R50%, D2cm) es demasiado lenta. La isodosis de prescripción o la del 50% "
+            "no se ajustan bien al PTV; recomendable replantear el plan (p.ej. estructuras "
+            "anillo de control de gradiente)."
         ),
         "radonc": (
             "La conformidad entre isodosis de prescripción y volumen objetivo es pobre. "
@@ -3195,6 +3809,366 @@ PTV_CONFORMITY_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
 }
 
 
+# ------------------------------------------------------------
+# 2.7) DOSE_GAMMA (TPS vs recálculo / predicción)
+#      - criterio gamma y umbrales de pass rate
+#      - recomendaciones
+# ------------------------------------------------------------
+
+DOSE_GAMMA_CONFIG: Dict[str, Dict[str, Any]] = {
+    "DEFAULT": {
+        # Criterio gamma (ver core.gamma)
+        "dose_pct": 3.0,
+        "dta_mm": 2.0,
+        "low_dose_threshold_pct": 10.0,
+        "local": False,
+        # Normalizar ΔD global a la Rx del plan en vez de al Dmax
+        "normalize_to_prescription": False,
+        # Radio de búsqueda (en DTA) y paso del stencil (DTA / step_fraction)
+        "max_gamma": 2.0,
+        "step_fraction": 3,
+        # Grid de cálculo: la dosis del Case está en el grid del CT
+        "grid_mm": 2.5,
+        # Pass rate (%) con γ <= 1
+        "min_pass_rate_ok": 95.0,
+        "min_pass_rate_warn": 90.0,
+        "score_ok": 1.0,
+        "score_warn": 0.6,
+        "score_fail": 0.2,
+        "score_no_info": 0.8,
+    },
+}
+
+
+def get_dose_gamma_config_for_site(site: Optional[str]) -> Dict[str, Any]:
+    key = (site or "DEFAULT").upper()
+    return DOSE_GAMMA_CONFIG.get(key, DOSE_GAMMA_CONFIG["DEFAULT"])
+
+
+DOSE_GAMMA_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
+    "NO_DOSE": {
+        "physicist": (
+            "No se encontró matriz de dosis del TPS en el Case; no se puede calcular gamma."
+        ),
+        "radonc": (
+            "El sistema de QA no tiene la dosis del plan, por lo que no puede compararla con "
+            "un cálculo independiente."
+        ),
+    },
+    "NO_EVAL": {
+        "physicist": (
+            "No hay dosis de comparación (metadata['dose_eval_gy']). Para activar este check, "
+            "adjuntar un recálculo independiente o la predicción del modelo en el grid del CT."
+        ),
+        "radonc": (
+            "No se dispone de un cálculo independiente de la dosis; la verificación gamma no "
+            "se ha realizado."
+        ),
+    },
+    "GRID_MISMATCH": {
+        "physicist": (
+            "La dosis de comparación no está en el mismo grid que la dosis del TPS. "
+            "Remuestrearla al grid del CT antes de adjuntarla."
+        ),
+        "radonc": (
+            "La dosis de comparación no es compatible con la del plan; la verificación gamma "
+            "no se ha realizado."
+        ),
+    },
+    "OK": {
+        "physicist": (
+            "El pass rate gamma frente a la dosis de comparación está dentro de tolerancia."
+        ),
+        "radonc": (
+            "La dosis del plan coincide con el cálculo independiente dentro de la tolerancia "
+            "habitual."
+        ),
+    },
+    "WARN": {
+        "physicist": (
+            "Pass rate gamma algo por debajo de lo esperado. Revisar el mapa gamma: "
+            "localizar las zonas con γ > 1 (penumbra, heterogeneidades, bordes del "
+            "cuerpo) y valorar si la discrepancia es clínicamente relevante."
+        ),
+        "radonc": (
+            "Hay diferencias moderadas entre la dosis del plan y el cálculo independiente. "
+            "El físico revisará si afectan a zonas clínicamente relevantes."
+        ),
+    },
+    "FAIL": {
+        "physicist": (
+            "Pass rate gamma bajo. Verificar que ambas dosis corresponden al mismo plan y "
+            "grid (registro, unidades, normalización) y, si es así, investigar el cálculo "
+            "del TPS o del modelo antes de aprobar."
+        ),
+        "radonc": (
+            "La dosis del plan difiere claramente del cálculo independiente. Se recomienda "
+            "no aprobar hasta que el físico aclare la discrepancia."
+        ),
+    },
+}
+
+
+# ------------------------------------------------------------
+# 2.8) OAR_DVH_EQD2
+#      - α/β por estructura (core.radiobiology)
+#      - límites DVH en EQD2 por sitio
+#      - recomendaciones
+# ------------------------------------------------------------
+
+ALPHA_BETA_CONFIG: Dict[str, Dict[str, Any]] = {
+    "DEFAULT": {
+        # α/β (Gy) por canonical de core.naming (sin sufijo _L/_R)
+        "by_canonical": {
+            "RECTUM": 3.0,
+            "RECTUM_WALL": 3.0,
+            "BLADDER": 5.0,
+            "FEMUR_HEAD": 2.0,
+            "PENILE_BULB": 3.0,
+            "BOWEL": 3.0,
+            "SMALL_BOWEL": 3.0,
+            "LARGE_BOWEL": 3.0,
+        },
+        # PTV / CTV
+        "target_ab_gy": 10.0,
+        # Resto de tejidos
+        "default_ab_gy": 3.0,
+    },
+    "PROSTATE": {
+        "by_canonical": {
+            "PROSTATE": 1.5,
+            "RECTUM": 3.0,
+            "RECTUM_WALL": 3.0,
+            "BLADDER": 5.0,
+            "FEMUR_HEAD": 2.0,
+            "PENILE_BULB": 3.0,
+            "BOWEL": 3.0,
+            "SMALL_BOWEL": 3.0,
+            "LARGE_BOWEL": 3.0,
+        },
+        "target_ab_gy": 1.5,
+        "default_ab_gy": 3.0,
+    },
+}
+
+
+def get_alpha_beta_config_for_site(site: Optional[str]) -> Dict[str, Any]:
+    key = _normalize_site_key(site)
+    return ALPHA_BETA_CONFIG.get(key, ALPHA_BETA_CONFIG["DEFAULT"])
+
+
+# Límites DVH expresados en EQD2 (Gy) por canonical de OAR. Las claves
+# siguen el formato de DVH_LIMITS: "V<x>_%" (x en Gy EQD2), "Dmax_Gy",
+# "Dmean_Gy". Valen igual para 39, 20 o 5 fracciones: la dosis se convierte
+# a EQD2 con el nº de fracciones del plan antes de comparar.
+DVH_LIMITS_EQD2: Dict[str, Dict[str, Dict[str, float]]] = {
+    "PROSTATE": {
+        "RECTUM": {
+            "V70_%": 20.0,
+            "V60_%": 35.0,
+            "V50_%": 50.0,
+        },
+        "BLADDER": {
+            "V70_%": 35.0,
+            "V65_%": 50.0,
+        },
+        "FEMUR_HEAD": {
+            "Dmax_Gy": 50.0,
+        },
+    },
+}
+
+
+def get_dvh_eqd2_limits_for_site(site: Optional[str]) -> Dict[str, Dict[str, float]]:
+    """Límites DVH en EQD2 para el sitio ({} si no hay)."""
+    return DVH_LIMITS_EQD2.get(_normalize_site_key(site), {})
+
+
+OAR_DVH_EQD2_CONFIG: Dict[str, Dict[str, Any]] = {
+    "DEFAULT": {
+        # Tolerancia (puntos % o Gy) antes de contar una violación
+        "tolerance": 0.0,
+        # Fracción de restricciones violadas hasta la que es WARN
+        "frac_viol_warn": 0.33,
+        "score_ok": 1.0,
+        "score_warn": 0.6,
+        "score_fail": 0.3,
+        "score_no_info": 0.8,
+    },
+}
+
+
+def get_oar_dvh_eqd2_config_for_site(site: Optional[str]) -> Dict[str, Any]:
+    key = _normalize_site_key(site)
+    return OAR_DVH_EQD2_CONFIG.get(key, OAR_DVH_EQD2_CONFIG["DEFAULT"])
+
+
+OAR_DVH_EQD2_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
+    "NO_DOSE": {
+        "physicist": (
+            "No hay dosis cargada; no se pueden evaluar restricciones DVH en EQD2."
+        ),
+        "radonc": (
+            "La distribución de dosis no está disponible; no se puede verificar el "
+            "cumplimiento de restricciones en dosis equivalente."
+        ),
+    },
+    "NO_INFO": {
+        "physicist": (
+            "No se conoce el número de fracciones del plan (RTPLAN ausente o incompleto); "
+            "no se puede convertir la dosis a EQD2."
+        ),
+        "radonc": (
+            "Sin el fraccionamiento del plan no se puede calcular la dosis equivalente a "
+            "2 Gy por fracción de los órganos de riesgo."
+        ),
+    },
+    "NO_CONSTRAINTS": {
+        "physicist": (
+            "No hay límites DVH en EQD2 configurados para este sitio o no se reconocieron "
+            "OARs con límites. Revisar DVH_LIMITS_EQD2 y la nomenclatura del RTSTRUCT."
+        ),
+        "radonc": (
+            "No se identificaron órganos de riesgo con restricciones en EQD2 configuradas."
+        ),
+    },
+    "OK": {
+        "physicist": (
+            "Las restricciones DVH en EQD2 de los OARs se cumplen con el fraccionamiento "
+            "del plan."
+        ),
+        "radonc": (
+            "Los órganos de riesgo cumplen las restricciones de dosis equivalente (EQD2)."
+        ),
+    },
+    "WARN": {
+        "physicist": (
+            "Alguna restricción DVH en EQD2 se supera. En hipofraccionamiento la EQD2 de "
+            "los OARs de α/β bajo crece más rápido que la dosis física: revisar los "
+            "objetivos de optimización con los límites convertidos."
+        ),
+        "radonc": (
+            "Alguna restricción de órganos de riesgo en dosis equivalente se supera. "
+            "Valóralo con el físico según el protocolo de fraccionamiento."
+        ),
+    },
+    "FAIL": {
+        "physicist": (
+            "Varias restricciones DVH en EQD2 se superan. Comprobar el número de fracciones "
+            "y los α/β usados y, si son correctos, reoptimizar antes de aprobar."
+        ),
+        "radonc": (
+            "Los órganos de riesgo superan varias restricciones de dosis equivalente; se "
+            "recomienda revisar el plan antes de aprobarlo."
+        ),
+    },
+}
+
+
+# ------------------------------------------------------------
+# 2.9) OAR_DVH_KB (plan vs dosis predicha por el modelo)
+#      - modelo, caché y parámetros de inferencia (ml.kb)
+#      - umbrales de exceso plan − predicción
+#      - recomendaciones
+# ------------------------------------------------------------
+
+DOSE_KB_CONFIG: Dict[str, Dict[str, Any]] = {
+    "DEFAULT": {
+        # Checkpoint de ml.kb.save_dose_model o modelo de ml.export
+        # (None = check informativo). Al configurarlo, activar también
+        # OAR_DVH_KB en GLOBAL_CHECK_CONFIG["Dose"] / DOSE_CHECK_CONFIG.
+        "model_path": None,
+        # Caché en disco de predicciones (None = sólo en memoria del worker)
+        "cache_dir": None,
+        # Inferencia por tiles (ml.inference) en el bbox de PTVs + OARs
+        "margin_mm": 20.0,
+        "tile_size": [64, 128, 128],
+        "overlap": 0.25,
+        "batch_size": 1,
+        "num_threads": None,
+        "memory_budget_mb": 2048,
+        # Métricas comparadas por OAR: Dmean y D2% (casi-máximo)
+        "metrics": ["Dmean_Gy", "D2_Gy"],
+        # Exceso (Gy) del plan sobre la predicción
+        "excess_warn_gy": 3.0,
+        "excess_fail_gy": 6.0,
+        # OARs más pequeños se ignoran
+        "min_volume_cc": 1.0,
+        "score_ok": 1.0,
+        "score_warn": 0.6,
+        "score_fail": 0.3,
+        "score_no_info": 0.8,
+    },
+}
+
+
+def get_dose_kb_config_for_site(site: Optional[str]) -> Dict[str, Any]:
+    key = _normalize_site_key(site)
+    return DOSE_KB_CONFIG.get(key, DOSE_KB_CONFIG["DEFAULT"])
+
+
+OAR_DVH_KB_RECOMMENDATIONS: Dict[str, Dict[str, str]] = {
+    "NO_DOSE": {
+        "physicist": (
+            "No hay dosis cargada; no se pueden comparar los DVH del plan con la predicción."
+        ),
+        "radonc": (
+            "La distribución de dosis no está disponible; no se puede comparar con la dosis "
+            "alcanzable estimada."
+        ),
+    },
+    "NO_MODEL": {
+        "physicist": (
+            "No hay modelo de predicción de dosis configurado, no se pudo cargar "
+            "(DOSE_KB_CONFIG['model_path'], PyTorch) o no es aplicable al caso (el CT no "
+            "se puede remuestrear al spacing de entrenamiento). El check queda informativo."
+        ),
+        "radonc": (
+            "La comparación con la dosis alcanzable estimada por el modelo no está activa."
+        ),
+    },
+    "NO_OARS": {
+        "physicist": (
+            "No se encontraron PTVs / OARs clínicos con volumen suficiente para comparar "
+            "con la predicción. Revisar la nomenclatura del RTSTRUCT."
+        ),
+        "radonc": (
+            "No se identificaron órganos de riesgo para comparar con la dosis alcanzable."
+        ),
+    },
+    "OK": {
+        "physicist": (
+            "Los DVH de los OARs están en línea con la dosis alcanzable predicha por el modelo."
+        ),
+        "radonc": (
+            "La dosis a los órganos de riesgo es similar a la que se consigue en casos "
+            "comparables."
+        ),
+    },
+    "WARN": {
+        "physicist": (
+            "Algún OAR recibe más dosis de la predicha como alcanzable. Revisar los objetivos "
+            "de optimización de ese OAR (Dmean / casi-máximo) y valorar reoptimizar."
+        ),
+        "radonc": (
+            "Algún órgano de riesgo recibe algo más de dosis que en casos comparables. El "
+            "físico valorará si se puede mejorar."
+        ),
+    },
+    "FAIL": {
+        "physicist": (
+            "Uno o más OARs reciben bastante más dosis de la alcanzable según el modelo. "
+            "Comprobar que la anatomía y los contornos son comparables a los de "
+            "entrenamiento y, si es así, reoptimizar antes de aprobar."
+        ),
+        "radonc": (
+            "Algún órgano de riesgo recibe claramente más dosis de la esperable; se "
+            "recomienda revisar el plan antes de aprobarlo."
+        ),
+    },
+}
+
+
 # ============================================================
 # 3) AGREGADORES (para mantener las APIs get_dose_check_texts
 #    y get_dose_recommendations tal como las usas en dose.py)
@@ -3231,6 +4205,9 @@ DOSE_RECOMMENDATIONS_BY_ID: Dict[str, Dict[str, Dict[str, str]]] = {
     "OAR_DVH_BASIC": OAR_DVH_BASIC_RECOMMENDATIONS,
     "PTV_HOMOGENEITY": PTV_HOMOGENEITY_RECOMMENDATIONS,
     "PTV_CONFORMITY": PTV_CONFORMITY_RECOMMENDATIONS,
+    "DOSE_GAMMA": DOSE_GAMMA_RECOMMENDATIONS,
+    "OAR_DVH_EQD2": OAR_DVH_EQD2_RECOMMENDATIONS,
+    "OAR_DVH_KB": OAR_DVH_KB_RECOMMENDATIONS,
 }
 
 # (opcional, por compatibilidad si en algún lado usas DOSE_RECOMMENDATIONS directo)
@@ -3836,6 +4813,19 @@ class MachineProfile(TypedDict, total=False):
     default_reporting_profile: str  # 'PHYSICS_DEEP', 'CLINICAL_QUICK', ...
     notes: str
 
+    # Límites de entrega (orientativos; ajústalos a la máquina real)
+    max_gantry_speed_deg_s: float   # velocidad máxima de gantry
+    max_dose_rate_mu_min: float     # tasa de dosis máxima (energía clínica)
+    max_leaf_speed_mm_s: float      # velocidad máxima de lámina (isocentro)
+    max_leaf_accel_mm_s2: float     # aceleración máxima de lámina
+    min_leaf_gap_mm: float          # gap mínimo entre láminas opuestas abiertas
+
+    # Geometría del gantry (cribado de colisiones, planning.collision)
+    gantry_type: str                # 'C_ARM' o 'RING'
+    head_clearance_mm: float        # isocentro → cara del cabezal (C_ARM)
+    head_radius_mm: float           # radio del cabezal/colimador (C_ARM)
+    bore_radius_mm: float           # radio libre del anillo (RING)
+
 
 MACHINE_PROFILES: Dict[str, MachineProfile] = {
     "HALCYON": {
@@ -3846,6 +4836,13 @@ MACHINE_PROFILES: Dict[str, MachineProfile] = {
         "default_site": "PROSTATE",
         "default_reporting_profile": "PHYSICS_DEEP",
         "notes": "Uso típico: pelvis/prostata VMAT 6X-FFF, workflows auto-QA.",
+        "max_gantry_speed_deg_s": 24.0,
+        "max_dose_rate_mu_min": 800.0,
+        "max_leaf_speed_mm_s": 50.0,
+        "max_leaf_accel_mm_s2": 1000.0,
+        "min_leaf_gap_mm": 0.5,
+        "gantry_type": "RING",
+        "bore_radius_mm": 500.0,
     },
     "TRUEBEAM": {
         "machine_id": "TRUEBEAM",
@@ -3855,6 +4852,14 @@ MACHINE_PROFILES: Dict[str, MachineProfile] = {
         "default_site": "DEFAULT",
         "default_reporting_profile": "PHYSICS_DEEP",
         "notes": "Plataforma generalista; usar perfiles por sitio según caso.",
+        "max_gantry_speed_deg_s": 6.0,
+        "max_dose_rate_mu_min": 600.0,
+        "max_leaf_speed_mm_s": 25.0,
+        "max_leaf_accel_mm_s2": 250.0,
+        "min_leaf_gap_mm": 0.5,
+        "gantry_type": "C_ARM",
+        "head_clearance_mm": 400.0,
+        "head_radius_mm": 350.0,
     },
     "ETHOS": {
         "machine_id": "ETHOS",
@@ -3864,6 +4869,13 @@ MACHINE_PROFILES: Dict[str, MachineProfile] = {
         "default_site": "PROSTATE",
         "default_reporting_profile": "CLINICAL_QUICK",
         "notes": "Workflows adaptativos; puede combinarse con perfiles de CBCT.",
+        "max_gantry_speed_deg_s": 24.0,
+        "max_dose_rate_mu_min": 800.0,
+        "max_leaf_speed_mm_s": 50.0,
+        "max_leaf_accel_mm_s2": 1000.0,
+        "min_leaf_gap_mm": 0.5,
+        "gantry_type": "RING",
+        "bore_radius_mm": 500.0,
     },
 }
 
@@ -3896,30 +4908,50 @@ CLINIC_PROFILES: Dict[str, ClinicProfile] = {
 }
 
 
+# Nombre de máquina (TreatmentMachineName del RTPLAN, en mayúsculas) →
+# clave de MACHINE_PROFILES. Se busca como substring; añade aquí los
+# nombres locales de cada acelerador del servicio.
+MACHINE_NAME_ALIASES: Dict[str, str] = {
+    "HALCYON": "HALCYON",
+    "TRUEBEAM": "TRUEBEAM",
+    "ETHOS": "ETHOS",
+    "HAL2290": "HALCYON",
+}
+
+
+def match_machine_profile(machine_name: Optional[str]) -> Optional[MachineProfile]:
+    """
+    Perfil de máquina para un nombre libre (por ejemplo el
+    TreatmentMachineName del RTPLAN) según MACHINE_NAME_ALIASES, o None
+    si el nombre no corresponde a ninguna máquina conocida.
+
+    Los checks que dependen de la geometría o de los límites físicos de
+    la máquina (colisiones, entregabilidad, tiempo de haz) usan esta
+    función: con None quedan en NO_INFO en vez de evaluarse contra un
+    perfil por defecto.
+    """
+    if not machine_name:
+        return None
+    name_up = machine_name.strip().upper()
+    if name_up in MACHINE_PROFILES:
+        return MACHINE_PROFILES[name_up]
+    # alias más largo primero (el más específico)
+    for alias in sorted(MACHINE_NAME_ALIASES, key=len, reverse=True):
+        if alias.upper() in name_up:
+            return MACHINE_PROFILES.get(MACHINE_NAME_ALIASES[alias])
+    return None
+
+
 def infer_machine_profile(machine_name: Optional[str]) -> MachineProfile:
     """
     Intenta inferir el perfil de máquina a partir de un nombre libre
-    (por ejemplo metadata['machine_name'] del Case).
+    (por ejemplo metadata['machine_name'] del Case) para la UI.
 
-    Reglas simples basadas en substrings:
-      - contiene 'HALCYON'  -> MACHINE_PROFILES['HALCYON']
-      - contiene 'TRUEBEAM' -> MACHINE_PROFILES['TRUEBEAM']
-      - contiene 'ETHOS'    -> MACHINE_PROFILES['ETHOS']
-      - otro / None         -> MACHINE_PROFILES['HALCYON'] (por defecto)
+    Usa match_machine_profile (MACHINE_NAME_ALIASES); si el nombre no
+    corresponde a ninguna máquina devuelve MACHINE_PROFILES['HALCYON']
+    (por defecto). Los checks no deben usar este fallback.
     """
-    if not machine_name:
-        return MACHINE_PROFILES["HALCYON"]
-
-    name_up = machine_name.upper()
-    if "HALCYON" in name_up:
-        return MACHINE_PROFILES["HALCYON"]
-    if "TRUEBEAM" in name_up:
-        return MACHINE_PROFILES["TRUEBEAM"]
-    if "ETHOS" in name_up:
-        return MACHINE_PROFILES["ETHOS"]
-
-    # Fallback
-    return MACHINE_PROFILES["HALCYON"]
+    return match_machine_profile(machine_name) or MACHINE_PROFILES["HALCYON"]
 
 
 def get_clinic_profile(clinic_id: Optional[str]) -> ClinicProfile:
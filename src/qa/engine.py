@@ -1,13 +1,13 @@
 # src/qa/engine.py
 
-from typing import List
+from typing import List, Optional, Set
 
 from core.case import Case, CheckResult, QAResult
-from .checks import run_all_checks
+from .checks import run_all_checks, run_preview_checks
 from .scoring import build_qa_result
 
 
-def evaluate_case(case: Case) -> QAResult:
+def evaluate_case(case: Case, enabled_checks: Optional[Set[str]] = None) -> QAResult:
     """
     Interfaz de alto nivel del Auto-QA.
 
@@ -15,11 +15,28 @@ def evaluate_case(case: Case) -> QAResult:
       - total_score
       - lista de CheckResult
       - recomendaciones agregadas
+
+    enabled_checks: ids "<sección>.<check_key>" a ejecutar
+    (ver qa.build_ui_config.get_enabled_check_ids). None = todos.
     """
-    # 1) Correr todos los checks definidos en qa.checks
-    checks_list: List[CheckResult] = run_all_checks(case)
+    # 1) Correr los checks activos definidos en qa.checks
+    checks_list: List[CheckResult] = run_all_checks(case, enabled_checks)
 
     # 2) Construir QAResult a partir de esos checks
     qa_result: QAResult = build_qa_result(case, checks_list)
 
     return qa_result
+
+
+def evaluate_case_preview(case: Case, enabled_checks: Optional[Set[str]] = None) -> QAResult:
+    """
+    Vista previa del Auto-QA: ejecuta sólo los checks activos que
+    dependen de cabeceras DICOM (geometría/FOV del CT, nombres de
+    estructuras, técnica, geometría de beams, fraccionamiento,
+    prescripción, MU, modulación...).
+
+    Pensado para un Case de core.build_case.build_preview_case_from_dicom;
+    el score es parcial (sólo de esos checks).
+    """
+    checks_list: List[CheckResult] = run_preview_checks(case, enabled_checks)
+    return build_qa_result(case, checks_list)
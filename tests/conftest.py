@@ -0,0 +1,9 @@
+# tests/conftest.py
+
+import os
+import sys
+
+# Los módulos se importan como en la app: core.*, qa.*, ml.*, planning.*
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
@@ -0,0 +1,61 @@
+# tests/test_bev.py
+
+import numpy as np
+import pytest
+
+from planning.bev import patient_to_bld_matrices
+
+
+def _R(gantry, collimator=0.0, couch=0.0, position="HFS"):
+    return patient_to_bld_matrices(np.array([gantry]), np.array([collimator]), np.array([couch]), position)[0]
+
+
+# Dirección DICOM (LPS) del isocentro hacia la fuente en cada caso: al
+# aplicarle R debe quedar en +Z_bld
+@pytest.mark.parametrize("position, gantry, couch, towards_source", [
+    ("HFS", 0, 0, (0, -1, 0)),     # anterior
+    ("HFS", 90, 0, (1, 0, 0)),     # izquierda del paciente
+    ("HFS", 180, 0, (0, 1, 0)),    # posterior
+    ("HFS", 270, 0, (-1, 0, 0)),   # derecha del paciente
+    ("HFS", 0, 90, (0, -1, 0)),    # la mesa gira alrededor del eje vertical
+    ("HFS", 90, 90, (0, 0, -1)),   # mesa a 90°: los pies apuntan a +X_f
+    ("HFS", 90, 270, (0, 0, 1)),
+    ("HFP", 0, 0, (0, 1, 0)),      # prono: la espalda mira a la fuente
+    ("HFP", 90, 0, (-1, 0, 0)),
+    ("FFS", 0, 0, (0, -1, 0)),
+    ("FFS", 90, 0, (-1, 0, 0)),
+    ("FFP", 0, 0, (0, 1, 0)),
+])
+def test_source_direction_at_cardinal_angles(position, gantry, couch, towards_source):
+    R = _R(gantry, couch=couch, position=position)
+    np.testing.assert_allclose(R @ np.array(towards_source, float), [0.0, 0.0, 1.0], atol=1e-12)
+
+
+def test_hfs_axes_at_zero_angles():
+    R = _R(0)
+    # X_bld = izquierda del paciente (+x DICOM), Y_bld = hacia el gantry (cabeza, +z DICOM)
+    np.testing.assert_allclose(R @ [1, 0, 0], [1, 0, 0], atol=1e-12)
+    np.testing.assert_allclose(R @ [0, 0, 1], [0, 1, 0], atol=1e-12)
+
+
+def test_collimator_rotates_about_beam_axis():
+    R0, R90 = _R(0), _R(0, collimator=90)
+    # El eje del haz no cambia; X_bld pasa a ser la antigua Y_bld
+    np.testing.assert_allclose(R90 @ [0, -1, 0], [0, 0, 1], atol=1e-12)
+    np.testing.assert_allclose(R90 @ [0, 0, 1], [1, 0, 0], atol=1e-12)
+    np.testing.assert_allclose(R90[2], R0[2], atol=1e-12)
+
+
+def test_matrices_are_rotations_for_all_control_points():
+    rng = np.random.default_rng(0)
+    g, c, t = (rng.uniform(0, 360, 50) for _ in range(3))
+    for position in ("HFS", "HFP", "FFS", "FFP"):
+        R = patient_to_bld_matrices(g, c, t, position)
+        assert R.shape == (50, 3, 3)
+        np.testing.assert_allclose(R @ np.swapaxes(R, 1, 2), np.broadcast_to(np.eye(3), R.shape), atol=1e-12)
+        np.testing.assert_allclose(np.linalg.det(R), 1.0, atol=1e-12)
+
+
+def test_unknown_patient_position_raises():
+    with pytest.raises(ValueError):
+        _R(0, position="DECUBITUS")
@@ -0,0 +1,75 @@
+# tests/test_crop.py
+
+import numpy as np
+import pytest
+
+from ml.crop import CropTransform, crop_region_from_mask, make_crop_transform
+
+
+SHAPE = (12, 20, 24)                      # (Z, Y, X)
+SPACING = (1.5, 1.5, 3.0)                 # (sx, sy, sz)
+ORIGIN = (-20.0, 35.0, 100.0)
+DIRECTION = (1, 0, 0, 0, 1, 0, 0, 0, 1)
+
+
+def _volume(seed=0):
+    return np.random.default_rng(seed).normal(size=SHAPE).astype(np.float32)
+
+
+def _linear_ramp():
+    zz, yy, xx = np.meshgrid(*(np.arange(n) for n in SHAPE), indexing="ij")
+    return (0.7 * zz * SPACING[2] - 0.2 * yy * SPACING[1] + 0.5 * xx * SPACING[0]).astype(np.float32)
+
+
+def test_full_region_without_resampling_is_identity():
+    vol = _volume()
+    t = make_crop_transform(SHAPE, SPACING, ORIGIN, DIRECTION)
+    np.testing.assert_array_equal(t.apply(vol), vol)
+    np.testing.assert_array_equal(t.invert(vol), vol)
+    assert t.crop_origin == pytest.approx(ORIGIN)
+
+
+def test_crop_then_invert_restores_region():
+    vol = _volume()
+    region = (slice(2, 9), slice(4, 15), slice(3, 20))
+    t = make_crop_transform(SHAPE, SPACING, ORIGIN, DIRECTION, region=region)
+
+    out = t.invert(t.apply(vol), fill_value=-1.0)
+    np.testing.assert_array_equal(out[region], vol[region])
+    outside = np.ones(SHAPE, bool)
+    outside[region] = False
+    assert np.all(out[outside] == -1.0)
+
+    model = _volume(1)[: t.out_shape[0], : t.out_shape[1], : t.out_shape[2]]
+    np.testing.assert_array_equal(t.apply(t.invert(model)), model)
+
+
+def test_resampling_round_trip_preserves_linear_field():
+    # La interpolación lineal es exacta para un campo lineal, salvo en el
+    # borde del recorte (extrapolación)
+    vol = _linear_ramp()
+    region = (slice(1, 11), slice(2, 18), slice(2, 22))
+    t = make_crop_transform(SHAPE, SPACING, ORIGIN, DIRECTION, region=region, out_spacing=2.5)
+    assert t.out_shape != t.crop_shape
+
+    out = t.invert(t.apply(vol))
+    inner = (slice(3, 8), slice(5, 14), slice(5, 19))
+    np.testing.assert_allclose(out[inner], vol[inner], atol=1e-3)
+
+
+def test_resampling_to_same_spacing_is_identity():
+    vol = _volume()
+    t = make_crop_transform(SHAPE, SPACING, ORIGIN, DIRECTION, out_spacing=SPACING)
+    np.testing.assert_allclose(t.apply(vol), vol, atol=1e-6)
+    np.testing.assert_allclose(t.invert(vol), vol, atol=1e-6)
+
+
+def test_meta_round_trip_and_mask_region():
+    mask = np.zeros(SHAPE, bool)
+    mask[4:7, 8:11, 10:13] = True
+    region = crop_region_from_mask(mask, SPACING, margin_mm=3.0)
+    assert region == (slice(3, 8), slice(6, 13), slice(8, 15))
+
+    t = make_crop_transform(SHAPE, SPACING, ORIGIN, DIRECTION, region=region, out_spacing=2.0)
+    assert CropTransform.from_meta(t.to_meta()) == t
+    assert CropTransform.from_meta({"crop_transform": t.to_meta()}) == t
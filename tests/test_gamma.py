@@ -0,0 +1,50 @@
+# tests/test_gamma.py
+
+import numpy as np
+import pytest
+
+from core.gamma import compute_gamma
+
+ndimage = pytest.importorskip("scipy.ndimage")
+
+
+def _brute_force_gamma(ref, ev, spacing_zyx, dose_pct, dta_mm, threshold_pct, local, max_gamma, step_fraction):
+    """Γ voxel a voxel recorriendo todo el stencil, con interpolación trilineal de scipy."""
+    d_norm = float(ref.max())
+    step = dta_mm / step_fraction
+    n = int(np.floor(max_gamma * dta_mm / step))
+    axis = np.arange(-n, n + 1) * step
+    off_mm = np.stack(np.meshgrid(axis, axis, axis, indexing="ij"), axis=-1).reshape(-1, 3)
+    off_mm = off_mm[np.linalg.norm(off_mm, axis=1) <= max_gamma * dta_mm + 1e-9]
+    off_vox = off_mm / np.asarray(spacing_zyx)
+    dist2 = (off_mm ** 2).sum(axis=1) / dta_mm ** 2
+
+    out = np.full(ref.shape, np.nan)
+    for z, y, x in np.argwhere(ref >= threshold_pct / 100.0 * d_norm):
+        coords = (np.array([z, y, x]) + off_vox).T
+        d_eval = ndimage.map_coordinates(ev.astype(np.float64), coords, order=1, mode="nearest")
+        dd = dose_pct / 100.0 * (ref[z, y, x] if local else d_norm)
+        out[z, y, x] = np.sqrt(np.min(dist2 + (d_eval - ref[z, y, x]) ** 2 / dd ** 2))
+    return out
+
+
+@pytest.mark.parametrize("local", [False, True])
+def test_compute_gamma_matches_brute_force(local):
+    rng = np.random.default_rng(0)
+    zz, yy, xx = np.meshgrid(np.arange(8), np.arange(10), np.arange(12), indexing="ij")
+    ref = 50.0 * np.exp(-((zz - 4) ** 2 / 18.0 + (yy - 5) ** 2 / 12.0 + (xx - 6) ** 2 / 20.0))
+    ev = np.roll(ref, 1, axis=2) * 1.02 + rng.normal(0.0, 0.3, ref.shape)
+    ref, ev = ref.astype(np.float32), ev.astype(np.float32)
+    spacing = (2.5, 2.0, 1.5)
+    kw = dict(dose_pct=3.0, dta_mm=2.0, local=local, max_gamma=2.0, step_fraction=3)
+
+    res = compute_gamma(ref, ev, spacing, low_dose_threshold_pct=10.0, n_workers=2, slab_size=3, **kw)
+    expected = _brute_force_gamma(ref, ev, spacing, threshold_pct=10.0, **kw)
+
+    evaluated = np.isfinite(expected)
+    assert np.array_equal(np.isfinite(res.gamma), evaluated)
+    # Mismo stencil: la terminación temprana no cambia el mínimo
+    np.testing.assert_allclose(res.gamma[evaluated], expected[evaluated], rtol=1e-4, atol=1e-4)
+    assert res.n_evaluated == int(evaluated.sum())
+    assert res.pass_rate == pytest.approx(100.0 * np.mean(expected[evaluated] <= 1.0))
+    assert 0.0 < res.pass_rate < 100.0
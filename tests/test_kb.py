@@ -0,0 +1,80 @@
+# tests/test_kb.py
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+
+from ml.kb import (
+    IncompatibleModelError,
+    LoadedDoseModel,
+    load_dose_model,
+    predict_case_kb_dose,
+    save_dose_model,
+)
+from ml.models import UNet3D
+
+
+SHAPE = (16, 32, 32)                      # (Z, Y, X)
+SPACING_ZYX = (3.0, 1.0, 1.0)
+
+
+class _ProbeModel(torch.nn.Module):
+    """Devuelve 10 × el canal del PTV y cuenta los voxeles de PTV que ve."""
+
+    def __init__(self):
+        super().__init__()
+        self.ptv_voxels = 0.0
+
+    def forward(self, x):
+        self.ptv_voxels += float(x[:, 1].sum())
+        return 10.0 * x[:, 1:2]
+
+
+def _case(with_geometry=True):
+    ptv = np.zeros(SHAPE, bool)
+    ptv[4:12, 8:24, 8:24] = True
+    rectum = np.zeros(SHAPE, bool)
+    rectum[4:12, 24:30, 12:20] = True
+    metadata = {}
+    if with_geometry:
+        metadata = {"ct_origin": (-16.0, -16.0, 0.0), "ct_direction": (1, 0, 0, 0, 1, 0, 0, 0, 1)}
+    return SimpleNamespace(
+        ct_hu=np.zeros(SHAPE, np.float32),
+        ct_spacing=SPACING_ZYX,
+        structs={"PTV": SimpleNamespace(mask=ptv), "Rectum": SimpleNamespace(mask=rectum)},
+        metadata=metadata,
+    )
+
+
+def _loaded(model, spacing_mm, model_hash):
+    return LoadedDoseModel(model=model, roi_order=["PTV", "Rectum"], hu_min=-1000, hu_max=2000,
+                           model_hash=model_hash, path="", spacing_mm=spacing_mm)
+
+
+def test_checkpoint_records_training_spacing(tmp_path):
+    path = str(tmp_path / "model.pt")
+    save_dose_model(path, UNet3D(3, base_filters=4), ["PTV", "Rectum"], spacing_mm=2.5)
+    assert load_dose_model(path).spacing_mm == (2.5, 2.5, 2.5)
+
+
+def test_prediction_runs_on_training_grid_and_returns_to_ct_grid():
+    model = _ProbeModel()
+    case = _case()
+    pred = predict_case_kb_dose(case, _loaded(model, (2.0, 2.0, 6.0), "kb-test-resample"),
+                                margin_mm=0.0, tile_size=(64, 64, 64))
+
+    # la red ve la región a la mitad de resolución en cada eje (un solo tile)
+    assert model.ptv_voxels == pytest.approx(case.structs["PTV"].mask.sum() / 8, rel=0.1)
+    assert pred.dose.shape == tuple(s.stop - s.start for s in pred.region)
+    # la dosis vuelve al grid del CT: ≈ 10 Gy en el interior del PTV
+    inner = np.zeros(SHAPE, bool)
+    inner[6:10, 12:20, 12:20] = True
+    assert np.allclose(pred.dose[inner[pred.region]], 10.0, atol=1e-3)
+
+
+def test_prediction_without_ct_geometry_is_incompatible():
+    with pytest.raises(IncompatibleModelError):
+        predict_case_kb_dose(_case(with_geometry=False),
+                             _loaded(_ProbeModel(), (2.0, 2.0, 6.0), "kb-test-incompatible"))
@@ -0,0 +1,33 @@
+# tests/test_machine_profiles.py
+
+from types import SimpleNamespace
+
+import pytest
+
+from qa.checks.plan import check_plan_collision, check_plan_deliverability
+from qa.config import MACHINE_PROFILES, infer_machine_profile, match_machine_profile
+
+
+def test_known_names_and_aliases_map_to_their_profile():
+    assert match_machine_profile("TrueBeam_STx")["machine_id"] == "TRUEBEAM"
+    assert match_machine_profile("halcyon")["machine_id"] == "HALCYON"
+    assert match_machine_profile("HAL2290")["machine_id"] == "HALCYON"
+
+
+@pytest.mark.parametrize("name", ["TB1", "LINAC2", "", None])
+def test_unknown_names_have_no_profile(name):
+    assert match_machine_profile(name) is None
+    # la UI sigue mostrando el perfil por defecto
+    assert infer_machine_profile(name) is MACHINE_PROFILES["HALCYON"]
+
+
+@pytest.mark.parametrize("check", [check_plan_collision, check_plan_deliverability])
+def test_plan_checks_skip_unknown_machine(check):
+    case = SimpleNamespace(
+        plan=SimpleNamespace(machine_name="TB1", beams=[]),
+        structs={"BODY": None, "PTV_7800": None},
+        metadata={},
+    )
+    result = check(case)
+    assert result.passed and result.details["machine_name"] == "TB1"
+    assert "TB1" in result.message
@@ -0,0 +1,46 @@
+# tests/test_plan_complexity.py
+
+import numpy as np
+import pytest
+
+from core.case import ControlPointArrays
+from core.plan_complexity import compute_control_point_metrics
+
+
+def _cpa(bank_a, bank_b, jaw_x, jaw_y, leaf_width_mm=10.0):
+    """Un CP con un MLCX de len(bank_a) pares de láminas centrados en 0."""
+    n_pairs = len(bank_a)
+    half = 0.5 * n_pairs * leaf_width_mm
+    return ControlPointArrays(
+        gantry_deg=np.zeros(1, np.float32),
+        collimator_deg=np.zeros(1, np.float32),
+        couch_deg=np.zeros(1, np.float32),
+        cum_meterset_weight=np.zeros(1, np.float32),
+        jaw_x_mm=np.array([jaw_x], np.float32),
+        jaw_y_mm=np.array([jaw_y], np.float32),
+        mlc_mm={"MLCX": np.array([list(bank_a) + list(bank_b)], np.float32)},
+        leaf_boundaries_mm={"MLCX": np.linspace(-half, half, n_pairs + 1).astype(np.float32)},
+    )
+
+
+def test_edge_metric_ignores_open_leaves_behind_the_y_jaw():
+    # 10 pares de 10 mm, todos abiertos 10 mm; la mandíbula Y ±5 deja ver
+    # sólo dos medias franjas → rectángulo de 10 x 10 mm: perímetro / área = 0.4
+    cpa = _cpa([-5.0] * 10, [5.0] * 10, jaw_x=(-10.0, 10.0), jaw_y=(-5.0, 5.0))
+    m = compute_control_point_metrics(cpa)
+    assert m["area_cm2"][0] == pytest.approx(1.0)
+    assert m["edge_mm1"][0] == pytest.approx(0.4)
+
+
+def test_edge_metric_of_staggered_aperture():
+    # Tres franjas abiertas desplazadas entre sí, con franjas cerradas y
+    # franjas abiertas tapadas por la mandíbula alrededor
+    a = [-5.0, -5.0, 0.0, -10.0, -5.0, 0.0, -5.0, -5.0]
+    b = [5.0, 5.0, 0.0, 0.0, 5.0, 10.0, 5.0, 5.0]
+    cpa = _cpa(a, b, jaw_x=(-20.0, 20.0), jaw_y=(-10.0, 20.0))
+    m = compute_control_point_metrics(cpa)
+    # Abiertas y visibles: [-10, 0], [-5, 5], [0, 10] (10 mm de ancho cada una)
+    area = 3 * 10 * 10
+    tips = 2 * 3 * 10
+    sides = 10 + (5 + 5) + (5 + 5) + 10
+    assert m["edge_mm1"][0] == pytest.approx((tips + sides) / area)
@@ -0,0 +1,88 @@
+# tests/test_shards.py
+
+import numpy as np
+import pytest
+
+from ml.shards import DoseShard, list_shards, normalize_ct, write_shard
+
+
+ROIS = ["PTV", "Rectum", "Bladder"]
+
+
+def _sample(shape=(5, 6, 19), seed=0):
+    rng = np.random.default_rng(seed)
+    ct = rng.integers(-1200, 2500, size=shape).astype(np.int16)
+    masks = {name: rng.random(shape) > 0.6 for name in ROIS[:2]}  # Bladder ausente → vacía
+    dose = rng.uniform(0.0, 80.0, size=shape).astype(np.float32)
+    return ct, masks, dose
+
+
+def _write(tmp_path, dose_dtype="float32"):
+    ct, masks, dose = _sample()
+    path = write_shard(
+        str(tmp_path), "p1", ct, masks, ROIS, dose,
+        ct_spacing=(1.2, 1.2, 2.5), ct_origin=(-10.0, 20.0, 30.0),
+        ct_direction=(1, 0, 0, 0, 1, 0, 0, 0, 1), dose_dtype=dose_dtype,
+    )
+    return path, ct, masks, dose
+
+
+@pytest.mark.parametrize("dose_dtype", ["float32", "float16"])
+def test_write_read_round_trip(tmp_path, dose_dtype):
+    path, ct, masks, dose = _write(tmp_path, dose_dtype)
+    assert list_shards(str(tmp_path)) == ["p1"]
+
+    shard = DoseShard(path)
+    assert shard.shape == ct.shape and shard.roi_order == ROIS
+    np.testing.assert_array_equal(shard.read_ct(), normalize_ct(ct))
+    dense = shard.read_masks()
+    for i, name in enumerate(ROIS):
+        expected = masks.get(name, np.zeros(ct.shape, bool))
+        np.testing.assert_array_equal(dense[i], expected.astype(np.float32))
+    rtol = 0 if dose_dtype == "float32" else 1e-3
+    np.testing.assert_allclose(shard.read_dose(), dose, rtol=rtol, atol=1e-6)
+
+    X = shard.read_input()
+    np.testing.assert_array_equal(X[0], shard.read_ct())
+    np.testing.assert_array_equal(X[1:], dense)
+
+
+def test_region_reads_match_full_volume(tmp_path):
+    path, _, _, _ = _write(tmp_path)
+    shard = DoseShard(path)
+    full_ct, full_masks, full_dose = shard.read_ct(), shard.read_masks(), shard.read_dose()
+
+    # x no alineado a bytes (las máscaras van empaquetadas de 8 en 8) y con paso
+    for region in [
+        (slice(1, 4), slice(0, 6), slice(3, 17)),
+        (slice(0, 5, 2), slice(1, 5), slice(1, 19, 3)),
+        (slice(2, 3), slice(2, 3), slice(7, 9)),
+    ]:
+        np.testing.assert_array_equal(shard.read_ct(region), full_ct[region])
+        np.testing.assert_array_equal(shard.read_masks(region), full_masks[(slice(None),) + region])
+        np.testing.assert_array_equal(shard.read_dose(region), full_dose[region])
+        np.testing.assert_array_equal(
+            shard.read_masks(region, channels=[1]), full_masks[(slice(1, 2),) + region]
+        )
+
+
+def test_label_bits_match_dense_masks(tmp_path):
+    torch = pytest.importorskip("torch")
+    from ml.dataset import expand_label_bits
+
+    path, _, _, _ = _write(tmp_path)
+    shard = DoseShard(path)
+    region = (slice(0, 5), slice(1, 6), slice(2, 19, 2))
+
+    labels = shard.read_label_bits(region)
+    dense = shard.read_masks(region)
+    assert labels.dtype == np.uint8 and labels.shape == dense.shape[1:]
+    for i in range(len(ROIS)):
+        np.testing.assert_array_equal((labels >> i) & 1, dense[i])
+
+    # Expansión one-hot tras el DataLoader (mask_encoding="bits")
+    onehot = expand_label_bits(torch.from_numpy(labels[None]), len(ROIS))
+    np.testing.assert_array_equal(onehot[0].numpy(), dense)
+
+    sub = shard.read_label_bits(region, channels=[1])
+    np.testing.assert_array_equal(sub, dense[1].astype(np.uint8))